@@ -447,21 +447,38 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 # Video encoding
 
+# The renditions ladder as (name, height, video bitrate in kbps), a rendition is never encoded above the height of
+# the video but the lowest one is always encoded
+VIDEO_ENCODING_LADDER = (
+    ('mp4_ld', 240, 400),
+    ('mp4_sd', 480, 1000),
+    ('mp4_hd', 720, 2500),
+)
+VIDEO_ENCODING_RENDITIONS = os.environ.get('VIDEO_ENCODING_RENDITIONS', 'mp4_ld,mp4_sd,mp4_hd').split(',')
+
 VIDEO_ENCODING_FORMATS = {
     'FFmpeg': [
         {
-            'name': 'mp4_sd',
+            'name': name,
             'extension': 'mp4',
+            # Scaled with scale=-2:<height>, http://superuser.com/a/776254
+            'height': height,
             'params': [
                 '-codec:v', 'libx264', '-crf', '20', '-preset', 'medium',
-                '-b:v', '1000k', '-maxrate', '1000k', '-bufsize', '2000k',
-                '-vf', 'scale=-2:480',  # http://superuser.com/a/776254
+                '-b:v', '%dk' % bitrate, '-maxrate', '%dk' % bitrate, '-bufsize', '%dk' % (bitrate * 2),
                 '-codec:a', 'aac', '-b:a', '128k', '-strict', '-2', '-preset', 'veryfast'
             ],
-        },
+        } for name, height, bitrate in VIDEO_ENCODING_LADDER if name in VIDEO_ENCODING_RENDITIONS
     ]
 }
 
+# Every rendition is encoded in its own job, at most VIDEO_ENCODING_MAX_CONCURRENCY at once across the workers
+VIDEO_ENCODING_MAX_CONCURRENCY = int(os.environ.get('VIDEO_ENCODING_MAX_CONCURRENCY', '2'))
+VIDEO_ENCODING_SLOT_SECONDS = int(os.environ.get('VIDEO_ENCODING_SLOT_SECONDS', str(60 * 30)))
+VIDEO_ENCODING_RETRY_SECONDS = int(os.environ.get('VIDEO_ENCODING_RETRY_SECONDS', '15'))
+# A rendition not encoded VIDEO_ENCODING_CLAIM_SECONDS after its job last waited for or took a slot is enqueued again
+VIDEO_ENCODING_CLAIM_SECONDS = int(os.environ.get('VIDEO_ENCODING_CLAIM_SECONDS', str(60 * 60)))
+
 PROXY_URL = os.environ.get('PROXY_URL', '')
 
 # Openbook config
@@ -531,8 +548,79 @@ ALERT_HOOK_URL = os.environ.get('ALERT_HOOK_URL')
 
 MIN_UNIQUE_TOP_POST_REACTIONS_COUNT = int(os.environ.get('MIN_UNIQUE_TOP_POST_REACTIONS_COUNT', '5'))
 MIN_UNIQUE_TOP_POST_COMMENTS_COUNT = int(os.environ.get('MIN_UNIQUE_TOP_POST_COMMENTS_COUNT', '5'))
+# The top posts candidates are dropped once older than TOP_POSTS_CANDIDATES_MAX_AGE_SECONDS, or past the latest
+# TOP_POSTS_CANDIDATES_MAX_COUNT, even when a top posts job hasn't evaluated them, see openbook_posts.top_posts
+TOP_POSTS_CANDIDATES_MAX_AGE_SECONDS = int(os.environ.get('TOP_POSTS_CANDIDATES_MAX_AGE_SECONDS', str(60 * 60 * 24)))
+TOP_POSTS_CANDIDATES_MAX_COUNT = int(os.environ.get('TOP_POSTS_CANDIDATES_MAX_COUNT', '100000'))
 MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT = int(os.environ.get('MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT', '5'))
 
+# Materialized timelines
+TIMELINE_MAX_POSTS = int(os.environ.get('TIMELINE_MAX_POSTS', '800'))
+TIMELINE_EXPIRATION_SECONDS = int(os.environ.get('TIMELINE_EXPIRATION_SECONDS', str(60 * 60 * 24 * 7)))
+TIMELINE_WARM_UP_LOCK_SECONDS = int(os.environ.get('TIMELINE_WARM_UP_LOCK_SECONDS', '60'))
+
+# New post notifications are created in a job once the post is published
+POST_SUBSCRIBERS_FAN_OUT_ASYNC = True
+
+# The sizes and formats post images are stored in, see openbook_posts.image_variants
+POST_IMAGE_VARIANTS_WIDTHS = [int(width) for width in
+                              os.environ.get('POST_IMAGE_VARIANTS_WIDTHS', '320,640,1024').split(',')]
+POST_IMAGE_VARIANTS_FORMATS = os.environ.get('POST_IMAGE_VARIANTS_FORMATS', 'JPEG,WEBP').split(',')
+POST_IMAGE_VARIANTS_QUALITY = int(os.environ.get('POST_IMAGE_VARIANTS_QUALITY', '75'))
+
+# The hashtags without an image are covered with a post image in a job
+HASHTAG_COVER_ASYNC = True
+
+# The media added to posts are ingested in a job, see openbook_posts.media_ingestion
+POST_MEDIA_INGESTION_ASYNC = True
+# The uploads processing for longer are deemed stalled, their worker died, and can be ingested again
+POST_MEDIA_UPLOAD_PROCESSING_TIMEOUT_SECONDS = int(
+    os.environ.get('POST_MEDIA_UPLOAD_PROCESSING_TIMEOUT_SECONDS', str(60 * 30)))
+# The files of the post images and videos no longer referenced are deleted once their deletion is committed
+POST_MEDIA_FILES_DELETION_ON_COMMIT = True
+
+# The notifications of a post beyond the first chunk are purged in a job
+POST_NOTIFICATIONS_PURGE_CHUNK_SIZE = int(os.environ.get('POST_NOTIFICATIONS_PURGE_CHUNK_SIZE', '1000'))
+
+# Trending posts scores
+TRENDING_POSTS_SCORES_BACKEND = 'openbook_posts.trending.RedisTrendingPostsScores'
+TRENDING_POSTS_HALF_LIFE_SECONDS = int(os.environ.get('TRENDING_POSTS_HALF_LIFE_SECONDS', str(60 * 60 * 6)))
+TRENDING_POSTS_REACTION_WEIGHT = float(os.environ.get('TRENDING_POSTS_REACTION_WEIGHT', '1'))
+TRENDING_POSTS_COMMENT_WEIGHT = float(os.environ.get('TRENDING_POSTS_COMMENT_WEIGHT', '2'))
+TRENDING_POSTS_MIN_SCORE = float(os.environ.get('TRENDING_POSTS_MIN_SCORE', '0.1'))
+TRENDING_POSTS_MAX_SCORES = int(os.environ.get('TRENDING_POSTS_MAX_SCORES', '10000'))
+TRENDING_POSTS_CURATED_COUNT = int(os.environ.get('TRENDING_POSTS_CURATED_COUNT', '30'))
+
+# Trending communities ranking
+TRENDING_COMMUNITIES_MAX_AGE_SECONDS = int(os.environ.get('TRENDING_COMMUNITIES_MAX_AGE_SECONDS', str(60 * 60 * 2)))
+TRENDING_COMMUNITIES_REFRESH_LOCK_SECONDS = int(os.environ.get('TRENDING_COMMUNITIES_REFRESH_LOCK_SECONDS', '300'))
+TRENDING_COMMUNITIES_GROWTH_SECONDS = int(os.environ.get('TRENDING_COMMUNITIES_GROWTH_SECONDS', str(60 * 60 * 24 * 7)))
+TRENDING_COMMUNITIES_RANKING_SIZE = int(os.environ.get('TRENDING_COMMUNITIES_RANKING_SIZE', '100'))
+
+# Unread notifications counts
+UNREAD_NOTIFICATIONS_COUNTS_BACKEND = 'openbook_notifications.unread_counts.RedisUnreadNotificationsCounts'
+UNREAD_NOTIFICATIONS_COUNTS_EXPIRATION_SECONDS = int(os.environ.get('UNREAD_NOTIFICATIONS_COUNTS_EXPIRATION_SECONDS',
+                                                                    str(60 * 60 * 24)))
+
+# Notifications aggregation, the reactions and comments to the same post or comment collapse into one notification
+NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS = int(os.environ.get('NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS', str(60 * 60)))
+NOTIFICATIONS_AGGREGATION_MAX_LATEST_ACTORS = int(os.environ.get('NOTIFICATIONS_AGGREGATION_MAX_LATEST_ACTORS', '3'))
+NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS = int(os.environ.get('NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS',
+                                                                     str(60 * 15)))
+
+# Notifications preferences, the settings and muted posts gating the notifications of every user
+NOTIFICATIONS_PREFERENCES_BACKEND = 'openbook_notifications.preferences.RedisNotificationsPreferences'
+NOTIFICATIONS_PREFERENCES_EXPIRATION_SECONDS = int(os.environ.get('NOTIFICATIONS_PREFERENCES_EXPIRATION_SECONDS',
+                                                                  str(60 * 60 * 24)))
+
+# Notifications retention, the notifications past their max age are compacted away in batches by a scheduled job
+NOTIFICATIONS_RETENTION_MAX_AGE_SECONDS = int(os.environ.get('NOTIFICATIONS_RETENTION_MAX_AGE_SECONDS',
+                                                             str(60 * 60 * 24 * 90)))
+NOTIFICATIONS_RETENTION_INCLUDE_UNREAD = os.environ.get('NOTIFICATIONS_RETENTION_INCLUDE_UNREAD', 'False') == 'True'
+NOTIFICATIONS_COMPACTION_CHUNK_SIZE = int(os.environ.get('NOTIFICATIONS_COMPACTION_CHUNK_SIZE', '500'))
+NOTIFICATIONS_COMPACTION_SLEEP_SECONDS = float(os.environ.get('NOTIFICATIONS_COMPACTION_SLEEP_SECONDS', '0.5'))
+NOTIFICATIONS_COMPACTION_MAX_SECONDS = int(os.environ.get('NOTIFICATIONS_COMPACTION_MAX_SECONDS', str(60 * 10)))
+
 # Email Config
 
 EMAIL_BACKEND = 'django_amazon_ses.EmailBackend'
@@ -555,6 +643,18 @@ if TESTING:
     MIN_UNIQUE_TOP_POST_REACTIONS_COUNT = 1
     MIN_UNIQUE_TOP_POST_COMMENTS_COUNT = 1
     MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT = 1
+    TRENDING_POSTS_SCORES_BACKEND = 'openbook_posts.trending.LocalTrendingPostsScores'
+    # On commit callbacks never run in the tests
+    POST_SUBSCRIBERS_FAN_OUT_ASYNC = False
+    POST_MEDIA_INGESTION_ASYNC = False
+    HASHTAG_COVER_ASYNC = False
+    POST_MEDIA_FILES_DELETION_ON_COMMIT = False
+    UNREAD_NOTIFICATIONS_COUNTS_BACKEND = 'openbook_notifications.unread_counts.LocalUnreadNotificationsCounts'
+    NOTIFICATIONS_PREFERENCES_BACKEND = 'openbook_notifications.preferences.LocalNotificationsPreferences'
+    # Every reaction and comment gets its own notification and push
+    NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS = 0
+    NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS = 0
+    NOTIFICATIONS_COMPACTION_SLEEP_SECONDS = 0
 
 if IS_PRODUCTION:
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
@@ -583,6 +683,20 @@ if IS_PRODUCTION:
 # ONE SIGNAL
 ONE_SIGNAL_APP_ID = os.environ.get('ONE_SIGNAL_APP_ID')
 ONE_SIGNAL_API_KEY = os.environ.get('ONE_SIGNAL_API_KEY')
+ONE_SIGNAL_API_URL = os.environ.get('ONE_SIGNAL_API_URL', 'https://onesignal.com/api/v1')
+
+# Push notifications dispatcher
+PUSH_NOTIFICATIONS_BUFFER_SECONDS = int(os.environ.get('PUSH_NOTIFICATIONS_BUFFER_SECONDS', '5'))
+PUSH_NOTIFICATIONS_FLUSH_LOCK_SECONDS = int(os.environ.get('PUSH_NOTIFICATIONS_FLUSH_LOCK_SECONDS', '60'))
+# A notification takes at most 200 filters, every targeted device takes 3 of them
+PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST = int(os.environ.get('PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST', '50'))
+PUSH_NOTIFICATIONS_MAX_REQUESTS_PER_SECOND = float(os.environ.get('PUSH_NOTIFICATIONS_MAX_REQUESTS_PER_SECOND', '10'))
+PUSH_NOTIFICATIONS_MAX_RETRIES = int(os.environ.get('PUSH_NOTIFICATIONS_MAX_RETRIES', '5'))
+PUSH_NOTIFICATIONS_RETRY_BACKOFF_SECONDS = float(os.environ.get('PUSH_NOTIFICATIONS_RETRY_BACKOFF_SECONDS', '1'))
+PUSH_NOTIFICATIONS_MAX_RETRY_BACKOFF_SECONDS = float(os.environ.get('PUSH_NOTIFICATIONS_MAX_RETRY_BACKOFF_SECONDS',
+                                                                    '60'))
+PUSH_NOTIFICATIONS_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('PUSH_NOTIFICATIONS_REQUEST_TIMEOUT_SECONDS', '10'))
+PUSH_NOTIFICATIONS_HTTP_POOL_SIZE = int(os.environ.get('PUSH_NOTIFICATIONS_HTTP_POOL_SIZE', '10'))
 
 # Peekalink
 
@@ -81,7 +81,7 @@ from openbook_posts.views.post_comment.post_comment_replies.views import PostCom
 from openbook_posts.views.post_comment.views import PostCommentItem, MutePostComment, UnmutePostComment, \
     TranslatePostComment
 from openbook_posts.views.post_comments.views import PostComments, PostCommentsDisable, PostCommentsEnable
-from openbook_posts.views.post_media.views import PostMedia
+from openbook_posts.views.post_media.views import PostMedia, PostMediaUploads
 from openbook_posts.views.post_reaction.views import PostReactionItem
 from openbook_posts.views.post_reactions.views import PostReactions, PostReactionsEmojiCount, PostReactionEmojiGroups
 from openbook_posts.views.posts.views import Posts, TrendingPosts, TopPosts, TrendingPostsNew, \
@@ -189,6 +189,7 @@ post_participants_patterns = [
 
 post_media_patterns = [
     path('', PostMedia.as_view(), name='post-media'),
+    path('uploads/', PostMediaUploads.as_view(), name='post-media-uploads'),
 ]
 post_patterns = [
     path('', PostItem.as_view(), name='post'),
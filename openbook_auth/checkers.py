@@ -1456,6 +1456,10 @@ def check_can_get_media_for_post(user, post):
     check_can_see_post(user=user, post=post)
 
 
+def check_can_get_media_uploads_for_post(user, post):
+    check_has_post(user=user, post=post)
+
+
 def check_can_get_preview_link_data_for_post(user, post):
     check_can_see_post(post=post, user=user)
     if not post.has_links():
@@ -4,11 +4,11 @@ import re
 import uuid
 from django.contrib.auth.validators import UnicodeUsernameValidator, ASCIIUsernameValidator
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.utils import six, timezone, translation
+from django.utils import six, timezone
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 from imagekit.models import ProcessedImageField
@@ -22,8 +22,17 @@ from openbook_auth.helpers import upload_to_user_cover_directory, upload_to_user
 from openbook_common.peekalink_client import peekalink_client
 from openbook_hashtags.queries import make_search_hashtag_query_for_user_with_id, \
     make_get_hashtag_with_name_for_user_with_id_query
-from openbook_notifications.helpers import get_notification_language_code_for_target_user
-from openbook_posts.queries import make_get_hashtag_posts_for_user_with_id_query
+from openbook_notifications import push_messages
+from openbook_notifications.preferences import get_notifications_preferences_for_user_with_id, \
+    get_notifications_preferences_for_users_with_ids, invalidate_notifications_preferences_for_user_with_id
+from openbook_notifications.unread_counts import count_unread_notifications_for_user_with_id, \
+    get_unread_notifications_counts_for_user_with_id, invalidate_unread_notifications_counts_for_user_with_id, \
+    reset_unread_notifications_counts_for_user_with_id, remove_unread_notifications
+from openbook_posts.jobs import warm_up_timeline_for_user_with_id
+from openbook_posts.queries import make_get_hashtag_posts_for_user_with_id_query, \
+    make_only_blocked_users_ids_for_user_with_id_query
+from openbook_posts.timelines import get_timeline_posts_ids, claim_timeline_warm_up, invalidate_timeline, \
+    get_all_timeline_posts_ids, remove_posts_from_timeline
 from openbook_posts.query_collections import get_posts_for_user_collection
 from openbook_translation import translation_strategy
 from openbook_common.helpers import get_supported_translation_language
@@ -38,7 +47,8 @@ from openbook_common.utils.model_loaders import get_connection_model, get_circle
     get_moderation_penalty_model, get_post_comment_mute_model, get_post_comment_reaction_model, \
     get_post_comment_reaction_notification_model, get_top_post_model, get_top_post_community_exclusion_model, \
     get_hashtag_model, get_profile_posts_community_exclusion_model, get_user_new_post_notification_model, \
-    get_follow_request_model, get_follow_request_notification_model, get_follow_request_approved_notification_model
+    get_follow_request_model, get_follow_request_notification_model, get_follow_request_approved_notification_model, \
+    get_post_reaction_emoji_count_model
 from openbook_common.validators import name_characters_validator
 from openbook_notifications import helpers
 from openbook_auth.checkers import *
@@ -240,7 +250,7 @@ class User(AbstractUser):
             user_query.add(Q(id__gt=min_id), Q.AND)
 
         posts_prefetch_related = (
-            'circles', 'creator', 'creator__profile__badges', 'hashtags', 'community')
+            'circles', 'creator', 'creator__profile__badges', 'hashtags', 'hashtags__cover_post_image', 'community')
 
         posts_only = ('text', 'id', 'uuid', 'created',
                       'creator__username', 'creator__id', 'creator__profile__name',
@@ -297,8 +307,11 @@ class User(AbstractUser):
         return self.moderation_penalties.filter(
             moderated_object__category__severity=moderation_severity).count()
 
-    def count_unread_notifications(self):
-        return self.notifications.filter(read=False).count()
+    def count_unread_notifications(self, types=None):
+        return count_unread_notifications_for_user_with_id(user_id=self.pk, types=types)
+
+    def get_unread_notifications_counts(self):
+        return get_unread_notifications_counts_for_user_with_id(user_id=self.pk)
 
     def count_public_posts_for_user(self, user):
         """
@@ -419,6 +432,12 @@ class User(AbstractUser):
             community.soft_delete()
 
         self.delete_all_notifications()
+
+        with transaction.atomic():
+            # Only the request flipping the flag updates the members counts
+            if User.objects.filter(pk=self.pk, is_deleted=False).update(is_deleted=True):
+                self._update_communities_members_counts(delta=-1)
+
         self.is_deleted = True
         self.save()
 
@@ -429,9 +448,18 @@ class User(AbstractUser):
         for community in self.created_communities.all().iterator():
             community.unsoft_delete()
 
+        with transaction.atomic():
+            if User.objects.filter(pk=self.pk, is_deleted=True).update(is_deleted=False):
+                self._update_communities_members_counts(delta=1)
+
         self.is_deleted = False
         self.save()
 
+    def _update_communities_members_counts(self, delta):
+        Community = get_community_model()
+        communities_ids = list(self.communities_memberships.values_list('community_id', flat=True))
+        Community.update_members_count_for_communities_with_ids(communities_ids, delta=delta)
+
     def update_profile_cover(self, cover, save=True):
         if cover is None:
             self.delete_profile_cover(save=False)
@@ -825,52 +853,55 @@ class User(AbstractUser):
         return self.devices.filter(uuid=device_uuid).exists()
 
     def has_follow_notifications_enabled(self):
-        return self.notifications_settings.follow_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='follow_notifications')
 
     def has_follow_request_notifications_enabled(self):
-        return self.notifications_settings.follow_request_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='follow_request_notifications')
 
     def has_follow_request_approved_notifications_enabled(self):
-        return self.notifications_settings.follow_request_approved_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='follow_request_approved_notifications')
 
     def has_post_comment_mention_notifications_enabled(self):
-        return self.notifications_settings.post_comment_user_mention_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='post_comment_user_mention_notifications')
 
     def has_post_mention_notifications_enabled(self):
-        return self.notifications_settings.post_user_mention_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='post_user_mention_notifications')
 
     def has_reaction_notifications_enabled_for_post_with_id(self, post_id):
-        return self.notifications_settings.post_reaction_notifications and not self.has_muted_post_with_id(
-            post_id=post_id)
+        return self.get_notifications_preferences().is_enabled(notifications_setting='post_reaction_notifications',
+                                                               post_id=post_id)
 
     def has_reaction_notifications_enabled_for_post_comment(self, post_comment):
-        return self.notifications_settings.post_comment_reaction_notifications and not self.has_muted_post_with_id(
-            post_id=post_comment.post_id) and not self.has_muted_post_comment_with_id(
-            post_comment_id=post_comment.id)
+        return self.get_notifications_preferences().is_enabled(
+            notifications_setting='post_comment_reaction_notifications',
+            post_id=post_comment.post_id) and not self.has_muted_post_comment_with_id(post_comment_id=post_comment.id)
 
     def has_comment_notifications_enabled_for_post_with_id(self, post_id):
-        return self.notifications_settings.post_comment_notifications and not self.has_muted_post_with_id(
-            post_id=post_id)
+        return self.get_notifications_preferences().is_enabled(notifications_setting='post_comment_notifications',
+                                                               post_id=post_id)
 
     def has_reply_notifications_enabled_for_post_comment(self, post_comment):
-        return self.notifications_settings.post_comment_reply_notifications and not self.has_muted_post_with_id(
-            post_id=post_comment.post_id) and not self.has_muted_post_comment_with_id(
-            post_comment_id=post_comment.id)
+        return self.get_notifications_preferences().is_enabled(
+            notifications_setting='post_comment_reply_notifications',
+            post_id=post_comment.post_id) and not self.has_muted_post_comment_with_id(post_comment_id=post_comment.id)
+
+    def get_notifications_preferences(self):
+        return get_notifications_preferences_for_user_with_id(user_id=self.pk)
 
     def has_connection_request_notifications_enabled(self):
-        return self.notifications_settings.connection_request_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='connection_request_notifications')
 
     def has_community_invite_notifications_enabled(self):
-        return self.notifications_settings.community_invite_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='community_invite_notifications')
 
     def has_community_new_post_notifications_enabled(self):
-        return self.notifications_settings.community_new_post_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='community_new_post_notifications')
 
     def has_user_new_post_notifications_enabled(self):
-        return self.notifications_settings.user_new_post_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='user_new_post_notifications')
 
     def has_connection_confirmed_notifications_enabled(self):
-        return self.notifications_settings.connection_confirmed_notifications
+        return self.get_notifications_preferences().is_enabled(notifications_setting='connection_confirmed_notifications')
 
     def has_reported_post_comment_with_id(self, post_comment_id):
         ModeratedObject = get_moderated_object_model()
@@ -998,38 +1029,25 @@ class User(AbstractUser):
     def get_emoji_counts_for_post(self, post, emoji_id=None):
         check_can_get_reactions_for_post(user=self, post=post)
 
-        Emoji = get_emoji_model()
+        PostReactionEmojiCount = get_post_reaction_emoji_count_model()
 
-        emoji_query = Q(post_reactions__post_id=post.pk, )
-
-        if emoji_id:
-            emoji_query.add(Q(post_reactions__emoji_id=emoji_id), Q.AND)
+        excluded_reactions_query = None
 
         post_community = post.community
 
-        if post_community:
-            if not self.is_staff_of_community_with_name(community_name=post_community.name):
-                # Exclude blocked users reactions
-                blocked_users_query = ~Q(Q(post_reactions__reactor__blocked_by_users__blocker_id=self.pk) | Q(
-                    post_reactions__reactor__user_blocks__blocked_user_id=self.pk))
-                blocked_users_query_staff_members = Q(
-                    post_reactions__reactor__communities_memberships__community_id=post_community.pk)
-                blocked_users_query_staff_members.add(
-                    Q(post_reactions__reactor__communities_memberships__is_administrator=True) | Q(
-                        post_reactions__reactor__communities_memberships__is_moderator=True), Q.AND)
-
-                blocked_users_query.add(~blocked_users_query_staff_members, Q.AND)
-                emoji_query.add(blocked_users_query, Q.AND)
-        else:
-            # Show all, even blocked users reactions
-            blocked_users_query = ~Q(Q(post_reactions__reactor__blocked_by_users__blocker_id=self.pk) | Q(
-                post_reactions__reactor__user_blocks__blocked_user_id=self.pk))
-            emoji_query.add(blocked_users_query, Q.AND)
+        # Exclude blocked users reactions, on community posts only if we and them are not staff members
+        if not post_community or not self.is_staff_of_community_with_name(community_name=post_community.name):
+            excluded_reactions_query = make_only_blocked_users_ids_for_user_with_id_query(
+                user_id=self.pk,
+                users_ids_field='reactor_id',
+                community_id=post.community_id)
 
-        emojis = Emoji.objects.filter(emoji_query).annotate(Count('post_reactions')).distinct().order_by(
-            '-post_reactions__count').cache().all()
+        emoji_counts = PostReactionEmojiCount.get_emoji_counts_for_posts_with_ids(
+            posts_ids=[post.pk],
+            emoji_id=emoji_id,
+            excluded_reactions_query=excluded_reactions_query)
 
-        return [{'emoji': emoji, 'count': emoji.post_reactions__count} for emoji in emojis]
+        return emoji_counts.get(post.pk, [])
 
     def get_emoji_counts_for_post_comment_with_id(self, post_comment_id, emoji_id=None):
         PostComment = get_post_comment_model()
@@ -1103,8 +1121,7 @@ class User(AbstractUser):
 
         if self.has_reacted_to_post_with_id(post_id):
             post_reaction = self.post_reactions.get(post_id=post_id)
-            post_reaction.emoji_id = emoji_id
-            post_reaction.save()
+            post_reaction.update_emoji(emoji_id=emoji_id)
         else:
             post_reaction = post.react(reactor=self, emoji_id=emoji_id)
             if post_reaction.post.creator_id != self.pk:
@@ -1250,38 +1267,34 @@ class User(AbstractUser):
             'id', 'username', 'notifications_settings__post_comment_notifications')
         PostCommentNotification = get_post_comment_notification_model()
 
+        post_notification_target_users = list(post_notification_target_users)
+        post_notification_target_users_preferences = get_notifications_preferences_for_users_with_ids(
+            users_ids=[post_notification_target_user.pk for post_notification_target_user in
+                       post_notification_target_users])
+
         for post_notification_target_user in post_notification_target_users:
             if post_notification_target_user.pk == post_commenter.pk or \
                     not post_notification_target_user.can_see_post_comment(post_comment=post_comment):
                 continue
             post_notification_target_user_is_post_creator = post_notification_target_user.id == post_creator.id
-            post_notification_target_has_comment_notifications_enabled = post_notification_target_user.has_comment_notifications_enabled_for_post_with_id(
-                post_id=post_comment.post_id)
+            post_notification_target_has_comment_notifications_enabled = post_notification_target_users_preferences[
+                post_notification_target_user.pk].is_enabled(notifications_setting='post_comment_notifications',
+                                                             post_id=post_comment.post_id)
 
             if post_notification_target_has_comment_notifications_enabled:
-                target_user_language_code = get_notification_language_code_for_target_user(
-                    post_notification_target_user)
-                with translation.override(target_user_language_code):
-                    if post_notification_target_user_is_post_creator:
-                        notification_message = {
-                            "en": _('%(post_commenter_name)s · %(post_commenter_username)s commented on your post.') % {
-                                'post_commenter_username': post_commenter.username,
-                                'post_commenter_name': post_commenter.profile.name,
-                            }}
-                    else:
-                        notification_message = {
-                            "en": _(
-                                '%(post_commenter_name)s · @%(post_commenter_username)s commented on a post you also commented on.') % {
-                                      'post_commenter_username': post_commenter.username,
-                                      'post_commenter_name': post_commenter.profile.name,
-                                  }}
+                if post_notification_target_user_is_post_creator:
+                    notification_message = push_messages.POST_COMMENT_ON_OWN_POST
+                else:
+                    notification_message = push_messages.POST_COMMENT_ON_COMMENTED_POST
 
-                    self._send_post_comment_push_notification(post_comment=post_comment,
-                                                              notification_message=notification_message,
-                                                              notification_target_user=post_notification_target_user)
+                self._send_post_comment_push_notification(post_comment=post_comment,
+                                                          notification_message=notification_message,
+                                                          notification_target_user=post_notification_target_user)
 
             PostCommentNotification.create_post_comment_notification(post_comment_id=post_comment.pk,
-                                                                     owner_id=post_notification_target_user.id)
+                                                                     owner_id=post_notification_target_user.id,
+                                                                     post_id=post_comment.post_id,
+                                                                     commenter_id=post_commenter.pk)
 
         return post_comment
 
@@ -1321,39 +1334,21 @@ class User(AbstractUser):
                     post_comment=post_comment)
 
             if post_notification_target_has_comment_reply_notifications_enabled:
-                target_user_language_code = get_notification_language_code_for_target_user(
-                    post_notification_target_user)
-
-                with translation.override(target_user_language_code):
-                    if post_notification_target_user_is_post_comment_creator:
-                        notification_message = {
-                            "en": _(
-                                '%(post_commenter_name)s · @%(post_commenter_username)s replied to your comment on a post.') % {
-                                      'post_commenter_username': replier.username,
-                                      'post_commenter_name': replier.profile.name,
-                                  }}
-                    elif post_notification_target_user_is_post_creator:
-                        notification_message = {
-                            "en": _(
-                                '%(post_commenter_name)s · %(post_commenter_username)s replied to a comment on your post.') % {
-                                      'post_commenter_username': replier.username,
-                                      'post_commenter_name': replier.profile.name,
-                                  }}
-                    else:
-                        notification_message = {
-                            "en": _(
-                                '%(post_commenter_name)s · @%(post_commenter_username)s replied on a comment you also replied on.') % {
-                                      'post_commenter_username': replier.username,
-                                      'post_commenter_name': replier.profile.name,
-                                  }}
+                if post_notification_target_user_is_post_comment_creator:
+                    notification_message = push_messages.POST_COMMENT_REPLY_ON_OWN_COMMENT
+                elif post_notification_target_user_is_post_creator:
+                    notification_message = push_messages.POST_COMMENT_REPLY_ON_OWN_POST
+                else:
+                    notification_message = push_messages.POST_COMMENT_REPLY_ON_REPLIED_COMMENT
 
-                    self._send_post_comment_push_notification(post_comment=post_comment_reply,
-                                                              notification_message=notification_message,
-                                                              notification_target_user=post_notification_target_user)
+                self._send_post_comment_push_notification(post_comment=post_comment_reply,
+                                                          notification_message=notification_message,
+                                                          notification_target_user=post_notification_target_user)
 
             PostCommentReplyNotification.create_post_comment_reply_notification(
                 post_comment_id=post_comment_reply.pk,
-                owner_id=post_notification_target_user.id)
+                owner_id=post_notification_target_user.id,
+                post_id=post_comment_reply.post_id)
 
         return post_comment_reply
 
@@ -1363,6 +1358,9 @@ class User(AbstractUser):
         check_can_delete_comment_with_id_for_post(user=self, post_comment_id=post_comment_id, post=post)
         PostComment = get_post_comment_model()
         post_comment = PostComment.objects.get(pk=post_comment_id)
+        # The notifications aggregating the comment with others of the post outlive it
+        PostCommentNotification = get_post_comment_notification_model()
+        PostCommentNotification.release_aggregated_post_comment_notifications(post_comment_id=post_comment.pk)
         self._delete_post_comment_notification(post_comment=post_comment)
         post_comment.delete()
 
@@ -1466,6 +1464,10 @@ class User(AbstractUser):
         check_is_not_connected_with_user_with_id_in_circle_with_id(user=self, user_id=user_id, circle_id=circle_id)
         connection = self.get_connection_for_user_with_id(user_id)
         connection.circles.add(circle_id)
+
+        # The user might be able to see more of our encircled posts now
+        invalidate_timeline(user_id=user_id)
+
         return connection
 
     def get_circle_with_id(self, circle_id):
@@ -1613,6 +1615,9 @@ class User(AbstractUser):
         community_to_join = Community.objects.get(name=community_name)
         community_to_join.add_member(self)
 
+        # The community posts need to make it into our timeline
+        invalidate_timeline(user_id=self.pk)
+
         # Clean up_full any invites
         CommunityInvite = get_community_invite_model()
         CommunityInvite.objects.filter(community__name=community_name, invited_user__username=self.username).delete()
@@ -1637,6 +1642,8 @@ class User(AbstractUser):
 
         community_to_leave.remove_member(self)
 
+        self._remove_posts_from_timeline(posts_query=Q(community_id=community_to_leave.pk))
+
         return community_to_leave
 
     def invite_user_with_username_to_community_with_name(self, username, community_name):
@@ -1890,7 +1897,8 @@ class User(AbstractUser):
         hashtags_query = make_search_hashtag_query_for_user_with_id(search_query=query, user_id=self.pk)
         Hashtag = get_hashtag_model()
 
-        return Hashtag.objects.filter(hashtags_query)
+        # The cover is serialized as the image of the hashtags without one
+        return Hashtag.objects.select_related('cover_post_image').filter(hashtags_query)
 
     def search_users_with_query(self, query):
         users_query = self._make_search_users_query(query=query)
@@ -2186,6 +2194,15 @@ class User(AbstractUser):
         check_can_get_media_for_post(user=self, post=post)
         return post.get_media()
 
+    def get_media_uploads_for_post_with_uuid(self, post_uuid):
+        Post = get_post_model()
+        post = Post.objects.get(uuid=post_uuid)
+        return self.get_media_uploads_for_post(post=post)
+
+    def get_media_uploads_for_post(self, post):
+        check_can_get_media_uploads_for_post(user=self, post=post)
+        return post.get_media_uploads()
+
     def add_media_to_post_with_uuid(self, file, post_uuid, order):
         Post = get_post_model()
         post = Post.objects.get(uuid=post_uuid)
@@ -2260,7 +2277,7 @@ class User(AbstractUser):
 
     def get_hashtag_with_name(self, hashtag_name):
         Hashtag = get_hashtag_model()
-        hashtag = Hashtag.objects.get(name=hashtag_name)
+        hashtag = Hashtag.objects.select_related('cover_post_image').get(name=hashtag_name)
         check_can_see_hashtag(user=self, hashtag=hashtag)
         return hashtag
 
@@ -2274,7 +2291,8 @@ class User(AbstractUser):
             hashtag_posts_query.add(Q(id__lt=max_id), Q.AND)
 
         Post = get_post_model()
-        hashtag_posts = Post.objects.filter(hashtag_posts_query).distinct()
+        hashtag_posts = Post.objects.prefetch_related('hashtags__cover_post_image').filter(
+            hashtag_posts_query).distinct()
 
         return hashtag_posts
 
@@ -2400,7 +2418,7 @@ class User(AbstractUser):
         check_can_get_posts_for_user(user=self, target_user=user)
 
         posts_prefetch_related = (
-            'circles', 'creator', 'creator__profile__badges', 'hashtags', 'community')
+            'circles', 'creator', 'creator__profile__badges', 'hashtags', 'hashtags__cover_post_image', 'community')
 
         posts_only = ('text', 'id', 'uuid', 'created',
                       'creator__username', 'creator__id', 'creator__profile__name',
@@ -2533,45 +2551,55 @@ class User(AbstractUser):
         """
 
         if not circles_ids and not lists_ids:
-            return self._get_timeline_posts_with_no_filters(max_id=max_id)
+            return self._get_timeline_posts_with_no_filters(max_id=max_id, min_id=min_id, count=count)
+
+        return self._get_timeline_posts_with_filters(max_id=max_id, min_id=min_id, circles_ids=circles_ids,
+                                                     lists_ids=lists_ids)
 
-        return self._get_timeline_posts_with_filters(max_id=max_id, circles_ids=circles_ids, lists_ids=lists_ids)
+    def get_timeline_posts_from_query(self, max_id=None, min_id=None):
+        """
+        Get the timeline posts for self bypassing the materialized timeline.
+        """
+        return self._get_timeline_posts_with_no_filters_query(max_id=max_id, min_id=min_id)
 
     def _get_timeline_posts_with_filters(self, max_id=None, min_id=None, circles_ids=None, lists_ids=None):
+        """
+        Get the timeline posts for self filtered by circles and/or lists. The followed users are resolved
+        with subqueries so the amount of joins doesn't grow with the amount of follows.
+        """
         Post = get_post_model()
+        Follow = get_follow_model()
 
         world_circle_id = self._get_world_circle_id()
 
-        if circles_ids:
-            timeline_posts_query = Q(creator=self.pk, circles__id__in=circles_ids)
-        else:
-            timeline_posts_query = Q()
+        followed_users_ids_query = Q(user_id=self.pk)
 
         if lists_ids:
-            followed_users_query = self.follows.filter(lists__id__in=lists_ids)
-        else:
-            followed_users_query = self.follows.all()
-
-        followed_users = followed_users_query.values('followed_user__id').cache()
-
-        for followed_user in followed_users:
+            followed_users_ids_query.add(Q(lists__id__in=lists_ids), Q.AND)
 
-            followed_user_id = followed_user['followed_user__id']
+        followed_users_ids = Follow.objects.filter(followed_users_ids_query).values('followed_user_id')
 
-            followed_user_query = Q(creator_id=followed_user_id)
+        followed_users_posts_query = Q(creator_id__in=followed_users_ids)
 
-            if circles_ids:
-                followed_user_query.add(Q(creator__connections__target_connection__circles__in=circles_ids), Q.AND)
+        if circles_ids:
+            # Followed users we have in any of the given circles
+            Connection = get_connection_model()
+            encircled_users_ids = Connection.objects.filter(
+                target_connection__circles__id__in=circles_ids).values('user_id')
+            followed_users_posts_query.add(Q(creator_id__in=encircled_users_ids), Q.AND)
 
-            followed_user_circles_query = Q(circles__id=world_circle_id)
+        followed_users_circles_query = Q(circles__id=world_circle_id)
 
-            followed_user_circles_query.add(Q(circles__connections__target_user_id=self.pk,
-                                              circles__connections__target_connection__circles__isnull=False), Q.OR)
+        followed_users_circles_query.add(Q(circles__connections__target_user_id=self.pk,
+                                           circles__connections__target_connection__circles__isnull=False), Q.OR)
 
-            followed_user_query.add(followed_user_circles_query, Q.AND)
+        followed_users_posts_query.add(followed_users_circles_query, Q.AND)
 
-            # Add all followed user circles
-            timeline_posts_query.add(followed_user_query, Q.OR)
+        if circles_ids:
+            timeline_posts_query = Q(creator=self.pk, circles__id__in=circles_ids)
+            timeline_posts_query.add(followed_users_posts_query, Q.OR)
+        else:
+            timeline_posts_query = followed_users_posts_query
 
         if max_id:
             timeline_posts_query.add(Q(id__lt=max_id), Q.AND)
@@ -2584,10 +2612,22 @@ class User(AbstractUser):
 
         return Post.objects.filter(timeline_posts_query).distinct()
 
-    def _get_timeline_posts_with_no_filters(self, max_id=None):
+    def _get_timeline_posts_with_no_filters(self, max_id=None, min_id=None, count=None):
         """
         Being the main action of the network, an optimised call of the get timeline posts call with no filtering.
+        Posts are taken from the materialized timeline, falling back to the timeline query for cold timelines.
         """
+        timeline_posts_ids = get_timeline_posts_ids(user_id=self.pk, count=count, max_id=max_id, min_id=min_id)
+
+        if timeline_posts_ids is None:
+            if count and claim_timeline_warm_up(user_id=self.pk):
+                warm_up_timeline_for_user_with_id.delay(user_id=self.pk)
+            return self._get_timeline_posts_with_no_filters_query(max_id=max_id, min_id=min_id)
+
+        # The timeline might hold posts that are no longer visible, the query takes care of excluding them
+        return self._get_timeline_posts_with_no_filters_query(posts_ids=timeline_posts_ids)
+
+    def _get_timeline_posts_with_no_filters_query(self, max_id=None, min_id=None, posts_ids=None):
         world_circle_id = self._get_world_circle_id()
 
         Post = get_post_model()
@@ -2606,12 +2646,20 @@ class User(AbstractUser):
         ModeratedObject = get_moderated_object_model()
         reported_posts_exclusion_query = ~Q(moderated_object__reports__reporter_id=self.pk)
 
+        if posts_ids is not None:
+            timeline_posts_boundary_query = Q(id__in=posts_ids)
+        elif max_id:
+            timeline_posts_boundary_query = Q(id__lt=max_id)
+        elif min_id:
+            timeline_posts_boundary_query = Q(id__gt=min_id)
+        else:
+            timeline_posts_boundary_query = Q()
+
         own_posts_query = Q(creator=self.pk, community__isnull=True, is_deleted=False, status=Post.STATUS_PUBLISHED)
 
         own_posts_query.add(reported_posts_exclusion_query, Q.AND)
 
-        if max_id:
-            own_posts_query.add(Q(id__lt=max_id), Q.AND)
+        own_posts_query.add(timeline_posts_boundary_query, Q.AND)
 
         own_posts_queryset = self.posts.select_related(*posts_select_related).prefetch_related(
             *posts_prefetch_related).only(*posts_only).filter(own_posts_query)
@@ -2622,8 +2670,7 @@ class User(AbstractUser):
         community_posts_query.add(~Q(Q(creator__blocked_by_users__blocker_id=self.pk) | Q(
             creator__user_blocks__blocked_user_id=self.pk)), Q.AND)
 
-        if max_id:
-            community_posts_query.add(Q(id__lt=max_id), Q.AND)
+        community_posts_query.add(timeline_posts_boundary_query, Q.AND)
 
         community_posts_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
 
@@ -2640,8 +2687,7 @@ class User(AbstractUser):
 
         followed_users_query.add(reported_posts_exclusion_query, Q.AND)
 
-        if max_id:
-            followed_users_query.add(Q(id__lt=max_id), Q.AND)
+        followed_users_query.add(timeline_posts_boundary_query, Q.AND)
 
         followed_users_query.add(
             Q(circles__id=world_circle_id) | Q(circles__connections__target_connection__circles__isnull=False,
@@ -2654,6 +2700,22 @@ class User(AbstractUser):
 
         return final_queryset
 
+    def _remove_posts_from_timeline(self, posts_query):
+        """
+        Removes the posts matching the query from our materialized timeline. Only the posts already in the
+        timeline are checked against the query.
+        """
+        timeline_posts_ids = get_all_timeline_posts_ids(user_id=self.pk)
+
+        if not timeline_posts_ids:
+            return
+
+        Post = get_post_model()
+        posts_query.add(Q(id__in=timeline_posts_ids), Q.AND)
+        posts_ids_to_remove = list(Post.objects.filter(posts_query).values_list('id', flat=True))
+
+        remove_posts_from_timeline(user_id=self.pk, posts_ids=posts_ids_to_remove)
+
     def get_global_moderated_objects(self, types=None, max_id=None, verified=None, statuses=None):
         check_can_get_global_moderated_objects(user=self)
         ModeratedObject = get_moderated_object_model()
@@ -2832,6 +2894,9 @@ class User(AbstractUser):
         follow = Follow.create_follow(user_id=self.pk, followed_user_id=user.pk, lists_ids=lists_ids)
         self._create_follow_notification(followed_user_id=user.pk)
 
+        # The followed user posts need to make it into our timeline
+        invalidate_timeline(user_id=self.pk)
+
         if not is_pre_approved:
             # When its preapproved by the user to be followed, do not send the person a push notification
             self._send_follow_push_notification(followed_user_id=user.pk)
@@ -2850,6 +2915,7 @@ class User(AbstractUser):
         follow = self.follows.get(followed_user_id=user_id)
         self._delete_follow_notification(followed_user_id=user_id)
         follow.delete()
+        self._remove_posts_from_timeline(posts_query=Q(creator_id=user_id, community__isnull=True))
 
     def update_follow_for_user(self, user, lists_ids=None):
         return self.update_follow_for_user_with_id(user.pk, lists_ids=lists_ids)
@@ -2939,6 +3005,9 @@ class User(AbstractUser):
 
         self._create_connection_confirmed_notification(user_connected_with_id=user_id)
 
+        # We might be able to see the encircled posts of the user now
+        invalidate_timeline(user_id=self.pk)
+
         return connection
 
     def update_connection_with_user_with_id(self, user_id, circles_ids=None):
@@ -2958,6 +3027,9 @@ class User(AbstractUser):
         connection.circles.add(*circles_ids)
         connection.save()
 
+        # The user might be able to see more of our encircled posts now
+        invalidate_timeline(user_id=user_id)
+
         return connection
 
     def disconnect_from_user(self, user):
@@ -3005,6 +3077,12 @@ class User(AbstractUser):
 
         self.notifications.filter(notifications_query).update(read=True)
 
+        if max_id:
+            # Newer notifications might still be unread
+            invalidate_unread_notifications_counts_for_user_with_id(user_id=self.pk)
+        else:
+            reset_unread_notifications_counts_for_user_with_id(user_id=self.pk, types=types)
+
     def get_unread_notifications(self, max_id=None, types=None):
         notifications_query = Q(read=False)
 
@@ -3018,8 +3096,12 @@ class User(AbstractUser):
     def read_notification_with_id(self, notification_id):
         check_can_read_notification_with_id(user=self, notification_id=notification_id)
         notification = self.notifications.get(id=notification_id)
+
+        # Only uncounted by whoever actually marks it as read
+        if self.notifications.filter(id=notification_id, read=False).update(read=True):
+            remove_unread_notifications([(self.pk, notification.notification_type)])
+
         notification.read = True
-        notification.save()
         return notification
 
     def delete_notification_with_id(self, notification_id):
@@ -3102,6 +3184,7 @@ class User(AbstractUser):
 
         check_can_unmute_post(user=self, post=post)
         self.post_mutes.filter(post_id=post_id).delete()
+        invalidate_notifications_preferences_for_user_with_id(user_id=self.pk)
         return post
 
     def mute_post_comment_with_id(self, post_comment_id):
@@ -3201,6 +3284,9 @@ class User(AbstractUser):
         UserBlock = get_user_block_model()
         UserBlock.create_user_block(blocker_id=self.pk, blocked_user_id=user_id)
 
+        self._remove_posts_from_timeline(posts_query=Q(creator_id=user_id))
+        user_to_block._remove_posts_from_timeline(posts_query=Q(creator_id=self.pk))
+
         return user_to_block
 
     def unblock_user_with_username(self, username):
@@ -3210,6 +3296,11 @@ class User(AbstractUser):
     def unblock_user_with_id(self, user_id):
         check_can_unblock_user_with_id(user=self, user_id=user_id)
         self.user_blocks.filter(blocked_user_id=user_id).delete()
+
+        # Community posts of one another will be visible again
+        invalidate_timeline(user_id=self.pk)
+        invalidate_timeline(user_id=user_id)
+
         return User.objects.get(pk=user_id)
 
     def report_comment_with_id_for_post_with_uuid(self, post_comment_id, post_uuid, category_id, description=None):
@@ -3456,7 +3547,9 @@ class User(AbstractUser):
     def _create_post_reaction_notification(self, post_reaction):
         PostReactionNotification = get_post_reaction_notification_model()
         PostReactionNotification.create_post_reaction_notification(post_reaction_id=post_reaction.pk,
-                                                                   owner_id=post_reaction.post.creator_id)
+                                                                   owner_id=post_reaction.post.creator_id,
+                                                                   post_id=post_reaction.post_id,
+                                                                   reactor_id=post_reaction.reactor_id)
 
     def _send_post_reaction_push_notification(self, post_reaction):
         helpers.send_post_reaction_push_notification(post_reaction=post_reaction)
@@ -3470,7 +3563,10 @@ class User(AbstractUser):
         PostCommentReactionNotification = get_post_comment_reaction_notification_model()
         PostCommentReactionNotification.create_post_comment_reaction_notification(
             post_comment_reaction_id=post_comment_reaction.pk,
-            owner_id=post_comment_reaction.post_comment.commenter_id)
+            owner_id=post_comment_reaction.post_comment.commenter_id,
+            post_id=post_comment_reaction.post_comment.post_id,
+            post_comment_id=post_comment_reaction.post_comment_id,
+            reactor_id=post_comment_reaction.reactor_id)
 
     def _send_post_comment_reaction_push_notification(self, post_comment_reaction):
         helpers.send_post_comment_reaction_push_notification(post_comment_reaction=post_comment_reaction)
@@ -3968,6 +4064,10 @@ class UserNotificationsSettings(models.Model):
 
         self.save()
 
+    def save(self, *args, **kwargs):
+        super(UserNotificationsSettings, self).save(*args, **kwargs)
+        invalidate_notifications_preferences_for_user_with_id(user_id=self.user_id)
+
 
 class UserBlock(models.Model):
     blocked_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocked_by_users')
@@ -10,6 +10,7 @@ from django.utils.translation import ugettext_lazy as _
 
 # Create your views here.
 from openbook.settings import COLOR_ATTR_MAX_LENGTH
+from openbook_common.utils.model_loaders import get_post_reaction_emoji_count_model
 from openbook_common.validators import hex_color_validator
 import tldextract
 
@@ -62,6 +63,10 @@ class Emoji(models.Model):
 
     @classmethod
     def get_emoji_counts_for_post_with_id(cls, post_id, emoji_id=None, reactor_id=None):
+        if not reactor_id:
+            PostReactionEmojiCount = get_post_reaction_emoji_count_model()
+            return PostReactionEmojiCount.get_emoji_counts_for_post_with_id(post_id=post_id, emoji_id=emoji_id)
+
         emoji_query = Q(post_reactions__post_id=post_id, )
 
         if emoji_id:
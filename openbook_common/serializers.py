@@ -4,6 +4,7 @@ from rest_framework import serializers
 from openbook_auth.models import User, UserProfile
 from openbook_circles.models import Circle
 from openbook_common.models import Emoji, EmojiGroup, Badge, Language
+from openbook_common.serializers_fields.hashtag import HashtagImageField
 from openbook_common.serializers_fields.user import IsFollowingField, IsFollowedField
 from openbook_communities.models import Community, CommunityMembership
 from openbook_communities.serializers_fields import IsFavoriteField, CommunityMembershipsField
@@ -139,6 +140,7 @@ class CommonCommunityMembershipSerializer(serializers.ModelSerializer):
 
 class CommonHashtagSerializer(serializers.ModelSerializer):
     emoji = CommonEmojiSerializer()
+    image = HashtagImageField()
 
     class Meta:
         model = Hashtag
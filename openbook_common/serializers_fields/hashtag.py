@@ -5,18 +5,11 @@ class HashtagPostsCountField(Field):
     def __init__(self, **kwargs):
         kwargs['source'] = '*'
         kwargs['read_only'] = True
-        self.show_all = kwargs.get('show_all', False)
-        kwargs.pop('show_all', None)
         super(HashtagPostsCountField, self).__init__(**kwargs)
 
     def to_representation(self, hashtag):
-        request = self.context.get('request')
-        request_user = request.user
-
-        if request_user.is_anonymous or self.show_all:
-            return hashtag.count_posts()
-
-        return request_user.count_posts_for_hashtag(hashtag=hashtag)
+        # The maintained count of public posts, the same for every user
+        return hashtag.posts_count
 
 
 class IsHashtagReportedField(Field):
@@ -34,3 +27,24 @@ class IsHashtagReportedField(Field):
             return request.user.has_reported_hashtag_with_id(value.pk)
 
         return False
+
+
+class HashtagImageField(Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super(HashtagImageField, self).__init__(**kwargs)
+
+    def to_representation(self, hashtag):
+        # Its own image or else the post image covering it
+        image = hashtag.get_image()
+
+        if not image:
+            return None
+
+        request = self.context.get('request')
+
+        if request is not None:
+            return request.build_absolute_uri(image.url)
+
+        return image.url
@@ -5,6 +5,18 @@ from openbook_communities.models import CommunityMembership
 from openbook_posts.models import PostReaction, PostCommentReaction
 
 
+def get_posts_viewer_state_for_post(context, post):
+    """
+    Returns the posts viewer state of the serializer context if it holds the given post
+    """
+    posts_viewer_state = context.get('posts_viewer_state')
+
+    if posts_viewer_state and posts_viewer_state.has_post(post):
+        return posts_viewer_state
+
+    return None
+
+
 class ReactionField(Field):
     def __init__(self, reaction_serializer=None, **kwargs):
         kwargs['source'] = '*'
@@ -19,11 +31,18 @@ class ReactionField(Field):
         serialized_reaction = None
 
         if not request_user.is_anonymous:
-            try:
-                reaction = request_user.get_reaction_for_post_with_id(post.pk)
-                serialized_reaction = self.reaction_serializer(reaction, context={'request': request}).data
-            except PostReaction.DoesNotExist:
-                pass
+            posts_viewer_state = get_posts_viewer_state_for_post(self.context, post)
+
+            if posts_viewer_state:
+                reaction = posts_viewer_state.get_reaction_for_post(post)
+                if reaction:
+                    serialized_reaction = self.reaction_serializer(reaction, context={'request': request}).data
+            else:
+                try:
+                    reaction = request_user.get_reaction_for_post_with_id(post.pk)
+                    serialized_reaction = self.reaction_serializer(reaction, context={'request': request}).data
+                except PostReaction.DoesNotExist:
+                    pass
 
         return serialized_reaction
 
@@ -43,7 +62,12 @@ class CommentsCountField(Field):
         if request_user.is_anonymous:
             comments_count = post.count_comments()
         else:
-            comments_count = request_user.get_comments_count_for_post(post=post)
+            posts_viewer_state = get_posts_viewer_state_for_post(self.context, post)
+
+            if posts_viewer_state:
+                comments_count = posts_viewer_state.get_comments_count_for_post(post)
+            else:
+                comments_count = request_user.get_comments_count_for_post(post=post)
 
         return comments_count
 
@@ -65,7 +89,12 @@ class PostReactionsEmojiCountField(Field):
                 Post = get_post_model()
                 reaction_emoji_count = Post.get_emoji_counts_for_post_with_id(post.pk)
         else:
-            reaction_emoji_count = request_user.get_emoji_counts_for_post_with_id(post.pk)
+            posts_viewer_state = get_posts_viewer_state_for_post(self.context, post)
+
+            if posts_viewer_state:
+                reaction_emoji_count = posts_viewer_state.get_emoji_counts_for_post(post)
+            else:
+                reaction_emoji_count = request_user.get_emoji_counts_for_post_with_id(post.pk)
 
         post_reactions_serializer = self.emoji_count_serializer(reaction_emoji_count, many=True,
                                                                 context={"request": request, 'post': post})
@@ -108,8 +137,17 @@ class PostCreatorField(Field):
         post_creator_serializer = self.post_creator_serializer(post_creator, context={"request": request}).data
 
         if post_community:
-            try:
-                post_creator_membership = post_community.memberships.get(user_id=post_creator.pk)
+            posts_viewer_state = get_posts_viewer_state_for_post(self.context, post)
+
+            if posts_viewer_state:
+                post_creator_membership = posts_viewer_state.get_creator_membership_for_post(post)
+            else:
+                try:
+                    post_creator_membership = post_community.memberships.get(user_id=post_creator.pk)
+                except CommunityMembership.DoesNotExist:
+                    post_creator_membership = None
+
+            if post_creator_membership:
                 post_creator_serializer['communities_memberships'] = [
                     self.community_membership_serializer(
                         post_creator_membership,
@@ -117,8 +155,6 @@ class PostCreatorField(Field):
                         context={
                             "request": request}).data
                 ]
-            except CommunityMembership.DoesNotExist:
-                pass
 
         return post_creator_serializer
 
@@ -136,7 +172,12 @@ class PostIsMutedField(Field):
         is_muted = False
 
         if not request_user.is_anonymous:
-            is_muted = request_user.has_muted_post_with_id(post_id=post.pk)
+            posts_viewer_state = get_posts_viewer_state_for_post(self.context, post)
+
+            if posts_viewer_state:
+                is_muted = posts_viewer_state.is_post_muted(post)
+            else:
+                is_muted = request_user.has_muted_post_with_id(post_id=post.pk)
 
         return is_muted
 
@@ -1,3 +1,4 @@
+import re
 import tempfile
 
 from PIL import Image
@@ -379,3 +380,8 @@ def get_post_links():
         'www.blablacar.com/i/rest/results/',
         'https://longwebsite.social/?url=https%3A%2F%2Ftest.com%3Fyes%3Dtrue'
     ]
+
+
+def count_queries_for_table(captured_queries, table_name):
+    table_regex = re.compile(r'\b%s\b' % table_name)
+    return len([query for query in captured_queries if table_regex.search(query['sql'])])
@@ -2,11 +2,24 @@ from unittest.mock import patch
 
 from rest_framework.test import APITestCase
 
+from openbook_notifications.preferences import get_notifications_preferences
+from openbook_notifications.unread_counts import get_unread_notifications_counts
+from openbook_posts.timelines import clear_timelines
+from openbook_posts.video_renditions import clear_video_renditions_claims
+
 
 class OpenbookAPITestCase(APITestCase):
     def setUp(self):
         self.patcher = patch('openbook_notifications.helpers._send_notification_to_user')
         self.mock_foo = self.patcher.start()
+        self.batch_patcher = patch('openbook_notifications.helpers._send_notifications_to_users')
+        self.batch_patcher.start()
+        # Ids are reused across the tests, don't let them see each other's counts
+        get_unread_notifications_counts().clear()
+        get_notifications_preferences().clear()
+        clear_timelines()
+        clear_video_renditions_claims()
 
     def tearDown(self):
         self.patcher.stop()
+        self.batch_patcher.stop()
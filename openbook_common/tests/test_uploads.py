@@ -0,0 +1,110 @@
+import hashlib
+import os
+import time
+import tracemalloc
+from unittest import skipUnless
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from rest_framework.exceptions import ValidationError
+
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_common.tests.helpers import get_test_images, get_test_videos
+from openbook_common.utils.helpers import get_magic, sha256sum
+from openbook_common.utils.uploads import inspect_upload
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+magic = get_magic()
+
+
+class UploadsInspectionTests(OpenbookAPITestCase):
+    """
+    Uploads inspection
+    """
+
+    def test_inspects_in_memory_uploads(self):
+        """
+        should give the hash, mimetype and size of in memory uploads as when read whole
+        """
+        for test_file in get_test_images() + get_test_videos():
+            with open(test_file['path'], 'rb') as file:
+                content = file.read()
+
+            upload = SimpleUploadedFile(name=os.path.basename(test_file['path']), content=content)
+
+            upload_inspection = inspect_upload(file=upload)
+
+            self.assertEqual(upload_inspection.hash, hashlib.sha256(content).hexdigest())
+            self.assertEqual(upload_inspection.mimetype, magic.from_buffer(content))
+            self.assertEqual(upload_inspection.size, len(content))
+            self.assertEqual(upload.tell(), 0)
+
+    def test_inspects_temporary_uploads(self):
+        """
+        should give the hash, mimetype and size of temporary uploads as when read whole
+        """
+        for test_file in get_test_images() + get_test_videos():
+            upload = self._make_temporary_upload(path=test_file['path'])
+
+            upload_inspection = inspect_upload(file=upload)
+
+            self.assertEqual(upload_inspection.hash, sha256sum(filename=test_file['path']))
+            self.assertEqual(upload_inspection.mimetype, magic.from_file(test_file['path']))
+            self.assertEqual(upload_inspection.size, os.path.getsize(test_file['path']))
+
+            upload.close()
+
+    def test_rejects_uploads_over_max_size(self):
+        """
+        should reject the uploads bigger than the max size
+        """
+        upload = SimpleUploadedFile(name='upload.bin', content=os.urandom(1024))
+
+        inspect_upload(file=upload, max_size=1024)
+
+        with self.assertRaises(ValidationError):
+            inspect_upload(file=upload, max_size=1023)
+
+    @skipUnless(os.environ.get('OPENBOOK_RUN_BENCHMARKS'), 'Set OPENBOOK_RUN_BENCHMARKS to run benchmarks')
+    def test_benchmark_inspect_upload(self):
+        """
+        benchmarks the memory and throughput of the inspection against sniffing and hashing the whole upload
+        """
+        for size in (10 * 1024 * 1024, 100 * 1024 * 1024):
+            upload = TemporaryUploadedFile(name='upload.bin', content_type='application/octet-stream', size=size,
+                                           charset=None)
+            for i in range(0, size // (1024 * 1024)):
+                upload.write(os.urandom(1024 * 1024))
+            upload.seek(0)
+
+            elapsed, peak = self._measure(lambda: inspect_upload(file=upload))
+            whole_elapsed, whole_peak = self._measure(lambda: (magic.from_buffer(upload.read()),
+                                                               upload.seek(0), sha256sum(file=upload.file)))
+
+            logger.info('%d MB: %.1f MB/s with a peak of %.2f MB, whole read: %.1f MB/s with a peak of %.2f MB' % (
+                size // (1024 * 1024), size / elapsed / 1024 / 1024, peak / 1024 / 1024,
+                size / whole_elapsed / 1024 / 1024, whole_peak / 1024 / 1024))
+
+            upload.close()
+
+    def _measure(self, inspect):
+        tracemalloc.start()
+        start = time.perf_counter()
+        inspect()
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak
+
+    def _make_temporary_upload(self, path):
+        upload = TemporaryUploadedFile(name=os.path.basename(path), content_type='application/octet-stream',
+                                       size=os.path.getsize(path), charset=None)
+
+        with open(path, 'rb') as file:
+            upload.write(file.read())
+
+        upload.seek(0)
+
+        return upload
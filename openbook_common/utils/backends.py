@@ -0,0 +1,47 @@
+"""
+Swappable redis backends.
+
+The trending posts scores, the unread notifications counts and the notifications preferences are each accessed through
+a backend class named by a setting, the redis one in production and an in memory stand-in in the tests. The other
+redis stores, e.g. the timelines, the video encoding slots and claims, the top posts candidates and the push
+notifications buffer, use redis in the tests as well, the tests clear the ones that would leak between them.
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+
+
+def get_backend(setting_name, **kwargs):
+    """
+    Returns an instance of the backend class named by the given setting, built with the given kwargs
+    """
+    backend = getattr(settings, setting_name)
+
+    try:
+        cls = import_string(backend)
+    except ImportError as e:
+        raise ImproperlyConfigured('Cannot retrieve %s backend %s: %s' % (setting_name, backend, e))
+
+    return cls(**kwargs)
+
+
+class RedisBackend:
+
+    def _get_redis(self):
+        return get_redis_connection('default')
+
+    def _delete_keys_matching(self, pattern):
+        redis = self._get_redis()
+        for key in redis.scan_iter(match=pattern):
+            redis.delete(key)
+
+
+class LocalBackend:
+    """
+    Base of the in memory stand-ins. Their state is kept in class attributes so it's shared by the whole process, as
+    redis would be, and is only ever accessed holding the lock.
+    """
+    _lock = threading.Lock()
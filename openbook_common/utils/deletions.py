@@ -0,0 +1,64 @@
+"""
+Deletions in progress.
+
+The post_delete receivers keeping the counters of a parent up to date, e.g. the comments count of a post, have nothing
+to update when the parent is deleted along with the rows they count. The parents are tracked from their pre_delete to
+their post_delete signal, Django sends the pre_delete signals of a cascade before deleting any row and the post_delete
+ones of the parents after their children's, so the receivers of the children can tell they are being deleted.
+
+The tracking is kept per thread, as the deletions themselves. Django deletes in a transaction, and a deletion that
+failed between both signals, e.g. on a ProtectedError, is forgotten along with the on commit callback registered at
+its pre_delete signal, once its transaction or savepoint is rolled back. The deletions that went through are
+forgotten at their post_delete signal, or on commit at the latest.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models.signals import pre_delete, post_delete
+
+_deletions = threading.local()
+
+
+def track_deletions(sender):
+    """
+    Tracks the deletions of the instances of the given model
+    """
+    dispatch_uid = 'track_deletions_%s' % sender._meta.label_lower
+
+    pre_delete.connect(_start_deletion, sender=sender, dispatch_uid=dispatch_uid, weak=False)
+    post_delete.connect(_finish_deletion, sender=sender, dispatch_uid=dispatch_uid, weak=False)
+
+
+def is_being_deleted(sender, pk):
+    """
+    Returns whether the instance of the given tracked model with the given pk is being deleted
+    """
+    on_commit = _get_deleting_instances().get((sender._meta.label_lower, pk))
+
+    if on_commit is None:
+        return False
+
+    # The callback is dropped by a rollback, of the transaction or of a savepoint taken before the deletion started
+    return any(func is on_commit for savepoint_ids, func in transaction.get_connection().run_on_commit)
+
+
+def _start_deletion(sender, instance=None, **kwargs):
+    deletion = (sender._meta.label_lower, instance.pk)
+
+    def on_commit():
+        _get_deleting_instances().pop(deletion, None)
+
+    _get_deleting_instances()[deletion] = on_commit
+    transaction.on_commit(on_commit)
+
+
+def _finish_deletion(sender, instance=None, **kwargs):
+    _get_deleting_instances().pop((sender._meta.label_lower, instance.pk), None)
+
+
+def _get_deleting_instances():
+    if not hasattr(_deletions, 'instances') or not transaction.get_connection().in_atomic_block:
+        # Nothing is being deleted outside of a transaction, whatever is left was rolled back
+        _deletions.instances = {}
+
+    return _deletions.instances
@@ -41,6 +41,22 @@ def get_post_media_model():
     return apps.get_model('openbook_posts.PostMedia')
 
 
+def get_post_media_upload_model():
+    return apps.get_model('openbook_posts.PostMediaUpload')
+
+
+def get_post_image_model():
+    return apps.get_model('openbook_posts.PostImage')
+
+
+def get_post_image_variant_model():
+    return apps.get_model('openbook_posts.PostImageVariant')
+
+
+def get_post_video_model():
+    return apps.get_model('openbook_posts.PostVideo')
+
+
 def get_proxy_blacklist_domain_model():
     return apps.get_model('openbook_common.ProxyBlacklistedDomain')
 
@@ -73,6 +89,10 @@ def get_community_model():
     return apps.get_model('openbook_communities.Community')
 
 
+def get_trending_community_model():
+    return apps.get_model('openbook_communities.TrendingCommunity')
+
+
 def get_community_notifications_subscription_model():
     return apps.get_model('openbook_communities.CommunityNotificationsSubscription')
 
@@ -93,6 +113,10 @@ def get_post_reaction_model():
     return apps.get_model('openbook_posts.PostReaction')
 
 
+def get_post_reaction_emoji_count_model():
+    return apps.get_model('openbook_posts.PostReactionEmojiCount')
+
+
 def get_post_comment_reaction_model():
     return apps.get_model('openbook_posts.PostCommentReaction')
 
@@ -201,6 +225,10 @@ def get_user_notifications_subscription_model():
     return apps.get_model('openbook_auth.UserNotificationsSubscription')
 
 
+def get_user_notifications_settings_model():
+    return apps.get_model('openbook_auth.UserNotificationsSettings')
+
+
 def get_moderated_object_model():
     return apps.get_model('openbook_moderation.ModeratedObject')
 
@@ -0,0 +1,62 @@
+"""
+Uploads inspection.
+
+An upload is inspected in a single pass over its chunks, which gives its sha256, its mimetype sniffed from its first
+UPLOAD_HEADER_SIZE bytes and its size. The size is counted rather than taken from the upload, and the inspection stops
+as soon as it's over the maximum size, so it also holds for files opened from disk.
+
+The chunks come from File.chunks(), read from memory for the in memory uploads and from disk for the temporary ones,
+the upload is never held in memory as a whole. It's rewound once inspected, ready to be stored.
+"""
+import hashlib
+
+from django.template.defaultfilters import filesizeformat
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+from openbook_common.utils.helpers import get_magic
+
+# libmagic needs no more than the first few kilobytes to tell the supported media apart
+UPLOAD_HEADER_SIZE = 8 * 1024
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+magic = get_magic()
+
+
+class UploadInspection:
+
+    def __init__(self, hash, mimetype, size):
+        self.hash = hash
+        self.mimetype = mimetype
+        self.size = size
+
+    def __str__(self):
+        return '%s %s of %d bytes' % (self.hash, self.mimetype, self.size)
+
+
+def inspect_upload(file, max_size=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Returns the UploadInspection of the file, raises ValidationError if it's bigger than max_size
+    """
+    sha256 = hashlib.sha256()
+    header = bytearray()
+    size = 0
+
+    file.seek(0)
+
+    for chunk in file.chunks(chunk_size=chunk_size):
+        size += len(chunk)
+
+        if max_size is not None and size > max_size:
+            file.seek(0)
+            raise ValidationError(_('Please keep filesize under %s.' % filesizeformat(max_size)))
+
+        if len(header) < UPLOAD_HEADER_SIZE:
+            header.extend(chunk[:UPLOAD_HEADER_SIZE - len(header)])
+
+        sha256.update(chunk)
+
+    file.seek(0)
+
+    return UploadInspection(hash=sha256.hexdigest(), mimetype=magic.from_buffer(bytes(header)), size=size)
@@ -0,0 +1,21 @@
+from django.utils import timezone
+from django_rq import job
+
+from openbook_common.utils.model_loaders import get_trending_community_model
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@job('low')
+def refresh_trending_communities():
+    """
+    Ranks again the trending communities, overall and per category.
+    This job should be scheduled to be run more often than settings.TRENDING_COMMUNITIES_MAX_AGE_SECONDS.
+    """
+    TrendingCommunity = get_trending_community_model()
+    logger.info('Processing trending communities at %s...' % timezone.now())
+
+    ranked_communities = TrendingCommunity.refresh_ranking()
+
+    return 'Ranked: %d communities' % ranked_communities
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.utils.model_loaders import get_community_model
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recounts the members count of the communities, repairing any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='The amount of communities to recount at once')
+        parser.add_argument('--min-id', type=int, default=0, help='Only recount the communities after this id')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_community_id = options['min_id']
+
+        if chunk_size < 1:
+            raise Exception('--chunk-size must be greater than 0')
+
+        Community = get_community_model()
+
+        checked_communities = 0
+        repaired_communities = 0
+
+        while True:
+            communities_ids = list(
+                Community.objects.filter(pk__gt=last_community_id).order_by('pk').values_list('id', flat=True)[
+                :chunk_size])
+
+            if not communities_ids:
+                break
+
+            repaired_communities = repaired_communities + Community.reconcile_members_counts_for_communities_with_ids(
+                communities_ids=communities_ids)
+            checked_communities = checked_communities + len(communities_ids)
+            last_community_id = communities_ids[-1]
+
+            logger.info('Recounted communities up to id %d' % last_community_id)
+
+        logger.info('Checked %d communities, repaired the members count of %d communities' % (
+            checked_communities, repaired_communities))
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.12 on 2020-10-28 09:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_categories', '0009_auto_20190909_1236'),
+        ('openbook_communities', '0033_auto_20191209_1337'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingCommunity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField(editable=False)),
+                ('members_count', models.PositiveIntegerField(editable=False)),
+                ('members_growth', models.PositiveIntegerField(editable=False)),
+                ('created', models.DateTimeField(db_index=True, editable=False)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trending_communities', to='openbook_categories.Category')),
+                ('community', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_communities', to='openbook_communities.Community')),
+            ],
+            options={
+                'unique_together': {('category', 'community')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trendingcommunity',
+            index=models.Index(fields=['category', 'rank'], name='openbook_co_categor_cbde20_idx'),
+        ),
+    ]
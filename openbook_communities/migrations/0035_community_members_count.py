@@ -0,0 +1,42 @@
+# Generated by Django 2.2.12 on 2020-10-28 15:03
+
+from django.db import migrations, models
+
+
+# Every batch is recounted and committed on its own, so the communities are not locked all along
+BATCH_SIZE = 1000
+
+
+def forwards_func(apps, schema_editor):
+    # The communities are recounted with the current model, as by manage.py reconcile_community_members_counts.
+    # The historical models don't carry its methods, and every column it reads exists at this point.
+    from openbook_communities.models import Community
+
+    last_community_id = 0
+
+    while True:
+        communities_ids = list(
+            Community.objects.filter(pk__gt=last_community_id).order_by('pk').values_list('id', flat=True)[:BATCH_SIZE])
+
+        if not communities_ids:
+            break
+
+        Community.reconcile_members_counts_for_communities_with_ids(communities_ids=communities_ids)
+        last_community_id = communities_ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('openbook_communities', '0034_trendingcommunity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='members count'),
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,17 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import models
+from django.db import models, transaction
 
 # Create your models here.
 from django.utils import timezone
-from django.db.models import Q
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from django.db.models import Q, F, Case, When, Value
 from django.db.models import Count
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
 from pilkit.processors import ResizeToFill, ResizeToFit
 
 from openbook.settings import COLOR_ATTR_MAX_LENGTH
@@ -15,16 +21,22 @@ from django.utils.translation import ugettext_lazy as _
 from openbook_common.utils.model_loaders import get_community_invite_model, \
     get_community_log_model, get_category_model, get_user_model, get_moderated_object_model, \
     get_community_notifications_subscription_model, get_community_new_post_notification_model, \
-    get_community_invite_notification_model
+    get_community_invite_notification_model, get_top_post_model, get_trending_community_model
+from openbook_common.utils.deletions import track_deletions, is_being_deleted
 from openbook_common.validators import hex_color_validator
+from openbook_communities.jobs import refresh_trending_communities
+from openbook_hashtags.jobs import recount_community_hashtags_posts_counts
 from openbook_communities.helpers import upload_to_community_avatar_directory, upload_to_community_cover_directory
 from openbook_communities.queries import make_search_communities_query_for_user, \
     make_search_joined_communities_query_for_user, make_get_joined_communities_query_for_user
 from openbook_communities.validators import community_name_characters_validator
 from openbook_moderation.models import ModeratedObject, ModerationCategory
 from openbook_posts.models import Post
+from openbook_posts.top_posts import add_top_posts_candidates
 from imagekit.models import ProcessedImageField
 
+TRENDING_COMMUNITIES_REFRESHING_KEY = 'ob-api-trending-communities-refreshing'
+
 
 class Community(models.Model):
     moderated_object = GenericRelation(ModeratedObject, related_query_name='communities')
@@ -66,10 +78,57 @@ class Community(models.Model):
         _('is deleted'),
         default=False,
     )
+    # The members whose account is not soft deleted
+    members_count = models.PositiveIntegerField(_('members count'), default=0, editable=False)
+
+    COUNTERS_FIELDS = ('members_count',)
 
     class Meta:
         verbose_name_plural = 'communities'
 
+    @classmethod
+    def update_members_count_for_communities_with_ids(cls, communities_ids, delta):
+        """
+        Atomically adds the given delta to the members count of the communities, it never goes below zero
+        """
+        if not delta or not communities_ids:
+            return
+
+        if delta > 0:
+            members_count_update = F('members_count') + delta
+        else:
+            members_count_update = Case(When(members_count__gte=-delta, then=F('members_count') + delta),
+                                        default=Value(0), output_field=models.PositiveIntegerField())
+
+        cls.objects.filter(pk__in=communities_ids).update(members_count=members_count_update)
+
+    @classmethod
+    def reconcile_members_counts_for_communities_with_ids(cls, communities_ids):
+        """
+        Recounts from scratch the members count of the given communities, repairing any drift.
+        Returns the amount of communities whose members count was repaired.
+        """
+        repaired_communities = 0
+
+        with transaction.atomic():
+            # Lock the communities so the members counts are not moved while we recount them
+            communities = list(cls.objects.select_for_update().filter(pk__in=communities_ids).only('id',
+                                                                                                  'members_count'))
+
+            members_counts = dict(
+                CommunityMembership.objects.filter(community_id__in=communities_ids, user__is_deleted=False).values(
+                    'community_id').annotate(members_count=Count('id')).order_by().values_list('community_id',
+                                                                                              'members_count'))
+
+            for community in communities:
+                members_count = members_counts.get(community.pk, 0)
+
+                if community.members_count != members_count:
+                    cls.objects.filter(pk=community.pk).update(members_count=members_count)
+                    repaired_communities += 1
+
+        return repaired_communities
+
     @classmethod
     def is_user_with_username_invited_to_community_with_name(cls, username, community_name):
         CommunityInvite = get_community_invite_model()
@@ -145,19 +204,52 @@ class Community(models.Model):
 
     @classmethod
     def get_trending_communities_for_user_with_id(cls, user_id, category_name=None):
-        trending_communities_query = cls._make_trending_communities_query(category_name=category_name)
-        trending_communities_query.add(~Q(banned_users__id=user_id), Q.AND)
-        return cls._get_trending_communities_with_query(query=trending_communities_query)
+        return cls._get_trending_communities(category_name=category_name,
+                                             excluded_query=Q(banned_users__id=user_id))
 
     @classmethod
     def get_trending_communities(cls, category_name=None):
+        return cls._get_trending_communities(category_name=category_name)
+
+    @classmethod
+    def _get_trending_communities(cls, category_name=None, excluded_query=None):
+        """
+        Communities are taken from the trending communities ranking, falling back to ranking them on the fly
+        while the ranking is older than settings.TRENDING_COMMUNITIES_MAX_AGE_SECONDS
+        """
+        TrendingCommunity = get_trending_community_model()
+
+        if TrendingCommunity.is_ranking_fresh():
+            trending_communities_query = cls._make_ranked_trending_communities_query(category_name=category_name)
+
+            if excluded_query:
+                # The ranking only holds the top communities, excluding from it is cheap
+                trending_communities_query.add(~excluded_query, Q.AND)
+
+            return cls.objects.filter(trending_communities_query).order_by('trending_communities__rank')
+
+        if TrendingCommunity.claim_ranking_refresh():
+            refresh_trending_communities.delay()
+
         trending_communities_query = cls._make_trending_communities_query(category_name=category_name)
-        return cls._get_trending_communities_with_query(query=trending_communities_query)
+
+        if excluded_query:
+            trending_communities_query.add(~excluded_query, Q.AND)
+
+        return cls.objects.filter(trending_communities_query).order_by('-members_count', '-created')
 
     @classmethod
-    def _get_trending_communities_with_query(cls, query):
-        return cls.objects.annotate(Count('memberships')).filter(query).order_by(
-            '-memberships__count', '-created')
+    def _make_ranked_trending_communities_query(cls, category_name=None):
+        trending_communities_query = Q(type=cls.COMMUNITY_TYPE_PUBLIC, is_deleted=False)
+
+        if category_name:
+            trending_communities_query.add(Q(trending_communities__category__name=category_name), Q.AND)
+        else:
+            # Without the rank, a community missing from the ranking would match a null category
+            trending_communities_query.add(Q(trending_communities__category__isnull=True,
+                                             trending_communities__rank__isnull=False), Q.AND)
+
+        return trending_communities_query
 
     @classmethod
     def _make_trending_communities_query(cls, category_name=None):
@@ -303,10 +395,6 @@ class Community(models.Model):
         community_banned_users_query.add(Q(profile__name__icontains=query), Q.OR)
         return community.banned_users.filter(community_banned_users_query)
 
-    @property
-    def members_count(self):
-        return self.memberships.all().count()
-
     def get_staff_members(self):
         User = get_user_model()
         staff_members_query = Q(communities_memberships__community_id=self.pk)
@@ -327,6 +415,8 @@ class Community(models.Model):
         if title:
             self.title = title
 
+        type_changed = type and type != self.type
+
         if type:
             self.type = type
 
@@ -353,6 +443,14 @@ class Community(models.Model):
 
         self.save()
 
+        if type_changed:
+            # Its top posts might no longer be public
+            TopPost = get_top_post_model()
+            add_top_posts_candidates(TopPost.objects.filter(post__community_id=self.pk).values_list('post_id',
+                                                                                                  flat=True))
+            # Its posts no longer count, or count again, towards the posts count of their hashtags
+            recount_community_hashtags_posts_counts.delay(community_id=self.pk)
+
     def add_moderator(self, user):
         user_membership = self.memberships.get(user=user)
         user_membership.is_moderator = True
@@ -488,6 +586,13 @@ class Community(models.Model):
         if self.users_adjective:
             self.users_adjective = self.users_adjective.title()
 
+        if self.pk and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # The members count is only ever written with atomic updates, don't overwrite it with a stale value
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields if
+                                       not field.primary_key and field.attname not in deferred_fields and
+                                       field.name not in self.COUNTERS_FIELDS]
+
         return super(Community, self).save(*args, **kwargs)
 
     def delete_notifications(self):
@@ -541,8 +646,12 @@ class CommunityMembership(models.Model):
 
     @classmethod
     def create_membership(cls, user, community, is_administrator=False, is_moderator=False):
-        membership = cls.objects.create(user=user, community=community, is_administrator=is_administrator,
-                                        is_moderator=is_moderator)
+        with transaction.atomic():
+            membership = cls.objects.create(user=user, community=community, is_administrator=is_administrator,
+                                            is_moderator=is_moderator)
+
+            if not user.is_deleted:
+                Community.update_members_count_for_communities_with_ids([community.pk], delta=1)
 
         return membership
 
@@ -553,6 +662,34 @@ class CommunityMembership(models.Model):
         return super(CommunityMembership, self).save(*args, **kwargs)
 
 
+# The members counts are not updated as the memberships are deleted along with their community or user
+track_deletions(Community)
+track_deletions(User)
+
+
+@receiver(post_delete, sender=CommunityMembership, dispatch_uid='remove_community_membership_from_members_count')
+def remove_community_membership_from_members_count(sender, instance=None, **kwargs):
+    """
+    Remove deleted memberships from the members count of their community, including the ones deleted in cascade
+    """
+    if is_being_deleted(Community, instance.community_id) or is_being_deleted(User, instance.user_id):
+        return
+
+    if not User.objects.filter(pk=instance.user_id, is_deleted=True).exists():
+        Community.update_members_count_for_communities_with_ids([instance.community_id], delta=-1)
+
+
+@receiver(pre_delete, sender=User, dispatch_uid='remove_user_community_memberships_from_members_count')
+def remove_user_community_memberships_from_members_count(sender, instance=None, **kwargs):
+    """
+    Remove the memberships of deleted users from the members count of their communities at once, rather than as each
+    is deleted in cascade
+    """
+    if not instance.is_deleted:
+        communities_ids = list(instance.communities_memberships.values_list('community_id', flat=True))
+        Community.update_members_count_for_communities_with_ids(communities_ids, delta=-1)
+
+
 class CommunityLog(models.Model):
     """
     A log for community moderators user actions such as banning/unbanning
@@ -664,3 +801,77 @@ class CommunityNotificationsSubscription(models.Model):
         return cls.objects.filter(community__name=community_name,
                                   subscriber__username=username,
                                   new_post_notifications=True).exists()
+
+
+class TrendingCommunity(models.Model):
+    """
+    A community ranked by the last refresh of the trending communities, overall when it has no category
+    """
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='trending_communities')
+    category = models.ForeignKey('openbook_categories.Category', on_delete=models.CASCADE, null=True,
+                                 related_name='trending_communities')
+    rank = models.PositiveIntegerField(editable=False)
+    members_count = models.PositiveIntegerField(editable=False)
+    # The members that joined within settings.TRENDING_COMMUNITIES_GROWTH_SECONDS of the refresh
+    members_growth = models.PositiveIntegerField(editable=False)
+    created = models.DateTimeField(editable=False, db_index=True)
+
+    class Meta:
+        unique_together = (('category', 'community'),)
+        indexes = [
+            models.Index(fields=['category', 'rank']),
+        ]
+
+    @classmethod
+    def is_ranking_fresh(cls):
+        max_age = timezone.now() - timedelta(seconds=settings.TRENDING_COMMUNITIES_MAX_AGE_SECONDS)
+        return cls.objects.filter(created__gte=max_age).exists()
+
+    @classmethod
+    def claim_ranking_refresh(cls):
+        """
+        Returns whether the caller should schedule the refresh of the ranking, so reads of a stale ranking
+        don't schedule it more than once
+        """
+        try:
+            return bool(get_redis_connection('default').set(TRENDING_COMMUNITIES_REFRESHING_KEY, 1, nx=True,
+                                                            ex=settings.TRENDING_COMMUNITIES_REFRESH_LOCK_SECONDS))
+        except RedisError:
+            return False
+
+    @classmethod
+    def refresh_ranking(cls):
+        """
+        Ranks again the public communities overall and per category, replacing the previous ranking
+        """
+        Category = get_category_model()
+
+        now = timezone.now()
+        growth_since = now - timedelta(seconds=settings.TRENDING_COMMUNITIES_GROWTH_SECONDS)
+
+        trending_communities = cls._rank_communities(category=None, growth_since=growth_since, now=now)
+
+        for category in Category.objects.only('id'):
+            trending_communities.extend(cls._rank_communities(category=category, growth_since=growth_since, now=now))
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(trending_communities)
+
+        return len(trending_communities)
+
+    @classmethod
+    def _rank_communities(cls, category, growth_since, now):
+        communities_query = Q(type=Community.COMMUNITY_TYPE_PUBLIC, is_deleted=False)
+
+        if category:
+            communities_query.add(Q(categories=category), Q.AND)
+
+        ranked_communities = Community.objects.filter(communities_query).annotate(
+            members_growth=Count('memberships', filter=Q(memberships__created__gte=growth_since), distinct=True)
+        ).order_by('-members_count', '-members_growth', '-created').values_list(
+            'id', 'members_count', 'members_growth')[:settings.TRENDING_COMMUNITIES_RANKING_SIZE]
+
+        return [cls(community_id=community_id, category=category, rank=rank, members_count=members_count,
+                    members_growth=members_growth, created=now) for
+                rank, (community_id, members_count, members_growth) in enumerate(ranked_communities)]
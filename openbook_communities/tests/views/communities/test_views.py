@@ -1,6 +1,8 @@
 # Create your tests here.
 import random
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.conf import settings
 from faker import Faker
@@ -15,7 +17,8 @@ from openbook_common.tests.helpers import make_user, make_authentication_headers
     make_community_avatar, make_community_cover, make_category, make_community_users_adjective, \
     make_community_user_adjective, make_community
 from openbook_common.utils.model_loaders import get_community_model
-from openbook_communities.models import Community
+from openbook_communities.jobs import refresh_trending_communities
+from openbook_communities.models import Community, CommunityMembership
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -1544,6 +1547,114 @@ class TrendingCommunitiesAPITests(OpenbookAPITestCase):
 
         self.assertEqual(0, len(response_communities))
 
+    def test_displays_communities_from_the_refreshed_ranking(self):
+        """
+        should display the communities in the order of the last ranking refresh and return 200
+        """
+        user = make_user()
+
+        community = make_community()
+        community_two = make_community()
+
+        for i in range(0, 2):
+            make_user().join_community_with_name(community_name=community_two.name)
+
+        refresh_trending_communities()
+
+        # Neither are reflected until the next refresh
+        for i in range(0, 3):
+            make_user().join_community_with_name(community_name=community.name)
+        make_community()
+
+        headers = make_authentication_headers_for_user(user)
+
+        response = self.client.get(self._get_url(), **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_communities_ids = [response_community['id'] for response_community in
+                                    json.loads(response.content)]
+
+        self.assertEqual([community_two.pk, community.pk], response_communities_ids)
+
+    def test_displays_ranked_communities_of_category(self):
+        """
+        should only display the ranked communities of the given category and return 200
+        """
+        user = make_user()
+        category = make_category()
+
+        community = make_community()
+        community.categories.add(category)
+
+        community_two = make_community()
+        make_user().join_community_with_name(community_name=community_two.name)
+
+        refresh_trending_communities()
+
+        headers = make_authentication_headers_for_user(user)
+
+        response = self.client.get(self._get_url(), {'category': category.name}, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_communities_ids = [response_community['id'] for response_community in
+                                    json.loads(response.content)]
+
+        self.assertEqual([community.pk], response_communities_ids)
+
+    def test_does_not_display_ranked_community_banned_from(self):
+        """
+        should not display a ranked community banned from after the refresh and return 200
+        """
+        user = make_user()
+        community_owner = make_user()
+
+        community = make_community(creator=community_owner)
+
+        user.join_community_with_name(community_name=community.name)
+
+        refresh_trending_communities()
+
+        community_owner.ban_user_with_username_from_community_with_name(username=user.username,
+                                                                        community_name=community.name)
+
+        headers = make_authentication_headers_for_user(user)
+
+        response = self.client.get(self._get_url(), **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_communities = json.loads(response.content)
+
+        self.assertEqual(0, len(response_communities))
+
+    def test_does_not_count_members_of_every_community(self):
+        """
+        should serialize the members count of the communities without counting their memberships
+        """
+        user = make_user()
+
+        for i in range(0, 3):
+            make_community()
+
+        headers = make_authentication_headers_for_user(user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self._get_url(), **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_communities = json.loads(response.content)
+        self.assertEqual(3, len(response_communities))
+
+        for response_community in response_communities:
+            self.assertEqual(1, response_community['members_count'])
+
+        memberships_counts_queries = [query for query in context.captured_queries if
+                                      'COUNT(' in query['sql'] and CommunityMembership._meta.db_table in query['sql']]
+        self.assertEqual(0, len(memberships_counts_queries))
+
     def _get_url(self):
         return reverse('trending-communities')
 
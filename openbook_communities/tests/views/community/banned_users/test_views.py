@@ -215,6 +215,26 @@ class BanCommunityUserAPITest(OpenbookAPITestCase):
                                               source_user=user,
                                               target_user=user_to_ban).exists())
 
+    def test_banning_member_decrements_members_count(self):
+        """
+        should decrement the members count of the community when banning one of its members
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=user, type='P')
+
+        user_to_ban = make_user()
+        user_to_ban.join_community_with_name(community.name)
+
+        url = self._get_url(community_name=community.name)
+        self.client.post(url, {
+            'username': user_to_ban.username
+        }, **headers)
+
+        community.refresh_from_db()
+        self.assertEqual(1, community.members_count)
+
     def test_cant_ban_user_from_community_if_already_banned(self):
         """
         should not be able to ban user from a community if is already banned and return 400
@@ -543,6 +543,21 @@ class JoinCommunityAPITest(OpenbookAPITestCase):
 
         self.assertTrue(user.is_member_of_community_with_name(community_name=community.name))
 
+    def test_joining_community_increments_members_count(self):
+        """
+        should increment the members count of the community when joining it
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=make_user(), type='P')
+
+        url = self._get_url(community_name=community.name)
+        self.client.post(url, **headers)
+
+        community.refresh_from_db()
+        self.assertEqual(2, community.members_count)
+
     def test_can_join_private_community_with_invite(self):
         """
         should be able to join a private community with an invite and return 200
@@ -909,6 +924,54 @@ class LeaveCommunityAPITests(OpenbookAPITestCase):
         self.assertFalse(
             CommunityNotificationsSubscription.objects.filter(subscriber=user, community=community).exists())
 
+    def test_leaving_community_decrements_members_count(self):
+        """
+        should decrement the members count of the community when leaving it
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=make_user())
+        user.join_community_with_name(community_name=community.name)
+
+        url = self._get_url(community_name=community.name)
+        self.client.post(url, **headers)
+
+        community.refresh_from_db()
+        self.assertEqual(1, community.members_count)
+
+    def test_soft_deleting_account_removes_it_from_members_count(self):
+        """
+        should not count the members whose account is soft deleted, and count them back once restored
+        """
+        user = make_user()
+
+        community = make_community(creator=make_user())
+        user.join_community_with_name(community_name=community.name)
+
+        user.soft_delete()
+        community.refresh_from_db()
+        self.assertEqual(1, community.members_count)
+
+        # Deleting the soft deleted account must not count it out twice
+        user.delete()
+        community.refresh_from_db()
+        self.assertEqual(1, community.members_count)
+
+    def test_reconciles_members_count(self):
+        """
+        should repair a drifted members count
+        """
+        community = make_community(creator=make_user())
+        make_user().join_community_with_name(community_name=community.name)
+
+        Community.objects.filter(pk=community.pk).update(members_count=7)
+
+        self.assertEqual(1, Community.reconcile_members_counts_for_communities_with_ids([community.pk]))
+
+        community.refresh_from_db()
+        self.assertEqual(2, community.members_count)
+
     def _get_url(self, community_name):
         return reverse('community-leave', kwargs={
             'community_name': community_name,
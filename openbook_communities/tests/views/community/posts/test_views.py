@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from faker import Faker
 from openbook_common.tests.models import OpenbookAPITestCase
@@ -7,11 +9,12 @@ import logging
 import json
 
 from openbook_common.tests.helpers import make_user, make_authentication_headers_for_user, \
-    make_community, make_fake_post_text, make_post_image, make_moderation_category
+    make_community, make_fake_post_text, make_post_image, make_moderation_category, make_emoji, \
+    make_reactions_emoji_group, make_fake_post_comment_text, count_queries_for_table
 from openbook_communities.models import Community, CommunityNotificationsSubscription
 from openbook_moderation.models import ModeratedObject
 from openbook_notifications.models import CommunityNewPostNotification
-from openbook_posts.models import Post, PostUserMention
+from openbook_posts.models import Post, PostUserMention, PostReaction, PostComment, PostMute
 from openbook_notifications.models import Notification
 
 logger = logging.getLogger(__name__)
@@ -849,6 +852,39 @@ class CommunityPostsAPITest(OpenbookAPITestCase):
         self.assertEqual(retrieved_notifications_subscription.pk, community_notifications_subscription.pk)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_viewer_state_queries_do_not_grow_with_the_amount_of_posts(self):
+        """
+        should query the reactions, comments and mutes of the community posts a fixed amount of times
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=user)
+
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        url = self._get_url(community_name=community.name)
+
+        tables_queries_counts = []
+
+        for i in range(2):
+            for j in range(3):
+                post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+                user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+                user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+                user.mute_post_with_id(post_id=post.pk)
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((i + 1) * 3, len(json.loads(response.content)))
+            tables_queries_counts.append(
+                [count_queries_for_table(context.captured_queries, table_name) for table_name in
+                 (PostReaction._meta.db_table, PostComment._meta.db_table, PostMute._meta.db_table)])
+
+        self.assertEqual(tables_queries_counts[0], tables_queries_counts[1])
+
     def _get_url(self, community_name):
         return reverse('community-posts', kwargs={
             'community_name': community_name
@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from openbook_moderation.permissions import IsNotSuspended
 from openbook_common.utils.helpers import normalise_request_data
+from openbook_posts.viewer_state import PostsViewerState
 from openbook_communities.views.community.posts.serializers import GetCommunityPostsSerializer, CommunityPostSerializer, \
     CreateCommunityPostSerializer, GetCommunityPostsCountsSerializer, GetCommunityPostsCountCommunitySerializer
 
@@ -30,8 +31,11 @@ class CommunityPosts(APIView):
         posts = user.get_posts_for_community_with_name(community_name=community_name, max_id=max_id).order_by(
             '-created')[:count]
 
+        posts_viewer_state = PostsViewerState(user=user, posts=posts)
+
         response_serializer = CommunityPostSerializer(posts, many=True,
-                                                      context={"request": request})
+                                                      context={"request": request,
+                                                               "posts_viewer_state": posts_viewer_state})
 
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
@@ -80,8 +84,11 @@ class ClosedCommunityPosts(APIView):
         posts = user.get_closed_posts_for_community_with_name(community_name=community_name, max_id=max_id).order_by(
             '-created')[:count]
 
+        posts_viewer_state = PostsViewerState(user=user, posts=posts)
+
         response_serializer = CommunityPostSerializer(posts, many=True,
-                                                      context={"request": request})
+                                                      context={"request": request,
+                                                               "posts_viewer_state": posts_viewer_state})
 
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
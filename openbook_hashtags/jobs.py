@@ -0,0 +1,82 @@
+from django.utils import timezone
+from django_rq import job
+
+from openbook_common.utils.model_loaders import get_hashtag_model, get_post_model
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@job('low')
+def recount_hashtags_posts_counts(chunk_size=1000):
+    """
+    Recounts exactly the posts count of every hashtag, repairing the drift of the maintained counts.
+    This job should be scheduled to be run every day or so.
+    """
+    Hashtag = get_hashtag_model()
+    logger.info('Processing hashtags posts counts at %s...' % timezone.now())
+
+    hashtags = Hashtag.objects.order_by('pk').values_list('id', flat=True)
+
+    return 'Repaired: %d hashtags' % _recount_hashtags_posts_counts(hashtags=hashtags, chunk_size=chunk_size)
+
+
+@job('low')
+def recount_community_hashtags_posts_counts(community_id, chunk_size=1000):
+    """
+    Recounts the posts count of the hashtags of the posts of a community whose visibility changed
+    """
+    Hashtag = get_hashtag_model()
+
+    hashtags = Hashtag.objects.filter(posts__community_id=community_id).order_by('pk').values_list('id',
+                                                                                                flat=True).distinct()
+
+    return 'Repaired: %d hashtags' % _recount_hashtags_posts_counts(hashtags=hashtags, chunk_size=chunk_size)
+
+
+@job('low')
+def update_hashtag_cover_with_post(hashtag_id, post_id):
+    """
+    Makes the first image of the publicly visible post the cover of the hashtag if it has no image yet.
+    The stored post image is referenced as is, it's neither copied nor encoded again.
+    """
+    Hashtag = get_hashtag_model()
+    Post = get_post_model()
+
+    try:
+        post = Post.objects.get(pk=post_id)
+    except Post.DoesNotExist:
+        return 'Post no longer exists'
+
+    if not post.is_publicly_visible():
+        return 'Post not publicly visible'
+
+    post_first_media_image = post.get_first_media_image()
+
+    if not post_first_media_image:
+        return 'Post has no image'
+
+    if not Hashtag.update_cover_for_hashtag_with_id_with_post_image(hashtag_id=hashtag_id,
+                                                                      post_image=post_first_media_image.content_object):
+        return 'Hashtag already has an image'
+
+    return 'Updated the cover of the hashtag'
+
+
+def _recount_hashtags_posts_counts(hashtags, chunk_size):
+    Hashtag = get_hashtag_model()
+
+    repaired_hashtags = 0
+    last_hashtag_id = 0
+
+    while True:
+        hashtags_ids = list(hashtags.filter(pk__gt=last_hashtag_id)[:chunk_size])
+
+        if not hashtags_ids:
+            break
+
+        repaired_hashtags = repaired_hashtags + Hashtag.reconcile_posts_counts_for_hashtags_with_ids(
+            hashtags_ids=hashtags_ids)
+        last_hashtag_id = hashtags_ids[-1]
+
+    return repaired_hashtags
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.12 on 2020-10-29 11:26
+
+from django.db import migrations, models
+
+
+# Every batch is recounted and committed on its own, so the hashtags are not locked all along
+BATCH_SIZE = 1000
+
+
+def forwards_func(apps, schema_editor):
+    # The hashtags are recounted with the current model, as by the recount_hashtags_posts_counts job.
+    # The historical models don't carry its methods, and every column it reads exists at this point.
+    from openbook_hashtags.models import Hashtag
+
+    last_hashtag_id = 0
+
+    while True:
+        hashtags_ids = list(
+            Hashtag.objects.filter(pk__gt=last_hashtag_id).order_by('pk').values_list('id', flat=True)[:BATCH_SIZE])
+
+        if not hashtags_ids:
+            break
+
+        Hashtag.reconcile_posts_counts_for_hashtags_with_ids(hashtags_ids=hashtags_ids)
+        last_hashtag_id = hashtags_ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('openbook_hashtags', '0002_hashtag_text_color'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hashtag',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='posts count'),
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.12 on 2020-11-12 10:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0076_postimagevariant'),
+        ('openbook_hashtags', '0003_hashtag_posts_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hashtag',
+            name='cover_post_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='covered_hashtags', to='openbook_posts.PostImage'),
+        ),
+    ]
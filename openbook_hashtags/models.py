@@ -1,8 +1,8 @@
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q, F, Case, When, Value, Count
 from django.utils import timezone
 
 # Create your models here.
@@ -12,12 +12,14 @@ from pilkit.processors import ResizeToFit
 
 from openbook.storage_backends import S3PrivateMediaStorage
 from openbook_common.models import Emoji
+from openbook_common.utils.model_loaders import get_circle_model
 from openbook_common.utils.helpers import delete_file_field, get_random_pastel_color
 from openbook_common.validators import hex_color_validator
 from openbook_communities.models import Community
 from openbook_hashtags.helpers import upload_to_hashtags_directory
+from openbook_hashtags.jobs import update_hashtag_cover_with_post
 from openbook_hashtags.validators import hashtag_name_validator
-from openbook_posts.models import Post, PostComment
+from openbook_posts.models import Post, PostComment, PostImage
 from openbook_posts.queries import make_only_public_posts_query
 
 hashtag_image_storage = S3PrivateMediaStorage() if settings.IS_PRODUCTION else default_storage
@@ -46,7 +48,16 @@ class Hashtag(models.Model):
                                 height_field='height',
                                 blank=True, null=True, format='JPEG', options={'quality': 60},
                                 processors=[ResizeToFit(width=1024, upscale=False)])
+    # The stored post image used as the image of the hashtags without one of their own, it's referenced rather than
+    # copied so it's shared with the posts and deleted along with them
+    cover_post_image = models.ForeignKey(PostImage, on_delete=models.SET_NULL, related_name='covered_hashtags',
+                                         null=True, blank=True, editable=False)
     emoji = models.ForeignKey(Emoji, on_delete=models.SET_NULL, related_name='hashtags', null=True, blank=True)
+    # The publicly visible posts, as counted by count_posts. Kept up to date as posts are tagged and untagged,
+    # exactly recounted by the recount_hashtags_posts_counts job.
+    posts_count = models.PositiveIntegerField(_('posts count'), default=0, editable=False)
+
+    COUNTERS_FIELDS = ('posts_count',)
 
     @classmethod
     def create_hashtag(cls, name, color=None, image=None):
@@ -74,6 +85,52 @@ class Hashtag(models.Model):
     def hashtag_with_name_exists(cls, hashtag_name):
         return cls.objects.filter(name=hashtag_name).exists()
 
+    @classmethod
+    def update_posts_count_for_hashtags_with_ids(cls, hashtags_ids, delta):
+        """
+        Atomically adds the given delta to the posts count of the hashtags, it never goes below zero
+        """
+        if not delta or not hashtags_ids:
+            return
+
+        if delta > 0:
+            posts_count_update = F('posts_count') + delta
+        else:
+            posts_count_update = Case(When(posts_count__gte=-delta, then=F('posts_count') + delta),
+                                      default=Value(0), output_field=models.PositiveIntegerField())
+
+        cls.objects.filter(pk__in=hashtags_ids).update(posts_count=posts_count_update)
+
+    @classmethod
+    def reconcile_posts_counts_for_hashtags_with_ids(cls, hashtags_ids):
+        """
+        Recounts from scratch the posts count of the given hashtags, repairing any drift.
+        Returns the amount of hashtags whose posts count was repaired.
+        """
+        repaired_hashtags = 0
+
+        Circle = get_circle_model()
+
+        public_posts_query = Q(posts__community__type=Community.COMMUNITY_TYPE_PUBLIC)
+        public_posts_query.add(Q(posts__circles__id=Circle.get_world_circle_id()), Q.OR)
+
+        with transaction.atomic():
+            # Lock the hashtags so the posts counts are not moved while we recount them
+            hashtags = list(cls.objects.select_for_update().filter(pk__in=hashtags_ids).only('id', 'posts_count'))
+
+            posts_counts = dict(cls.objects.filter(pk__in=hashtags_ids).annotate(
+                public_posts_count=Count('posts', filter=public_posts_query, distinct=True)).values_list(
+                'id', 'public_posts_count'))
+
+            for hashtag in hashtags:
+                posts_count = posts_counts.get(hashtag.pk, 0)
+
+                if hashtag.posts_count != posts_count:
+                    cls.objects.filter(pk=hashtag.pk).update(posts_count=posts_count)
+                    repaired_hashtags += 1
+
+        return repaired_hashtags
+
     def __str__(self):
         return '#%s' % self.name
 
@@ -83,6 +140,13 @@ class Hashtag(models.Model):
 
         self.full_clean()
 
+        if self.pk and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # The posts count is only ever written with atomic updates, don't overwrite it with a stale value
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields if
+                                       not field.primary_key and field.attname not in deferred_fields and
+                                       field.name not in self.COUNTERS_FIELDS]
+
         return super(Hashtag, self).save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
@@ -91,25 +155,39 @@ class Hashtag(models.Model):
 
     def attempt_update_media_with_post(self, post):
         if not self.has_image() and post and post.is_publicly_visible():
-            post_first_media_image = post.get_first_media_image()
-            if post_first_media_image:
-                image_copy = ContentFile(post_first_media_image.content_object.image.read())
-                image_copy.name = post_first_media_image.content_object.image.name
-                self.image.save(image_copy.name, image_copy)
-                self.save()
+            if settings.HASHTAG_COVER_ASYNC:
+                transaction.on_commit(lambda: update_hashtag_cover_with_post.delay(hashtag_id=self.pk, post_id=post.pk))
+            else:
+                update_hashtag_cover_with_post(hashtag_id=self.pk, post_id=post.pk)
+
+    @classmethod
+    def update_cover_for_hashtag_with_id_with_post_image(cls, hashtag_id, post_image):
+        """
+        Makes the post image the cover of the hashtag, only if it has no image yet.
+        Returns whether the cover was updated.
+        """
+        hashtags = cls.objects.filter(pk=hashtag_id, cover_post_image__isnull=True).filter(
+            Q(image__isnull=True) | Q(image=''))
+
+        return hashtags.update(cover_post_image=post_image) > 0
 
     def count_posts(self):
         public_posts_query = make_only_public_posts_query()
         return self.posts.filter(public_posts_query).count()
 
     def delete_media(self):
-        if self.has_image():
+        # The cover post image belongs to the posts
+        if self.image:
             delete_file_field(self.image)
 
-    def has_image(self):
-        if hasattr(self, 'image'):
+    def get_image(self):
+        if self.image:
+            return self.image
 
-            if self.image:
-                return True
+        if self.cover_post_image_id and self.cover_post_image.image:
+            return self.cover_post_image.image
 
-        return False
+        return None
+
+    def has_image(self):
+        return bool(self.image) or self.cover_post_image_id is not None
@@ -1,14 +1,20 @@
 import json
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
 
 from openbook_common.tests.helpers import make_user, make_authentication_headers_for_user, make_hashtag, \
-    make_fake_post_text, make_community, make_circle, make_moderation_category, make_global_moderator
+    make_fake_post_text, make_community, make_circle, make_moderation_category, make_global_moderator, make_emoji, \
+    make_reactions_emoji_group, make_fake_post_comment_text, count_queries_for_table
 from openbook_common.tests.models import OpenbookAPITestCase
 from openbook_communities.models import Community
+from openbook_hashtags.jobs import recount_hashtags_posts_counts
+from openbook_hashtags.models import Hashtag
 from openbook_moderation.models import ModeratedObject
+from openbook_posts.models import PostReaction, PostComment, PostMute
 
 fake = Faker()
 
@@ -140,6 +146,60 @@ class HashtagAPITests(OpenbookAPITestCase):
         posts_count = parsed_response['posts_count']
         self.assertEqual(posts_count, amount_of_posts)
 
+    def test_posts_count_does_not_count_encircled_posts(self):
+        """
+        should only count the publicly visible posts of the hashtag
+        """
+        hashtag = make_hashtag()
+
+        user = make_user()
+        circle = make_circle(creator=user)
+
+        user.create_public_post(text='#%s' % hashtag.name)
+        user.create_encircled_post(circles_ids=[circle.pk], text='#%s' % hashtag.name)
+
+        hashtag.refresh_from_db()
+        self.assertEqual(1, hashtag.posts_count)
+
+    def test_posts_count_follows_post_edits_and_deletion(self):
+        """
+        should update the posts count when a post is untagged, tagged again and deleted
+        """
+        hashtag = make_hashtag()
+
+        user = make_user()
+        post = user.create_public_post(text='#%s' % hashtag.name)
+
+        user.update_post_with_uuid(post_uuid=post.uuid, text=make_fake_post_text())
+        hashtag.refresh_from_db()
+        self.assertEqual(0, hashtag.posts_count)
+
+        user.update_post_with_uuid(post_uuid=post.uuid, text='#%s' % hashtag.name)
+        hashtag.refresh_from_db()
+        self.assertEqual(1, hashtag.posts_count)
+
+        user.delete_post_with_uuid(post_uuid=post.uuid)
+        hashtag.refresh_from_db()
+        self.assertEqual(0, hashtag.posts_count)
+
+    def test_recounts_posts_count(self):
+        """
+        should repair a drifted posts count
+        """
+        hashtag = make_hashtag()
+
+        user = make_user()
+        community = make_community(creator=user)
+        user.create_community_post(community_name=community.name, text='#%s' % hashtag.name)
+
+        Hashtag.objects.filter(pk=hashtag.pk).update(posts_count=5)
+
+        recount_hashtags_posts_counts()
+
+        hashtag.refresh_from_db()
+        self.assertEqual(1, hashtag.posts_count)
+        self.assertEqual(hashtag.count_posts(), hashtag.posts_count)
+
     def _get_url(self, hashtag_name):
         return reverse('hashtag', kwargs={
             'hashtag_name': hashtag_name
@@ -350,6 +410,39 @@ class HashtagPostsAPITests(OpenbookAPITestCase):
 
         self.assertEqual(len(parsed_response), 0)
 
+    def test_viewer_state_queries_do_not_grow_with_the_amount_of_posts(self):
+        """
+        should query the reactions, comments and mutes of the hashtag posts a fixed amount of times
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        hashtag = make_hashtag()
+
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        url = self._get_url(hashtag_name=hashtag.name)
+
+        tables_queries_counts = []
+
+        for i in range(2):
+            for j in range(3):
+                post = user.create_public_post(text=make_fake_post_text() + ' #%s' % hashtag.name)
+                user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+                user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+                user.mute_post_with_id(post_id=post.pk)
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((i + 1) * 3, len(json.loads(response.content)))
+            tables_queries_counts.append(
+                [count_queries_for_table(context.captured_queries, table_name) for table_name in
+                 (PostReaction._meta.db_table, PostComment._meta.db_table, PostMute._meta.db_table)])
+
+        self.assertEqual(tables_queries_counts[0], tables_queries_counts[1])
+
     def _get_url(self, hashtag_name):
         return reverse('hashtag-posts', kwargs={
             'hashtag_name': hashtag_name
@@ -5,7 +5,8 @@ from openbook_common.serializers import CommonPublicUserSerializer, \
     CommonCommunityMembershipSerializer, CommonPostEmojiCountSerializer, CommonPostCommunitySerializer, \
     CommonPostReactionSerializer, CommonPostLanguageSerializer, CommonHashtagSerializer, CommonCircleSerializer, \
     CommonEmojiSerializer
-from openbook_common.serializers_fields.hashtag import HashtagPostsCountField, IsHashtagReportedField
+from openbook_common.serializers_fields.hashtag import HashtagPostsCountField, IsHashtagReportedField, \
+    HashtagImageField
 from openbook_common.serializers_fields.post import ReactionField, CommentsCountField, PostCreatorField, \
     PostReactionsEmojiCountField, PostIsMutedField, IsEncircledField, CirclesField
 from openbook_hashtags.models import Hashtag
@@ -36,6 +37,7 @@ class GetHashtagPostsSerializer(serializers.Serializer):
 class GetHashtagHashtagSerializer(serializers.ModelSerializer):
     posts_count = HashtagPostsCountField()
     emoji = CommonEmojiSerializer()
+    image = HashtagImageField()
     is_reported = IsHashtagReportedField()
 
     class Meta:
@@ -8,6 +8,7 @@ from openbook_common.serializers import CommonHashtagSerializer
 from openbook_hashtags.views.hashtag.serializers import GetHashtagSerializer, \
     GetHashtagPostsSerializer, GetHashtagPostsPostSerializer, GetHashtagHashtagSerializer
 from openbook_moderation.permissions import IsNotSuspended
+from openbook_posts.viewer_state import PostsViewerState
 
 
 class HashtagItem(APIView):
@@ -50,6 +51,10 @@ class HashtagPosts(APIView):
         hashtag_posts = user.get_posts_for_hashtag_with_name(hashtag_name=hashtag_name, max_id=max_id).order_by('-id')[
                         :count]
 
-        hashtag_posts_serializer = GetHashtagPostsPostSerializer(hashtag_posts, context={'request': request}, many=True)
+        posts_viewer_state = PostsViewerState(user=user, posts=hashtag_posts)
+
+        hashtag_posts_serializer = GetHashtagPostsPostSerializer(hashtag_posts, many=True,
+                                                                 context={'request': request,
+                                                                          'posts_viewer_state': posts_viewer_state})
 
         return Response(hashtag_posts_serializer.data, status=status.HTTP_200_OK)
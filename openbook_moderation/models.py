@@ -10,6 +10,7 @@ from django.utils import timezone
 from openbook_auth.models import User
 from openbook_common.utils.model_loaders import get_post_model, get_post_comment_model, get_community_model, \
     get_user_model, get_moderation_penalty_model, get_hashtag_model
+from openbook_posts.top_posts import add_top_posts_candidates
 
 
 class ModerationCategory(models.Model):
@@ -278,6 +279,11 @@ class ModeratedObject(models.Model):
                 isinstance(content_object, Community):
             content_object.delete_notifications()
 
+        if isinstance(content_object, Post) and content_object.community_id:
+            # Approved community posts are no longer shown on timelines nor top posts
+            content_object.purge_from_timelines()
+            add_top_posts_candidates([content_object.pk])
+
         if isinstance(content_object, User) and moderation_severity == ModerationCategory.SEVERITY_CRITICAL:
             content_object.delete_outgoing_notifications()
 
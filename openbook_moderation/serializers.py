@@ -4,7 +4,7 @@ from rest_framework import serializers
 from openbook_auth.models import User, UserProfile
 from openbook_common.models import Language, Badge
 from openbook_common.serializers import CommonEmojiSerializer, CommonPublicUserSerializer
-from openbook_common.serializers_fields.hashtag import HashtagPostsCountField
+from openbook_common.serializers_fields.hashtag import HashtagPostsCountField, HashtagImageField
 from openbook_common.serializers_fields.post import IsEncircledField
 from openbook_communities.models import Community
 from openbook_hashtags.models import Hashtag
@@ -46,7 +46,8 @@ class ModeratedObjectCommunitySerializer(serializers.ModelSerializer):
 
 class ModeratedObjectHashtagSerializer(serializers.ModelSerializer):
     emoji = CommonEmojiSerializer()
-    posts_count = HashtagPostsCountField(show_all=True)
+    image = HashtagImageField()
+    posts_count = HashtagPostsCountField()
 
     class Meta:
         model = Hashtag
@@ -0,0 +1 @@
+default_app_config = 'openbook_notifications.apps.OpenbookNotificationsConfig'
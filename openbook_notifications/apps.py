@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class OpenbookNotificationsConfig(AppConfig):
     name = 'openbook_notifications'
+
+    def ready(self):
+        from openbook_notifications.push_messages import compile_push_messages_catalogs
+
+        # Compiled before the workers fork the processes of their jobs, which inherit the catalogs
+        compile_push_messages_catalogs()
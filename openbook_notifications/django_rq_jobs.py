@@ -1,32 +1,48 @@
-from hashlib import sha256
-import onesignal as onesignal_sdk
 from django.conf import settings
 from django_rq import job
 
-from openbook_common.utils.model_loaders import get_user_model
+from openbook_notifications import retention
+from openbook_notifications.push_notifications import flush_push_notifications_buffer, send_push_notifications, \
+    pop_deferred_push_notification_of_group
 
-onesignal_client = onesignal_sdk.Client(
-    app_id=settings.ONE_SIGNAL_APP_ID,
-    app_auth_key=settings.ONE_SIGNAL_API_KEY
-)
+import logging
 
+logger = logging.getLogger(__name__)
 
-@job('default')
-def send_notification_to_user_with_id(user_id, notification):
-    User = get_user_model()
-    user = User.objects.only('username', 'uuid', 'id').get(pk=user_id)
-
-    for device in user.devices.all():
-        notification.set_parameter('ios_badgeType', 'Increase')
-        notification.set_parameter('ios_badgeCount', '1')
-
-        user_id_contents = (str(user.uuid) + str(user.id)).encode('utf-8')
 
-        user_id = sha256(user_id_contents).hexdigest()
+@job('default')
+def flush_push_notifications():
+    """
+    Sends the buffered push notifications, scheduled by the first notification buffered since the last flush
+    """
+    stats = flush_push_notifications_buffer()
+    return str(stats)
 
-        notification.set_filters([
-            {"field": "tag", "key": "user_id", "relation": "=", "value": user_id},
-            {"field": "tag", "key": "device_uuid", "relation": "=", "value": device.uuid},
-        ])
 
-        onesignal_client.send_notification(notification)
+@job('default')
+def send_deferred_push_notification(user_id, notification_type, group_key):
+    """
+    Sends the latest push notification of the group deferred during its push interval, scheduled by the first one
+    deferred
+    """
+    entry = pop_deferred_push_notification_of_group(user_id=user_id, notification_type=notification_type,
+                                                    group_key=group_key)
+
+    if entry is None:
+        return 'No deferred push notification'
+
+    stats = send_push_notifications(entries=[entry])
+    return str(stats)
+
+
+@job('low')
+def compact_notifications(include_unread=None, dry_run=False):
+    """
+    Deletes the notifications past their retention, see openbook_notifications.retention
+    """
+    if include_unread is None:
+        include_unread = settings.NOTIFICATIONS_RETENTION_INCLUDE_UNREAD
+
+    stats = retention.compact_notifications(include_unread=include_unread, dry_run=dry_run)
+    logger.info(str(stats))
+    return str(stats)
@@ -0,0 +1,156 @@
+"""
+Notifications content objects loader.
+
+A page of notifications points to content objects of many types, each serialized along with its posts, comments,
+reactions and users. Rather than letting the serializers resolve them one by one, the content objects are fetched
+one query per type, with the relations their serializer needs, and attached to their notifications. The latest
+actors of the aggregated notifications are fetched in a single query too.
+"""
+from django.contrib.contenttypes.models import ContentType
+
+from openbook_common.utils.model_loaders import get_user_model
+
+from openbook_notifications.models import Notification, PostCommentNotification, ConnectionRequestNotification, \
+    ConnectionConfirmedNotification, FollowNotification, CommunityInviteNotification, PostCommentReplyNotification, \
+    PostCommentReactionNotification, PostCommentUserMentionNotification, PostUserMentionNotification, \
+    CommunityNewPostNotification
+from openbook_notifications.models.follow_request_approved_notification import FollowRequestApprovedNotification
+from openbook_notifications.models.follow_request_notification import FollowRequestNotification
+from openbook_notifications.models.post_reaction_notification import PostReactionNotification
+from openbook_notifications.models.user_new_post_notification import UserNewPostNotification
+
+
+def _user_relations(path):
+    return [path + '__profile'], [path + '__profile__badges']
+
+
+def _post_relations(path):
+    creator_select_related, creator_prefetch_related = _user_relations(path + '__creator')
+
+    return creator_select_related + [path + '__community', path + '__image'], \
+        creator_prefetch_related + [path + '__circles']
+
+
+def _post_comment_relations(path):
+    commenter_select_related, commenter_prefetch_related = _user_relations(path + '__commenter')
+    post_select_related, post_prefetch_related = _post_relations(path + '__post')
+    parent_commenter_select_related, parent_commenter_prefetch_related = _user_relations(
+        path + '__parent_comment__commenter')
+
+    return commenter_select_related + post_select_related + parent_commenter_select_related + [
+        path + '__language', path + '__parent_comment__language'], \
+        commenter_prefetch_related + post_prefetch_related + parent_commenter_prefetch_related + [
+            path + '__hashtags__emoji']
+
+
+def _join_relations(*relations):
+    select_related = []
+    prefetch_related = []
+
+    for relation_select_related, relation_prefetch_related in relations:
+        select_related.extend(relation_select_related)
+        prefetch_related.extend(relation_prefetch_related)
+
+    return select_related, prefetch_related
+
+
+# The relations serialized by GetNotificationsNotificationSerializer, as select_related and prefetch_related lookups
+NOTIFICATIONS_CONTENT_OBJECTS_RELATIONS = {
+    PostCommentNotification: _post_comment_relations('post_comment'),
+    PostCommentReplyNotification: _post_comment_relations('post_comment'),
+    PostCommentReactionNotification: _join_relations(
+        _user_relations('post_comment_reaction__reactor'),
+        _post_comment_relations('post_comment_reaction__post_comment'),
+        (['post_comment_reaction__emoji'], []),
+    ),
+    PostReactionNotification: _join_relations(
+        _user_relations('post_reaction__reactor'),
+        _post_relations('post_reaction__post'),
+        (['post_reaction__emoji'], []),
+    ),
+    ConnectionRequestNotification: _user_relations('connection_requester'),
+    ConnectionConfirmedNotification: _user_relations('connection_confirmator'),
+    FollowNotification: _user_relations('follower'),
+    FollowRequestNotification: _join_relations(
+        _user_relations('follow_request__creator'),
+        _user_relations('follow_request__target_user'),
+    ),
+    FollowRequestApprovedNotification: _join_relations(
+        _user_relations('follow__followed_user'),
+        ([], ['follow__lists']),
+    ),
+    CommunityInviteNotification: _join_relations(
+        _user_relations('community_invite__creator'),
+        (['community_invite__community'], []),
+    ),
+    CommunityNewPostNotification: _post_relations('post'),
+    UserNewPostNotification: _post_relations('post'),
+    PostUserMentionNotification: _join_relations(
+        _post_relations('post_user_mention__post'),
+        _user_relations('post_user_mention__user'),
+    ),
+    PostCommentUserMentionNotification: _join_relations(
+        _post_comment_relations('post_comment_user_mention__post_comment'),
+        _user_relations('post_comment_user_mention__user'),
+    ),
+}
+
+
+def load_notifications_content_objects(notifications):
+    """
+    Fetches the content objects of the notifications, one query per content type plus their prefetched relations,
+    and the latest actors of the notifications, and attaches them to the notifications. Returns the notifications as
+    a list.
+    """
+    notifications = list(notifications)
+
+    objects_ids_by_content_type_id = {}
+
+    for notification in notifications:
+        objects_ids_by_content_type_id.setdefault(notification.content_type_id, set()).add(notification.object_id)
+
+    objects_by_key = {}
+
+    for content_type_id, objects_ids in objects_ids_by_content_type_id.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+
+        if model is None:
+            continue
+
+        select_related, prefetch_related = NOTIFICATIONS_CONTENT_OBJECTS_RELATIONS.get(model, ([], []))
+
+        objects = model._default_manager.filter(pk__in=objects_ids). \
+            select_related(*select_related). \
+            prefetch_related(*prefetch_related)
+
+        for content_object in objects:
+            objects_by_key[(content_type_id, content_object.pk)] = content_object
+
+    for notification in notifications:
+        content_object = objects_by_key.get((notification.content_type_id, notification.object_id))
+
+        # Dangling notifications are left for the generic foreign key to resolve
+        if content_object is not None:
+            Notification.content_object.set_cached_value(notification, content_object)
+
+    _load_notifications_latest_actors(notifications)
+
+    return notifications
+
+
+def _load_notifications_latest_actors(notifications):
+    latest_actors_ids = set()
+
+    for notification in notifications:
+        latest_actors_ids.update(notification.get_latest_actors_ids())
+
+    latest_actors = {}
+
+    if latest_actors_ids:
+        User = get_user_model()
+        latest_actors = User.objects.select_related('profile').prefetch_related('profile__badges').in_bulk(
+            latest_actors_ids)
+
+    for notification in notifications:
+        notification.latest_actors = [latest_actors[latest_actor_id] for latest_actor_id in
+                                      notification.get_latest_actors_ids() if latest_actor_id in latest_actors]
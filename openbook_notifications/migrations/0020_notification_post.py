@@ -0,0 +1,24 @@
+# Generated by Django 2.2.12 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0072_post_counters'),
+        ('openbook_notifications', '0019_auto_20200515_1826'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='post',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='openbook_posts.Post'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['post', 'owner'], name='openbook_no_post_id_4a1bc3_idx'),
+        ),
+    ]
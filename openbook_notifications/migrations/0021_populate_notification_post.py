@@ -0,0 +1,54 @@
+# Generated by Django 2.2.12 on 2020-10-22 09:14
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Max
+
+# The notification types about a post, with their content object model and the lookup of its post
+NOTIFICATIONS_POSTS_LOOKUPS = (
+    ('PR', 'PostReactionNotification', 'post_reaction__post_id'),
+    ('PC', 'PostCommentNotification', 'post_comment__post_id'),
+    ('PCR', 'PostCommentReplyNotification', 'post_comment__post_id'),
+    ('PCRA', 'PostCommentReactionNotification', 'post_comment_reaction__post_comment__post_id'),
+    ('PUM', 'PostUserMentionNotification', 'post_user_mention__post_id'),
+    ('PCUM', 'PostCommentUserMentionNotification', 'post_comment_user_mention__post_comment__post_id'),
+    ('CNP', 'CommunityNewPostNotification', 'post_id'),
+    ('UNP', 'UserNewPostNotification', 'post_id'),
+)
+
+# Every batch is committed on its own, so the notifications are not locked all along
+BATCH_SIZE = 10000
+
+
+def forwards_func(apps, schema_editor):
+    # We get the model from the versioned app registry;
+    # if we directly import it, it'll be the wrong version
+    Notification = apps.get_model('openbook_notifications', 'Notification')
+    db_alias = schema_editor.connection.alias
+
+    max_notification_id = Notification.objects.using(db_alias).aggregate(max_id=Max('id'))['max_id'] or 0
+
+    posts_ids = {}
+    for notification_type, content_object_model_name, post_lookup in NOTIFICATIONS_POSTS_LOOKUPS:
+        ContentObjectModel = apps.get_model('openbook_notifications', content_object_model_name)
+        posts_ids[notification_type] = ContentObjectModel.objects.using(db_alias).filter(
+            pk=OuterRef('object_id')).values(post_lookup)[:1]
+
+    for batch_start_id in range(0, max_notification_id, BATCH_SIZE):
+        notifications = Notification.objects.using(db_alias).filter(id__gt=batch_start_id,
+                                                                    id__lte=batch_start_id + BATCH_SIZE,
+                                                                    post_id__isnull=True)
+
+        for notification_type, post_id in posts_ids.items():
+            notifications.filter(notification_type=notification_type).update(post_id=Subquery(post_id))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('openbook_notifications', '0020_notification_post'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
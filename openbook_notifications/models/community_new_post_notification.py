@@ -17,9 +17,44 @@ class CommunityNewPostNotification(models.Model):
             community_notifications_subscription_id=community_notifications_subscription_id)
         Notification.create_notification(type=Notification.COMMUNITY_NEW_POST,
                                          content_object=community_new_post_notification,
-                                         owner_id=owner_id)
+                                         owner_id=owner_id,
+                                         post_id=post_id)
         return community_new_post_notification
 
+    @classmethod
+    def create_community_new_post_notifications(cls, post_id, community_notifications_subscriptions):
+        """
+        Creates the notifications of the subscriptions not yet notified of the post, returns these subscriptions
+        """
+        subscriptions_ids = [subscription.pk for subscription in community_notifications_subscriptions]
+
+        notified_subscriptions_ids = set(cls.objects.filter(
+            post_id=post_id, community_notifications_subscription_id__in=subscriptions_ids).values_list(
+            'community_notifications_subscription_id', flat=True))
+
+        new_subscriptions = {subscription.pk: subscription for subscription in community_notifications_subscriptions
+                             if subscription.pk not in notified_subscriptions_ids}
+
+        if not new_subscriptions:
+            return []
+
+        cls.objects.bulk_create([cls(post_id=post_id, community_notifications_subscription_id=subscription_id)
+                                 for subscription_id in new_subscriptions])
+
+        # The primary keys of bulk created rows are not set on every database
+        community_new_post_notifications = cls.objects.filter(
+            post_id=post_id, community_notifications_subscription_id__in=list(new_subscriptions)).values_list(
+            'id', 'community_notifications_subscription_id')
+
+        Notification.create_notifications(type=Notification.COMMUNITY_NEW_POST, content_objects_model=cls,
+                                          post_id=post_id,
+                                          owners_ids_by_object_id={
+                                              notification_id: new_subscriptions[subscription_id].subscriber_id
+                                              for notification_id, subscription_id in
+                                              community_new_post_notifications})
+
+        return list(new_subscriptions.values())
+
     @classmethod
     def delete_community_new_post_notification(cls, community_notifications_subscription_id, post_id, owner_id):
         cls.objects.filter(community_notifications_subscription_id=community_notifications_subscription_id,
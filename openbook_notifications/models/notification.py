@@ -1,9 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q, F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 from openbook_auth.models import User
+from openbook_notifications.unread_counts import add_unread_notifications, remove_unread_notifications
+
+# How long after its content an aggregated notification might have been created
+AGGREGATED_CONTENT_CREATION_LEEWAY_SECONDS = 1
 
 
 class Notification(models.Model):
@@ -50,17 +61,283 @@ class Notification(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
 
+    # The post the content object is about, if any, so the notifications of a post are purged without joins
+    post = models.ForeignKey('openbook_posts.Post', on_delete=models.CASCADE, null=True, blank=True,
+                             db_index=False, related_name='+')
+
+    # Notifications of the same type and group, e.g. the reactions to a post, collapse into one while unread
+    group_key = models.CharField(max_length=32, null=True, blank=True)
+    aggregated_count = models.PositiveIntegerField(default=1)
+    # Comma separated ids of the latest actors of the group, the newest first
+    latest_actors_ids = models.CharField(max_length=255, blank=True, default='')
+
+    # The fields of the notifications rows given to delete_notifications_rows
+    DELETED_NOTIFICATIONS_FIELDS = ('id', 'owner_id', 'notification_type', 'read', 'content_type_id', 'object_id')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'owner']),
+            models.Index(fields=['owner', 'group_key']),
+        ]
+
+    @classmethod
+    def create_notification(cls, owner_id, type, content_object, post_id=None):
+        return cls.objects.create(notification_type=type, content_object=content_object, owner_id=owner_id,
+                                  post_id=post_id)
+
+    @classmethod
+    def create_notifications(cls, type, content_objects_model, owners_ids_by_object_id, post_id=None):
+        """
+        Creates in bulk the notifications of the content objects with the given ids, owned by their given owners
+        """
+        content_type = ContentType.objects.get_for_model(content_objects_model)
+        created = timezone.now()
+
+        cls.objects.bulk_create([
+            cls(notification_type=type, content_type=content_type, object_id=object_id, owner_id=owner_id,
+                post_id=post_id, created=created) for object_id, owner_id in owners_ids_by_object_id.items()
+        ])
+
+        add_unread_notifications([(owner_id, type) for owner_id in owners_ids_by_object_id.values()])
+
+    @classmethod
+    def create_or_aggregate_notification(cls, owner_id, type, content_objects_model, content_object_fields,
+                                         group_key, actor_id, post_id=None):
+        """
+        Aggregates the notification into the unread notification of the same type and group created within
+        settings.NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS, pointing its content object to the given fields.
+        Creates the notification with a new content object of the given fields when there is none.
+        Returns the content object.
+        """
+        aggregate_notification = cls._get_aggregate_notification(owner_id=owner_id, type=type, group_key=group_key)
+
+        if aggregate_notification is not None:
+            latest_actors_ids = [actor_id] + [latest_actor_id for latest_actor_id in
+                                              aggregate_notification.get_latest_actors_ids() if
+                                              latest_actor_id != actor_id]
+
+            # The notification might have been read or deleted in the meantime
+            aggregated = cls.objects.filter(pk=aggregate_notification.pk, read=False).update(
+                aggregated_count=F('aggregated_count') + 1,
+                latest_actors_ids=cls._make_latest_actors_ids(latest_actors_ids))
+
+            if aggregated:
+                content_objects_model.objects.filter(pk=aggregate_notification.object_id).update(
+                    **content_object_fields)
+                return content_objects_model(pk=aggregate_notification.object_id, **content_object_fields)
+
+        content_object = content_objects_model.objects.create(**content_object_fields)
+        cls.objects.create(notification_type=type, content_object=content_object, owner_id=owner_id,
+                           post_id=post_id, group_key=group_key,
+                           latest_actors_ids=cls._make_latest_actors_ids([actor_id]))
+        return content_object
+
     @classmethod
-    def create_notification(cls, owner_id, type, content_object):
-        return cls.objects.create(notification_type=type, content_object=content_object, owner_id=owner_id)
+    def release_aggregated_notifications(cls, content_objects_model, content_objects_ids, actor_id,
+                                         get_replacement_content_object_fields, type, group_key, created,
+                                         owner_id=None):
+        """
+        Drops the actor from the aggregated notifications pointing to the content objects, about to be deleted,
+        and points them to the content of another of their latest actors, given by
+        get_replacement_content_object_fields(notification). Notifications without a replacement are left to be
+        deleted along with their content object.
+        The content, created at created, might also have been aggregated into an unread notification of the group
+        pointing to later content, the actor is dropped from it too.
+        """
+        content_type = ContentType.objects.get_for_model(content_objects_model)
+
+        cls._remove_actor_from_aggregated_notifications(
+            type=type, group_key=group_key, actor_id=actor_id, created=created, owner_id=owner_id,
+            excluded_notifications_query=Q(content_type=content_type, object_id__in=content_objects_ids))
+
+        aggregated_notifications = cls.objects.filter(content_type=content_type, object_id__in=content_objects_ids,
+                                                      aggregated_count__gt=1)
+
+        for aggregated_notification in aggregated_notifications:
+            replacement_content_object_fields = get_replacement_content_object_fields(aggregated_notification)
+
+            if not replacement_content_object_fields:
+                continue
+
+            content_objects_model.objects.filter(pk=aggregated_notification.object_id).update(
+                **replacement_content_object_fields)
+
+            latest_actors_ids = [latest_actor_id for latest_actor_id in
+                                 aggregated_notification.get_latest_actors_ids() if latest_actor_id != actor_id]
+
+            cls.objects.filter(pk=aggregated_notification.pk).update(
+                aggregated_count=F('aggregated_count') - 1,
+                latest_actors_ids=cls._make_latest_actors_ids(latest_actors_ids))
+
+    @classmethod
+    def _remove_actor_from_aggregated_notifications(cls, type, group_key, actor_id, created, owner_id,
+                                                    excluded_notifications_query):
+        """
+        Drops the actor from the unread aggregated notifications of the group created before its content was.
+        Without an owner, only the notifications listing the actor among their latest actors are known to hold it.
+        """
+        # The notification is created right after the content it was created for
+        notifications_query = Q(notification_type=type, group_key=group_key, read=False, aggregated_count__gt=1,
+                                created__lte=created + timedelta(seconds=AGGREGATED_CONTENT_CREATION_LEEWAY_SECONDS))
+
+        if owner_id is not None:
+            notifications_query.add(Q(owner_id=owner_id), Q.AND)
+        else:
+            notifications_query.add(~Q(owner_id=actor_id), Q.AND)
+
+        aggregated_notifications = cls.objects.filter(notifications_query).exclude(
+            excluded_notifications_query).only('id', 'latest_actors_ids')
+
+        for aggregated_notification in aggregated_notifications:
+            latest_actors_ids = aggregated_notification.get_latest_actors_ids()
+
+            if owner_id is None and actor_id not in latest_actors_ids:
+                continue
+
+            cls.objects.filter(pk=aggregated_notification.pk, aggregated_count__gt=1).update(
+                aggregated_count=F('aggregated_count') - 1,
+                latest_actors_ids=cls._make_latest_actors_ids(
+                    [latest_actor_id for latest_actor_id in latest_actors_ids if latest_actor_id != actor_id]))
+
+    @classmethod
+    def _get_aggregate_notification(cls, owner_id, type, group_key):
+        aggregation_window_seconds = settings.NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS
+
+        if not aggregation_window_seconds:
+            return None
+
+        return cls.objects.filter(owner_id=owner_id, group_key=group_key, notification_type=type, read=False,
+                                  created__gte=timezone.now() - timedelta(seconds=aggregation_window_seconds)). \
+            only('id', 'object_id', 'latest_actors_ids').order_by('-id').first()
+
+    @classmethod
+    def _make_latest_actors_ids(cls, latest_actors_ids):
+        return ','.join(str(latest_actor_id) for latest_actor_id in
+                        latest_actors_ids[:settings.NOTIFICATIONS_AGGREGATION_MAX_LATEST_ACTORS])
+
+    @classmethod
+    def delete_notifications_for_post_with_id(cls, post_id, owner_id=None, excluded_owners_ids=None, limit=None):
+        """
+        Deletes the notifications of the post, optionally only the ones of an owner or not of the excluded owners,
+        with a single delete over the post index, and their content objects by primary key. At most limit
+        notifications are deleted, returns their amount.
+        """
+        notifications_query = Q(post_id=post_id)
+
+        if owner_id is not None:
+            notifications_query.add(Q(owner_id=owner_id), Q.AND)
+
+        if excluded_owners_ids:
+            notifications_query.add(~Q(owner_id__in=excluded_owners_ids), Q.AND)
+
+        notifications = cls.objects.filter(notifications_query).values_list(*cls.DELETED_NOTIFICATIONS_FIELDS)
+
+        if limit is not None:
+            notifications = notifications.order_by('id')[:limit]
+
+        notifications = list(notifications)
+
+        cls.delete_notifications_rows(notifications)
+
+        return len(notifications)
+
+    @classmethod
+    def delete_notifications_rows(cls, notifications):
+        """
+        Deletes the notifications, given as rows of DELETED_NOTIFICATIONS_FIELDS, with a single delete by primary
+        key, and their content objects with one per content type, all in one transaction. Returns the amount of
+        deleted content objects per content type id.
+        """
+        if not notifications:
+            return {}
+
+        objects_ids_by_content_type_id = {}
+
+        for notification_id, owner_id, notification_type, read, content_type_id, object_id in notifications:
+            objects_ids_by_content_type_id.setdefault(content_type_id, []).append(object_id)
+
+        deleted_content_objects_counts = {}
+
+        with transaction.atomic():
+            deleted_notifications = cls.objects.filter(pk__in=[notification[0] for notification in notifications])
+            notifications_raw_deleted = _can_raw_delete(cls)
+
+            if notifications_raw_deleted:
+                deleted_notifications._raw_delete(deleted_notifications.db)
+            else:
+                # The post_delete receiver uncounts the unread notifications
+                deleted_notifications.delete()
+
+            for content_type_id, objects_ids in objects_ids_by_content_type_id.items():
+                content_objects_model = ContentType.objects.get_for_id(content_type_id).model_class()
+                deleted_content_objects = content_objects_model._default_manager.filter(pk__in=objects_ids)
+
+                if _can_raw_delete(content_objects_model):
+                    deleted_content_objects_count = deleted_content_objects._raw_delete(deleted_content_objects.db)
+                else:
+                    deleted_content_objects_count = deleted_content_objects.delete()[1].get(
+                        content_objects_model._meta.label, 0)
+
+                deleted_content_objects_counts[content_type_id] = deleted_content_objects_count
+
+        if notifications_raw_deleted:
+            remove_unread_notifications([(owner_id, notification_type) for
+                                         notification_id, owner_id, notification_type, read, content_type_id, object_id
+                                         in notifications if not read])
+
+        return deleted_content_objects_counts
 
     @classmethod
     def get_notification_types_values(cls):
         return [a for (a, b) in Notification.NOTIFICATION_TYPES]
 
+    def get_latest_actors_ids(self):
+        return [int(latest_actor_id) for latest_actor_id in self.latest_actors_ids.split(',') if latest_actor_id]
+
+    @cached_property
+    def latest_actors(self):
+        """
+        The latest actors of the notification, the newest first. Set in bulk by the notifications loader.
+        """
+        latest_actors_ids = self.get_latest_actors_ids()
+
+        if not latest_actors_ids:
+            return []
+
+        latest_actors = User.objects.select_related('profile').prefetch_related('profile__badges').in_bulk(
+            latest_actors_ids)
+
+        return [latest_actors[latest_actor_id] for latest_actor_id in latest_actors_ids if
+                latest_actor_id in latest_actors]
+
     def save(self, *args, **kwargs):
         ''' On save, update timestamps '''
-        if not self.id and not self.created:
+        is_new = not self.id
+
+        if is_new and not self.created:
             self.created = timezone.now()
 
-        return super(Notification, self).save(*args, **kwargs)
+        notification = super(Notification, self).save(*args, **kwargs)
+
+        if is_new and not self.read:
+            add_unread_notifications([(self.owner_id, self.notification_type)])
+
+        return notification
+
+
+def _can_raw_delete(model):
+    """
+    Returns whether the rows of the model can be deleted without fetching them to send their signals and collect the
+    rows pointing to them, the point of deleting notifications in bulk. Only while no other model points to it, the
+    generic relations of the content objects to their notifications aside, which are deleted along.
+    """
+    return not model._meta.related_objects
+
+
+@receiver(post_delete, sender=Notification, dispatch_uid='remove_notification_from_unread_notifications_counts')
+def remove_notification_from_unread_notifications_counts(sender, instance=None, **kwargs):
+    """
+    Uncount deleted unread notifications, including the ones deleted along with their content object
+    """
+    if not instance.read:
+        remove_unread_notifications([(instance.owner_id, instance.notification_type)])
@@ -10,12 +10,19 @@ class PostCommentNotification(models.Model):
     post_comment = models.ForeignKey(PostComment, on_delete=models.CASCADE)
 
     @classmethod
-    def create_post_comment_notification(cls, post_comment_id, owner_id):
-        post_comment_notification = cls.objects.create(post_comment_id=post_comment_id)
-        Notification.create_notification(type=Notification.POST_COMMENT,
-                                         content_object=post_comment_notification,
-                                         owner_id=owner_id)
-        return post_comment_notification
+    def create_post_comment_notification(cls, post_comment_id, owner_id, post_id, commenter_id):
+        return Notification.create_or_aggregate_notification(
+            type=Notification.POST_COMMENT,
+            content_objects_model=cls,
+            content_object_fields={'post_comment_id': post_comment_id},
+            group_key=cls.make_group_key(post_id=post_id),
+            actor_id=commenter_id,
+            owner_id=owner_id,
+            post_id=post_id)
+
+    @classmethod
+    def make_group_key(cls, post_id):
+        return 'post-%d' % post_id
 
     @classmethod
     def delete_post_comment_notification(cls, post_comment_id, owner_id):
@@ -25,3 +32,29 @@ class PostCommentNotification(models.Model):
     @classmethod
     def delete_post_comment_notifications(cls, post_comment_id):
         cls.objects.filter(post_comment_id=post_comment_id).delete()
+
+    @classmethod
+    def release_aggregated_post_comment_notifications(cls, post_comment_id):
+        """
+        Points the aggregated notifications of the comment, about to be deleted, to other comments of their group
+        """
+        post_comment = PostComment.objects.only('post_id', 'commenter_id', 'created').get(pk=post_comment_id)
+
+        def get_replacement_content_object_fields(notification):
+            replacement_post_comment_id = PostComment.objects.filter(
+                post_id=post_comment.post_id, parent_comment__isnull=True, is_deleted=False,
+                commenter_id__in=notification.get_latest_actors_ids()).exclude(pk=post_comment_id).order_by(
+                '-id').values_list('id', flat=True).first()
+
+            if replacement_post_comment_id is None:
+                return None
+
+            return {'post_comment_id': replacement_post_comment_id}
+
+        Notification.release_aggregated_notifications(
+            content_objects_model=cls,
+            content_objects_ids=list(cls.objects.filter(post_comment_id=post_comment_id).values_list('id', flat=True)),
+            actor_id=post_comment.commenter_id,
+            get_replacement_content_object_fields=get_replacement_content_object_fields,
+            type=Notification.POST_COMMENT, group_key=cls.make_group_key(post_id=post_comment.post_id),
+            created=post_comment.created)
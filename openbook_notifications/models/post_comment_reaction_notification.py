@@ -9,18 +9,56 @@ class PostCommentReactionNotification(models.Model):
     post_comment_reaction = models.ForeignKey(PostCommentReaction, on_delete=models.CASCADE)
 
     @classmethod
-    def create_post_comment_reaction_notification(cls, post_comment_reaction_id, owner_id):
-        post_comment_reaction_notification = cls.objects.create(post_comment_reaction_id=post_comment_reaction_id)
-        Notification.create_notification(type=Notification.POST_COMMENT_REACTION,
-                                         content_object=post_comment_reaction_notification,
-                                         owner_id=owner_id)
-        return post_comment_reaction_notification
+    def create_post_comment_reaction_notification(cls, post_comment_reaction_id, owner_id, post_id, post_comment_id,
+                                                  reactor_id):
+        return Notification.create_or_aggregate_notification(
+            type=Notification.POST_COMMENT_REACTION,
+            content_objects_model=cls,
+            content_object_fields={'post_comment_reaction_id': post_comment_reaction_id},
+            group_key=cls.make_group_key(post_comment_id=post_comment_id),
+            actor_id=reactor_id,
+            owner_id=owner_id,
+            post_id=post_id)
+
+    @classmethod
+    def make_group_key(cls, post_comment_id):
+        return 'post-comment-%d' % post_comment_id
 
     @classmethod
     def delete_post_comment_reaction_notification(cls, post_comment_reaction_id, owner_id):
-        cls.objects.filter(post_comment_reaction_id=post_comment_reaction_id,
-                           notification__owner_id=owner_id).delete()
+        post_comment_reaction_notifications = cls.objects.filter(post_comment_reaction_id=post_comment_reaction_id,
+                                                                 notification__owner_id=owner_id)
+        cls._release_aggregated_post_comment_reaction_notifications(
+            post_comment_reaction_id=post_comment_reaction_id, owner_id=owner_id,
+            post_comment_reaction_notifications_ids=list(
+                post_comment_reaction_notifications.values_list('id', flat=True)))
+        post_comment_reaction_notifications.delete()
 
     @classmethod
     def delete_post_comment_reaction_notifications(cls, post_comment_reaction_id):
         cls.objects.filter(post_comment_reaction_id=post_comment_reaction_id).delete()
+
+    @classmethod
+    def _release_aggregated_post_comment_reaction_notifications(cls, post_comment_reaction_id, owner_id,
+                                                                post_comment_reaction_notifications_ids):
+        post_comment_reaction = PostCommentReaction.objects.only('post_comment_id', 'reactor_id', 'created').get(
+            pk=post_comment_reaction_id)
+
+        def get_replacement_content_object_fields(notification):
+            replacement_post_comment_reaction_id = PostCommentReaction.objects.filter(
+                post_comment_id=post_comment_reaction.post_comment_id,
+                reactor_id__in=notification.get_latest_actors_ids()).exclude(pk=post_comment_reaction_id).order_by(
+                '-id').values_list('id', flat=True).first()
+
+            if replacement_post_comment_reaction_id is None:
+                return None
+
+            return {'post_comment_reaction_id': replacement_post_comment_reaction_id}
+
+        Notification.release_aggregated_notifications(
+            content_objects_model=cls, content_objects_ids=post_comment_reaction_notifications_ids,
+            actor_id=post_comment_reaction.reactor_id,
+            get_replacement_content_object_fields=get_replacement_content_object_fields,
+            type=Notification.POST_COMMENT_REACTION,
+            group_key=cls.make_group_key(post_comment_id=post_comment_reaction.post_comment_id),
+            created=post_comment_reaction.created, owner_id=owner_id)
@@ -10,11 +10,12 @@ class PostCommentReplyNotification(models.Model):
     post_comment = models.ForeignKey(PostComment, on_delete=models.CASCADE)
 
     @classmethod
-    def create_post_comment_reply_notification(cls, post_comment_id, owner_id):
+    def create_post_comment_reply_notification(cls, post_comment_id, owner_id, post_id):
         post_comment_reply_notification = cls.objects.create(post_comment_id=post_comment_id)
         Notification.create_notification(type=Notification.POST_COMMENT_REPLY,
                                          content_object=post_comment_reply_notification,
-                                         owner_id=owner_id)
+                                         owner_id=owner_id,
+                                         post_id=post_id)
         return post_comment_reply_notification
 
     @classmethod
@@ -10,12 +10,13 @@ class PostCommentUserMentionNotification(models.Model):
     post_comment_user_mention = models.ForeignKey(PostCommentUserMention, on_delete=models.CASCADE)
 
     @classmethod
-    def create_post_comment_user_mention_notification(cls, post_comment_user_mention_id, owner_id):
+    def create_post_comment_user_mention_notification(cls, post_comment_user_mention_id, owner_id, post_id):
         post_comment_user_mention_notification = cls.objects.create(
             post_comment_user_mention_id=post_comment_user_mention_id)
         Notification.create_notification(type=Notification.POST_COMMENT_USER_MENTION,
                                          content_object=post_comment_user_mention_notification,
-                                         owner_id=owner_id)
+                                         owner_id=owner_id,
+                                         post_id=post_id)
         return post_comment_user_mention_notification
 
     @classmethod
@@ -9,18 +9,51 @@ class PostReactionNotification(models.Model):
     post_reaction = models.ForeignKey(PostReaction, on_delete=models.CASCADE)
 
     @classmethod
-    def create_post_reaction_notification(cls, post_reaction_id, owner_id):
-        post_reaction_notification = cls.objects.create(post_reaction_id=post_reaction_id)
-        Notification.create_notification(type=Notification.POST_REACTION,
-                                         content_object=post_reaction_notification,
-                                         owner_id=owner_id)
-        return post_reaction_notification
+    def create_post_reaction_notification(cls, post_reaction_id, owner_id, post_id, reactor_id):
+        return Notification.create_or_aggregate_notification(
+            type=Notification.POST_REACTION,
+            content_objects_model=cls,
+            content_object_fields={'post_reaction_id': post_reaction_id},
+            group_key=cls.make_group_key(post_id=post_id),
+            actor_id=reactor_id,
+            owner_id=owner_id,
+            post_id=post_id)
+
+    @classmethod
+    def make_group_key(cls, post_id):
+        return 'post-%d' % post_id
 
     @classmethod
     def delete_post_reaction_notification(cls, post_reaction_id, owner_id):
-        cls.objects.filter(post_reaction_id=post_reaction_id,
-                           notification__owner_id=owner_id).delete()
+        post_reaction_notifications = cls.objects.filter(post_reaction_id=post_reaction_id,
+                                                         notification__owner_id=owner_id)
+        cls._release_aggregated_post_reaction_notifications(
+            post_reaction_id=post_reaction_id, owner_id=owner_id,
+            post_reaction_notifications_ids=list(post_reaction_notifications.values_list('id', flat=True)))
+        post_reaction_notifications.delete()
 
     @classmethod
     def delete_post_reaction_notifications(cls, post_reaction_id):
         cls.objects.filter(post_reaction_id=post_reaction_id).delete()
+
+    @classmethod
+    def _release_aggregated_post_reaction_notifications(cls, post_reaction_id, owner_id,
+                                                        post_reaction_notifications_ids):
+        post_reaction = PostReaction.objects.only('post_id', 'reactor_id', 'created').get(pk=post_reaction_id)
+
+        def get_replacement_content_object_fields(notification):
+            replacement_post_reaction_id = PostReaction.objects.filter(
+                post_id=post_reaction.post_id, reactor_id__in=notification.get_latest_actors_ids()).exclude(
+                pk=post_reaction_id).order_by('-id').values_list('id', flat=True).first()
+
+            if replacement_post_reaction_id is None:
+                return None
+
+            return {'post_reaction_id': replacement_post_reaction_id}
+
+        Notification.release_aggregated_notifications(
+            content_objects_model=cls, content_objects_ids=post_reaction_notifications_ids,
+            actor_id=post_reaction.reactor_id,
+            get_replacement_content_object_fields=get_replacement_content_object_fields,
+            type=Notification.POST_REACTION, group_key=cls.make_group_key(post_id=post_reaction.post_id),
+            created=post_reaction.created, owner_id=owner_id)
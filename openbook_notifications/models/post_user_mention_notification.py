@@ -10,11 +10,12 @@ class PostUserMentionNotification(models.Model):
     post_user_mention = models.ForeignKey(PostUserMention, on_delete=models.CASCADE)
 
     @classmethod
-    def create_post_user_mention_notification(cls, post_user_mention_id, owner_id):
+    def create_post_user_mention_notification(cls, post_user_mention_id, owner_id, post_id):
         post_user_mention_notification = cls.objects.create(post_user_mention_id=post_user_mention_id)
         Notification.create_notification(type=Notification.POST_USER_MENTION,
                                          content_object=post_user_mention_notification,
-                                         owner_id=owner_id)
+                                         owner_id=owner_id,
+                                         post_id=post_id)
         return post_user_mention_notification
 
     @classmethod
@@ -17,9 +17,43 @@ class UserNewPostNotification(models.Model):
             user_notifications_subscription_id=user_notifications_subscription_id)
         Notification.create_notification(type=Notification.USER_NEW_POST,
                                          content_object=user_new_post_notification,
-                                         owner_id=owner_id)
+                                         owner_id=owner_id,
+                                         post_id=post_id)
         return user_new_post_notification
 
+    @classmethod
+    def create_user_new_post_notifications(cls, post_id, user_notifications_subscriptions):
+        """
+        Creates the notifications of the subscriptions not yet notified of the post, returns these subscriptions
+        """
+        subscriptions_ids = [subscription.pk for subscription in user_notifications_subscriptions]
+
+        notified_subscriptions_ids = set(cls.objects.filter(
+            post_id=post_id, user_notifications_subscription_id__in=subscriptions_ids).values_list(
+            'user_notifications_subscription_id', flat=True))
+
+        new_subscriptions = {subscription.pk: subscription for subscription in user_notifications_subscriptions
+                             if subscription.pk not in notified_subscriptions_ids}
+
+        if not new_subscriptions:
+            return []
+
+        cls.objects.bulk_create([cls(post_id=post_id, user_notifications_subscription_id=subscription_id)
+                                 for subscription_id in new_subscriptions])
+
+        # The primary keys of bulk created rows are not set on every database
+        user_new_post_notifications = cls.objects.filter(
+            post_id=post_id, user_notifications_subscription_id__in=list(new_subscriptions)).values_list(
+            'id', 'user_notifications_subscription_id')
+
+        Notification.create_notifications(type=Notification.USER_NEW_POST, content_objects_model=cls, post_id=post_id,
+                                          owners_ids_by_object_id={
+                                              notification_id: new_subscriptions[subscription_id].subscriber_id
+                                              for notification_id, subscription_id in
+                                              user_new_post_notifications})
+
+        return list(new_subscriptions.values())
+
     @classmethod
     def delete_user_new_post_notification(cls, user_notifications_subscription_id, post_id, owner_id):
         cls.objects.filter(user_notifications_subscription_id=user_notifications_subscription_id,
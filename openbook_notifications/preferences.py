@@ -0,0 +1,249 @@
+"""
+Notifications preferences.
+
+Whether a user wants a notification depends on their notifications settings and, for the notifications of a post, on
+whether they muted the post. Both are cached per user in a compact entry, the settings as a bitmask and the muted
+posts as a set of ids, so gating the recipients of a notification, up to thousands of them in a fan out, takes a
+single redis round trip rather than queries to the settings and mutes tables per recipient.
+
+The entry of a user is dropped whenever their settings are saved or they mute or unmute a post, and rebuilt from the
+database on the next read. It expires settings.NOTIFICATIONS_PREFERENCES_EXPIRATION_SECONDS after being built, which
+bounds the staleness of the muted posts deleted along with their post.
+"""
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from openbook_common.utils.backends import get_backend, RedisBackend, LocalBackend
+from openbook_common.utils.model_loaders import get_user_notifications_settings_model, get_post_mute_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_PREFERENCES_KEY = 'ob-api-notifications-preferences-%(user_id)d'
+
+# The bit of every setting is its position, new settings are only ever appended
+NOTIFICATIONS_SETTINGS_FIELDS = (
+    'post_comment_notifications',
+    'post_comment_reply_notifications',
+    'post_reaction_notifications',
+    'follow_notifications',
+    'follow_request_notifications',
+    'follow_request_approved_notifications',
+    'connection_request_notifications',
+    'connection_confirmed_notifications',
+    'community_invite_notifications',
+    'community_new_post_notifications',
+    'user_new_post_notifications',
+    'post_comment_reaction_notifications',
+    'post_comment_user_mention_notifications',
+    'post_user_mention_notifications',
+)
+
+NOTIFICATIONS_SETTINGS_BITS = {field: 1 << index for index, field in enumerate(NOTIFICATIONS_SETTINGS_FIELDS)}
+
+# The settings of the users without settings, every notification enabled as by the settings defaults
+DEFAULT_NOTIFICATIONS_SETTINGS_MASK = (1 << len(NOTIFICATIONS_SETTINGS_FIELDS)) - 1
+
+
+class NotificationsPreferences:
+
+    def __init__(self, settings_mask, muted_posts_ids):
+        self.settings_mask = settings_mask
+        self.muted_posts_ids = muted_posts_ids
+
+    def is_enabled(self, notifications_setting, post_id=None):
+        """
+        Returns whether the notifications of the setting, e.g. post_reaction_notifications, are enabled, for the post
+        with the given id if any
+        """
+        if not self.settings_mask & NOTIFICATIONS_SETTINGS_BITS[notifications_setting]:
+            return False
+
+        return post_id is None or post_id not in self.muted_posts_ids
+
+    def has_muted_post_with_id(self, post_id):
+        return post_id in self.muted_posts_ids
+
+    def serialize(self):
+        return '%d:%s' % (self.settings_mask, ','.join(str(post_id) for post_id in sorted(self.muted_posts_ids)))
+
+    @classmethod
+    def deserialize(cls, value):
+        settings_mask, muted_posts_ids = value.split(':')
+        return cls(settings_mask=int(settings_mask),
+                   muted_posts_ids={int(post_id) for post_id in muted_posts_ids.split(',') if post_id})
+
+
+def get_notifications_preferences_for_user_with_id(user_id):
+    return get_notifications_preferences_for_users_with_ids(users_ids=[user_id])[user_id]
+
+
+def get_notifications_preferences_for_users_with_ids(users_ids):
+    """
+    Returns the preferences of the users by user id, the ones not cached are built with a query per table and cached
+    """
+    users_ids = set(users_ids)
+
+    if not users_ids:
+        return {}
+
+    notifications_preferences = get_notifications_preferences()
+
+    try:
+        values = notifications_preferences.get_many(users_ids=users_ids)
+    except RedisError as e:
+        logger.warning('Failed to get the notifications preferences of %d users: %s' % (len(users_ids), e))
+        return _build_notifications_preferences(users_ids=users_ids)
+
+    preferences = {user_id: NotificationsPreferences.deserialize(value) for user_id, value in values.items() if
+                   value is not None}
+
+    missing_users_ids = users_ids - preferences.keys()
+
+    if missing_users_ids:
+        built_preferences = _build_notifications_preferences(users_ids=missing_users_ids)
+
+        try:
+            notifications_preferences.set_many(values={user_id: user_preferences.serialize() for
+                                                       user_id, user_preferences in built_preferences.items()})
+        except RedisError as e:
+            logger.warning('Failed to cache the notifications preferences of %d users: %s' % (
+                len(missing_users_ids), e))
+
+        preferences.update(built_preferences)
+
+    return preferences
+
+
+def filter_users_ids_with_notifications_enabled(users_ids, notifications_setting, post_id=None):
+    """
+    Returns the ids of the users with the notifications of the setting enabled, for the post with the given id if
+    any, in the order they were given
+    """
+    preferences = get_notifications_preferences_for_users_with_ids(users_ids=users_ids)
+
+    return [user_id for user_id in users_ids if
+            preferences[user_id].is_enabled(notifications_setting=notifications_setting, post_id=post_id)]
+
+
+def invalidate_notifications_preferences_for_user_with_id(user_id):
+    """
+    Drops the cached preferences of the user, once right away and once more on commit so a read in between doesn't
+    cache the preferences the transaction is about to change
+    """
+    _invalidate_notifications_preferences(user_id=user_id)
+    transaction.on_commit(lambda: _invalidate_notifications_preferences(user_id=user_id))
+
+
+def get_notifications_preferences():
+    return get_backend('NOTIFICATIONS_PREFERENCES_BACKEND',
+                       expiration_seconds=settings.NOTIFICATIONS_PREFERENCES_EXPIRATION_SECONDS)
+
+
+def _invalidate_notifications_preferences(user_id):
+    try:
+        get_notifications_preferences().invalidate(user_id=user_id)
+    except RedisError as e:
+        logger.warning('Failed to invalidate the notifications preferences of user %d: %s' % (user_id, e))
+
+
+def _build_notifications_preferences(users_ids):
+    UserNotificationsSettings = get_user_notifications_settings_model()
+    PostMute = get_post_mute_model()
+
+    settings_masks = {}
+
+    for values in UserNotificationsSettings.objects.filter(user_id__in=users_ids).values_list(
+            'user_id', *NOTIFICATIONS_SETTINGS_FIELDS):
+        settings_mask = 0
+
+        for field, enabled in zip(NOTIFICATIONS_SETTINGS_FIELDS, values[1:]):
+            if enabled:
+                settings_mask |= NOTIFICATIONS_SETTINGS_BITS[field]
+
+        settings_masks[values[0]] = settings_mask
+
+    muted_posts_ids = {}
+
+    for muter_id, post_id in PostMute.objects.filter(muter_id__in=users_ids).values_list('muter_id', 'post_id'):
+        muted_posts_ids.setdefault(muter_id, set()).add(post_id)
+
+    return {user_id: NotificationsPreferences(
+        settings_mask=settings_masks.get(user_id, DEFAULT_NOTIFICATIONS_SETTINGS_MASK),
+        muted_posts_ids=muted_posts_ids.get(user_id, set())) for user_id in users_ids}
+
+
+class BaseNotificationsPreferences(ABC):
+
+    def __init__(self, expiration_seconds):
+        self.expiration_seconds = expiration_seconds
+
+    @abstractmethod
+    def get_many(self, users_ids):
+        """
+        Returns the serialized preferences of the users by user id, None for the users without cached preferences
+        """
+        pass
+
+    @abstractmethod
+    def set_many(self, values):
+        pass
+
+    @abstractmethod
+    def invalidate(self, user_id):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class RedisNotificationsPreferences(BaseNotificationsPreferences, RedisBackend):
+
+    def get_many(self, users_ids):
+        users_ids = list(users_ids)
+        values = self._get_redis().mget([self._make_key(user_id) for user_id in users_ids])
+
+        return {user_id: value.decode() if value is not None else None for user_id, value in zip(users_ids, values)}
+
+    def set_many(self, values):
+        pipeline = self._get_redis().pipeline(transaction=False)
+        for user_id, value in values.items():
+            pipeline.set(self._make_key(user_id), value, ex=self.expiration_seconds)
+        pipeline.execute()
+
+    def invalidate(self, user_id):
+        self._get_redis().delete(self._make_key(user_id))
+
+    def clear(self):
+        self._delete_keys_matching(NOTIFICATIONS_PREFERENCES_KEY.replace('%(user_id)d', '*'))
+
+    def _make_key(self, user_id):
+        return NOTIFICATIONS_PREFERENCES_KEY % {'user_id': user_id}
+
+
+class LocalNotificationsPreferences(BaseNotificationsPreferences, LocalBackend):
+    """
+    The preferences are never expired, the tests rely on the invalidations alone.
+    """
+    _values = {}
+
+    def get_many(self, users_ids):
+        with self._lock:
+            return {user_id: self._values.get(user_id) for user_id in users_ids}
+
+    def set_many(self, values):
+        with self._lock:
+            self._values.update(values)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._values.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
@@ -0,0 +1,288 @@
+"""
+Push notifications messages.
+
+The push notifications are not rendered where they are sent from. The handlers only buffer the key of their message
+along with the ids of its actor and target, e.g. the reactor of a post reaction, and the flush renders the buffered
+notifications in bulk. The actors and targets of a flush are fetched with a query per model and the messages are
+formatted from catalogs of the translated messages, compiled once per language when the app is ready so the job
+processes forked by the workers inherit them.
+
+The messages keep the ids of their translations, the catalogs are compiled from the existing django.po files.
+"""
+import threading
+
+from django.conf import settings
+from django.utils import translation
+from django.utils.translation import gettext_noop
+
+from openbook_common.utils.model_loaders import get_notification_model, get_user_model, get_community_model
+from openbook_translation import translation_strategy
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_GROUP_LOW_PRIORITY = 'low'
+NOTIFICATION_GROUP_MEDIUM_PRIORITY = 'medium'
+NOTIFICATION_GROUP_HIGH_PRIORITY = 'high'
+
+POST_REACTION = 'post_reaction'
+POST_COMMENT_ON_OWN_POST = 'post_comment_on_own_post'
+POST_COMMENT_ON_COMMENTED_POST = 'post_comment_on_commented_post'
+POST_COMMENT_REPLY_ON_OWN_COMMENT = 'post_comment_reply_on_own_comment'
+POST_COMMENT_REPLY_ON_OWN_POST = 'post_comment_reply_on_own_post'
+POST_COMMENT_REPLY_ON_REPLIED_COMMENT = 'post_comment_reply_on_replied_comment'
+POST_COMMENT_REACTION = 'post_comment_reaction'
+POST_COMMENT_USER_MENTION = 'post_comment_user_mention'
+POST_USER_MENTION = 'post_user_mention'
+FOLLOW = 'follow'
+FOLLOW_REQUEST = 'follow_request'
+FOLLOW_REQUEST_APPROVED = 'follow_request_approved'
+CONNECTION_REQUEST = 'connection_request'
+COMMUNITY_INVITE = 'community_invite'
+COMMUNITY_NEW_POST = 'community_new_post'
+USER_NEW_POST = 'user_new_post'
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+_push_messages = None
+
+
+class PushMessage:
+    """
+    A message, formatted with the name and username of its actor as the actor_param prefixed parameters and with the
+    name of its target community if any
+    """
+
+    def __init__(self, notification_type, text, group=None, actor_param=None, community_target=False):
+        self.notification_type = notification_type
+        self.text = text
+        self.group = group
+        self.actor_param = actor_param
+        self.community_target = community_target
+
+
+class PushNotification:
+    """
+    A push notification to render, sent to any amount of users
+    """
+
+    def __init__(self, message, actor_id=None, target_id=None):
+        self.message = message
+        self.actor_id = actor_id
+        self.target_id = target_id
+
+    def make_entry(self, user_id):
+        return {
+            'user_id': user_id,
+            'message': self.message,
+            'actor_id': self.actor_id,
+            'target_id': self.target_id,
+        }
+
+
+def get_push_messages():
+    global _push_messages
+
+    if _push_messages is None:
+        Notification = get_notification_model()
+
+        _push_messages = {
+            POST_REACTION: PushMessage(
+                notification_type=Notification.POST_REACTION,
+                text=gettext_noop('%(post_reactor_name)s · @%(post_reactor_username)s reacted to your post.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_reactor'),
+            POST_COMMENT_ON_OWN_POST: PushMessage(
+                notification_type=Notification.POST_COMMENT,
+                text=gettext_noop('%(post_commenter_name)s · %(post_commenter_username)s commented on your post.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_commenter'),
+            POST_COMMENT_ON_COMMENTED_POST: PushMessage(
+                notification_type=Notification.POST_COMMENT,
+                text=gettext_noop(
+                    '%(post_commenter_name)s · @%(post_commenter_username)s commented on a post you also commented '
+                    'on.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_commenter'),
+            POST_COMMENT_REPLY_ON_OWN_COMMENT: PushMessage(
+                notification_type=Notification.POST_COMMENT,
+                text=gettext_noop(
+                    '%(post_commenter_name)s · @%(post_commenter_username)s replied to your comment on a post.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_commenter'),
+            POST_COMMENT_REPLY_ON_OWN_POST: PushMessage(
+                notification_type=Notification.POST_COMMENT,
+                text=gettext_noop(
+                    '%(post_commenter_name)s · %(post_commenter_username)s replied to a comment on your post.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_commenter'),
+            POST_COMMENT_REPLY_ON_REPLIED_COMMENT: PushMessage(
+                notification_type=Notification.POST_COMMENT,
+                text=gettext_noop(
+                    '%(post_commenter_name)s · @%(post_commenter_username)s replied on a comment you also replied '
+                    'on.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_commenter'),
+            POST_COMMENT_REACTION: PushMessage(
+                notification_type=Notification.POST_COMMENT_REACTION,
+                text=gettext_noop(
+                    '%(post_comment_reactor_name)s · @%(post_comment_reactor_username)s reacted to your comment.'),
+                group=NOTIFICATION_GROUP_LOW_PRIORITY, actor_param='post_comment_reactor'),
+            POST_COMMENT_USER_MENTION: PushMessage(
+                notification_type=Notification.POST_COMMENT_USER_MENTION,
+                text=gettext_noop('%(mentioner_name)s · @%(mentioner_username)s mentioned you in a comment.'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='mentioner'),
+            POST_USER_MENTION: PushMessage(
+                notification_type=Notification.POST_USER_MENTION,
+                text=gettext_noop('%(mentioner_name)s · @%(mentioner_username)s mentioned you in a post.'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='mentioner'),
+            FOLLOW: PushMessage(
+                notification_type=Notification.FOLLOW,
+                text=gettext_noop('%(following_user_name)s · @%(following_user_username)s started following you'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='following_user'),
+            FOLLOW_REQUEST: PushMessage(
+                notification_type=Notification.FOLLOW_REQUEST,
+                text=gettext_noop('%(follow_requester_name)s · @%(follow_requester_username)s wants to follow you.'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='follow_requester'),
+            FOLLOW_REQUEST_APPROVED: PushMessage(
+                notification_type=Notification.FOLLOW_REQUEST_APPROVED,
+                text=gettext_noop(
+                    '%(followed_user_name)s · @%(followed_user_username)s has approved your follow request.'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='followed_user'),
+            CONNECTION_REQUEST: PushMessage(
+                notification_type=Notification.CONNECTION_REQUEST,
+                text=gettext_noop(
+                    '%(connection_requester_name)s · @%(connection_requester_username)s wants to connect with you.'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='connection_requester'),
+            COMMUNITY_INVITE: PushMessage(
+                notification_type=Notification.COMMUNITY_INVITE,
+                text=gettext_noop(
+                    '%(invite_creator_name)s · @%(invite_creator_username)s has invited you to join '
+                    'c/%(community_name)s.'),
+                group=NOTIFICATION_GROUP_MEDIUM_PRIORITY, actor_param='invite_creator', community_target=True),
+            COMMUNITY_NEW_POST: PushMessage(
+                notification_type=Notification.COMMUNITY_NEW_POST,
+                text=gettext_noop('A new post was posted in c/%(community_name)s.'),
+                group=NOTIFICATION_GROUP_HIGH_PRIORITY, community_target=True),
+            USER_NEW_POST: PushMessage(
+                notification_type=Notification.USER_NEW_POST,
+                text=gettext_noop('%(post_creator_name)s · @%(post_creator_username)s posted something.'),
+                actor_param='post_creator'),
+        }
+
+    return _push_messages
+
+
+def compile_push_messages_catalogs():
+    """
+    Compiles the catalog of every language, meant to run once per process before any push notification is rendered
+    """
+    for language_code, language_name in settings.LANGUAGES:
+        get_push_messages_catalog(language_code=language_code)
+
+
+def get_push_messages_catalog(language_code):
+    """
+    Returns the translated texts of the messages in the language, by message key
+    """
+    catalog = _catalogs.get(language_code)
+
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(language_code)
+
+            if catalog is None:
+                with translation.override(language_code):
+                    catalog = {key: translation.gettext(push_message.text) for key, push_message in
+                               get_push_messages().items()}
+                _catalogs[language_code] = catalog
+
+    return catalog
+
+
+def get_push_notifications_language_code_for_user(user):
+    if user.language and translation.check_for_language(user.language.code):
+        return user.language.code
+
+    return translation_strategy.get_default_translation_language_code()
+
+
+def render_push_notifications(entries):
+    """
+    Gives a post_body to the entries of the buffered push notifications, dicts with the user_id of the recipient, the
+    key of the message and the ids of its actor and target, rendered in the language of their recipient. The entries
+    whose recipient, actor or target no longer exists are left out.
+    """
+    push_messages = get_push_messages()
+
+    users_ids = set()
+    communities_ids = set()
+
+    for entry in entries:
+        users_ids.add(entry['user_id'])
+
+        if entry['actor_id'] is not None:
+            users_ids.add(entry['actor_id'])
+
+        if push_messages[entry['message']].community_target:
+            communities_ids.add(entry['target_id'])
+
+    User = get_user_model()
+    users = User.objects.filter(pk__in=users_ids).select_related('profile', 'language').in_bulk()
+
+    communities = {}
+
+    if communities_ids:
+        Community = get_community_model()
+        communities = Community.objects.filter(pk__in=communities_ids).only('id', 'name').in_bulk()
+
+    rendered_entries = []
+    entries_by_language_code = {}
+
+    for entry in entries:
+        user = users.get(entry['user_id'])
+
+        if user is None:
+            continue
+
+        entries_by_language_code.setdefault(get_push_notifications_language_code_for_user(user), []).append(entry)
+
+    for language_code, language_entries in entries_by_language_code.items():
+        catalog = get_push_messages_catalog(language_code=language_code)
+
+        for entry in language_entries:
+            push_message = push_messages[entry['message']]
+            params = {}
+
+            if push_message.actor_param:
+                actor = users.get(entry['actor_id'])
+
+                if actor is None:
+                    continue
+
+                params['%s_name' % push_message.actor_param] = actor.profile.name
+                params['%s_username' % push_message.actor_param] = actor.username
+
+            if push_message.community_target:
+                community = communities.get(entry['target_id'])
+
+                if community is None:
+                    continue
+
+                params['community_name'] = community.name
+
+            post_body = {
+                'contents': {'en': catalog[entry['message']] % params},
+                'data': {'type': push_message.notification_type},
+            }
+
+            if push_message.group:
+                post_body['!thread_id'] = push_message.group
+                post_body['android_group'] = push_message.group
+
+            rendered_entries.append({
+                'user_id': entry['user_id'],
+                'post_body': post_body,
+            })
+
+    if len(rendered_entries) < len(entries):
+        logger.info('Dropped %d push notifications whose recipient, actor or target no longer exists' % (
+            len(entries) - len(rendered_entries)))
+
+    return rendered_entries
@@ -0,0 +1,393 @@
+"""
+Push notifications dispatcher.
+
+Push notifications are not sent to OneSignal one by one as they are created. They are buffered in a redis list and
+the first notification of the buffer schedules a flush settings.PUSH_NOTIFICATIONS_BUFFER_SECONDS later. The flush
+merges the recipients of the notifications with identical payloads, so the same notification sent to many users goes
+out in as few OneSignal requests as the filters of a notification allow.
+
+The requests share a pooled HTTP session, are paced to settings.PUSH_NOTIFICATIONS_MAX_REQUESTS_PER_SECOND and are
+retried with an exponential backoff while OneSignal fails or rate limits us. settings.ONE_SIGNAL_API_URL can point
+the dispatcher to a local fake OneSignal server.
+
+The pushes of the notifications aggregated in groups, e.g. the reactions to a post, go out at most once every
+settings.NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS per group. The latest push of a group within the interval is
+deferred, and sent once the interval is over unless a push of the group went out meanwhile.
+
+The notifications that could not be buffered, while redis is unavailable, are not pushed. Their jobs would be enqueued
+through the same redis.
+
+The buffered notifications are rendered by the flush, see openbook_notifications.push_messages.
+"""
+import json
+import random
+import threading
+import time
+from hashlib import sha256
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+
+from openbook_common.utils.model_loaders import get_user_model
+from openbook_notifications.push_messages import render_push_notifications
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+PUSH_NOTIFICATIONS_BUFFER_KEY = 'ob-api-push-notifications-buffer'
+PUSH_NOTIFICATIONS_FLUSH_KEY = 'ob-api-push-notifications-flush'
+PUSH_NOTIFICATIONS_GROUP_KEY = 'ob-api-push-notifications-group-%(user_id)d-%(notification_type)s-%(group_key)s'
+PUSH_NOTIFICATIONS_GROUP_DEFERRED_KEY = \
+    'ob-api-push-notifications-group-deferred-%(user_id)d-%(notification_type)s-%(group_key)s'
+PUSH_NOTIFICATIONS_GROUP_TRAILING_KEY = \
+    'ob-api-push-notifications-group-trailing-%(user_id)d-%(notification_type)s-%(group_key)s'
+
+# The workers fork a process per job, the session keeps the connections alive across the requests of a flush
+_session = None
+_session_lock = threading.Lock()
+
+
+class OneSignalRequestError(Exception):
+    pass
+
+
+def buffer_push_notifications(users_ids_notifications):
+    """
+    Adds the push notifications, given as (user id, push notification) pairs, to the buffer. Returns whether the
+    caller must schedule the flush, which is the case for the first notifications buffered since the last flush.
+    """
+    entries = [json.dumps(notification.make_entry(user_id=user_id), cls=DjangoJSONEncoder) for user_id, notification
+               in users_ids_notifications]
+
+    if not entries:
+        return False
+
+    redis = _get_redis()
+    redis.rpush(PUSH_NOTIFICATIONS_BUFFER_KEY, *entries)
+
+    # Expires in case the scheduled flush is lost, the next notification then schedules a new one
+    flush_lock_seconds = settings.PUSH_NOTIFICATIONS_BUFFER_SECONDS + settings.PUSH_NOTIFICATIONS_FLUSH_LOCK_SECONDS
+
+    return bool(redis.set(PUSH_NOTIFICATIONS_FLUSH_KEY, 1, nx=True, ex=flush_lock_seconds))
+
+
+def acquire_push_notifications_group(user_id, notification_type, group_key):
+    """
+    Returns whether the push notification of the group can be sent to the user, which is the case for the first one
+    since settings.NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS
+    """
+    push_interval_seconds = settings.NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS
+
+    if not push_interval_seconds:
+        return True
+
+    key = _make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_KEY, user_id=user_id,
+                                             notification_type=notification_type, group_key=group_key)
+
+    try:
+        redis = _get_redis()
+
+        if not redis.set(key, 1, nx=True, ex=push_interval_seconds):
+            return False
+
+        # The push about to be sent supersedes the one deferred in the previous interval
+        redis.delete(_make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_DEFERRED_KEY, user_id=user_id,
+                                                        notification_type=notification_type, group_key=group_key))
+    except RedisError as e:
+        logger.warning('Failed to rate limit the push notifications of group %s: %s' % (key, e))
+
+    return True
+
+
+def defer_push_notification_of_group(user_id, notification_type, group_key, notification):
+    """
+    Defers the push notification of the group that could not be acquired, replacing the one deferred before. Returns
+    the seconds left in the push interval of the group if the caller must schedule the trailing push, which is the
+    case for the first push deferred in the interval, None otherwise.
+    """
+    push_interval_seconds = settings.NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS
+    keys = {'user_id': user_id, 'notification_type': notification_type, 'group_key': group_key}
+
+    entry = json.dumps(notification.make_entry(user_id=user_id), cls=DjangoJSONEncoder)
+
+    pipeline = _get_redis().pipeline(transaction=True)
+    pipeline.set(_make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_DEFERRED_KEY, **keys), entry,
+                 ex=push_interval_seconds * 2)
+    pipeline.set(_make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_TRAILING_KEY, **keys), 1, nx=True,
+                 ex=push_interval_seconds)
+    pipeline.pttl(_make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_KEY, **keys))
+    _, trailing_push_needed, group_milliseconds = pipeline.execute()
+
+    if not trailing_push_needed:
+        return None
+
+    return max(group_milliseconds, 0) / 1000
+
+
+def pop_deferred_push_notification_of_group(user_id, notification_type, group_key):
+    """
+    Returns the entry of the push notification deferred in the group, or None if there is none left, and starts a new
+    push interval for the group if so
+    """
+    keys = {'user_id': user_id, 'notification_type': notification_type, 'group_key': group_key}
+    deferred_key = _make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_DEFERRED_KEY, **keys)
+
+    redis = _get_redis()
+
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.get(deferred_key)
+    pipeline.delete(deferred_key)
+    pipeline.delete(_make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_TRAILING_KEY, **keys))
+    entry, _, _ = pipeline.execute()
+
+    if entry is None:
+        return None
+
+    redis.set(_make_push_notifications_group_key(PUSH_NOTIFICATIONS_GROUP_KEY, **keys), 1,
+              ex=settings.NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS)
+
+    return json.loads(entry)
+
+
+def flush_push_notifications_buffer():
+    """
+    Sends every buffered notification, returns the dispatch stats
+    """
+    redis = _get_redis()
+
+    # Released first, a notification buffered from now on schedules the next flush rather than waiting for the lock
+    # to expire. At worst that flush finds an empty buffer.
+    redis.delete(PUSH_NOTIFICATIONS_FLUSH_KEY)
+
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.lrange(PUSH_NOTIFICATIONS_BUFFER_KEY, 0, -1)
+    pipeline.delete(PUSH_NOTIFICATIONS_BUFFER_KEY)
+    entries, _ = pipeline.execute()
+
+    return send_push_notifications(entries=[json.loads(entry) for entry in entries])
+
+
+def send_push_notifications(entries):
+    """
+    Sends the notifications of the entries, dicts with the user_id of the recipient and either the post_body of the
+    notification or the message to render it from, to every device of their recipients. The recipients of identical
+    post bodies are merged into multi-target requests.
+    """
+    started = time.monotonic()
+
+    rendered_entries = render_push_notifications(entries=[entry for entry in entries if 'post_body' not in entry])
+    entries = [entry for entry in entries if 'post_body' in entry] + rendered_entries
+
+    stats = PushNotificationsDispatchStats(notifications=len(entries))
+
+    users_ids_by_payload = {}
+
+    for entry in entries:
+        payload = json.dumps(entry['post_body'], sort_keys=True)
+        # Dicts keep the recipients in the order they were notified, without duplicates
+        users_ids_by_payload.setdefault(payload, {})[entry['user_id']] = None
+
+    users_ids = set()
+    for payload_users_ids in users_ids_by_payload.values():
+        users_ids.update(payload_users_ids)
+
+    User = get_user_model()
+    users = User.objects.filter(pk__in=users_ids).only('id', 'uuid').prefetch_related('devices')
+    users_devices_filters = {user.pk: _make_user_devices_filters(user) for user in users}
+
+    one_signal_client = get_one_signal_client()
+    max_devices = settings.PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST
+
+    for payload, payload_users_ids in users_ids_by_payload.items():
+        devices_filters = []
+        for user_id in payload_users_ids:
+            devices_filters.extend(users_devices_filters.get(user_id, []))
+
+        stats.recipients += len(payload_users_ids)
+        stats.devices += len(devices_filters)
+
+        for offset in range(0, len(devices_filters), max_devices):
+            request_devices_filters = devices_filters[offset:offset + max_devices]
+
+            post_body = json.loads(payload)
+            post_body['ios_badgeType'] = 'Increase'
+            post_body['ios_badgeCount'] = '1'
+            post_body['filters'] = _join_filters(request_devices_filters)
+
+            stats.requests += 1
+
+            try:
+                stats.retries += one_signal_client.send_notification(post_body=post_body)
+            except OneSignalRequestError as e:
+                stats.failed_requests += 1
+                logger.error('Failed to send a push notification to %d devices: %s' % (
+                    len(request_devices_filters), e))
+
+    stats.seconds = time.monotonic() - started
+
+    logger.info(str(stats))
+
+    return stats
+
+
+def get_one_signal_client():
+    return OneSignalClient(app_id=settings.ONE_SIGNAL_APP_ID,
+                           api_key=settings.ONE_SIGNAL_API_KEY,
+                           api_url=settings.ONE_SIGNAL_API_URL,
+                           max_retries=settings.PUSH_NOTIFICATIONS_MAX_RETRIES,
+                           retry_backoff_seconds=settings.PUSH_NOTIFICATIONS_RETRY_BACKOFF_SECONDS,
+                           max_retry_backoff_seconds=settings.PUSH_NOTIFICATIONS_MAX_RETRY_BACKOFF_SECONDS,
+                           max_requests_per_second=settings.PUSH_NOTIFICATIONS_MAX_REQUESTS_PER_SECOND,
+                           timeout_seconds=settings.PUSH_NOTIFICATIONS_REQUEST_TIMEOUT_SECONDS)
+
+
+class PushNotificationsDispatchStats:
+
+    def __init__(self, notifications=0):
+        self.notifications = notifications
+        self.recipients = 0
+        self.devices = 0
+        self.requests = 0
+        self.retries = 0
+        self.failed_requests = 0
+        self.seconds = 0
+
+    @property
+    def notifications_per_second(self):
+        return self.notifications / self.seconds if self.seconds else 0
+
+    def __str__(self):
+        return 'Dispatched %d push notifications to %d recipients on %d devices with %d requests (%d retries, ' \
+               '%d failed) in %.2fs, %.1f notifications/s' % (self.notifications, self.recipients, self.devices,
+                                                              self.requests, self.retries, self.failed_requests,
+                                                              self.seconds, self.notifications_per_second)
+
+
+class OneSignalClient:
+    """
+    Sends notifications to the OneSignal notifications endpoint through the pooled session
+    """
+
+    def __init__(self, app_id, api_key, api_url, max_retries, retry_backoff_seconds, max_retry_backoff_seconds,
+                 max_requests_per_second, timeout_seconds):
+        self.app_id = app_id
+        self.api_key = api_key
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_retry_backoff_seconds = max_retry_backoff_seconds
+        self.min_request_interval = 1 / max_requests_per_second
+        self.timeout_seconds = timeout_seconds
+        self._next_request_at = 0
+
+    def send_notification(self, post_body):
+        """
+        Sends the notification, retrying while OneSignal rate limits us or fails. Returns the amount of retries it
+        took, raises OneSignalRequestError once the retries are exhausted or if the notification was rejected.
+        """
+        post_body = dict(post_body)
+        post_body['app_id'] = self.app_id
+
+        retries = 0
+
+        while True:
+            self._wait_for_rate_limit()
+
+            try:
+                response = _get_session().post('%s/notifications' % self.api_url, json=post_body,
+                                               headers={'Authorization': 'Basic %s' % self.api_key},
+                                               timeout=self.timeout_seconds)
+            except requests.RequestException as e:
+                error = str(e)
+                retry_after = None
+            else:
+                if response.ok:
+                    return retries
+
+                error = 'OneSignal responded %d: %s' % (response.status_code, response.text)
+
+                if response.status_code != 429 and response.status_code < 500:
+                    raise OneSignalRequestError(error)
+
+                retry_after = self._get_retry_after(response)
+
+            if retries >= self.max_retries:
+                raise OneSignalRequestError('Gave up after %d retries, %s' % (retries, error))
+
+            backoff = retry_after if retry_after is not None else self._get_backoff(retries)
+            logger.warning('Retrying a push notification in %.2fs, %s' % (backoff, error))
+            time.sleep(backoff)
+
+            retries += 1
+
+    def _wait_for_rate_limit(self):
+        now = time.monotonic()
+
+        if now < self._next_request_at:
+            time.sleep(self._next_request_at - now)
+            now = self._next_request_at
+
+        self._next_request_at = now + self.min_request_interval
+
+    def _get_backoff(self, retries):
+        backoff = min(self.retry_backoff_seconds * 2 ** retries, self.max_retry_backoff_seconds)
+        # Jittered so the workers retrying at once don't hit OneSignal at once again
+        return backoff * random.uniform(0.5, 1)
+
+    def _get_retry_after(self, response):
+        try:
+            return min(float(response.headers['Retry-After']), self.max_retry_backoff_seconds)
+        except (KeyError, ValueError):
+            return None
+
+
+def _make_user_devices_filters(user):
+    user_id_contents = (str(user.uuid) + str(user.id)).encode('utf-8')
+    hashed_user_id = sha256(user_id_contents).hexdigest()
+
+    return [[
+        {"field": "tag", "key": "user_id", "relation": "=", "value": hashed_user_id},
+        {"field": "tag", "key": "device_uuid", "relation": "=", "value": device.uuid},
+    ] for device in user.devices.all()]
+
+
+def _join_filters(devices_filters):
+    filters = []
+
+    for device_filters in devices_filters:
+        if filters:
+            filters.append({"operator": "OR"})
+        filters.extend(device_filters)
+
+    return filters
+
+
+def _get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.PUSH_NOTIFICATIONS_HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+
+    return _session
+
+
+def _make_push_notifications_group_key(key, user_id, notification_type, group_key):
+    return key % {
+        'user_id': user_id,
+        'notification_type': notification_type,
+        'group_key': group_key,
+    }
+
+
+def _get_redis():
+    return get_redis_connection('default')
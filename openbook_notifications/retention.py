@@ -0,0 +1,146 @@
+"""
+Notifications retention.
+
+The notifications older than settings.NOTIFICATIONS_RETENTION_MAX_AGE_SECONDS are compacted away, the read ones and
+optionally the unread ones too. They are deleted in primary key ordered batches of
+settings.NOTIFICATIONS_COMPACTION_CHUNK_SIZE, each along with its content objects in a transaction, sleeping
+settings.NOTIFICATIONS_COMPACTION_SLEEP_SECONDS between batches so the replicas keep up. A run stops after
+settings.NOTIFICATIONS_COMPACTION_MAX_SECONDS, the next one picks up from the oldest notification left.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count
+from django.utils import timezone
+
+from openbook_common.utils.model_loaders import get_notification_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def compact_notifications(include_unread=False, dry_run=False, max_age_seconds=None, chunk_size=None,
+                          sleep_seconds=None, max_seconds=None):
+    """
+    Deletes the notifications past their retention, returns the compaction stats. A dry run only counts them.
+    The settings are used for the arguments left to None.
+    """
+    Notification = get_notification_model()
+
+    max_age_seconds = max_age_seconds if max_age_seconds is not None else \
+        settings.NOTIFICATIONS_RETENTION_MAX_AGE_SECONDS
+    chunk_size = chunk_size or settings.NOTIFICATIONS_COMPACTION_CHUNK_SIZE
+    sleep_seconds = sleep_seconds if sleep_seconds is not None else settings.NOTIFICATIONS_COMPACTION_SLEEP_SECONDS
+    max_seconds = max_seconds if max_seconds is not None else settings.NOTIFICATIONS_COMPACTION_MAX_SECONDS
+
+    stats = NotificationsCompactionStats(dry_run=dry_run)
+    start = time.monotonic()
+
+    notifications = Notification.objects.filter(created__lt=timezone.now() - timedelta(seconds=max_age_seconds))
+
+    if not include_unread:
+        notifications = notifications.filter(read=True)
+
+    if dry_run:
+        # Every notification has a content object of its own, each counts for one row of its content type table
+        for content_type_id, count in notifications.order_by().values_list('content_type_id').annotate(
+                count=Count('id')):
+            stats.add_deleted(content_type_id=content_type_id, notifications_count=count,
+                              content_objects_count=count)
+
+        stats.seconds = time.monotonic() - start
+        return stats
+
+    # Bounds the batches to the notifications already past their retention, the newer ones are never scanned
+    max_notification_id = notifications.order_by('-id').values_list('id', flat=True).first()
+
+    if max_notification_id is None:
+        stats.seconds = time.monotonic() - start
+        return stats
+
+    notifications = notifications.filter(pk__lte=max_notification_id)
+    last_notification_id = 0
+
+    while True:
+        notifications_rows = list(notifications.filter(pk__gt=last_notification_id).order_by('id').values_list(
+            *Notification.DELETED_NOTIFICATIONS_FIELDS)[:chunk_size])
+
+        if not notifications_rows:
+            break
+
+        deleted_content_objects_counts = Notification.delete_notifications_rows(notifications_rows)
+
+        notifications_counts = {}
+
+        for notification_row in notifications_rows:
+            content_type_id = notification_row[4]
+            notifications_counts[content_type_id] = notifications_counts.get(content_type_id, 0) + 1
+
+        for content_type_id, notifications_count in notifications_counts.items():
+            stats.add_deleted(content_type_id=content_type_id, notifications_count=notifications_count,
+                              content_objects_count=deleted_content_objects_counts.get(content_type_id, 0))
+
+        stats.batches += 1
+        last_notification_id = notifications_rows[-1][0]
+
+        if len(notifications_rows) < chunk_size:
+            break
+
+        if time.monotonic() - start >= max_seconds:
+            stats.interrupted = True
+            logger.info('Stopped compacting the notifications at id %d after %.2fs' % (
+                last_notification_id, time.monotonic() - start))
+            break
+
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    stats.seconds = time.monotonic() - start
+    return stats
+
+
+class NotificationsCompactionStats:
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.notifications = 0
+        self.content_objects = 0
+        self.content_objects_by_content_type_id = {}
+        self.batches = 0
+        self.interrupted = False
+        self.seconds = 0
+
+    def add_deleted(self, content_type_id, notifications_count, content_objects_count):
+        self.notifications += notifications_count
+        self.content_objects += content_objects_count
+        self.content_objects_by_content_type_id[content_type_id] = self.content_objects_by_content_type_id.get(
+            content_type_id, 0) + content_objects_count
+
+    @property
+    def rows(self):
+        return self.notifications + self.content_objects
+
+    def get_content_objects_by_table(self):
+        content_objects_by_table = {}
+
+        for content_type_id, count in self.content_objects_by_content_type_id.items():
+            content_objects_model = ContentType.objects.get_for_id(content_type_id).model_class()
+            table = content_objects_model._meta.db_table if content_objects_model else str(content_type_id)
+            content_objects_by_table[table] = count
+
+        return content_objects_by_table
+
+    def __str__(self):
+        tables = ', '.join('%s: %d' % (table, count) for table, count in
+                           sorted(self.get_content_objects_by_table().items()))
+
+        if self.dry_run:
+            return 'Would delete %d rows, %d notifications and %d content objects (%s), counted in %.2fs' % (
+                self.rows, self.notifications, self.content_objects, tables, self.seconds)
+
+        return 'Deleted %d rows, %d notifications and %d content objects (%s), in %d batches in %.2fs%s' % (
+            self.rows, self.notifications, self.content_objects, tables, self.batches, self.seconds,
+            ', interrupted' if self.interrupted else '')
@@ -45,6 +45,9 @@ class UnreadNotificationsCountSerializer(serializers.Serializer):
         ),
         required=False,
     )
+    breakdown = serializers.BooleanField(
+        required=False,
+    )
 
 
 class GetNotificationsSerializer(serializers.Serializer):
@@ -452,6 +455,7 @@ class GetNotificationsNotificationSerializer(serializers.ModelSerializer):
         UserNewPostNotification: UserNewPostNotificationSerializer(),
         CommunityInviteNotification: CommunityInviteNotificationSerializer()
     })
+    latest_actors = CommonPublicUserSerializer(many=True, read_only=True)
 
     class Meta:
         model = Notification
@@ -461,6 +465,8 @@ class GetNotificationsNotificationSerializer(serializers.ModelSerializer):
             'content_object',
             'read',
             'created',
+            'aggregated_count',
+            'latest_actors',
         )
 
 
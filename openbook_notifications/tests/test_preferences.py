@@ -0,0 +1,79 @@
+from faker import Faker
+
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_common.tests.helpers import make_user, make_fake_post_text
+from openbook_notifications.preferences import filter_users_ids_with_notifications_enabled, \
+    get_notifications_preferences_for_users_with_ids
+
+fake = Faker()
+
+
+class NotificationsPreferencesTests(OpenbookAPITestCase):
+    """
+    Notifications preferences
+    """
+
+    def test_filters_users_with_notifications_enabled(self):
+        """
+        should keep the users with the setting enabled and the post unmuted, in the given order
+        """
+        post_creator = make_user()
+        post = post_creator.create_public_post(text=make_fake_post_text())
+
+        users = [make_user() for i in range(0, 4)]
+
+        users[1].update_notifications_settings(post_reaction_notifications=False)
+        users[2].mute_post(post=post)
+
+        users_ids = [user.pk for user in users]
+
+        self.assertEqual(filter_users_ids_with_notifications_enabled(
+            users_ids=users_ids, notifications_setting='post_reaction_notifications', post_id=post.pk),
+            [users[0].pk, users[3].pk])
+
+        self.assertEqual(filter_users_ids_with_notifications_enabled(
+            users_ids=users_ids, notifications_setting='post_comment_notifications'),
+            users_ids)
+
+    def test_caches_preferences(self):
+        """
+        should build the preferences of many users with a query per table, then serve them from the cache
+        """
+        users_ids = [make_user().pk for i in range(0, 5)]
+
+        with self.assertNumQueries(2):
+            get_notifications_preferences_for_users_with_ids(users_ids=users_ids)
+
+        with self.assertNumQueries(0):
+            preferences = get_notifications_preferences_for_users_with_ids(users_ids=users_ids)
+
+        self.assertEqual(set(preferences.keys()), set(users_ids))
+
+    def test_invalidates_preferences_on_settings_update(self):
+        """
+        should pick up the updated notifications settings of a user with cached preferences
+        """
+        user = make_user()
+
+        self.assertTrue(user.has_follow_notifications_enabled())
+
+        user.update_notifications_settings(follow_notifications=False)
+
+        self.assertFalse(user.has_follow_notifications_enabled())
+
+    def test_invalidates_preferences_on_mute_and_unmute(self):
+        """
+        should pick up the posts muted and unmuted by a user with cached preferences
+        """
+        user = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        self.assertTrue(user.has_reaction_notifications_enabled_for_post_with_id(post_id=post.pk))
+
+        user.mute_post(post=post)
+
+        self.assertFalse(user.has_reaction_notifications_enabled_for_post_with_id(post_id=post.pk))
+
+        user.unmute_post_with_id(post_id=post.pk)
+
+        self.assertTrue(user.has_reaction_notifications_enabled_for_post_with_id(post_id=post.pk))
@@ -0,0 +1,293 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import override_settings
+from faker import Faker
+
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_common.models import Language
+from openbook_common.tests.helpers import make_user, make_device, make_community
+from openbook_notifications import push_messages
+from openbook_notifications.push_messages import PushNotification
+from openbook_notifications.push_notifications import send_push_notifications, acquire_push_notifications_group, \
+    defer_push_notification_of_group, pop_deferred_push_notification_of_group
+
+fake = Faker()
+
+
+class FakeOneSignalRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        with server.lock:
+            server.requests.append((self.path, body))
+            status, headers = server.responses.pop(0) if server.responses else (200, {})
+
+        response = json.dumps({'id': fake.uuid4(), 'recipients': 1}).encode('utf-8')
+
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PushNotificationsDispatcherTests(OpenbookAPITestCase):
+    """
+    PushNotificationsDispatcher, against a local fake OneSignal server
+    """
+
+    def setUp(self):
+        super(PushNotificationsDispatcherTests, self).setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOneSignalRequestHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.responses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.settings_override = override_settings(
+            ONE_SIGNAL_APP_ID='app',
+            ONE_SIGNAL_API_KEY='key',
+            ONE_SIGNAL_API_URL='http://127.0.0.1:%d/api/v1' % self.server.server_address[1],
+            PUSH_NOTIFICATIONS_MAX_REQUESTS_PER_SECOND=1000,
+            PUSH_NOTIFICATIONS_RETRY_BACKOFF_SECONDS=0.01,
+            PUSH_NOTIFICATIONS_MAX_RETRIES=2,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.server.shutdown()
+        self.server.server_close()
+        super(PushNotificationsDispatcherTests, self).tearDown()
+
+    def test_merges_recipients_of_identical_notifications(self):
+        """
+        should send identical notifications to all their recipients in a single request
+        """
+        users = [make_user() for i in range(0, 3)]
+        devices = [make_device(owner=user) for user in users]
+
+        post_body = {'contents': {'en': 'Hello'}, 'data': {'type': 'PR'}}
+
+        stats = send_push_notifications(entries=[{'user_id': user.pk, 'post_body': post_body} for user in users])
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(stats.notifications, 3)
+        self.assertEqual(stats.devices, 3)
+        self.assertEqual(stats.requests, 1)
+
+        path, body = self.server.requests[0]
+
+        self.assertEqual(path, '/api/v1/notifications')
+        self.assertEqual(body['app_id'], 'app')
+        self.assertEqual(body['contents'], {'en': 'Hello'})
+
+        devices_uuids = [device_filter['value'] for device_filter in body['filters'] if
+                         device_filter.get('key') == 'device_uuid']
+        self.assertEqual(devices_uuids, [device.uuid for device in devices])
+        self.assertEqual(len([device_filter for device_filter in body['filters'] if
+                              device_filter.get('operator') == 'OR']), 2)
+
+    def test_sends_different_notifications_separately(self):
+        """
+        should send the notifications with different payloads in their own requests
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        stats = send_push_notifications(entries=[
+            {'user_id': user.pk, 'post_body': {'contents': {'en': 'Hello'}}},
+            {'user_id': user.pk, 'post_body': {'contents': {'en': 'Bye'}}},
+        ])
+
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(sorted(body['contents']['en'] for path, body in self.server.requests), ['Bye', 'Hello'])
+
+    def test_splits_requests_over_max_devices(self):
+        """
+        should split the recipients of a notification over requests of at most the max devices per request
+        """
+        users = [make_user() for i in range(0, 5)]
+
+        for user in users:
+            make_device(owner=user)
+
+        post_body = {'contents': {'en': 'Hello'}}
+
+        with override_settings(PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST=2):
+            stats = send_push_notifications(entries=[{'user_id': user.pk, 'post_body': post_body} for user in users])
+
+        self.assertEqual(stats.requests, 3)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retries_when_rate_limited(self):
+        """
+        should retry a request rate limited or failed by OneSignal
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        self.server.responses = [(429, {'Retry-After': '0'}), (500, {})]
+
+        stats = send_push_notifications(entries=[{'user_id': user.pk, 'post_body': {'contents': {'en': 'Hello'}}}])
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(stats.retries, 2)
+        self.assertEqual(stats.failed_requests, 0)
+
+    def test_gives_up_after_max_retries(self):
+        """
+        should give up on a request once the retries are exhausted
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        self.server.responses = [(503, {}), (503, {}), (503, {})]
+
+        stats = send_push_notifications(entries=[{'user_id': user.pk, 'post_body': {'contents': {'en': 'Hello'}}}])
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(stats.failed_requests, 1)
+
+    def test_does_not_retry_rejected_notification(self):
+        """
+        should not retry a notification rejected by OneSignal
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        self.server.responses = [(400, {})]
+
+        stats = send_push_notifications(entries=[{'user_id': user.pk, 'post_body': {'contents': {'en': 'Hello'}}}])
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(stats.failed_requests, 1)
+
+    def test_renders_push_notifications_in_the_language_of_their_recipients(self):
+        """
+        should render the buffered push messages with their actor in the language of each recipient
+        """
+        actor = make_user()
+        user = make_user()
+        spanish_user = make_user()
+        spanish_user.language = Language.objects.get(code='es')
+        spanish_user.save()
+
+        make_device(owner=user)
+        make_device(owner=spanish_user)
+
+        push_notification = PushNotification(message=push_messages.FOLLOW, actor_id=actor.pk)
+
+        stats = send_push_notifications(entries=[push_notification.make_entry(user_id=user.pk),
+                                                 push_notification.make_entry(user_id=spanish_user.pk)])
+
+        self.assertEqual(stats.requests, 2)
+
+        contents = sorted(body['contents']['en'] for path, body in self.server.requests)
+
+        self.assertEqual(contents, sorted([
+            '%s · @%s started following you' % (actor.profile.name, actor.username),
+            '%s · @%s comenzó a seguirte' % (actor.profile.name, actor.username),
+        ]))
+
+        for path, body in self.server.requests:
+            self.assertEqual(body['data'], {'type': 'F'})
+            self.assertEqual(body['!thread_id'], push_messages.NOTIFICATION_GROUP_MEDIUM_PRIORITY)
+
+    def test_renders_push_notifications_of_communities(self):
+        """
+        should render the buffered push messages with their target community
+        """
+        community = make_community()
+        users = [make_user() for i in range(0, 2)]
+
+        for user in users:
+            make_device(owner=user)
+
+        push_notification = PushNotification(message=push_messages.COMMUNITY_NEW_POST, target_id=community.pk)
+
+        stats = send_push_notifications(entries=[push_notification.make_entry(user_id=user.pk) for user in users])
+
+        self.assertEqual(stats.requests, 1)
+
+        path, body = self.server.requests[0]
+
+        self.assertEqual(body['contents'], {'en': 'A new post was posted in c/%s.' % community.name})
+
+    def test_drops_push_notifications_of_deleted_actors(self):
+        """
+        should not send the buffered push messages whose actor no longer exists
+        """
+        actor = make_user()
+        user = make_user()
+        make_device(owner=user)
+
+        entry = PushNotification(message=push_messages.FOLLOW, actor_id=actor.pk).make_entry(user_id=user.pk)
+        actor.delete()
+
+        stats = send_push_notifications(entries=[entry])
+
+        self.assertEqual(stats.notifications, 0)
+        self.assertEqual(len(self.server.requests), 0)
+
+
+class PushNotificationsGroupsTests(OpenbookAPITestCase):
+    """
+    Push notifications groups rate limit
+    """
+
+    def test_sends_one_push_notification_per_group_and_interval(self):
+        """
+        should allow a single push notification of a group per interval
+        """
+        user = make_user()
+        group_key = fake.uuid4()
+        other_group_key = fake.uuid4()
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS=60):
+            self.assertTrue(acquire_push_notifications_group(user_id=user.pk, notification_type='PR',
+                                                             group_key=group_key))
+            self.assertFalse(acquire_push_notifications_group(user_id=user.pk, notification_type='PR',
+                                                              group_key=group_key))
+            self.assertTrue(acquire_push_notifications_group(user_id=user.pk, notification_type='PR',
+                                                             group_key=other_group_key))
+
+    def test_defers_the_latest_push_notification_of_a_group_to_the_end_of_its_interval(self):
+        """
+        should keep the latest push notification of a group within its interval to be sent once the interval is over
+        """
+        user = make_user()
+        actors = [make_user() for i in range(0, 2)]
+        group_key = fake.uuid4()
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_PUSH_INTERVAL_SECONDS=60):
+            self.assertTrue(acquire_push_notifications_group(user_id=user.pk, notification_type='PR',
+                                                             group_key=group_key))
+
+            trailing_push_seconds = [defer_push_notification_of_group(
+                user_id=user.pk, notification_type='PR', group_key=group_key,
+                notification=PushNotification(message=push_messages.POST_REACTION, actor_id=actor.pk)) for actor in
+                actors]
+
+            self.assertTrue(0 < trailing_push_seconds[0] <= 60)
+            self.assertIsNone(trailing_push_seconds[1])
+
+            entry = pop_deferred_push_notification_of_group(user_id=user.pk, notification_type='PR',
+                                                            group_key=group_key)
+
+            self.assertEqual(entry['actor_id'], actors[1].pk)
+            self.assertIsNone(pop_deferred_push_notification_of_group(user_id=user.pk, notification_type='PR',
+                                                                      group_key=group_key))
+            self.assertFalse(acquire_push_notifications_group(user_id=user.pk, notification_type='PR',
+                                                              group_key=group_key))
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from faker import Faker
+
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_common.tests.helpers import make_user
+from openbook_notifications.models import Notification, FollowNotification
+from openbook_notifications.retention import compact_notifications
+
+fake = Faker()
+
+
+class CompactNotificationsTests(OpenbookAPITestCase):
+    """
+    compact_notifications
+    """
+
+    def _make_follow_notification(self, owner, read, age_days):
+        follow_notification = FollowNotification.create_follow_notification(follower_id=make_user().pk,
+                                                                            owner_id=owner.pk)
+        Notification.objects.filter(object_id=follow_notification.pk, notification_type=Notification.FOLLOW).update(
+            read=read, created=timezone.now() - timedelta(days=age_days))
+        return follow_notification
+
+    def test_deletes_old_read_notifications_in_batches(self):
+        """
+        should delete the read notifications past their max age with their content objects, batch by batch
+        """
+        user = make_user()
+
+        old_read_follow_notifications = [self._make_follow_notification(owner=user, read=True, age_days=10) for i in
+                                         range(0, 5)]
+        old_unread_follow_notification = self._make_follow_notification(owner=user, read=False, age_days=10)
+        recent_read_follow_notification = self._make_follow_notification(owner=user, read=True, age_days=1)
+
+        stats = compact_notifications(max_age_seconds=60 * 60 * 24 * 5, chunk_size=2, sleep_seconds=0)
+
+        self.assertEqual(stats.notifications, 5)
+        self.assertEqual(stats.content_objects, 5)
+        self.assertEqual(stats.batches, 3)
+
+        self.assertFalse(FollowNotification.objects.filter(
+            pk__in=[follow_notification.pk for follow_notification in old_read_follow_notifications]).exists())
+        self.assertEqual(Notification.objects.filter(owner=user).count(), 2)
+        self.assertTrue(FollowNotification.objects.filter(pk=old_unread_follow_notification.pk).exists())
+        self.assertTrue(FollowNotification.objects.filter(pk=recent_read_follow_notification.pk).exists())
+
+    def test_deletes_old_unread_notifications_if_included(self):
+        """
+        should delete the unread notifications past their max age too if included and uncount them
+        """
+        user = make_user()
+
+        self._make_follow_notification(owner=user, read=False, age_days=10)
+        self._make_follow_notification(owner=user, read=False, age_days=1)
+
+        self.assertEqual(user.count_unread_notifications(), 2)
+
+        stats = compact_notifications(include_unread=True, max_age_seconds=60 * 60 * 24 * 5, sleep_seconds=0)
+
+        self.assertEqual(stats.notifications, 1)
+        self.assertEqual(Notification.objects.filter(owner=user).count(), 1)
+        self.assertEqual(user.count_unread_notifications(), 1)
+
+    def test_dry_run_deletes_nothing(self):
+        """
+        should count the rows past their retention per table without deleting them on a dry run
+        """
+        user = make_user()
+
+        for i in range(0, 3):
+            self._make_follow_notification(owner=user, read=True, age_days=10)
+
+        stats = compact_notifications(dry_run=True, max_age_seconds=60 * 60 * 24 * 5)
+
+        self.assertEqual(stats.notifications, 3)
+        self.assertEqual(stats.rows, 6)
+        self.assertEqual(stats.get_content_objects_by_table(), {FollowNotification._meta.db_table: 3})
+        self.assertEqual(Notification.objects.filter(owner=user).count(), 3)
+        self.assertEqual(FollowNotification.objects.count(), 3)
@@ -1,12 +1,20 @@
 import json
 
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
 from openbook_common.tests.models import OpenbookAPITestCase
 
-from openbook_common.tests.helpers import make_user, make_authentication_headers_for_user, make_notification
-from openbook_notifications.models import Notification
+from openbook_common.tests.helpers import make_user, make_authentication_headers_for_user, make_notification, \
+    count_queries_for_table, make_community, make_emoji, make_reactions_emoji_group, make_fake_post_text, \
+    make_fake_post_comment_text
+from openbook_notifications.models import Notification, PostCommentNotification, PostCommentReplyNotification, \
+    PostReactionNotification, FollowNotification, ConnectionRequestNotification, CommunityInviteNotification, \
+    PostUserMentionNotification
+from openbook_posts.models import Post, PostComment
 
 fake = Faker()
 
@@ -116,6 +124,138 @@ class NotificationsAPITests(OpenbookAPITestCase):
         return reverse('notifications')
 
 
+class NotificationsContentObjectsAPITests(OpenbookAPITestCase):
+    """
+    NotificationsAPI content objects loading
+    """
+
+    fixtures = [
+        'openbook_circles/fixtures/circles.json'
+    ]
+
+    def test_content_objects_queries_do_not_grow_with_the_amount_of_notifications(self):
+        """
+        should query the content objects of a mix of notification types a fixed amount of times
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        tables = (
+            PostCommentNotification._meta.db_table,
+            PostCommentReplyNotification._meta.db_table,
+            PostReactionNotification._meta.db_table,
+            FollowNotification._meta.db_table,
+            ConnectionRequestNotification._meta.db_table,
+            CommunityInviteNotification._meta.db_table,
+            PostUserMentionNotification._meta.db_table,
+            Post._meta.db_table,
+            PostComment._meta.db_table,
+            'openbook_auth_user',
+            'openbook_auth_userprofile',
+        )
+
+        tables_queries_counts = []
+
+        for i in range(2):
+            for j in range(2):
+                self._make_notifications_mix(user=user, emoji=emoji)
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(self._get_url(), {'count': 20}, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response_notifications = json.loads(response.content)
+            self.assertTrue(all(notification['content_object'] for notification in response_notifications))
+
+            tables_queries_counts.append(
+                [count_queries_for_table(context.captured_queries, table_name) for table_name in tables])
+
+        self.assertEqual(tables_queries_counts[0], tables_queries_counts[1])
+
+    def test_content_objects_are_serialized(self):
+        """
+        should serialize the content objects loaded for the notifications
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        commenter = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+        post_comment = commenter.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+
+        response = self.client.get(self._get_url(), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_notifications = json.loads(response.content)
+
+        self.assertEqual(len(response_notifications), 1)
+
+        response_post_comment = response_notifications[0]['content_object']['post_comment']
+
+        self.assertEqual(response_post_comment['id'], post_comment.pk)
+        self.assertEqual(response_post_comment['commenter']['id'], commenter.pk)
+        self.assertEqual(response_post_comment['post']['id'], post.pk)
+        self.assertFalse(response_post_comment['post']['is_encircled'])
+
+    def test_aggregated_notifications_are_serialized_with_their_latest_actors(self):
+        """
+        should serialize the aggregated count and the latest actors of an aggregated notification
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        post = user.create_public_post(text=make_fake_post_text())
+        commenters = [make_user() for i in range(0, 3)]
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS=60 * 60):
+            for commenter in commenters:
+                commenter.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+
+        response = self.client.get(self._get_url(), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_notifications = json.loads(response.content)
+
+        self.assertEqual(len(response_notifications), 1)
+
+        response_notification = response_notifications[0]
+
+        self.assertEqual(response_notification['aggregated_count'], 3)
+        self.assertEqual([latest_actor['id'] for latest_actor in response_notification['latest_actors']],
+                         [commenter.pk for commenter in reversed(commenters)])
+        self.assertEqual(response_notification['content_object']['post_comment']['commenter']['id'],
+                         commenters[-1].pk)
+
+    def _make_notifications_mix(self, user, emoji):
+        other_user = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+        other_user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+        other_user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+
+        other_post = other_user.create_public_post(text=make_fake_post_text())
+        post_comment = user.comment_post_with_id(post_id=other_post.pk, text=make_fake_post_comment_text())
+        other_user.reply_to_comment_for_post(post_comment=post_comment, post=other_post,
+                                             text=make_fake_post_comment_text())
+
+        other_user.follow_user_with_id(user_id=user.pk)
+        other_user.connect_with_user_with_id(user_id=user.pk)
+
+        invited_community = make_community(creator=other_user)
+        other_user.invite_user_with_username_to_community_with_name(username=user.username,
+                                                                    community_name=invited_community.name)
+
+        other_user.create_public_post(text='Hello @%s' % user.username)
+
+    def _get_url(self):
+        return reverse('notifications')
+
+
 class ReadNotificationsAPITests(OpenbookAPITestCase):
     """
     ReadNotificationsAPI
@@ -417,6 +557,83 @@ class UnreadNotificationsCountAPITests(OpenbookAPITestCase):
 
         self.assertEqual(parsed_response['count'], len(valid_ids))
 
+    def test_should_not_query_notifications_once_counted(self):
+        """
+        should count the unread notifications without querying them once they have been counted
+        """
+        user = make_user()
+
+        for i in range(0, 3):
+            make_notification(owner=user)
+
+        url = self._get_url()
+        headers = make_authentication_headers_for_user(user)
+        self.client.get(url, {}, **headers)
+
+        make_notification(owner=user)
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            response = self.client.get(url, {}, **headers)
+
+        self.assertEqual(count_queries_for_table(captured_queries, Notification._meta.db_table), 0)
+
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(parsed_response['count'], 4)
+
+    def test_should_count_read_and_deleted_notifications_out(self):
+        """
+        should no longer count the notifications read or deleted once counted
+        """
+        user = make_user()
+
+        notifications = [make_notification(owner=user) for i in range(0, 4)]
+
+        url = self._get_url()
+        headers = make_authentication_headers_for_user(user)
+        self.client.get(url, {}, **headers)
+
+        user.read_notification_with_id(notification_id=notifications[0].pk)
+        # Reading it twice doesn't count it out twice
+        user.read_notification_with_id(notification_id=notifications[0].pk)
+        user.delete_notification_with_id(notification_id=notifications[1].pk)
+
+        response = self.client.get(url, {}, **headers)
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(parsed_response['count'], 2)
+
+        user.read_notifications()
+
+        response = self.client.get(url, {}, **headers)
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(parsed_response['count'], 0)
+
+    def test_should_be_able_to_get_unread_notifications_count_breakdown(self):
+        """
+        should be able to get the unread notifications counts per type and return 200
+        """
+        user = make_user()
+
+        make_notification(owner=user, notification_type=Notification.POST_REACTION)
+        make_notification(owner=user, notification_type=Notification.POST_REACTION)
+        make_notification(owner=user, notification_type=Notification.FOLLOW)
+
+        url = self._get_url()
+        headers = make_authentication_headers_for_user(user)
+        response = self.client.get(url, {'breakdown': True}, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(parsed_response['count'], 3)
+        self.assertEqual(parsed_response['breakdown'], {
+            Notification.POST_REACTION: 2,
+            Notification.FOLLOW: 1,
+        })
+
     def test_should_not_be_able_to_get_unread_notifications_count_with_bad_type(self):
         """
         should return 400 if an invalid notification type is specified
@@ -0,0 +1,273 @@
+"""
+Unread notifications counts.
+
+The unread notifications of every user are counted per notification type in a redis hash, so polling the unread
+count doesn't query the database. The counts are adjusted as notifications are created, read and deleted, but only
+while the hash exists. A missing hash is rebuilt from the database on the next read, and expires
+settings.UNREAD_NOTIFICATIONS_COUNTS_EXPIRATION_SECONDS after being built so any drift, e.g. from a rolled back
+transaction, doesn't last.
+"""
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db.models import Count
+from redis.exceptions import RedisError
+
+from openbook_common.utils.backends import get_backend, RedisBackend, LocalBackend
+from openbook_common.utils.model_loaders import get_notification_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+UNREAD_NOTIFICATIONS_COUNTS_KEY = 'ob-api-unread-notifications-counts-%(user_id)d'
+
+# Redis drops hashes without fields, the field marks the counts of a user without unread notifications as built
+UNREAD_NOTIFICATIONS_COUNTS_BUILT_FIELD = 'built'
+
+UPDATE_UNREAD_NOTIFICATIONS_COUNT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if count < 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], 0)
+end
+return 1
+"""
+
+RESET_UNREAD_NOTIFICATIONS_COUNTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for _, notification_type in ipairs(ARGV) do
+    redis.call('HDEL', KEYS[1], notification_type)
+end
+return 1
+"""
+
+
+def count_unread_notifications_for_user_with_id(user_id, types=None):
+    counts = get_unread_notifications_counts_for_user_with_id(user_id=user_id)
+
+    if types:
+        return sum(counts.get(notification_type, 0) for notification_type in types)
+
+    return sum(counts.values())
+
+
+def get_unread_notifications_counts_for_user_with_id(user_id):
+    """
+    Returns the amount of unread notifications of the user per notification type, types without unread
+    notifications are left out
+    """
+    unread_notifications_counts = get_unread_notifications_counts()
+
+    try:
+        counts = unread_notifications_counts.get_counts(user_id=user_id)
+    except RedisError as e:
+        logger.warning('Failed to get the unread notifications counts of user %d: %s' % (user_id, e))
+        return _count_unread_notifications(user_id=user_id)
+
+    if counts is None:
+        counts = _count_unread_notifications(user_id=user_id)
+
+        try:
+            unread_notifications_counts.set_counts(user_id=user_id, counts=counts)
+        except RedisError as e:
+            logger.warning('Failed to build the unread notifications counts of user %d: %s' % (user_id, e))
+
+    return counts
+
+
+def add_unread_notifications(owners_ids_types):
+    """
+    Counts the created unread notifications, given as (owner id, notification type) pairs
+    """
+    _update_unread_notifications_counts([(owner_id, notification_type, 1) for owner_id, notification_type in
+                                         owners_ids_types])
+
+
+def remove_unread_notifications(owners_ids_types):
+    """
+    Uncounts the read or deleted unread notifications, given as (owner id, notification type) pairs
+    """
+    _update_unread_notifications_counts([(owner_id, notification_type, -1) for owner_id, notification_type in
+                                         owners_ids_types])
+
+
+def reset_unread_notifications_counts_for_user_with_id(user_id, types=None):
+    """
+    Zeroes the counts of the given types, or of every type, once all the notifications of the user were read
+    """
+    try:
+        get_unread_notifications_counts().reset_counts(user_id=user_id, types=types)
+    except RedisError as e:
+        logger.warning('Failed to reset the unread notifications counts of user %d: %s' % (user_id, e))
+
+
+def invalidate_unread_notifications_counts_for_user_with_id(user_id):
+    """
+    Drops the counts of the user, to be rebuilt from the database on the next read
+    """
+    try:
+        get_unread_notifications_counts().invalidate(user_id=user_id)
+    except RedisError as e:
+        logger.warning('Failed to invalidate the unread notifications counts of user %d: %s' % (user_id, e))
+
+
+def get_unread_notifications_counts():
+    return get_backend('UNREAD_NOTIFICATIONS_COUNTS_BACKEND',
+                       expiration_seconds=settings.UNREAD_NOTIFICATIONS_COUNTS_EXPIRATION_SECONDS)
+
+
+def _update_unread_notifications_counts(updates):
+    if not updates:
+        return
+
+    try:
+        get_unread_notifications_counts().update_counts(updates=updates)
+    except RedisError as e:
+        logger.warning('Failed to update the unread notifications counts of users %s: %s' % (
+            sorted({user_id for user_id, notification_type, delta in updates}), e))
+
+
+def _count_unread_notifications(user_id):
+    Notification = get_notification_model()
+
+    counts = Notification.objects.filter(owner_id=user_id, read=False).values('notification_type').annotate(
+        count=Count('id')).values_list('notification_type', 'count')
+
+    return dict(counts)
+
+
+class BaseUnreadNotificationsCounts(ABC):
+
+    def __init__(self, expiration_seconds):
+        self.expiration_seconds = expiration_seconds
+
+    @abstractmethod
+    def get_counts(self, user_id):
+        """
+        Returns the counts of the user per notification type, None if they have not been built
+        """
+        pass
+
+    @abstractmethod
+    def set_counts(self, user_id, counts):
+        pass
+
+    @abstractmethod
+    def update_counts(self, updates):
+        """
+        Adds the deltas of the (user id, notification type, delta) updates to the built counts, counts never go
+        below 0
+        """
+        pass
+
+    @abstractmethod
+    def reset_counts(self, user_id, types=None):
+        pass
+
+    @abstractmethod
+    def invalidate(self, user_id):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class RedisUnreadNotificationsCounts(BaseUnreadNotificationsCounts, RedisBackend):
+
+    def get_counts(self, user_id):
+        counts = self._get_redis().hgetall(self._make_key(user_id))
+
+        if not counts:
+            return None
+
+        counts.pop(UNREAD_NOTIFICATIONS_COUNTS_BUILT_FIELD.encode(), None)
+
+        return {notification_type.decode(): int(count) for notification_type, count in counts.items() if
+                int(count) > 0}
+
+    def set_counts(self, user_id, counts):
+        key = self._make_key(user_id)
+
+        pipeline = self._get_redis().pipeline(transaction=True)
+        pipeline.delete(key)
+        pipeline.hset(key, mapping={UNREAD_NOTIFICATIONS_COUNTS_BUILT_FIELD: 1, **counts})
+        pipeline.expire(key, self.expiration_seconds)
+        pipeline.execute()
+
+    def update_counts(self, updates):
+        redis = self._get_redis()
+        update_unread_notifications_count_script = redis.register_script(UPDATE_UNREAD_NOTIFICATIONS_COUNT_SCRIPT)
+
+        pipeline = redis.pipeline(transaction=False)
+        for user_id, notification_type, delta in updates:
+            update_unread_notifications_count_script(keys=[self._make_key(user_id)], args=[notification_type, delta],
+                                                     client=pipeline)
+        pipeline.execute()
+
+    def reset_counts(self, user_id, types=None):
+        if types is None:
+            Notification = get_notification_model()
+            types = Notification.get_notification_types_values()
+
+        redis = self._get_redis()
+        reset_unread_notifications_counts_script = redis.register_script(RESET_UNREAD_NOTIFICATIONS_COUNTS_SCRIPT)
+        reset_unread_notifications_counts_script(keys=[self._make_key(user_id)], args=types)
+
+    def invalidate(self, user_id):
+        self._get_redis().delete(self._make_key(user_id))
+
+    def clear(self):
+        self._delete_keys_matching(UNREAD_NOTIFICATIONS_COUNTS_KEY.replace('%(user_id)d', '*'))
+
+    def _make_key(self, user_id):
+        return UNREAD_NOTIFICATIONS_COUNTS_KEY % {'user_id': user_id}
+
+
+class LocalUnreadNotificationsCounts(BaseUnreadNotificationsCounts, LocalBackend):
+    """
+    The counts are never expired, so a drift in the tests shows rather than being rebuilt away.
+    """
+    _counts = {}
+
+    def get_counts(self, user_id):
+        with self._lock:
+            counts = self._counts.get(user_id)
+            if counts is None:
+                return None
+            return {notification_type: count for notification_type, count in counts.items() if count > 0}
+
+    def set_counts(self, user_id, counts):
+        with self._lock:
+            self._counts[user_id] = dict(counts)
+
+    def update_counts(self, updates):
+        with self._lock:
+            for user_id, notification_type, delta in updates:
+                counts = self._counts.get(user_id)
+                if counts is not None:
+                    counts[notification_type] = max(counts.get(notification_type, 0) + delta, 0)
+
+    def reset_counts(self, user_id, types=None):
+        with self._lock:
+            counts = self._counts.get(user_id)
+            if counts is None:
+                return
+            if types is None:
+                counts.clear()
+            else:
+                for notification_type in types:
+                    counts.pop(notification_type, None)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._counts.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
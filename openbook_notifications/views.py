@@ -1,11 +1,13 @@
 # Create your views here.
 from django.db import transaction
+from django.db.models import Count
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from openbook_common.utils.helpers import normalize_list_value_in_request_data
+from openbook_notifications.loaders import load_notifications_content_objects
 from openbook_moderation.permissions import IsNotSuspended
 from openbook_notifications.serializers import GetNotificationsSerializer, GetNotificationsNotificationSerializer, \
     DeleteNotificationSerializer, ReadNotificationSerializer, ReadNotificationsSerializer, \
@@ -31,6 +33,7 @@ class Notifications(APIView):
         types = data.get('types')
 
         notifications = user.get_notifications(max_id=max_id, types=types).order_by('-created')[:count]
+        notifications = load_notifications_content_objects(notifications)
 
         response_serializer = GetNotificationsNotificationSerializer(notifications, many=True,
                                                                      context={"request": request})
@@ -86,10 +89,26 @@ class UnreadNotificationsCount(APIView):
 
         max_id = data.get('max_id')
         types = data.get('types')
+        breakdown = data.get('breakdown')
 
-        notifications = user.get_unread_notifications(max_id=max_id, types=types)
+        if max_id:
+            # The unread notifications counts don't go back in time
+            notifications = user.get_unread_notifications(max_id=max_id, types=types)
+            counts = dict(notifications.values('notification_type').annotate(count=Count('id')).values_list(
+                'notification_type', 'count'))
+        else:
+            counts = user.get_unread_notifications_counts()
 
-        return Response({'count': notifications.count()}, status=status.HTTP_200_OK)
+            if types:
+                counts = {notification_type: count for notification_type, count in counts.items() if
+                          notification_type in types}
+
+        response_data = {'count': sum(counts.values())}
+
+        if breakdown:
+            response_data['breakdown'] = counts
+
+        return Response(response_data, status=status.HTTP_200_OK)
 
 
 class NotificationItem(APIView):
@@ -11,11 +11,23 @@ def upload_to_post_image_directory(post_image, filename):
     return _upload_to_post_directory_directory(post=post, filename=filename)
 
 
+def upload_to_post_image_variant_directory(post_image_variant, filename):
+    post_image = post_image_variant.post_image
+    # The post that stored the image might be deleted while others still reference it
+    post = post_image.post or post_image.media.select_related('post').first().post
+    return _upload_to_post_directory_directory(post=post, filename=filename)
+
+
 def upload_to_post_video_directory(post_video, filename):
     post = post_video.post
     return _upload_to_post_directory_directory(post=post, filename=filename)
 
 
+def upload_to_post_media_upload_directory(post_media_upload, filename):
+    post = post_media_upload.post
+    return _upload_to_post_directory_directory(post=post, filename=filename)
+
+
 def _upload_to_post_directory_directory(post, filename):
     extension = splitext(filename)[1].lower()
     new_filename = str(uuid.uuid4()) + extension
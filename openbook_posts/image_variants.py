@@ -0,0 +1,74 @@
+"""
+Post images variants.
+
+Every post media image is stored in the sizes of settings.POST_IMAGE_VARIANTS_WIDTHS, in each of the formats of
+settings.POST_IMAGE_VARIANTS_FORMATS, alongside the image itself. The variants are made once, when the image is
+stored, so the clients can pick the smallest one fitting their viewport and format support.
+
+The variants are resized from the stored image and never upscaled, an image narrower than a width gets no variant of
+that width, but every image gets a variant in every format of at most the smallest width.
+"""
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from pilkit.processors import ResizeToFit
+
+from openbook_common.utils.model_loaders import get_post_image_variant_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_post_image_variants_widths_for_width(width):
+    """
+    Returns the widths of the variants of an image of the given width
+    """
+    widths = sorted(settings.POST_IMAGE_VARIANTS_WIDTHS)
+    variants_widths = [variant_width for variant_width in widths if variant_width <= width]
+
+    if not variants_widths:
+        variants_widths = [width]
+
+    return variants_widths
+
+
+def create_post_image_variants(post_image):
+    """
+    Creates the variants of the post image it doesn't have yet, returns the amount created
+    """
+    PostImageVariant = get_post_image_variant_model()
+
+    existing_variants = set(post_image.variants.values_list('format', 'requested_width'))
+
+    missing_variants = [(variant_format, variant_width) for variant_width in
+                        get_post_image_variants_widths_for_width(width=post_image.width) for variant_format in
+                        settings.POST_IMAGE_VARIANTS_FORMATS if (variant_format, variant_width) not in existing_variants]
+
+    if not missing_variants:
+        return 0
+
+    post_image.image.open('rb')
+
+    try:
+        image = Image.open(post_image.image)
+        image.load()
+    finally:
+        post_image.image.close()
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    for variant_format, variant_width in missing_variants:
+        variant_image = ResizeToFit(width=variant_width, upscale=False).process(image)
+
+        variant_file = BytesIO()
+        variant_image.save(variant_file, format=variant_format, quality=settings.POST_IMAGE_VARIANTS_QUALITY)
+
+        PostImageVariant.create_post_image_variant(
+            post_image=post_image, format=variant_format, requested_width=variant_width,
+            image=ContentFile(variant_file.getvalue(), name='variant.%s' % variant_format.lower()))
+
+    return len(missing_variants)
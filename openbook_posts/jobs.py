@@ -1,13 +1,25 @@
+import time
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
-from django_rq import job
+from django_rq import job, get_scheduler
 from video_encoding import tasks
-from datetime import timedelta
-from django.db.models import Q, Count
+from video_encoding.media_info import get_media_subprocesses_stats
+from video_encoding.models import Format
+from django.db import transaction
+from django.db.models import Q
 from django.conf import settings
 from cursor_pagination import CursorPaginator
+from rest_framework.exceptions import ValidationError
 
 from openbook_common.utils.model_loaders import get_post_model, get_post_media_model, get_community_model, \
-    get_top_post_model, get_post_comment_model, get_moderated_object_model, get_trending_post_model
+    get_top_post_model, get_moderated_object_model, get_trending_post_model, get_user_model, \
+    get_community_new_post_notification_model, get_user_new_post_notification_model, get_notification_model, \
+    get_post_media_upload_model, get_post_video_model
+from openbook_notifications.helpers import send_community_new_post_push_notifications, \
+    send_user_new_post_push_notifications
+from openbook_posts import timelines, top_posts, trending, media_ingestion, video_renditions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,33 +47,220 @@ def flush_draft_posts():
 @job('high')
 def process_post_media(post_id):
     """
-    This job is called to process post media and mark it as published
+    This job is called to process post media and mark it as published.
+    While the media uploads of the post are being ingested it does nothing, the last one ingested calls it again.
+    The renditions of the videos are encoded in their own jobs, the last one encoded publishes the post.
     """
     Post = get_post_model()
     PostMedia = get_post_media_model()
+
+    if not _is_post_media_ready_to_process(post_id=post_id):
+        return
+
     post = Post.objects.get(pk=post_id)
     logger.info('Processing media of post with id: %d' % post_id)
 
     post_media_videos = post.media.filter(type=PostMedia.MEDIA_TYPE_VIDEO)
 
+    renditions = []
+
+    # The formats of every rendition are created before any is encoded, so the post is only published once all of
+    # them are
     for post_media_video in post_media_videos.iterator():
         post_video = post_media_video.content_object
-        tasks.convert_video(post_video.file)
 
-    # This updates the status and created attributes
-    post._publish()
+        for options in video_renditions.get_renditions_formats_for_post_video(post_video=post_video):
+            video_format, created = tasks.get_or_create_video_format(fieldfile=post_video.file, options=options)
+
+            if video_format.progress >= 100:
+                continue
+
+            # The incomplete ones claimed by another job, e.g. enqueued for another post with the same video, are left
+            # to it. Only the ones whose job died are enqueued again.
+            claim = video_renditions.claim_video_rendition(format_id=video_format.pk)
+
+            if claim is not None:
+                renditions.append((post_video.pk, options['name'], claim))
+
+    enqueued_at = time.time()
+
+    for post_video_id, format_name, claim in renditions:
+        encode_post_video_rendition.delay(post_video_id=post_video_id, format_name=format_name,
+                                          enqueued_at=enqueued_at, claim=claim)
+
+    if renditions:
+        logger.info('Enqueued %d renditions of post with id: %d' % (len(renditions), post_id))
+    else:
+        _publish_post_with_processed_media(post_id=post_id)
+
+
+@job('high')
+def encode_post_video_rendition(post_video_id, format_name, enqueued_at, claim=None):
+    """
+    This job is called to encode a rendition of a post video, see openbook_posts.video_renditions.
+    Publishes the post once all of its renditions are encoded.
+    """
+    PostVideo = get_post_video_model()
+
+    try:
+        post_video = PostVideo.objects.get(pk=post_video_id)
+    except PostVideo.DoesNotExist:
+        logger.info('Post video with id %d no longer exists, its post was deleted' % post_video_id)
+        return
+
+    format_id = post_video.format_set.filter(format=format_name).values_list('id', flat=True).first()
+
+    if format_id is None:
+        logger.info('The %s rendition of post video with id %d no longer exists' % (format_name, post_video_id))
+        return
+
+    if not video_renditions.refresh_video_rendition_claim(format_id=format_id, claim=claim):
+        # The claim expired and the rendition was enqueued again, the other job encodes it and publishes the posts
+        logger.warning('The %s rendition of post video with id %d was claimed by another job' % (
+            format_name, post_video_id))
+        return
+
+    slot = video_renditions.acquire_video_encoding_slot()
+
+    if slot is None:
+        # Every slot is taken, the time spent waiting for one counts as queue wait
+        get_scheduler('high').enqueue_in(timedelta(seconds=settings.VIDEO_ENCODING_RETRY_SECONDS),
+                                         encode_post_video_rendition, post_video_id=post_video_id,
+                                         format_name=format_name, enqueued_at=enqueued_at, claim=claim)
+        return
+
+    started_at = time.time()
+
+    try:
+        options = video_renditions.get_video_encoding_format_with_name(name=format_name)
+        video_format = tasks.convert_video_to_format(fieldfile=post_video.file, options=options)
+    except Exception:
+        # The post is published without the rendition rather than left processing
+        logger.exception('Failed to encode the %s rendition of post video with id %d' % (format_name, post_video_id))
+        post_video.format_set.filter(format=format_name).delete()
+    else:
+        if video_format is None:
+            logger.warning('Failed to encode the %s rendition of post video with id %d' % (format_name, post_video_id))
+        else:
+            subprocesses_count, subprocesses_seconds = get_media_subprocesses_stats(post_video.hash)
+            logger.info('Encoded the %s rendition of post video with id %d in %.2fs, after %.2fs in the queue, '
+                        'the video ran %d subprocesses in %.2fs so far' % (
+                            format_name, post_video_id, time.time() - started_at, started_at - enqueued_at,
+                            subprocesses_count, subprocesses_seconds))
+    finally:
+        video_renditions.release_video_encoding_slot(slot)
+        video_renditions.release_video_rendition_claim(format_id=format_id, claim=claim)
+
+    # The posts with the same video reference it rather than encode it again
+    for post_id in post_video.media.values_list('post_id', flat=True).distinct():
+        _publish_post_with_processed_media(post_id=post_id)
+
+
+def _publish_post_with_processed_media(post_id):
+    """
+    Publishes the post if it's still processing and none of the renditions of its videos are still being encoded
+    """
+    Post = get_post_model()
+    PostMedia = get_post_media_model()
+    PostVideo = get_post_video_model()
+
+    with transaction.atomic():
+        post = Post.objects.select_for_update().filter(pk=post_id).first()
+
+        # Another run might have published it meanwhile
+        if post is None or post.status != Post.STATUS_PROCESSING:
+            return
+
+        has_pending_renditions = Format.objects.filter(
+            content_type=ContentType.objects.get_for_model(PostVideo),
+            object_id__in=PostMedia.objects.filter(post_id=post_id, type=PostMedia.MEDIA_TYPE_VIDEO).values(
+                'object_id'),
+            progress__lt=100).exists()
+
+        if has_pending_renditions:
+            return
+
+        # This updates the status and created attributes
+        post._publish()
+
     logger.info('Processed media of post with id: %d' % post_id)
 
 
+@job('high')
+def ingest_post_media_upload(post_media_upload_id):
+    """
+    This job is called to ingest a media upload into a post media, see openbook_posts.media_ingestion.
+    Processes the media of the post if it was published meanwhile.
+    """
+    PostMediaUpload = get_post_media_upload_model()
+
+    # Another run might be ingesting it, the ones whose worker died are claimed again once stalled
+    if not PostMediaUpload.claim_post_media_upload_with_id(post_media_upload_id=post_media_upload_id):
+        logger.info('Media upload with id %d no longer exists or was already ingested' % post_media_upload_id)
+        return
+
+    post_media_upload = PostMediaUpload.objects.select_related('post').get(pk=post_media_upload_id)
+
+    try:
+        media_ingestion.ingest_post_media_upload(post_media_upload=post_media_upload)
+    except ValidationError as e:
+        logger.info('Media upload with id %d was rejected: %s' % (post_media_upload_id, e))
+    except Exception as e:
+        # Marked as failed already, the post is processed without it rather than left processing
+        logger.info('Media upload with id %d failed: %s' % (post_media_upload_id, e))
+
+    post_id = post_media_upload.post_id
+
+    if _is_post_media_ready_to_process(post_id=post_id):
+        process_post_media.delay(post_id=post_id)
+
+
+@job('low')
+def retry_stalled_post_media_uploads():
+    """
+    Ingests again the media uploads whose ingestion stalled, as their worker died.
+    This job should be scheduled to be run every n minutes.
+    """
+    PostMediaUpload = get_post_media_upload_model()
+
+    stalled_uploads_ids = list(PostMediaUpload.get_stalled_post_media_uploads().values_list('id', flat=True))
+
+    for post_media_upload_id in stalled_uploads_ids:
+        ingest_post_media_upload.delay(post_media_upload_id=post_media_upload_id)
+
+    return 'Retried: %d media uploads' % len(stalled_uploads_ids)
+
+
+def _is_post_media_ready_to_process(post_id):
+    """
+    Returns whether the post is waiting on its media to be published and none of its uploads are still being ingested
+    """
+    Post = get_post_model()
+
+    # Locks the post so a publish in progress is seen once committed
+    with transaction.atomic():
+        post = Post.objects.select_for_update().filter(pk=post_id).first()
+
+        if post is None or post.status != Post.STATUS_PROCESSING:
+            return False
+
+        if post.has_pending_media_uploads():
+            logger.info('Waiting on the media uploads of post with id: %d' % post_id)
+            return False
+
+    return True
+
+
 @job('low')
-def curate_top_posts():
+def curate_top_posts(full=False):
     """
     Curates the top posts.
     This job should be scheduled to be run every n hours.
+    Only the posts whose comments, reactions or visibility changed since the last run are evaluated,
+    unless full is given.
     """
     Post = get_post_model()
     Community = get_community_model()
-    PostComment = get_post_comment_model()
     ModeratedObject = get_moderated_object_model()
     TopPost = get_top_post_model()
     logger.info('Processing top posts at %s...' % timezone.now())
@@ -71,63 +270,44 @@ def curate_top_posts():
     top_posts_community_query.add(Q(is_closed=False, is_deleted=False, status=Post.STATUS_PUBLISHED), Q.AND)
     top_posts_community_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
 
-    top_posts_criteria_query = Q(total_comments_count__gte=settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT) | \
+    top_posts_criteria_query = Q(commenters_count__gte=settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT) | \
                                Q(reactions_count__gte=settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT)
 
-    posts_select_related = 'community'
-    posts_prefetch_related = ('comments__commenter', 'reactions__reactor')
-    posts_only = ('id', 'status', 'is_deleted', 'is_closed', 'community__type')
-
     posts = Post.objects. \
-        select_related(posts_select_related). \
-        prefetch_related(*posts_prefetch_related). \
-        only(*posts_only). \
         filter(top_posts_community_query). \
-        annotate(total_comments_count=Count('comments__commenter_id'),
-                 reactions_count=Count('reactions__reactor_id')). \
         filter(top_posts_criteria_query)
 
-    top_posts_objects = []
+    full_posts_ids = posts.values_list('id', flat=True) if full else None
+
     total_checked_posts = 0
     total_curated_posts = 0
 
-    for post in _chunked_queryset_iterator(posts, 1000):
-        total_checked_posts = total_checked_posts + 1
-        if not post.reactions_count >= settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT:
-            unique_comments_count = PostComment.objects.filter(post=post). \
-                values('commenter_id'). \
-                annotate(user_comments_count=Count('commenter_id')).count()
-
-            if unique_comments_count >= settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT:
-                top_post = _add_post_to_top_post(post=post)
-                if top_post is not None:
-                    top_posts_objects.append(top_post)
-        else:
-            top_post = _add_post_to_top_post(post=post)
-            if top_post is not None:
-                top_posts_objects.append(top_post)
+    for posts_ids in _chunked_top_posts_candidates_iterator(consumer=top_posts.CURATE_TOP_POSTS_CONSUMER,
+                                                            full_posts_ids=full_posts_ids, size=1000):
+        curated_posts_ids = list(posts.filter(id__in=posts_ids).values_list('id', flat=True))
+        created = timezone.now()
 
-        if len(top_posts_objects) > 1000:
-            TopPost.objects.bulk_create(top_posts_objects)
-            total_curated_posts += len(top_posts_objects)
-            top_posts_objects = []
+        top_posts_objects = [TopPost(post_id=post_id, created=created) for post_id in curated_posts_ids]
+        # The post could have been curated by a concurrent run, its top post is skipped then
+        TopPost.objects.bulk_create(top_posts_objects, ignore_conflicts=True)
 
-    if len(top_posts_objects) > 0:
-        total_curated_posts += len(top_posts_objects)
-        TopPost.objects.bulk_create(top_posts_objects)
+        total_checked_posts += len(posts_ids)
+        # The ignored conflicts are not reported, the top posts created by this run are the ones created at its time
+        total_curated_posts += TopPost.objects.filter(post_id__in=curated_posts_ids, created=created).count()
 
     return 'Checked: %d. Curated: %d' % (total_checked_posts, total_curated_posts)
 
 
 @job('low')
-def clean_top_posts():
+def clean_top_posts(full=False):
     """
     Cleans up top posts, that no longer meet the criteria.
+    Only the posts whose comments, reactions or visibility changed since the last run are evaluated,
+    unless full is given.
     """
     Post = get_post_model()
     Community = get_community_model()
     TopPost = get_top_post_model()
-    PostComment = get_post_comment_model()
     ModeratedObject = get_moderated_object_model()
 
     # if any of these is true, we will remove the top post
@@ -139,69 +319,62 @@ def clean_top_posts():
     top_posts_community_query.add(Q(post__moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.OR)
 
     # counts less than minimum
-    top_posts_criteria_query = Q(total_comments_count__lt=settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT) & \
-                               Q(reactions_count__lt=settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT)
+    top_posts_criteria_query = Q(post__commenters_count__lt=settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT) & \
+                               Q(post__reactions_count__lt=settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT)
 
-    posts_select_related = 'post__community'
-    posts_prefetch_related = ('post__comments__commenter', 'post__reactions__reactor')
-    posts_only = ('post__id', 'post__status', 'post__is_deleted', 'post__is_closed', 'post__community__type')
+    # the ones where the unique comments or reactions count might have dropped, while all other criteria is fine
+    top_posts_dropped_query = Q(post__community__isnull=False, post__community__type=Community.COMMUNITY_TYPE_PUBLIC)
+    top_posts_dropped_query.add(Q(post__is_closed=False, post__is_deleted=False, post__status=Post.STATUS_PUBLISHED),
+                                Q.AND)
+    top_posts_dropped_query.add(~Q(post__moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
 
-    direct_removable_top_posts = TopPost.objects.select_related(posts_select_related). \
-        prefetch_related(*posts_prefetch_related). \
-        only(*posts_only). \
-        filter(top_posts_community_query). \
-        annotate(total_comments_count=Count('post__comments__commenter_id'),
-                 reactions_count=Count('post__reactions__reactor_id')). \
-        filter(top_posts_criteria_query)
+    full_posts_ids = TopPost.objects.values_list('post_id', flat=True) if full else None
 
-    # bulk delete all that definitely dont meet the criteria anymore
-    direct_removable_top_posts.delete()
+    total_checked_posts = 0
+    total_cleaned_posts = 0
 
-    # Now we need to only check the ones where the unique comments count might have dropped,
-    # while all other criteria is fine
+    for posts_ids in _chunked_top_posts_candidates_iterator(consumer=top_posts.CLEAN_TOP_POSTS_CONSUMER,
+                                                            full_posts_ids=full_posts_ids, size=1000):
+        candidates_top_posts = TopPost.objects.filter(post_id__in=posts_ids)
 
-    top_posts_community_query = Q(post__community__isnull=False, post__community__type=Community.COMMUNITY_TYPE_PUBLIC)
-    top_posts_community_query.add(Q(post__is_closed=False, post__is_deleted=False, post__status=Post.STATUS_PUBLISHED),
-                                  Q.AND)
-    top_posts_community_query.add(~Q(post__moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
+        # bulk delete all that definitely dont meet the criteria anymore
+        direct_removable_top_posts = candidates_top_posts. \
+            filter(top_posts_community_query). \
+            filter(top_posts_criteria_query)
 
-    top_posts_criteria_query = Q(total_comments_count__gte=settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT) | \
-                               Q(reactions_count__gte=settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT)
+        total_cleaned_posts += direct_removable_top_posts.delete()[0]
 
-    top_posts = TopPost.objects.select_related(posts_select_related). \
-        prefetch_related(*posts_prefetch_related). \
-        only(*posts_only). \
-        filter(top_posts_community_query). \
-        annotate(total_comments_count=Count('post__comments__commenter_id'),
-                 reactions_count=Count('post__reactions__reactor_id')). \
-        filter(top_posts_criteria_query)
+        removable_top_posts = candidates_top_posts. \
+            filter(top_posts_dropped_query). \
+            filter(top_posts_criteria_query)
 
-    delete_ids = []
+        total_cleaned_posts += removable_top_posts.delete()[0]
 
-    for top_post in _chunked_queryset_iterator(top_posts, 1000):
-        if not top_post.reactions_count >= settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT:
-            unique_comments_count = PostComment.objects.filter(post=top_post.post). \
-                values('commenter_id'). \
-                annotate(user_comments_count=Count('commenter_id')).count()
+        total_checked_posts += len(posts_ids)
 
-            if unique_comments_count < settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT:
-                delete_ids.append(top_post.pk)
+    return 'Checked: %d. Cleaned: %d' % (total_checked_posts, total_cleaned_posts)
 
-    # bulk delete ids
-    TopPost.objects.filter(id__in=delete_ids).delete()
 
+def _chunked_top_posts_candidates_iterator(consumer, full_posts_ids=None, size=1000):
+    """
+    Yields lists of up to size ids of the top posts candidates of the consumer, or of full_posts_ids if given.
+    The candidates are committed once all of them have been yielded.
+    """
+    candidates_posts_ids, mark = top_posts.get_top_posts_candidates(consumer=consumer)
 
-def _add_post_to_top_post(post):
-    TopPost = get_top_post_model()
-    if not TopPost.objects.filter(post=post).exists():
-        return TopPost(post=post, created=timezone.now())
-    return None
+    if full_posts_ids is not None:
+        yield from _chunked_iterator(full_posts_ids, size)
+    else:
+        for index in range(0, len(candidates_posts_ids), size):
+            yield candidates_posts_ids[index:index + size]
+
+    top_posts.commit_top_posts_candidates(consumer=consumer, mark=mark)
 
 
 @job('low')
 def curate_trending_posts():
     """
-    Curates the trending posts.
+    Curates the trending posts from the top of the trending posts scores.
     This job should be scheduled to be run every n hours.
     """
     Post = get_post_model()
@@ -210,43 +383,46 @@ def curate_trending_posts():
     TrendingPost = get_trending_post_model()
     logger.info('Processing trending posts at %s...' % timezone.now())
 
-    trending_posts_query = Q(created__gte=timezone.now() - timedelta(
-        hours=12))
+    trending_posts_scores = trending.get_trending_posts_scores()
+    scored_posts_count = trending_posts_scores.compact(now=timezone.now().timestamp())
 
     trending_posts_community_query = Q(community__isnull=False, community__type=Community.COMMUNITY_TYPE_PUBLIC,
                                        status=Post.STATUS_PUBLISHED,
                                        is_closed=False, is_deleted=False)
     trending_posts_community_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
 
-    trending_posts_query.add(trending_posts_community_query, Q.AND)
+    curated_posts_ids = []
+    offset = 0
+    chunk_size = 100
 
-    posts_select_related = 'community'
-    posts_prefetch_related = 'reactions__reactor'
-    posts_only = ('id', 'status', 'is_deleted', 'is_closed', 'community__type')
+    while len(curated_posts_ids) < settings.TRENDING_POSTS_CURATED_COUNT:
+        scored_posts_ids = trending_posts_scores.get_posts_ids(offset=offset, count=chunk_size)
 
-    trending_posts_criteria_query = Q(reactions_count__gte=settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT)
+        if not scored_posts_ids:
+            break
 
-    posts = Post.objects. \
-        select_related(posts_select_related). \
-        prefetch_related(posts_prefetch_related). \
-        only(*posts_only). \
-        filter(trending_posts_query). \
-        annotate(reactions_count=Count('reactions__reactor_id')).\
-        filter(trending_posts_criteria_query).\
-        order_by('-reactions_count', '-created')[:30]
+        reactions_counts_by_post_id = dict(Post.objects.filter(trending_posts_community_query,
+                                                               id__in=scored_posts_ids).values_list('id',
+                                                                                                    'reactions_count'))
 
-    trending_posts_objects = []
+        # Posts no longer eligible only get back in with new engagement, posts short of reactions can still make it
+        ineligible_posts_ids = [post_id for post_id in scored_posts_ids if post_id not in reactions_counts_by_post_id]
+        trending_posts_scores.remove_posts(ineligible_posts_ids)
+        offset = offset + len(scored_posts_ids) - len(ineligible_posts_ids)
 
-    for post in posts.iterator():
-        if TrendingPost.objects.filter(post=post).exists():
-            TrendingPost.objects.filter(post=post).delete()
+        for post_id in scored_posts_ids:
+            reactions_count = reactions_counts_by_post_id.get(post_id)
+            if reactions_count is not None and reactions_count >= settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT:
+                curated_posts_ids.append(post_id)
 
-        trending_post = TrendingPost(post=post, created=timezone.now())
-        trending_posts_objects.insert(0, trending_post)
+    curated_posts_ids = curated_posts_ids[:settings.TRENDING_POSTS_CURATED_COUNT]
 
-    TrendingPost.objects.bulk_create(trending_posts_objects)
+    # Recreated from the lowest score up, the highest scores get the newest ids and are listed first
+    TrendingPost.objects.filter(post_id__in=curated_posts_ids).delete()
+    TrendingPost.objects.bulk_create([TrendingPost(post_id=post_id, created=timezone.now()) for post_id in
+                                      reversed(curated_posts_ids)])
 
-    return 'Curated: %d posts' % posts.count()
+    return 'Curated: %d posts out of %d scored posts' % (len(curated_posts_ids), scored_posts_count)
 
 
 @job('low')
@@ -268,17 +444,14 @@ def bootstrap_trending_posts():
     trending_posts_community_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
 
     posts_select_related = 'community'
-    posts_prefetch_related = 'reactions__reactor'
     posts_only = ('id', 'status', 'is_deleted', 'is_closed', 'community__type')
 
     trending_posts_criteria_query = Q(reactions_count__gte=settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT)
 
     posts = Post.objects. \
         select_related(posts_select_related). \
-        prefetch_related(posts_prefetch_related). \
         only(*posts_only). \
         filter(trending_posts_community_query). \
-        annotate(reactions_count=Count('reactions__reactor_id')). \
         filter(trending_posts_criteria_query). \
         order_by('-created')
 
@@ -335,18 +508,173 @@ def clean_trending_posts():
     TrendingPost.objects.filter(id__in=direct_removable_delete_ids).delete()
 
     # Now we filter trending posts that do not meet criteria anymore
-    trending_posts_criteria_query = Q(reactions_count__lt=settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT)
+    trending_posts_criteria_query = Q(post__reactions_count__lt=settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT)
 
     less_than_min_reactions_trending_posts = TrendingPost.objects.\
-        prefetch_related('post__reactions__reactor'). \
         only('id'). \
-        annotate(reactions_count=Count('post__reactions__reactor_id')). \
         filter(trending_posts_criteria_query)
 
     delete_ids = [trending_post.pk for trending_post in less_than_min_reactions_trending_posts]
     TrendingPost.objects.filter(id__in=delete_ids).delete()
 
 
+@job('default')
+def fan_out_post_to_timelines(post_id):
+    """
+    Adds a freshly published post to the materialized timelines of the users that can see it.
+    """
+    Post = get_post_model()
+
+    try:
+        post = Post.objects.only('id', 'creator_id', 'community_id', 'status', 'is_deleted').get(pk=post_id)
+    except Post.DoesNotExist:
+        return 'Post with id %d no longer exists' % post_id
+
+    if post.status != Post.STATUS_PUBLISHED or post.is_deleted:
+        return 'Post with id %d is not published' % post_id
+
+    total_fanned_out = 0
+
+    for users_ids in _chunked_iterator(post.get_timeline_target_users_ids(), 1000):
+        timelines.add_post_to_timelines(post_id=post_id, users_ids=users_ids)
+        total_fanned_out += len(users_ids)
+
+    return 'Fanned out to: %d timelines' % total_fanned_out
+
+
+@job('default')
+def fan_out_post_to_subscribers(post_id, chunk_size=1000):
+    """
+    Notifies the subscribers of the community or the creator of a freshly published post, chunk_size subscriptions
+    at a time. The subscribers already notified of the post are skipped, so it is safe to retry.
+    """
+    Post = get_post_model()
+
+    try:
+        post = Post.objects.select_related('creator__profile', 'community').get(pk=post_id)
+    except Post.DoesNotExist:
+        return 'Post with id %d no longer exists' % post_id
+
+    if post.status != Post.STATUS_PUBLISHED or post.is_deleted:
+        return 'Post with id %d is not published' % post_id
+
+    if post.community_id:
+        NewPostNotification = get_community_new_post_notification_model()
+        target_subscriptions = Post.get_community_notification_target_subscriptions(post=post)
+
+        def notify_subscriptions(subscriptions):
+            with transaction.atomic():
+                new_subscriptions = NewPostNotification.create_community_new_post_notifications(
+                    post_id=post_id, community_notifications_subscriptions=subscriptions)
+
+            send_community_new_post_push_notifications(
+                community=post.community, target_users=[subscription.subscriber for subscription in new_subscriptions])
+
+            return len(new_subscriptions)
+    else:
+        NewPostNotification = get_user_new_post_notification_model()
+        target_subscriptions = Post.get_user_notification_target_subscriptions(post=post)
+
+        def notify_subscriptions(subscriptions):
+            with transaction.atomic():
+                new_subscriptions = NewPostNotification.create_user_new_post_notifications(
+                    post_id=post_id, user_notifications_subscriptions=subscriptions)
+
+            send_user_new_post_push_notifications(
+                post_creator=post.creator, target_users=[subscription.subscriber for subscription in new_subscriptions])
+
+            return len(new_subscriptions)
+
+    # The notifications settings of the subscribers are read from their cached notifications preferences
+    target_subscriptions = target_subscriptions.select_related('subscriber__language')
+
+    total_notified = 0
+    last_subscription_id = 0
+
+    while True:
+        subscriptions = list(target_subscriptions.filter(pk__gt=last_subscription_id).order_by('pk')[:chunk_size])
+
+        if not subscriptions:
+            break
+
+        total_notified += notify_subscriptions(subscriptions)
+        last_subscription_id = subscriptions[-1].pk
+
+    return 'Notified %d subscribers' % total_notified
+
+
+@job('default')
+def purge_post_from_timelines(post_id, creator_id, community_id=None):
+    """
+    Removes a deleted or moderated post from every timeline it could have been fanned out to.
+    Receives the creator and community ids as the post might not exist anymore.
+    """
+    User = get_user_model()
+
+    if community_id:
+        target_users_ids = User.objects.filter(communities_memberships__community_id=community_id)
+    else:
+        target_users_ids = User.objects.filter(Q(follows__followed_user_id=creator_id) | Q(pk=creator_id))
+
+    target_users_ids = target_users_ids.values_list('id', flat=True).distinct()
+
+    for users_ids in _chunked_iterator(target_users_ids, 1000):
+        timelines.remove_post_from_timelines(post_id=post_id, users_ids=users_ids)
+
+
+@job('low')
+def purge_post_notifications(post_id, excluded_owners_ids=None):
+    """
+    Deletes the notifications of a post, but the ones of the excluded owners, a chunk at a time. Picks up the purges
+    too large to be done along with the request deleting, closing or moderating the post.
+    """
+    Notification = get_notification_model()
+    chunk_size = settings.POST_NOTIFICATIONS_PURGE_CHUNK_SIZE
+
+    total_deleted = 0
+
+    while True:
+        deleted_notifications_count = Notification.delete_notifications_for_post_with_id(
+            post_id=post_id, excluded_owners_ids=excluded_owners_ids, limit=chunk_size)
+
+        total_deleted += deleted_notifications_count
+
+        if deleted_notifications_count < chunk_size:
+            break
+
+    return 'Deleted %d notifications' % total_deleted
+
+
+@job('default')
+def warm_up_timeline_for_user_with_id(user_id):
+    """
+    Fills the materialized timeline of a cold user from the timeline query.
+    """
+    User = get_user_model()
+    user = User.objects.get(pk=user_id)
+
+    timeline_posts = user.get_timeline_posts_from_query().order_by('-id')[:settings.TIMELINE_MAX_POSTS]
+    timeline_posts_ids = [post.pk for post in timeline_posts]
+
+    timelines.fill_timeline(user_id=user_id, posts_ids=timeline_posts_ids)
+
+    return 'Warmed up with: %d posts' % len(timeline_posts_ids)
+
+
+def _chunked_iterator(queryset, size):
+    """
+    Yields lists of up to size items of a flat values_list queryset
+    """
+    chunk = []
+    for item in queryset.iterator():
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def _chunked_queryset_iterator(queryset, size, *, ordering=('id',)):
     """
     Split a queryset into chunks.
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+import logging
+
+from openbook_common.utils.model_loaders import get_post_image_model
+from openbook_posts.image_variants import create_post_image_variants
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Creates the missing variants of the post media images, in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='The amount of images to process at once')
+        parser.add_argument('--workers', type=int, default=4, help='The amount of images processed in parallel')
+        parser.add_argument('--min-id', type=int, default=0, help='Only process the images after this id')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        last_post_image_id = options['min_id']
+
+        if chunk_size < 1:
+            raise Exception('--chunk-size must be greater than 0')
+
+        if workers < 1:
+            raise Exception('--workers must be greater than 0')
+
+        PostImage = get_post_image_model()
+
+        processed_images = 0
+        created_variants = 0
+
+        # Resizing and encoding release the GIL, the images are processed in threads with their own connections
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                post_images_ids = list(
+                    PostImage.objects.filter(pk__gt=last_post_image_id, media__isnull=False).exclude(
+                        image='').order_by('pk').values_list('id', flat=True).distinct()[:chunk_size])
+
+                if not post_images_ids:
+                    break
+
+                created_variants = created_variants + sum(
+                    executor.map(_create_variants_for_post_image_with_id, post_images_ids))
+                processed_images = processed_images + len(post_images_ids)
+                last_post_image_id = post_images_ids[-1]
+
+                logger.info('Created the variants of the images up to id %d' % last_post_image_id)
+
+        logger.info('Processed %d images, created %d variants' % (processed_images, created_variants))
+
+
+def _create_variants_for_post_image_with_id(post_image_id):
+    PostImage = get_post_image_model()
+
+    try:
+        post_image = PostImage.objects.get(pk=post_image_id)
+        return create_post_image_variants(post_image=post_image)
+    except (FileNotFoundError, OSError) as e:
+        logger.warning('Ignoring image with id %d: %s' % (post_image_id, e))
+        return 0
+    finally:
+        connection.close()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.utils.model_loaders import get_post_model
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recounts the comments, commenters, reactions and reactions emoji counters of the posts, repairing any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='The amount of posts to recount at once')
+        parser.add_argument('--min-id', type=int, default=0, help='Only recount the posts after this id')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_post_id = options['min_id']
+
+        if chunk_size < 1:
+            raise Exception('--chunk-size must be greater than 0')
+
+        Post = get_post_model()
+
+        checked_posts = 0
+        repaired_posts = 0
+
+        while True:
+            posts_ids = list(Post.objects.filter(pk__gt=last_post_id).order_by('pk').values_list('id', flat=True)[
+                             :chunk_size])
+
+            if not posts_ids:
+                break
+
+            repaired_posts = repaired_posts + Post.reconcile_counters_for_posts_with_ids(posts_ids=posts_ids)
+            checked_posts = checked_posts + len(posts_ids)
+            last_post_id = posts_ids[-1]
+
+            logger.info('Recounted posts up to id %d' % last_post_id)
+
+        logger.info('Checked %d posts, repaired the counters of %d posts' % (checked_posts, repaired_posts))
@@ -0,0 +1,251 @@
+"""
+Post media ingestion.
+
+Adding a media to a post only stores the raw uploaded file as a PostMediaUpload. The upload is then ingested into a
+PostMedia in a job, through the stages of PostMediaUpload.STAGES:
+
+* sniff, the mimetype of the file is checked against settings.SUPPORTED_MEDIA_MIMETYPES
+* hash, the sha256 of the file is kept
+* convert, GIFs are converted to MP4 videos
+* thumbnail, the first frame of the videos is extracted
+* resize, the image or video and its thumbnail are resized and stored as the post media, along with the variants of
+  the images, see openbook_posts.image_variants
+
+The images and videos are content addressed by the sha256 of their upload. An upload with the hash of an image or
+video already stored for a post media skips the remaining stages, its post media references the stored one along
+with its thumbnail and renditions. The stored images and videos are deleted once no post media references them.
+
+The mimetype and sha256 of the uploads are taken from their inspection, see openbook_common.utils.uploads, done in
+the same single pass over the file that checks its size before storing it.
+
+The stage and progress of every upload are recorded on it as it goes. A post published while its uploads are still
+being ingested stays processing, the last upload ingested publishes it.
+
+settings.POST_MEDIA_INGESTION_ASYNC set to False ingests the uploads right away, as the tests do.
+"""
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+import ffmpy
+from django.core.files import File
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from video_encoding.backends import get_backend
+
+from openbook_common.utils.helpers import sha256sum, get_magic
+from openbook_common.utils.model_loaders import get_post_media_upload_model, get_post_image_model, \
+    get_post_video_model, get_post_media_model
+from openbook_posts import image_variants
+from openbook_posts.checkers import check_mimetype_is_supported_media_mimetypes
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+magic = get_magic()
+
+
+def ingest_post_media_upload(post_media_upload):
+    """
+    Ingests the upload into a media of its post, returns the post media. Marks the upload as failed and raises
+    ValidationError if its file is not a supported media.
+    """
+    PostMediaUpload = get_post_media_upload_model()
+
+    post_media_upload.start_processing()
+
+    temp_files_paths = []
+
+    try:
+        with _get_local_file_path(post_media_upload.file) as file_path:
+            post_media_upload.start_stage(PostMediaUpload.STAGE_SNIFF)
+            # Sniffed along with the hash when the upload was inspected
+            file_mime = post_media_upload.mimetype or magic.from_file(file_path)
+            check_mimetype_is_supported_media_mimetypes(file_mime)
+            file_mime_type, file_mime_subtype = file_mime.split('/')
+
+            if file_mime_subtype == 'gif':
+                file_mime_type = 'video'
+            elif file_mime_type not in ('image', 'video'):
+                raise ValidationError(_('Unsupported media file type'))
+
+            post_media_upload.start_stage(PostMediaUpload.STAGE_HASH)
+            # The hash of the upload as inspected, before any conversion
+            file_hash = post_media_upload.hash or sha256sum(filename=file_path)
+
+            post_media = _reference_stored_post_media(post_media_upload=post_media_upload,
+                                                      file_mime_type=file_mime_type, file_hash=file_hash)
+
+            if post_media is None:
+                post_media_upload.start_stage(PostMediaUpload.STAGE_CONVERT)
+                if file_mime_subtype == 'gif':
+                    file_path = _convert_gif_to_mp4(gif_path=file_path)
+                    temp_files_paths.append(file_path)
+
+                post_media_upload.start_stage(PostMediaUpload.STAGE_THUMBNAIL)
+                thumbnail_path = None
+                if file_mime_type == 'video':
+                    # A converted gif has a hash of its own
+                    video_hash = file_hash if file_mime_subtype != 'gif' else None
+                    thumbnail_path = get_backend().get_thumbnail(video_path=file_path, at_time=0.0,
+                                                                 video_hash=video_hash)
+                    temp_files_paths.append(thumbnail_path)
+
+                post_media_upload.start_stage(PostMediaUpload.STAGE_RESIZE)
+                post_media = _store_post_media(post_media_upload=post_media_upload, file_path=file_path,
+                                               file_mime_type=file_mime_type, file_hash=file_hash,
+                                               thumbnail_path=thumbnail_path)
+    except ValidationError as e:
+        post_media_upload.fail(error=str(e.detail[0] if isinstance(e.detail, list) else e.detail))
+        raise
+    except Exception:
+        logger.exception('Failed to ingest the media upload with id %d' % post_media_upload.pk)
+        post_media_upload.fail(error=str(_('The media could not be processed')))
+        raise
+    finally:
+        for temp_file_path in temp_files_paths:
+            try:
+                os.remove(temp_file_path)
+            except FileNotFoundError:
+                pass
+
+    post_media_upload.finish(post_media=post_media)
+
+    return post_media
+
+
+def _reference_stored_post_media(post_media_upload, file_mime_type, file_hash):
+    """
+    Returns a post media of the upload post referencing the image or video stored with the same hash, or None if there
+    is none
+    """
+    PostMedia = get_post_media_model()
+
+    if file_mime_type == 'image':
+        Model = get_post_image_model()
+        stored_content_object = Model.get_post_media_image_with_hash(hash=file_hash)
+        media_type = PostMedia.MEDIA_TYPE_IMAGE
+    else:
+        Model = get_post_video_model()
+        stored_content_object = Model.get_post_media_video_with_hash(hash=file_hash)
+        media_type = PostMedia.MEDIA_TYPE_VIDEO
+
+    if stored_content_object is None:
+        return None
+
+    post = post_media_upload.post
+
+    with transaction.atomic():
+        # Locks the stored image or video so it's not deleted as unreferenced meanwhile
+        content_object = Model.objects.select_for_update().filter(pk=stored_content_object.pk).first()
+
+        if content_object is None:
+            return None
+
+        post_media = PostMedia.create_post_media(type=media_type, content_object=content_object, post_id=post.pk,
+                                                 order=post_media_upload.order)
+
+    logger.info('Media upload with id %d references the stored media with hash %s' % (post_media_upload.pk,
+                                                                                       file_hash))
+
+    if post.get_first_media() == post_media:
+        post.media_width = content_object.width
+        post.media_height = content_object.height
+
+        # The thumbnail of a post with the same first media, if any, is the one this post would get
+        referencing_post_media = PostMedia.objects.filter(
+            content_type_id=post_media.content_type_id, object_id=post_media.object_id).exclude(
+            post_id=post.pk).exclude(post__media_thumbnail='').exclude(
+            post__media_thumbnail__isnull=True).select_related('post').first()
+
+        if referencing_post_media and referencing_post_media.post.get_first_media() == referencing_post_media:
+            post.media_thumbnail.name = referencing_post_media.post.media_thumbnail.name
+        else:
+            post.media_thumbnail = _get_post_media_thumbnail(content_object=content_object).file
+
+        post.save()
+
+    return post_media
+
+
+def _store_post_media(post_media_upload, file_path, file_mime_type, file_hash, thumbnail_path):
+    post = post_media_upload.post
+
+    file_name = os.path.basename(post_media_upload.file.name)
+
+    with open(file_path, 'rb') as file:
+        if file_mime_type == 'image':
+            PostImage = get_post_image_model()
+            post_image = PostImage.create_post_media_image(image=File(file, name=file_name), post_id=post.pk,
+                                                           order=post_media_upload.order, hash=file_hash)
+            image_variants.create_post_image_variants(post_image=post_image)
+            post_media = post_image.media.get()
+            content_object = post_image
+        else:
+            PostVideo = get_post_video_model()
+            post_video = PostVideo.create_post_media_video(file=File(file, name=file_name), post_id=post.pk,
+                                                           order=post_media_upload.order, hash=file_hash,
+                                                           thumbnail_path=thumbnail_path)
+            post_media = post_video.media.get()
+            content_object = post_video
+
+    # The uploads may be ingested in any order, the first media of the post gives it its thumbnail and dimensions
+    if post.get_first_media() == post_media:
+        post.media_width = content_object.width
+        post.media_height = content_object.height
+        post.media_thumbnail = _get_post_media_thumbnail(content_object=content_object).file
+        post.save()
+
+    return post_media
+
+
+def _get_post_media_thumbnail(content_object):
+    """
+    Returns the file the post thumbnail is made of, the image itself for images and the thumbnail for videos
+    """
+    PostImage = get_post_image_model()
+
+    if isinstance(content_object, PostImage):
+        return content_object.image
+
+    return content_object.thumbnail
+
+
+def _convert_gif_to_mp4(gif_path):
+    converted_gif_path = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()) + '.mp4')
+
+    ff = ffmpy.FFmpeg(inputs={gif_path: None}, outputs={converted_gif_path: None})
+    ff.run()
+
+    return converted_gif_path
+
+
+@contextmanager
+def _get_local_file_path(field_file):
+    """
+    Yields the path of the file on the local disk, downloaded to a temporary file if its storage is remote
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+
+    if path is not None:
+        yield path
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(field_file.name)[1]) as local_file:
+        field_file.open('rb')
+
+        try:
+            for chunk in field_file.chunks():
+                local_file.write(chunk)
+        finally:
+            field_file.close()
+
+        local_file.flush()
+
+        yield local_file.name
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.12 on 2020-10-26 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Every batch is recounted and committed on its own, so the posts are not locked all along
+BATCH_SIZE = 1000
+
+
+def forwards_func(apps, schema_editor):
+    # The posts are recounted with the current model, as by manage.py reconcile_post_counters.
+    # The historical models don't carry its methods, and every column it reads exists at this point.
+    from openbook_posts.models import Post
+
+    last_post_id = 0
+
+    while True:
+        posts_ids = list(
+            Post.objects.filter(pk__gt=last_post_id).order_by('pk').values_list('id', flat=True)[:BATCH_SIZE])
+
+        if not posts_ids:
+            break
+
+        Post.reconcile_counters_for_posts_with_ids(posts_ids=posts_ids)
+        last_post_id = posts_ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('openbook_common', '0021_auto_20190917_1806'),
+        ('openbook_posts', '0071_auto_20201019_1951'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='commenters_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='commenters count'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='comments count'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reactions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='reactions count'),
+        ),
+        migrations.CreateModel(
+            name='PostReactionEmojiCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('emoji', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_reactions_counts', to='openbook_common.Emoji')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions_emoji_counts', to='openbook_posts.Post')),
+            ],
+            options={
+                'unique_together': {('post', 'emoji')},
+            },
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
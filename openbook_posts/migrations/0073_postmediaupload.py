@@ -0,0 +1,31 @@
+# Generated by Django 2.2.12 on 2020-10-28 09:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import openbook_posts.helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0072_post_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostMediaUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(null=True, upload_to=openbook_posts.helpers.upload_to_post_media_upload_directory, verbose_name='file')),
+                ('order', models.IntegerField(null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('PG', 'Processing'), ('D', 'Processed'), ('F', 'Failed')], default='P', max_length=2)),
+                ('stage', models.CharField(choices=[('S', 'Sniff'), ('C', 'Convert'), ('H', 'Hash'), ('T', 'Thumbnail'), ('R', 'Resize')], max_length=2, null=True)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.CharField(max_length=255, null=True, verbose_name='error')),
+                ('media', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='openbook_posts.PostMedia')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_uploads', to='openbook_posts.Post')),
+            ],
+        ),
+    ]
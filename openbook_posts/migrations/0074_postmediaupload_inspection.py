@@ -0,0 +1,23 @@
+# Generated by Django 2.2.12 on 2020-10-29 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0073_postmediaupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmediaupload',
+            name='hash',
+            field=models.CharField(max_length=64, null=True, verbose_name='hash'),
+        ),
+        migrations.AddField(
+            model_name='postmediaupload',
+            name='mimetype',
+            field=models.CharField(max_length=255, null=True, verbose_name='mimetype'),
+        ),
+    ]
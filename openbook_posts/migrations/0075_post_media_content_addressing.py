@@ -0,0 +1,39 @@
+# Generated by Django 2.2.12 on 2020-10-30 11:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0074_postmediaupload_inspection'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postimage',
+            name='hash',
+            field=models.CharField(db_index=True, max_length=64, null=True, verbose_name='hash'),
+        ),
+        migrations.AlterField(
+            model_name='postimage',
+            name='post',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='image', to='openbook_posts.Post'),
+        ),
+        migrations.AlterField(
+            model_name='postvideo',
+            name='hash',
+            field=models.CharField(db_index=True, max_length=64, null=True, verbose_name='hash'),
+        ),
+        migrations.AlterField(
+            model_name='postvideo',
+            name='post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='videos', to='openbook_posts.Post'),
+        ),
+        migrations.AlterField(
+            model_name='postmediaupload',
+            name='stage',
+            field=models.CharField(choices=[('S', 'Sniff'), ('H', 'Hash'), ('C', 'Convert'), ('T', 'Thumbnail'), ('R', 'Resize')], max_length=2, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.12 on 2020-11-02 10:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import openbook_posts.helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0075_post_media_content_addressing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('JPEG', 'JPEG'), ('WEBP', 'WebP')], max_length=5)),
+                ('requested_width', models.PositiveIntegerField(editable=False)),
+                ('image', models.ImageField(height_field='height', upload_to=openbook_posts.helpers.upload_to_post_image_variant_directory, verbose_name='image', width_field='width')),
+                ('width', models.PositiveIntegerField(editable=False)),
+                ('height', models.PositiveIntegerField(editable=False)),
+                ('post_image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='openbook_posts.PostImage')),
+            ],
+            options={
+                'unique_together': {('post_image', 'format', 'requested_width')},
+            },
+        ),
+    ]
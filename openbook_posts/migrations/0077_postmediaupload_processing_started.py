@@ -0,0 +1,18 @@
+# Generated by Django 2.2.12 on 2020-11-16 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0076_postimagevariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmediaupload',
+            name='processing_started',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
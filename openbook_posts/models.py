@@ -1,6 +1,4 @@
 # Create your models here.
-import os
-import tempfile
 import uuid
 from datetime import timedelta
 
@@ -8,13 +6,14 @@ from django.contrib.contenttypes.fields import GenericRelation, GenericForeignKe
 from django.contrib.contenttypes.models import ContentType
 from django.core.files import File
 from django.core.files.storage import default_storage
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile, SimpleUploadedFile
-from django.db import models
-from django.db.models import Q
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q, F, Case, When, Value
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.db.models import Count
-import ffmpy
 
 # Create your views here.
 from ordered_model.models import OrderedModel
@@ -25,6 +24,7 @@ from django.conf import settings
 
 from openbook_common.peekalink_client import peekalink_client
 from openbook_posts.validators import post_text_validators, post_comment_text_validators
+from openbook_posts.queries import make_only_excluded_post_comments_for_user_with_id_query
 from video_encoding.backends import get_backend
 from video_encoding.fields import VideoField
 from video_encoding.models import Format
@@ -33,29 +33,33 @@ from openbook.storage_backends import S3PrivateMediaStorage
 from openbook_auth.models import User
 
 from openbook_common.models import Emoji, Language
-from openbook_common.utils.helpers import delete_file_field, sha256sum, extract_usernames_from_string, get_magic, \
+from openbook_common.utils.helpers import delete_file_field, sha256sum, extract_usernames_from_string, \
     write_in_memory_file_to_disk, extract_hashtags_from_string, normalize_url
+from openbook_common.utils.deletions import track_deletions, is_being_deleted
+from openbook_common.utils.uploads import inspect_upload
 from openbook_common.utils.model_loaders import get_emoji_model, \
     get_circle_model, get_community_model, get_post_comment_notification_model, \
-    get_post_comment_reply_notification_model, get_post_reaction_notification_model, get_moderated_object_model, \
+    get_post_comment_reply_notification_model, get_moderated_object_model, \
     get_post_user_mention_notification_model, get_post_comment_user_mention_notification_model, get_user_model, \
     get_post_user_mention_model, get_post_comment_user_mention_model, get_community_notifications_subscription_model, \
-    get_community_new_post_notification_model, get_user_new_post_notification_model, \
     get_hashtag_model, get_user_notifications_subscription_model, get_trending_post_model, \
-    get_post_comment_reaction_notification_model
+    get_post_comment_reaction_notification_model, get_notification_model
 from imagekit.models import ProcessedImageField
 
 from openbook_moderation.models import ModeratedObject
 from openbook_notifications.helpers import send_post_comment_user_mention_push_notification, \
-    send_post_user_mention_push_notification, send_community_new_post_push_notification, \
-    send_user_new_post_push_notification
+    send_post_user_mention_push_notification
+from openbook_notifications.preferences import invalidate_notifications_preferences_for_user_with_id
 from openbook_posts.checkers import check_can_be_updated, check_can_add_media, check_can_be_published, \
     check_mimetype_is_supported_media_mimetypes
 from openbook_posts.helpers import upload_to_post_image_directory, upload_to_post_video_directory, \
-    upload_to_post_directory
-from openbook_posts.jobs import process_post_media
+    upload_to_post_directory, upload_to_post_media_upload_directory, upload_to_post_image_variant_directory
+from openbook_posts.jobs import process_post_media, fan_out_post_to_timelines, purge_post_from_timelines, \
+    fan_out_post_to_subscribers, purge_post_notifications, ingest_post_media_upload
+from openbook_posts import media_ingestion
+from openbook_posts.top_posts import add_top_posts_candidates
+from openbook_posts.trending import add_trending_post_engagement, remove_trending_post_engagement
 
-magic = get_magic()
 from openbook_common.helpers import get_language_for_text, extract_urls_from_string
 
 post_image_storage = S3PrivateMediaStorage() if settings.IS_PRODUCTION else default_storage
@@ -93,12 +97,73 @@ class Post(models.Model):
                                           upload_to=upload_to_post_directory,
                                           blank=False, null=True, format='JPEG', options={'quality': 30},
                                           processors=[ResizeToFit(width=512, upscale=False)])
+    # Engagement counters, kept up to date by the comments and reactions create/delete paths
+    comments_count = models.PositiveIntegerField(_('comments count'), default=0, editable=False)
+    commenters_count = models.PositiveIntegerField(_('commenters count'), default=0, editable=False)
+    reactions_count = models.PositiveIntegerField(_('reactions count'), default=0, editable=False)
+
+    COUNTERS_FIELDS = ('comments_count', 'commenters_count', 'reactions_count')
 
     class Meta:
         index_together = [
             ('creator', 'community'),
         ]
 
+    @classmethod
+    def update_counters_for_post_with_id(cls, post_id, **counters_deltas):
+        """
+        Atomically adds the given deltas to the counters of the post, counters never go below zero
+        """
+        counters_updates = {}
+
+        for counter, delta in counters_deltas.items():
+            if not delta:
+                continue
+
+            if delta > 0:
+                counters_updates[counter] = F(counter) + delta
+            else:
+                counters_updates[counter] = Case(When(**{'%s__gte' % counter: -delta, 'then': F(counter) + delta}),
+                                                 default=Value(0), output_field=models.PositiveIntegerField())
+
+        if counters_updates:
+            cls.objects.filter(pk=post_id).update(**counters_updates)
+            add_top_posts_candidates([post_id])
+
+    @classmethod
+    def reconcile_counters_for_posts_with_ids(cls, posts_ids):
+        """
+        Recounts from scratch the counters of the given posts, repairing any drift.
+        Returns the amount of posts whose counters were repaired.
+        """
+        repaired_posts_ids = set()
+
+        with transaction.atomic():
+            # Lock the posts so the counters are not moved while we recount them
+            posts = list(cls.objects.select_for_update().filter(pk__in=posts_ids).only('id', *cls.COUNTERS_FIELDS))
+
+            comments_counts = PostComment.count_post_counters_for_posts_with_ids(posts_ids=posts_ids)
+
+            reactions_counts = dict(
+                PostReaction.objects.filter(post_id__in=posts_ids).values('post_id').annotate(
+                    reactions_count=Count('id')).order_by().values_list('post_id', 'reactions_count'))
+
+            for post in posts:
+                post_comments_counts = comments_counts.get(post.pk, {})
+                counters = {
+                    'comments_count': post_comments_counts.get('comments_count', 0),
+                    'commenters_count': post_comments_counts.get('commenters_count', 0),
+                    'reactions_count': reactions_counts.get(post.pk, 0),
+                }
+
+                if any(getattr(post, counter) != count for counter, count in counters.items()):
+                    cls.objects.filter(pk=post.pk).update(**counters)
+                    repaired_posts_ids.add(post.pk)
+
+            repaired_posts_ids.update(PostReactionEmojiCount.reconcile_counts_for_posts_with_ids(posts_ids=posts_ids))
+
+        return len(repaired_posts_ids)
+
     @classmethod
     def get_post_id_for_post_with_uuid(cls, post_uuid):
         post = cls.objects.values('id').get(uuid=post_uuid)
@@ -159,7 +224,8 @@ class Post(models.Model):
     @classmethod
     def get_trending_posts_for_user_with_id(cls, user_id, max_id=None, min_id=None):
         """
-        Gets trending posts (communities only) for authenticated user excluding reported, closed, blocked users posts
+        Gets trending posts (communities only) for authenticated user excluding reported, closed, blocked users posts.
+        The trending posts are curated from the top of the trending posts scores, highest score first.
         """
         Post = cls
         TrendingPost = get_trending_post_model()
@@ -226,8 +292,7 @@ class Post(models.Model):
 
     @classmethod
     def _get_trending_posts_old_with_query(cls, query):
-        return cls.objects.filter(query).annotate(Count('reactions')).order_by(
-            '-reactions__count', '-created')
+        return cls.objects.filter(query).order_by('-reactions_count', '-created')
 
     @classmethod
     def _get_trending_posts_old_query(cls):
@@ -315,7 +380,10 @@ class Post(models.Model):
                    exclude_self_query
                    )
 
-        results = target_subscriptions_excluding_blocked.union(target_subscriptions_with_staff)
+        # Not a union, so the subscriptions can be paginated
+        results = CommunityNotificationsSubscription.objects.filter(
+            Q(pk__in=target_subscriptions_excluding_blocked.values('pk')) |
+            Q(pk__in=target_subscriptions_with_staff.values('pk')))
 
         return results
 
@@ -336,42 +404,55 @@ class Post(models.Model):
 
         user_subscriptions_query.add(exclude_self_query, Q.AND)
 
-        # Subscriptions after excluding blocked users
+        # Subscriptions after excluding blocked users, subscribers might be in several of the circles
         target_subscriptions = UserNotificationsSubscription.objects. \
             filter(user_subscriptions_query). \
-            exclude(exclude_blocked_users_query)
+            exclude(exclude_blocked_users_query).distinct()
 
         return target_subscriptions
 
+    def get_timeline_target_users_ids(self):
+        """
+        Returns the ids of the users whose timeline should contain the post, mirroring the
+        sources of User.get_timeline_posts
+        """
+        User = get_user_model()
+
+        if self.community_id:
+            return User.objects.filter(communities_memberships__community_id=self.community_id). \
+                values_list('id', flat=True)
+
+        Circle = get_circle_model()
+        world_circle_id = Circle.get_world_circle_id()
+        circles_ids = [circle.pk for circle in self.circles.all()]
+
+        target_users_query = Q(follows__followed_user_id=self.creator_id)
+
+        if world_circle_id not in circles_ids:
+            target_users_query.add(Q(targeted_connections__circles__id__in=circles_ids,
+                                     targeted_connections__target_connection__circles__isnull=False), Q.AND)
+
+        target_users_query.add(Q(pk=self.creator_id), Q.OR)
+
+        return User.objects.filter(target_users_query).values_list('id', flat=True).distinct()
+
     def count_comments(self):
-        return PostComment.count_comments_for_post_with_id(self.pk)
+        return self.comments_count
 
     def count_comments_with_user(self, user):
-        # Count comments excluding users blocked by authenticated user
-        count_query = ~Q(Q(commenter__blocked_by_users__blocker_id=user.pk) | Q(
-            commenter__user_blocks__blocked_user_id=user.pk))
+        is_community_staff = False
 
         if self.community:
-            if not user.is_staff_of_community_with_name(community_name=self.community.name):
-                # Dont retrieve comments except from staff members
-                blocked_users_query_staff_members = Q(
-                    commenter__communities_memberships__community_id=self.community.pk)
-                blocked_users_query_staff_members.add(Q(commenter__communities_memberships__is_administrator=True) | Q(
-                    commenter__communities_memberships__is_moderator=True), Q.AND)
+            is_community_staff = user.is_staff_of_community_with_name(community_name=self.community.name)
 
-                count_query.add(~blocked_users_query_staff_members, Q.AND)
-
-            # Don't count items that have been reported and approved by community moderators
-            ModeratedObject = get_moderated_object_model()
-            count_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
-
-        # Dont count soft deleted items
-        count_query.add(Q(is_deleted=False), Q.AND)
+        excluded_comments_query = make_only_excluded_post_comments_for_user_with_id_query(
+            user_id=user.pk,
+            community_id=self.community_id,
+            is_community_staff=is_community_staff)
 
-        # Dont count items we have reported
-        count_query.add(~Q(moderated_object__reports__reporter_id=user.pk), Q.AND)
+        excluded_comments_count = self.comments.filter(excluded_comments_query).distinct().count()
 
-        return self.comments.filter(count_query).count()
+        return max(self.comments_count - excluded_comments_count, 0)
 
     def count_reactions(self, reactor_id=None):
         return PostReaction.count_reactions_for_post_with_id(self.pk, reactor_id=reactor_id)
@@ -415,6 +496,8 @@ class Post(models.Model):
     def is_public_post(self):
         Circle = get_circle_model()
         world_circle_id = Circle.get_world_circle_id()
+        if 'circles' in getattr(self, '_prefetched_objects_cache', {}):
+            return any(circle.pk == world_circle_id for circle in self.circles.all())
         if self.circles.filter(id=world_circle_id).exists():
             return True
         return False
@@ -440,67 +523,28 @@ class Post(models.Model):
         return self.media
 
     def add_media(self, file, order=None):
+        """
+        Stores the raw file as an upload of the post and ingests it into a post media, in a job if
+        settings.POST_MEDIA_INGESTION_ASYNC. Returns the upload.
+        """
         check_can_add_media(post=self)
 
-        is_in_memory_file = isinstance(file, InMemoryUploadedFile) or isinstance(file, SimpleUploadedFile)
+        # The upload is read once for its hash, mimetype and size, unsupported media are rejected before being stored
+        upload_inspection = inspect_upload(file=file, max_size=settings.POST_MEDIA_MAX_SIZE)
+        check_mimetype_is_supported_media_mimetypes(upload_inspection.mimetype)
 
-        if is_in_memory_file:
-            file_mime = magic.from_buffer(file.read())
-        elif isinstance(file, TemporaryUploadedFile):
-            file_mime = magic.from_file(file.temporary_file_path())
-        else:
-            file_mime = magic.from_file(file.name)
-
-        check_mimetype_is_supported_media_mimetypes(file_mime)
-        # Mime check moved pointer
-        file.seek(0)
-
-        file_mime_types = file_mime.split('/')
-
-        file_mime_type = file_mime_types[0]
-        file_mime_subtype = file_mime_types[1]
-
-        temp_files_to_close = []
-
-        if file_mime_subtype == 'gif':
-            if is_in_memory_file:
-                file = write_in_memory_file_to_disk(file)
-
-            temp_dir = tempfile.gettempdir()
-            converted_gif_file_name = os.path.join(temp_dir, str(uuid.uuid4()) + '.mp4')
-
-            ff = ffmpy.FFmpeg(
-                inputs={file.temporary_file_path() if hasattr(file, 'temporary_file_path') else file.name: None},
-                outputs={converted_gif_file_name: None})
-            ff.run()
-            converted_gif_file = open(converted_gif_file_name, 'rb')
-            temp_files_to_close.append(converted_gif_file)
-            file = File(file=converted_gif_file)
-            file_mime_type = 'video'
-
-        has_other_media = self.media.exists()
-
-        if file_mime_type == 'image':
-            post_image = self._add_media_image(image=file, order=order)
-            if not has_other_media:
-                self.media_width = post_image.width
-                self.media_height = post_image.height
-                self.media_thumbnail = file
-        elif file_mime_type == 'video':
-            post_video = self._add_media_video(video=file, order=order)
-            if not has_other_media:
-                self.media_width = post_video.width
-                self.media_height = post_video.height
-                self.media_thumbnail = post_video.thumbnail.file
-        else:
-            raise ValidationError(
-                _('Unsupported media file type')
-            )
+        post_media_upload = PostMediaUpload.create_post_media_upload(post=self, file=file, order=order,
+                                                                     hash=upload_inspection.hash,
+                                                                     mimetype=upload_inspection.mimetype)
 
-        for file_to_close in temp_files_to_close:
-            file_to_close.close()
+        if settings.POST_MEDIA_INGESTION_ASYNC:
+            post_media_upload_id = post_media_upload.pk
+            transaction.on_commit(
+                lambda: ingest_post_media_upload.delay(post_media_upload_id=post_media_upload_id))
+        else:
+            media_ingestion.ingest_post_media_upload(post_media_upload=post_media_upload)
 
-        self.save()
+        return post_media_upload
 
     def get_first_media(self):
         return self.media.first()
@@ -508,20 +552,26 @@ class Post(models.Model):
     def get_first_media_image(self):
         return self.media.filter(type=PostMedia.MEDIA_TYPE_IMAGE).first()
 
-    def _add_media_image(self, image, order):
-        return PostImage.create_post_media_image(image=image, post_id=self.pk, order=order)
+    def count_media(self):
+        return self.media.count() + self.count_pending_media_uploads()
 
-    def _add_media_video(self, video, order):
-        return PostVideo.create_post_media_video(file=video, post_id=self.pk, order=order)
+    def get_media_uploads(self):
+        return self.media_uploads
 
-    def count_media(self):
-        return self.media.count()
+    def has_pending_media_uploads(self):
+        return self.media_uploads.filter(
+            status__in=[PostMediaUpload.STATUS_PENDING, PostMediaUpload.STATUS_PROCESSING]).exists()
+
+    def count_pending_media_uploads(self):
+        return self.media_uploads.filter(
+            status__in=[PostMediaUpload.STATUS_PENDING, PostMediaUpload.STATUS_PROCESSING]).count()
 
     def publish(self):
         check_can_be_published(post=self)
 
         if self.has_media():
-            # After finishing, this will call _publish()
+            # After finishing, this will call _publish(). If uploads are still being ingested, the last one ingested
+            # processes the media instead.
             self.status = Post.STATUS_PROCESSING
             self.save()
             process_post_media.delay(post_id=self.pk)
@@ -531,8 +581,9 @@ class Post(models.Model):
     def _publish(self):
         self.status = Post.STATUS_PUBLISHED
         self.created = timezone.now()
-        self._process_post_subscribers()
         self.save()
+        self._process_post_subscribers()
+        transaction.on_commit(lambda: fan_out_post_to_timelines.delay(post_id=self.pk))
 
     def is_draft(self):
         return self.status == Post.STATUS_DRAFT
@@ -541,7 +592,7 @@ class Post(models.Model):
         return not self.text and not hasattr(self, 'image') and not hasattr(self, 'video') and not self.has_media()
 
     def has_media(self):
-        return self.media.exists()
+        return self.media.exists() or self.has_pending_media_uploads()
 
     def save(self, *args, **kwargs):
         ''' On create, update timestamps '''
@@ -550,8 +601,19 @@ class Post(models.Model):
 
         self.modified = timezone.now()
 
+        if self.pk and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # The counters are only ever written with atomic updates, don't overwrite them with stale values
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields if
+                                       not field.primary_key and field.attname not in deferred_fields and
+                                       field.name not in self.COUNTERS_FIELDS]
+
         post = super(Post, self).save(*args, **kwargs)
 
+        if self.community_id:
+            # Its visibility might have changed
+            add_top_posts_candidates([self.pk])
+
         self._process_post_mentions()
         self._process_post_hashtags()
         self._process_post_links()
@@ -560,148 +622,78 @@ class Post(models.Model):
 
     def delete(self, *args, **kwargs):
         self.delete_media()
+        self.purge_from_timelines()
+
+        if self.has_image() and not self.image.media.exists():
+            # Not a post media, which are deleted once no longer referenced by any post
+            self.image.delete_if_unreferenced()
+
+        hashtags_ids = list(self.hashtags.values_list('id', flat=True))
+        if hashtags_ids and self.is_publicly_visible():
+            Hashtag = get_hashtag_model()
+            Hashtag.update_posts_count_for_hashtags_with_ids(hashtags_ids, delta=-1)
+
         super(Post, self).delete(*args, **kwargs)
 
     def delete_media(self):
-        if self.has_image():
-            delete_file_field(self.image.image)
+        # The images and videos are deleted along with their files once no post media references them, see
+        # delete_unreferenced_post_media_content
+        for post_media_upload in self.media_uploads.exclude(file='').iterator():
+            delete_file_field(post_media_upload.file)
 
     def soft_delete(self):
         self.delete_notifications()
         for comment in self.comments.all().iterator():
-            comment.soft_delete()
+            # Deleted along with the post notifications
+            comment.soft_delete(delete_notifications=False)
         self.is_deleted = True
         self.save()
+        self.purge_from_timelines()
 
     def unsoft_delete(self):
         self.is_deleted = False
         for comment in self.comments.all().iterator():
             comment.unsoft_delete()
         self.save()
+        if self.status == Post.STATUS_PUBLISHED:
+            transaction.on_commit(lambda: fan_out_post_to_timelines.delay(post_id=self.pk))
 
-    def delete_notifications(self):
-        # Remove all post reaction notifications
-        PostReactionNotification = get_post_reaction_notification_model()
-        PostReactionNotification.objects.filter(post_reaction__post_id=self.pk).delete()
-
-        # Remove all post user mention notifications
-        PostUserMentionNotification = get_post_user_mention_notification_model()
-        PostUserMentionNotification.objects.filter(post_user_mention__post_id=self.pk).delete()
-
-        # Remove all post comment notifications
-        PostCommentNotification = get_post_comment_notification_model()
-        PostCommentNotification.objects.filter(post_comment__post_id=self.pk).delete()
-
-        # Remove all post comment reply notifications
-        PostCommentReplyNotification = get_post_comment_reply_notification_model()
-        PostCommentReplyNotification.objects.filter(post_comment__post_id=self.pk).delete()
-
-        # Remove all post comment reaction notifications
-        PostCommentReactionNotification = get_post_comment_reaction_notification_model()
-        PostCommentReactionNotification.objects.filter(
-            post_comment_reaction__post_comment__post_id=self.pk).delete()
+    def purge_from_timelines(self):
+        if self.status != Post.STATUS_PUBLISHED:
+            return
 
-        # Remove all post comment user mention notifications
-        PostCommentUserMentionNotification = get_post_comment_user_mention_notification_model()
-        PostCommentUserMentionNotification.objects.filter(
-            post_comment_user_mention__post_comment__post_id=self.pk).delete()
+        post_id = self.pk
+        creator_id = self.creator_id
+        community_id = self.community_id
 
-        # Remove all community new post notifications
-        CommunityNewPostNotification = get_community_new_post_notification_model()
-        CommunityNewPostNotification.objects.filter(post_id=self.pk).delete()
+        transaction.on_commit(lambda: purge_post_from_timelines.delay(post_id=post_id, creator_id=creator_id,
+                                                                      community_id=community_id))
 
-        # Remove all user new post notifications
-        UserNewPostNotification = get_user_new_post_notification_model()
-        UserNewPostNotification.objects.filter(post_id=self.pk).delete()
+    def delete_notifications(self):
+        self._delete_notifications()
 
     def delete_notifications_for_user(self, user):
-        # Remove all post reaction notifications
-        PostReactionNotification = get_post_reaction_notification_model()
-        PostReactionNotification.objects.filter(
-            notification__owner_id=user.pk,
-            post_reaction__post_id=self.pk).delete()
-
-        # Remove all post user mention notifications
-        PostUserMentionNotification = get_post_user_mention_notification_model()
-        PostUserMentionNotification.objects.filter(
-            notification__owner_id=user.pk,
-            post_user_mention__post_id=self.pk).delete()
-
-        # Remove all post comment notifications
-        PostCommentNotification = get_post_comment_notification_model()
-        PostCommentNotification.objects.filter(post_comment__post_id=self.pk,
-                                               notification__owner_id=user.pk).delete()
-
-        # Remove all post comment reply notifications
-        PostCommentReplyNotification = get_post_comment_reply_notification_model()
-        PostCommentReplyNotification.objects.filter(post_comment__post_id=self.pk,
-                                                    notification__owner_id=user.pk).delete()
-
-        # Remove all post comment user mention notifications
-        PostCommentUserMentionNotification = get_post_comment_user_mention_notification_model()
-        PostCommentUserMentionNotification.objects.filter(
-            notification__owner_id=user.pk,
-            post_comment_user_mention__post_comment__post_id=self.pk).delete()
-
-        # Remove all post comment reaction notifications
-        PostCommentReactionNotification = get_post_comment_reaction_notification_model()
-        PostCommentReactionNotification.objects.filter(
-            notification__owner_id=user.pk,
-            post_comment_reaction__post_comment__post_id=self.pk).delete()
-
-        # Remove all community new post notifications
-        CommunityNewPostNotification = get_community_new_post_notification_model()
-        CommunityNewPostNotification.objects.filter(notification__owner_id=user.pk,
-                                                    post_id=self.pk).delete()
-
-        # Remove all user new post notifications
-        UserNewPostNotification = get_user_new_post_notification_model()
-        UserNewPostNotification.objects.filter(notification__owner_id=user.pk,
-                                               post_id=self.pk).delete()
+        Notification = get_notification_model()
+        Notification.delete_notifications_for_post_with_id(post_id=self.pk, owner_id=user.pk)
 
     def delete_notifications_except_for_users(self, excluded_users):
-        excluded_ids = [user.pk for user in excluded_users]
-
-        # Remove all post user mention notifications
-        PostUserMentionNotification = get_post_user_mention_notification_model()
-        PostUserMentionNotification.objects.filter(post_user_mention__post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
-
-        # Remove all post comment notifications
-        PostCommentNotification = get_post_comment_notification_model()
-        PostCommentNotification.objects.filter(post_comment__post_id=self.pk). \
-            exclude(notification__owner_id__in=excluded_ids).delete()
-
-        # Remove all post reaction notifications
-        PostReactionNotification = get_post_reaction_notification_model()
-        PostReactionNotification.objects.filter(post_reaction__post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
-
-        # Remove all post comment reply notifications
-        PostCommentReplyNotification = get_post_comment_reply_notification_model()
-        PostCommentReplyNotification.objects.filter(post_comment__post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
+        self._delete_notifications(excluded_owners_ids=[user.pk for user in excluded_users])
 
-        # Remove all post comment reaction notifications
-        PostCommentReactionNotification = get_post_comment_reaction_notification_model()
-        PostCommentReactionNotification.objects.filter(post_comment_reaction__post_comment__post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
+    def _delete_notifications(self, excluded_owners_ids=None):
+        # The notifications of all the post comments, reactions and mentions are indexed by the post
+        Notification = get_notification_model()
+        chunk_size = settings.POST_NOTIFICATIONS_PURGE_CHUNK_SIZE
 
-        # Remove all post comment user mention notifications
-        PostCommentUserMentionNotification = get_post_comment_user_mention_notification_model()
-        PostCommentUserMentionNotification.objects.filter(
-            post_comment_user_mention__post_comment__post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
+        deleted_notifications_count = Notification.delete_notifications_for_post_with_id(
+            post_id=self.pk, excluded_owners_ids=excluded_owners_ids, limit=chunk_size)
 
-        # Remove all community new post notifications
-        CommunityNewPostNotification = get_community_new_post_notification_model()
-        CommunityNewPostNotification.objects.filter(post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
+        if deleted_notifications_count < chunk_size:
+            return
 
-        # Remove all user new post notifications
-        UserNewPostNotification = get_user_new_post_notification_model()
-        UserNewPostNotification.objects.filter(post_id=self.pk).exclude(
-            notification__owner_id__in=excluded_ids).delete()
+        # Large purges go on in the background, a chunk at a time
+        post_id = self.pk
+        transaction.on_commit(lambda: purge_post_notifications.delay(post_id=post_id,
+                                                                     excluded_owners_ids=excluded_owners_ids))
 
     def get_participants(self):
         User = get_user_model()
@@ -754,47 +746,37 @@ class Post(models.Model):
                             pass
 
     def _process_post_hashtags(self):
-        if not self.text:
-            self.hashtags.all().delete()
-        else:
-            hashtags = extract_hashtags_from_string(string=self.text)
-            if not hashtags:
-                self.hashtags.all().delete()
+        hashtags = extract_hashtags_from_string(string=self.text) if self.text else []
+
+        # Untagged hashtags are only removed from the post, they might still be used by others
+        existing_hashtags = []
+        removed_hashtags_ids = []
+        for existing_hashtag in self.hashtags.only('id', 'name').all().iterator():
+            if existing_hashtag.name not in hashtags:
+                self.hashtags.remove(existing_hashtag)
+                removed_hashtags_ids.append(existing_hashtag.pk)
             else:
-                existing_hashtags = []
-                for existing_hashtag in self.hashtags.only('id', 'name').all().iterator():
-                    if existing_hashtag.name not in hashtags:
-                        self.hashtags.remove(existing_hashtag)
-                    else:
-                        existing_hashtags.append(existing_hashtag.name)
+                existing_hashtags.append(existing_hashtag.name)
 
-                Hashtag = get_hashtag_model()
+        Hashtag = get_hashtag_model()
 
-                for hashtag in hashtags:
-                    hashtag = hashtag.lower()
-                    hashtag_obj = Hashtag.get_or_create_hashtag(name=hashtag, post=self)
-                    if hashtag not in existing_hashtags:
-                        self.hashtags.add(hashtag_obj)
+        added_hashtags_ids = []
+        for hashtag in hashtags:
+            hashtag = hashtag.lower()
+            hashtag_obj = Hashtag.get_or_create_hashtag(name=hashtag, post=self)
+            if hashtag not in existing_hashtags:
+                self.hashtags.add(hashtag_obj)
+                added_hashtags_ids.append(hashtag_obj.pk)
+
+        if (added_hashtags_ids or removed_hashtags_ids) and self.is_publicly_visible():
+            Hashtag.update_posts_count_for_hashtags_with_ids(added_hashtags_ids, delta=1)
+            Hashtag.update_posts_count_for_hashtags_with_ids(removed_hashtags_ids, delta=-1)
 
     def _process_post_subscribers(self):
-        if self.community:
-            CommunityNewPostNotification = get_community_new_post_notification_model()
-            community_subscriptions = Post.get_community_notification_target_subscriptions(post=self)
-
-            for subscription in community_subscriptions:
-                CommunityNewPostNotification.create_community_new_post_notification(
-                    post_id=self.pk,
-                    owner_id=subscription.subscriber.pk, community_notifications_subscription_id=subscription.pk)
-                send_community_new_post_push_notification(community_notifications_subscription=subscription)
+        if settings.POST_SUBSCRIBERS_FAN_OUT_ASYNC:
+            transaction.on_commit(lambda: fan_out_post_to_subscribers.delay(post_id=self.pk))
         else:
-            UserNewPostNotification = get_user_new_post_notification_model()
-            user_subscriptions = Post.get_user_notification_target_subscriptions(post=self)
-
-            for subscription in user_subscriptions:
-                UserNewPostNotification.create_user_new_post_notification(
-                    post_id=self.pk, owner_id=subscription.subscriber.pk,
-                    user_notifications_subscription_id=subscription.pk)
-                send_user_new_post_push_notification(user_notifications_subscription=subscription, post=self)
+            fan_out_post_to_subscribers(post_id=self.pk)
 
     def _process_post_links(self):
         if self.has_text():
@@ -874,6 +856,10 @@ class ProfilePostsCommunityExclusion(models.Model):
         return super(ProfilePostsCommunityExclusion, self).save(*args, **kwargs)
 
 
+# The counters of the posts are not updated as their comments and reactions are deleted along with them
+track_deletions(Post)
+
+
 class PostMedia(OrderedModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media')
     order_with_respect_to = 'post'
@@ -899,7 +885,8 @@ class PostMedia(OrderedModel):
 
 
 class PostImage(models.Model):
-    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='image', null=True)
+    # The post that stored the image, the post media of other posts with the same image reference it too
+    post = models.OneToOneField(Post, on_delete=models.SET_NULL, related_name='image', null=True)
     image = ProcessedImageField(verbose_name=_('image'), storage=post_image_storage,
                                 upload_to=upload_to_post_image_directory,
                                 width_field='width',
@@ -908,7 +895,7 @@ class PostImage(models.Model):
                                 processors=[ResizeToFit(width=1024, upscale=False)])
     width = models.PositiveIntegerField(editable=False, null=False, blank=False)
     height = models.PositiveIntegerField(editable=False, null=False, blank=False)
-    hash = models.CharField(_('hash'), max_length=64, blank=False, null=True)
+    hash = models.CharField(_('hash'), max_length=64, blank=False, null=True, db_index=True)
     thumbnail = ProcessedImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
                                     upload_to=upload_to_post_image_directory,
                                     blank=False, null=True, format='JPEG', options={'quality': 30},
@@ -916,25 +903,82 @@ class PostImage(models.Model):
 
     media = GenericRelation(PostMedia)
 
+    @classmethod
+    def get_post_media_image_with_hash(cls, hash):
+        return cls.objects.filter(hash=hash, media__isnull=False).exclude(image='').order_by('pk').first()
+
     @classmethod
     def create_post_image(cls, image, post_id):
         hash = sha256sum(file=image.file)
         return cls.objects.create(image=image, post_id=post_id, hash=hash)
 
     @classmethod
-    def create_post_media_image(cls, image, post_id, order):
-        hash = sha256sum(file=image.file)
+    def create_post_media_image(cls, image, post_id, order, hash=None):
+        if hash is None:
+            hash = sha256sum(file=image.file)
         post_image = cls.objects.create(image=image, post_id=post_id, hash=hash, thumbnail=image)
         PostMedia.create_post_media(type=PostMedia.MEDIA_TYPE_IMAGE,
                                     content_object=post_image,
                                     post_id=post_id, order=order)
         return post_image
 
+    def delete_if_unreferenced(self):
+        """
+        Deletes the image if no post media references it anymore, and its files once the deletion is committed
+        """
+        with transaction.atomic():
+            # Locks the image so a post referencing it meanwhile is seen
+            post_image = PostImage.objects.select_for_update().filter(pk=self.pk).first()
+
+            if post_image is None or post_image.media.exists():
+                return False
+
+            files = [post_image_variant.image for post_image_variant in post_image.variants.all()]
+            files.extend((post_image.image, post_image.thumbnail))
+
+            post_image.delete()
+
+            # The rows survive a rollback of the outer transaction, their files have to as well
+            _delete_file_fields_on_commit(files)
+
+        return True
+
+
+class PostImageVariant(models.Model):
+    """
+    A variant of a post image in another size and format, see openbook_posts.image_variants
+    """
+    post_image = models.ForeignKey(PostImage, on_delete=models.CASCADE, related_name='variants')
+
+    FORMAT_JPEG = 'JPEG'
+    FORMAT_WEBP = 'WEBP'
+
+    FORMATS = (
+        (FORMAT_JPEG, 'JPEG'),
+        (FORMAT_WEBP, 'WebP'),
+    )
+
+    format = models.CharField(max_length=5, choices=FORMATS)
+    # The width of the variants setting the variant was made for, its width is lower for narrower images
+    requested_width = models.PositiveIntegerField(editable=False)
+    image = models.ImageField(_('image'), storage=post_image_storage, upload_to=upload_to_post_image_variant_directory,
+                              width_field='width', height_field='height', blank=False, null=False)
+    width = models.PositiveIntegerField(editable=False, null=False, blank=False)
+    height = models.PositiveIntegerField(editable=False, null=False, blank=False)
+
+    class Meta:
+        unique_together = ('post_image', 'format', 'requested_width',)
+
+    @classmethod
+    def create_post_image_variant(cls, post_image, format, requested_width, image):
+        return cls.objects.create(post_image=post_image, format=format, requested_width=requested_width, image=image)
+
 
 class PostVideo(models.Model):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='videos', null=True)
+    # The post that stored the video, the post media of other posts with the same video reference it too
+    post = models.ForeignKey(Post, on_delete=models.SET_NULL, related_name='videos', null=True)
 
-    hash = models.CharField(_('hash'), max_length=64, blank=False, null=True)
+    hash = models.CharField(_('hash'), max_length=64, blank=False, null=True, db_index=True)
 
     media = GenericRelation(PostMedia)
 
@@ -943,7 +987,7 @@ class PostVideo(models.Model):
     duration = models.FloatField(editable=False, null=True)
 
     file = VideoField(width_field='width', height_field='height',
-                      duration_field='duration', storage=post_image_storage,
+                      duration_field='duration', hash_field='hash', storage=post_image_storage,
                       upload_to=upload_to_post_video_directory, blank=False, null=True)
 
     format_set = GenericRelation(Format)
@@ -959,16 +1003,20 @@ class PostVideo(models.Model):
     thumbnail_height = models.PositiveIntegerField(editable=False, null=False, blank=False)
 
     @classmethod
-    def create_post_media_video(cls, file, post_id, order):
-        hash = sha256sum(file=file.file)
-        video_backend = get_backend()
-
-        if isinstance(file, InMemoryUploadedFile):
-            # If its in memory, doing read shouldn't be an issue as the file should be small.
-            in_disk_file = write_in_memory_file_to_disk(file)
-            thumbnail_path = video_backend.get_thumbnail(video_path=in_disk_file.name, at_time=0.0)
-        else:
-            thumbnail_path = video_backend.get_thumbnail(video_path=file.file.name, at_time=0.0)
+    def create_post_media_video(cls, file, post_id, order, hash=None, thumbnail_path=None):
+        if hash is None:
+            hash = sha256sum(file=file.file)
+
+        if thumbnail_path is None:
+            video_backend = get_backend()
+
+            if isinstance(file, InMemoryUploadedFile):
+                # If its in memory, doing read shouldn't be an issue as the file should be small.
+                in_disk_file = write_in_memory_file_to_disk(file)
+                thumbnail_path = video_backend.get_thumbnail(video_path=in_disk_file.name, at_time=0.0,
+                                                             video_hash=hash)
+            else:
+                thumbnail_path = video_backend.get_thumbnail(video_path=file.file.name, at_time=0.0, video_hash=hash)
 
         with open(thumbnail_path, 'rb+') as thumbnail_file:
             post_video = cls.objects.create(file=file, post_id=post_id, hash=hash, thumbnail=File(thumbnail_file), )
@@ -977,6 +1025,158 @@ class PostVideo(models.Model):
                                     post_id=post_id, order=order)
         return post_video
 
+    @classmethod
+    def get_post_media_video_with_hash(cls, hash):
+        return cls.objects.filter(hash=hash, media__isnull=False).exclude(file='').order_by('pk').first()
+
+    def delete_if_unreferenced(self):
+        """
+        Deletes the video and its renditions if no post media references it anymore, and their files once the
+        deletion is committed
+        """
+        with transaction.atomic():
+            # Locks the video so a post referencing it meanwhile is seen
+            post_video = PostVideo.objects.select_for_update().filter(pk=self.pk).first()
+
+            if post_video is None or post_video.media.exists():
+                return False
+
+            files = [video_format.file for video_format in post_video.format_set.all()]
+            files.extend((post_video.file, post_video.thumbnail))
+
+            post_video.delete()
+
+            # The rows survive a rollback of the outer transaction, their files have to as well
+            _delete_file_fields_on_commit(files)
+
+        return True
+
+
+def _delete_file_fields_on_commit(file_fields):
+    def delete_file_fields():
+        for file_field in file_fields:
+            delete_file_field(file_field)
+
+    if settings.POST_MEDIA_FILES_DELETION_ON_COMMIT:
+        transaction.on_commit(delete_file_fields)
+    else:
+        delete_file_fields()
+
+
+@receiver(post_delete, sender=PostMedia, dispatch_uid='delete_unreferenced_post_media_content')
+def delete_unreferenced_post_media_content(sender, instance=None, **kwargs):
+    """
+    Deletes the image or video of deleted post media, including the ones deleted in cascade, once no other post media
+    references it
+    """
+    content_object = instance.content_object
+
+    if content_object is not None:
+        content_object.delete_if_unreferenced()
+
+
+class PostMediaUpload(models.Model):
+    """
+    The raw file of a media added to a post, ingested into a post media in a job
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media_uploads')
+    file = models.FileField(_('file'), storage=post_image_storage, upload_to=upload_to_post_media_upload_directory,
+                            blank=False, null=True)
+    order = models.IntegerField(null=True)
+    created = models.DateTimeField(editable=False, default=timezone.now)
+    hash = models.CharField(_('hash'), max_length=64, blank=False, null=True)
+    mimetype = models.CharField(_('mimetype'), max_length=255, blank=False, null=True)
+
+    STATUS_PENDING = 'P'
+    STATUS_PROCESSING = 'PG'
+    STATUS_PROCESSED = 'D'
+    STATUS_FAILED = 'F'
+
+    STATUSES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_PROCESSED, 'Processed'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    status = models.CharField(blank=False, null=False, choices=STATUSES, default=STATUS_PENDING, max_length=2)
+
+    STAGE_SNIFF = 'S'
+    STAGE_HASH = 'H'
+    STAGE_CONVERT = 'C'
+    STAGE_THUMBNAIL = 'T'
+    STAGE_RESIZE = 'R'
+
+    STAGES = (
+        (STAGE_SNIFF, 'Sniff'),
+        (STAGE_HASH, 'Hash'),
+        (STAGE_CONVERT, 'Convert'),
+        (STAGE_THUMBNAIL, 'Thumbnail'),
+        (STAGE_RESIZE, 'Resize'),
+    )
+
+    stage = models.CharField(blank=False, null=True, choices=STAGES, max_length=2)
+    progress = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(_('error'), max_length=255, blank=False, null=True)
+    processing_started = models.DateTimeField(editable=False, null=True)
+
+    media = models.OneToOneField(PostMedia, on_delete=models.SET_NULL, related_name='upload', null=True)
+
+    @classmethod
+    def create_post_media_upload(cls, post, file, order=None, hash=None, mimetype=None):
+        return cls.objects.create(post=post, file=file, order=order, hash=hash, mimetype=mimetype)
+
+    @classmethod
+    def claim_post_media_upload_with_id(cls, post_media_upload_id):
+        """
+        Atomically claims the upload for ingestion if it's pending or stalled processing.
+        Returns whether it was claimed.
+        """
+        claimable_query = Q(status=cls.STATUS_PENDING)
+        claimable_query.add(Q(status=cls.STATUS_PROCESSING,
+                              processing_started__lt=cls._get_stalled_processing_started()), Q.OR)
+
+        return cls.objects.filter(claimable_query, pk=post_media_upload_id).update(
+            status=cls.STATUS_PROCESSING, processing_started=timezone.now()) > 0
+
+    @classmethod
+    def get_stalled_post_media_uploads(cls):
+        return cls.objects.filter(status=cls.STATUS_PROCESSING,
+                                  processing_started__lt=cls._get_stalled_processing_started())
+
+    @classmethod
+    def _get_stalled_processing_started(cls):
+        return timezone.now() - timedelta(seconds=settings.POST_MEDIA_UPLOAD_PROCESSING_TIMEOUT_SECONDS)
+
+    def start_processing(self):
+        self.status = PostMediaUpload.STATUS_PROCESSING
+        self.processing_started = timezone.now()
+        self.save(update_fields=['status', 'processing_started'])
+
+    def start_stage(self, stage):
+        stages = [stage for stage, stage_name in PostMediaUpload.STAGES]
+        self.stage = stage
+        self.progress = int(stages.index(stage) * 100 / len(stages))
+        self.save(update_fields=['stage', 'progress'])
+
+    def finish(self, post_media):
+        self.status = PostMediaUpload.STATUS_PROCESSED
+        self.progress = 100
+        self.media = post_media
+        self._delete_file()
+        self.save(update_fields=['status', 'progress', 'media', 'file'])
+
+    def fail(self, error):
+        self.status = PostMediaUpload.STATUS_FAILED
+        self.error = error[:255]
+        self._delete_file()
+        self.save(update_fields=['status', 'error', 'file'])
+
+    def _delete_file(self):
+        # The raw file is no longer needed once ingested
+        if self.file:
+            self.file.delete(save=False)
+
 
 class PostComment(models.Model):
     moderated_object = GenericRelation(ModeratedObject, related_query_name='post_comments')
@@ -994,8 +1194,11 @@ class PostComment(models.Model):
 
     @classmethod
     def create_comment(cls, text, commenter, post, parent_comment=None):
-        post_comment = PostComment.objects.create(text=text, commenter=commenter, post=post,
-                                                  parent_comment=parent_comment)
+        with transaction.atomic():
+            post_comment = PostComment.objects.create(text=text, commenter=commenter, post=post,
+                                                      parent_comment=parent_comment)
+            post_comment._update_post_counters(delta=1)
+
         post_comment.language = get_language_for_text(text)
         post_comment.save()
 
@@ -1007,6 +1210,16 @@ class PostComment(models.Model):
 
         return cls.objects.filter(count_query).count()
 
+    @classmethod
+    def count_post_counters_for_posts_with_ids(cls, posts_ids):
+        """
+        Counts from scratch the comments and unique commenters of the given posts, as held by their counters
+        """
+        counts = cls.objects.filter(post_id__in=posts_ids, is_deleted=False).values('post_id').annotate(
+            comments_count=Count('id'), commenters_count=Count('commenter_id', distinct=True)).order_by()
+
+        return {count['post_id']: count for count in counts}
+
     @classmethod
     def get_emoji_counts_for_post_comment_with_id(cls, post_comment_id, emoji_id=None, reactor_id=None):
         return Emoji.get_emoji_counts_for_post_comment_with_id(post_comment_id=post_comment_id, emoji_id=emoji_id,
@@ -1119,11 +1332,11 @@ class PostComment(models.Model):
 
     def _process_post_comment_hashtags(self):
         if not self.text:
-            self.hashtags.all().delete()
+            self.hashtags.clear()
         else:
             hashtags = extract_hashtags_from_string(string=self.text)
             if not hashtags:
-                self.hashtags.all().delete()
+                self.hashtags.clear()
             else:
                 existing_hashtags = []
                 for existing_hashtag in self.hashtags.only('id', 'name').all().iterator():
@@ -1146,15 +1359,39 @@ class PostComment(models.Model):
         self.language = get_language_for_text(text)
         self.save()
 
-    def soft_delete(self):
+    def soft_delete(self, delete_notifications=True):
+        with transaction.atomic():
+            # Only the request flipping the flag updates the counters
+            if PostComment.objects.filter(pk=self.pk, is_deleted=False).update(is_deleted=True):
+                self._update_post_counters(delta=-1)
         self.is_deleted = True
-        self.delete_notifications()
+        if delete_notifications:
+            self.delete_notifications()
         self.save()
 
     def unsoft_delete(self):
+        with transaction.atomic():
+            if PostComment.objects.filter(pk=self.pk, is_deleted=True).update(is_deleted=False):
+                self._update_post_counters(delta=1)
         self.is_deleted = False
         self.save()
 
+    def _update_post_counters(self, delta):
+        # The commenter is only counted once, by its first non deleted comment
+        commenter_has_other_comments = PostComment.objects.filter(post_id=self.post_id,
+                                                                  commenter_id=self.commenter_id,
+                                                                  is_deleted=False).exclude(pk=self.pk).exists()
+
+        Post.update_counters_for_post_with_id(self.post_id, comments_count=delta,
+                                              commenters_count=0 if commenter_has_other_comments else delta)
+
+        if delta < 0:
+            remove_trending_post_engagement(post_id=self.post_id, weight=settings.TRENDING_POSTS_COMMENT_WEIGHT,
+                                            created=self.created)
+        elif self.post.community_id:
+            add_trending_post_engagement(post_id=self.post_id, weight=settings.TRENDING_POSTS_COMMENT_WEIGHT,
+                                         created=self.created)
+
     def delete_notifications(self):
         # Delete all post comment notifications
         PostCommentNotification = get_post_comment_notification_model()
@@ -1206,6 +1443,14 @@ class PostComment(models.Model):
             post_comment_user_mention__post_comment__post_id=self.pk,
             notification__owner_id=user.pk).delete()
 
+@receiver(post_delete, sender=PostComment, dispatch_uid='remove_post_comment_from_post_counters')
+def remove_post_comment_from_post_counters(sender, instance=None, **kwargs):
+    """
+    Remove deleted comments from their post counters, including the ones deleted in cascade unless along with the post
+    """
+    if not instance.is_deleted and not is_being_deleted(Post, instance.post_id):
+        instance._update_post_counters(delta=-1)
+
 
 class PostReaction(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions')
@@ -1218,7 +1463,16 @@ class PostReaction(models.Model):
 
     @classmethod
     def create_reaction(cls, reactor, emoji_id, post):
-        return PostReaction.objects.create(reactor=reactor, emoji_id=emoji_id, post=post)
+        with transaction.atomic():
+            post_reaction = PostReaction.objects.create(reactor=reactor, emoji_id=emoji_id, post=post)
+            Post.update_counters_for_post_with_id(post.pk, reactions_count=1)
+            PostReactionEmojiCount.increment_count_for_post_with_id(post_id=post.pk, emoji_id=emoji_id)
+
+        if post.community_id:
+            add_trending_post_engagement(post_id=post.pk, weight=settings.TRENDING_POSTS_REACTION_WEIGHT,
+                                         created=post_reaction.created)
+
+        return post_reaction
 
     @classmethod
     def count_reactions_for_post_with_id(cls, post_id, reactor_id=None):
@@ -1229,6 +1483,19 @@ class PostReaction(models.Model):
 
         return cls.objects.filter(count_query).count()
 
+    def update_emoji(self, emoji_id):
+        with transaction.atomic():
+            previous_emoji_id = self.emoji_id
+
+            # Only the request actually changing the emoji moves the counts
+            if PostReaction.objects.filter(pk=self.pk, emoji_id=previous_emoji_id).exclude(
+                    emoji_id=emoji_id).update(emoji_id=emoji_id):
+                PostReactionEmojiCount.decrement_count_for_post_with_id(post_id=self.post_id,
+                                                                        emoji_id=previous_emoji_id)
+                PostReactionEmojiCount.increment_count_for_post_with_id(post_id=self.post_id, emoji_id=emoji_id)
+
+        self.emoji_id = emoji_id
+
     def save(self, *args, **kwargs):
         ''' On save, update timestamps '''
         if not self.id:
@@ -1236,6 +1503,115 @@ class PostReaction(models.Model):
         return super(PostReaction, self).save(*args, **kwargs)
 
 
+class PostReactionEmojiCount(models.Model):
+    """
+    The amount of reactions of a post with an emoji, kept up to date by the post reactions create/delete paths
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions_emoji_counts')
+    emoji = models.ForeignKey(Emoji, on_delete=models.CASCADE, related_name='post_reactions_counts')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'emoji',)
+
+    @classmethod
+    def increment_count_for_post_with_id(cls, post_id, emoji_id):
+        if cls.objects.filter(post_id=post_id, emoji_id=emoji_id).update(count=F('count') + 1):
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(post_id=post_id, emoji_id=emoji_id, count=1)
+        except IntegrityError:
+            # Created concurrently
+            cls.objects.filter(post_id=post_id, emoji_id=emoji_id).update(count=F('count') + 1)
+
+    @classmethod
+    def decrement_count_for_post_with_id(cls, post_id, emoji_id):
+        # Rows are kept at zero rather than deleted so they don't race with the increments
+        cls.objects.filter(post_id=post_id, emoji_id=emoji_id, count__gt=0).update(count=F('count') - 1)
+
+    @classmethod
+    def reconcile_counts_for_posts_with_ids(cls, posts_ids):
+        """
+        Recounts from scratch the emoji counts of the given posts, returns the ids of the posts that were repaired
+        """
+        counts = PostReaction.objects.filter(post_id__in=posts_ids).values('post_id', 'emoji_id').annotate(
+            reactions_count=Count('id')).order_by()
+
+        counts = {(count['post_id'], count['emoji_id']): count['reactions_count'] for count in counts}
+
+        repaired_posts_ids = set()
+        emoji_counts_to_create = []
+
+        for emoji_count in cls.objects.filter(post_id__in=posts_ids):
+            count = counts.pop((emoji_count.post_id, emoji_count.emoji_id), 0)
+            if emoji_count.count != count:
+                cls.objects.filter(pk=emoji_count.pk).update(count=count)
+                repaired_posts_ids.add(emoji_count.post_id)
+
+        for (post_id, emoji_id), count in counts.items():
+            emoji_counts_to_create.append(cls(post_id=post_id, emoji_id=emoji_id, count=count))
+            repaired_posts_ids.add(post_id)
+
+        cls.objects.bulk_create(emoji_counts_to_create)
+
+        return repaired_posts_ids
+
+    @classmethod
+    def get_emoji_counts_for_post_with_id(cls, post_id, emoji_id=None):
+        return cls.get_emoji_counts_for_posts_with_ids(posts_ids=[post_id], emoji_id=emoji_id).get(post_id, [])
+
+    @classmethod
+    def get_emoji_counts_for_posts_with_ids(cls, posts_ids, emoji_id=None, excluded_reactions_query=None):
+        """
+        Returns the emoji counts of the given posts by post id, most used first.
+        The reactions matching the excluded_reactions_query are taken out of the counts.
+        """
+        posts_query = Q(post_id__in=posts_ids)
+
+        if emoji_id:
+            posts_query.add(Q(emoji_id=emoji_id), Q.AND)
+
+        emoji_counts = list(cls.objects.select_related('emoji').filter(posts_query, count__gt=0))
+
+        if excluded_reactions_query is not None:
+            excluded_reactions_counts = PostReaction.objects.filter(posts_query & excluded_reactions_query).values(
+                'post_id', 'emoji_id').annotate(reactions_count=Count('id')).order_by()
+
+            excluded_counts = {(excluded_reactions_count['post_id'], excluded_reactions_count['emoji_id']):
+                                   excluded_reactions_count['reactions_count'] for excluded_reactions_count in
+                               excluded_reactions_counts}
+
+            for emoji_count in emoji_counts:
+                emoji_count.count -= excluded_counts.get((emoji_count.post_id, emoji_count.emoji_id), 0)
+
+        emoji_counts_by_post_id = {}
+
+        for emoji_count in sorted(emoji_counts, key=lambda emoji_count: -emoji_count.count):
+            if emoji_count.count <= 0:
+                continue
+            emoji_counts_by_post_id.setdefault(emoji_count.post_id, []).append({
+                'emoji': emoji_count.emoji,
+                'count': emoji_count.count
+            })
+
+        return emoji_counts_by_post_id
+
+@receiver(post_delete, sender=PostReaction, dispatch_uid='remove_post_reaction_from_post_counters')
+def remove_post_reaction_from_post_counters(sender, instance=None, **kwargs):
+    """
+    Remove deleted reactions from their post counters, including the ones deleted in cascade unless along with the post
+    """
+    if is_being_deleted(Post, instance.post_id):
+        return
+
+    Post.update_counters_for_post_with_id(instance.post_id, reactions_count=-1)
+    PostReactionEmojiCount.decrement_count_for_post_with_id(post_id=instance.post_id, emoji_id=instance.emoji_id)
+    remove_trending_post_engagement(post_id=instance.post_id, weight=settings.TRENDING_POSTS_REACTION_WEIGHT,
+                                    created=instance.created)
+
+
 class PostCommentReaction(models.Model):
     post_comment = models.ForeignKey(PostComment, on_delete=models.CASCADE, related_name='reactions')
     created = models.DateTimeField(editable=False)
@@ -1274,7 +1650,9 @@ class PostMute(models.Model):
 
     @classmethod
     def create_post_mute(cls, post_id, muter_id):
-        return cls.objects.create(post_id=post_id, muter_id=muter_id)
+        post_mute = cls.objects.create(post_id=post_id, muter_id=muter_id)
+        invalidate_notifications_preferences_for_user_with_id(user_id=muter_id)
+        return post_mute
 
 
 class PostCommentMute(models.Model):
@@ -1320,7 +1698,8 @@ class PostUserMention(models.Model):
         post_user_mention = cls.objects.create(user=user, post=post)
         PostUserMentionNotification = get_post_user_mention_notification_model()
         PostUserMentionNotification.create_post_user_mention_notification(post_user_mention_id=post_user_mention.pk,
-                                                                          owner_id=user.pk)
+                                                                          owner_id=user.pk,
+                                                                          post_id=post.pk)
         send_post_user_mention_push_notification(post_user_mention=post_user_mention)
         return post_user_mention
 
@@ -1338,6 +1717,7 @@ class PostCommentUserMention(models.Model):
         PostCommentUserMentionNotification = get_post_comment_user_mention_notification_model()
         PostCommentUserMentionNotification.create_post_comment_user_mention_notification(
             post_comment_user_mention_id=post_comment_user_mention.pk,
-            owner_id=user.pk)
+            owner_id=user.pk,
+            post_id=post_comment.post_id)
         send_post_comment_user_mention_push_notification(post_comment_user_mention=post_comment_user_mention)
         return post_comment_user_mention
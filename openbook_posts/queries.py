@@ -1,7 +1,7 @@
 from django.db.models import Q
 
 from openbook_common.utils.model_loaders import get_post_model, get_moderated_object_model, get_community_model, \
-    get_circle_model
+    get_circle_model, get_user_block_model, get_community_membership_model
 
 
 def make_only_posts_with_max_id(max_id):
@@ -70,6 +70,51 @@ def make_exclude_blocked_community_posts_for_user_and_community_with_ids(user_id
     return blocked_users_query
 
 
+def make_only_blocked_users_ids_for_user_with_id_query(user_id, users_ids_field, community_id=None):
+    """
+    Matches the rows whose users_ids_field is a user blocked by or blocking the given user. If a community is given,
+    its staff members are never matched.
+    """
+    UserBlock = get_user_block_model()
+
+    blocked_users_query = Q(**{
+        '%s__in' % users_ids_field: UserBlock.objects.filter(blocker_id=user_id).values('blocked_user_id')})
+    blocked_users_query.add(Q(**{
+        '%s__in' % users_ids_field: UserBlock.objects.filter(blocked_user_id=user_id).values('blocker_id')}), Q.OR)
+
+    if community_id:
+        CommunityMembership = get_community_membership_model()
+        community_staff_members = CommunityMembership.objects.filter(
+            Q(is_administrator=True) | Q(is_moderator=True), community_id=community_id).values('user_id')
+
+        blocked_users_query = blocked_users_query & ~Q(**{'%s__in' % users_ids_field: community_staff_members})
+
+    return blocked_users_query
+
+
+def make_only_excluded_post_comments_for_user_with_id_query(user_id, community_id=None, is_community_staff=False):
+    """
+    Matches the comments held by the post comments counter that should not be counted for the given user
+    """
+    # Items we have reported
+    excluded_comments_query = Q(moderated_object__reports__reporter_id=user_id)
+
+    if community_id:
+        # Items that have been reported and approved by community moderators
+        ModeratedObject = get_moderated_object_model()
+        excluded_comments_query.add(Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.OR)
+
+    if not community_id or not is_community_staff:
+        # Comments of users blocked by or blocking the authenticated user, on communities only if they're not staff
+        excluded_comments_query.add(make_only_blocked_users_ids_for_user_with_id_query(user_id=user_id,
+                                                                                       users_ids_field='commenter_id',
+                                                                                       community_id=community_id),
+                                    Q.OR)
+
+    # Soft deleted items are not held by the counter
+    return Q(is_deleted=False) & excluded_comments_query
+
+
 def make_only_visible_community_posts_for_user_with_id_query(user_id):
     # Ensure public/private visibility is respected
     community_posts_visibility_query = Q(community__memberships__user__id=user_id)
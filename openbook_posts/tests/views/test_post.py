@@ -14,6 +14,7 @@ from django.core.files.images import ImageFile
 from django.core.files import File
 from django.core.cache import cache
 from django.conf import settings
+from django.test import override_settings
 from unittest import mock
 
 import logging
@@ -31,6 +32,7 @@ from openbook_common.utils.model_loaders import get_language_model, get_communit
 from openbook_communities.models import Community
 from openbook_hashtags.models import Hashtag
 from openbook_notifications.models import PostUserMentionNotification, Notification
+from openbook_posts.jobs import purge_post_notifications
 from openbook_posts.models import Post, PostUserMention, PostMedia
 from openbook_common.models import ProxyBlacklistedDomain
 
@@ -1984,6 +1986,51 @@ class PostCloseAPITests(OpenbookAPITestCase):
         self.assertFalse(CommunityNewPostNotification.objects.filter(notification__owner_id=community_member.pk,
                                                                     post_id=post.pk).exists())
 
+    def test_close_post_purges_notifications_beyond_the_purge_chunk_size_in_a_job(self):
+        """
+         should delete a chunk of the notifications of a closed post right away and the rest in a job
+        """
+        community_post_creator = make_user()
+        admin = make_user()
+        community = make_community(admin)
+
+        community_post_creator.join_community_with_name(community_name=community.name)
+        admin.enable_new_post_notifications_for_community_with_name(community_name=community.name)
+
+        community_members = []
+
+        for i in range(0, 5):
+            community_member = make_user()
+            community_member.join_community_with_name(community_name=community.name)
+            community_member.enable_new_post_notifications_for_community_with_name(community_name=community.name)
+            community_members.append(community_member)
+
+        post = community_post_creator.create_community_post(community.name, text=make_fake_post_text())
+
+        for community_member in community_members:
+            self.assertEqual(community_member.count_unread_notifications(), 1)
+
+        url = self._get_url(post)
+        headers = make_authentication_headers_for_user(admin)
+
+        with override_settings(POST_NOTIFICATIONS_PURGE_CHUNK_SIZE=2):
+            # close post
+            self.client.post(url, **headers)
+
+            self.assertEqual(Notification.objects.filter(post_id=post.pk, owner__in=community_members).count(), 3)
+
+            purge_post_notifications(post_id=post.pk, excluded_owners_ids=[admin.pk, community_post_creator.pk])
+
+        CommunityNewPostNotification = get_community_new_post_notification_model()
+
+        self.assertFalse(Notification.objects.filter(post_id=post.pk, owner__in=community_members).exists())
+        self.assertFalse(CommunityNewPostNotification.objects.filter(post_id=post.pk).exclude(
+            notification__owner_id=admin.pk).exists())
+        self.assertTrue(Notification.objects.filter(post_id=post.pk, owner_id=admin.pk).exists())
+
+        for community_member in community_members:
+            self.assertEqual(community_member.count_unread_notifications(), 0)
+
     def _get_url(self, post):
         return reverse('close-post', kwargs={
             'post_uuid': post.uuid
@@ -2799,6 +2846,43 @@ class PublishPostAPITests(OpenbookAPITestCase):
                 self.assertEqual(post_media_video.height, test_file['height'])
                 self.assertTrue(post_media_video.format_set.exists())
 
+    def test_publishing_draft_video_post_should_not_upscale_renditions(self):
+        """
+        should only encode the renditions up to the height of the video, and the lowest one regardless
+        """
+        user = make_user()
+
+        headers = make_authentication_headers_for_user(user)
+
+        test_videos = get_test_videos()
+        test_video = min(test_videos, key=lambda test_video: test_video['height'])
+
+        with open(test_video['path'], 'rb') as file:
+            post = user.create_public_post(video=File(file), is_draft=True)
+
+        url = self._get_url(post=post)
+
+        response = self.client.post(url, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Run the process and the renditions encodings handled by a worker
+        get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.status, Post.STATUS_PUBLISHED)
+
+        post_media_video = post.media.get(type=PostMedia.MEDIA_TYPE_VIDEO).content_object
+
+        lowest_format = min(settings.VIDEO_ENCODING_FORMATS['FFmpeg'], key=lambda options: options['height'])
+
+        self.assertEqual(list(post_media_video.format_set.values_list('format', flat=True)), [lowest_format['name']])
+
+        video_format = post_media_video.format_set.get()
+        self.assertEqual(video_format.progress, 100)
+        self.assertTrue(video_format.height <= test_video['height'])
+
     def test_can_publish_draft_text_post(self):
         """
         should be able to publish a draft text post and return 200
@@ -2963,6 +3047,41 @@ class PublishPostAPITests(OpenbookAPITestCase):
         hashtag = Hashtag.objects.get(name=hashtag_name)
         self.assertTrue(hashtag.has_image())
 
+    def test_publishing_image_post_with_new_hashtag_should_reference_image(self):
+        """
+        when publishing a publicly visible post with a new hashtag, the hashtag should reference the stored image
+        """
+        user = make_user()
+
+        headers = make_authentication_headers_for_user(user)
+
+        image = Image.new('RGB', (100, 100))
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file)
+        tmp_file.seek(0)
+
+        hashtag_name = make_hashtag_name()
+
+        post_text = '#%s' % hashtag_name
+
+        post = user.create_public_post(text=post_text, image=ImageFile(tmp_file), is_draft=True)
+
+        url = self._get_url(post=post)
+
+        response = self.client.post(url, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Run the process handled by a worker
+        get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+        post_image = post.get_first_media_image().content_object
+
+        hashtag = Hashtag.objects.get(name=hashtag_name)
+        self.assertFalse(hashtag.image)
+        self.assertEqual(hashtag.cover_post_image_id, post_image.pk)
+        self.assertEqual(hashtag.get_image().name, post_image.image.name)
+
     def _get_url(self, post):
         return reverse('publish-post', kwargs={
             'post_uuid': post.uuid
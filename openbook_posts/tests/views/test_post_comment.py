@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models.signals import pre_delete
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
@@ -14,7 +16,7 @@ from openbook_communities.models import Community
 from openbook_hashtags.models import Hashtag
 from openbook_notifications.models import PostCommentNotification, Notification, PostCommentReplyNotification, \
     PostCommentUserMentionNotification
-from openbook_posts.models import PostComment, PostCommentUserMention
+from openbook_posts.models import Post, PostComment, PostCommentUserMention
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -2156,6 +2158,118 @@ class PostCommentItemAPITests(OpenbookAPITestCase):
         self.assertTrue(post_comment_reply.text == original_post_comment_reply_text)
         self.assertFalse(post_comment_reply.is_edited)
 
+    def test_deleting_comment_updates_post_comments_counters(self):
+        """
+        should remove the comment and its replies from the post comments counters when deleting a comment
+        """
+        user = make_user()
+        commenter = make_user()
+        replier = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        user.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        post_comment = commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        replier.reply_to_comment_with_id_for_post_with_uuid(post_comment_id=post_comment.pk, post_uuid=post.uuid,
+                                                            text=make_fake_post_comment_text())
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(post.commenters_count, 3)
+
+        url = self._get_url(post_comment=post_comment, post=post)
+
+        headers = make_authentication_headers_for_user(commenter)
+        response = self.client.delete(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.commenters_count, 1)
+
+    def test_deleting_commenters_updates_post_comments_counters(self):
+        """
+        should remove the comments of deleted users from the counters of the posts, but not of the posts deleted along
+        """
+        user = make_user()
+        commenter = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+        commenter_post = commenter.create_public_post(text=make_fake_post_text())
+
+        user.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        commenter.comment_post_with_id(commenter_post.pk, text=make_fake_post_comment_text())
+
+        commenter.delete()
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.commenters_count, 1)
+        self.assertFalse(Post.objects.filter(pk=commenter_post.pk).exists())
+
+    def test_failed_post_deletion_does_not_stop_its_comments_counters(self):
+        """
+        should keep updating the comments counters of a post whose deletion failed
+        """
+        user = make_user()
+        commenter = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        user.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        post_comment = commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+
+        def fail_deletion(**kwargs):
+            raise Exception('Failed to delete')
+
+        pre_delete.connect(fail_deletion, sender=Post, dispatch_uid='test_fail_post_deletion')
+
+        try:
+            with self.assertRaises(Exception), transaction.atomic():
+                post.delete()
+        finally:
+            pre_delete.disconnect(sender=Post, dispatch_uid='test_fail_post_deletion')
+
+        post_comment.delete()
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.commenters_count, 1)
+
+    def test_soft_deleting_comment_updates_post_comments_counters(self):
+        """
+        should remove soft deleted comments from the post comments counters and add them back when restored
+        """
+        user = make_user()
+        commenter = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        post_comment = commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+
+        post_comment.soft_delete()
+        # Soft deleting twice should not count twice
+        post_comment.soft_delete()
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.commenters_count, 1)
+
+        post_comment.unsoft_delete()
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(post.commenters_count, 1)
+
     def _get_url(self, post, post_comment):
         return reverse('post-comment', kwargs={
             'post_uuid': post.uuid,
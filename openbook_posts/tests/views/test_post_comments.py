@@ -2057,6 +2057,27 @@ class PostCommentsAPITests(OpenbookAPITestCase):
         for post_id in post_comments_ids:
             self.assertIn(post_id, response_post_comments_ids)
 
+    def test_commenting_updates_post_comments_counters(self):
+        """
+        should increment the post comments count and only count once every commenter when commenting
+        """
+        user = make_user()
+        commenter = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        url = self._get_url(post)
+
+        for post_commenter in [user, commenter, commenter]:
+            headers = make_authentication_headers_for_user(post_commenter)
+            data = self._get_create_post_comment_request_data(make_fake_post_comment_text())
+            response = self.client.put(url, data, **headers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(post.commenters_count, 2)
+
     def _get_create_post_comment_request_data(self, post_comment_text):
         return {
             'text': post_comment_text
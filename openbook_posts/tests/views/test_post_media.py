@@ -1,15 +1,21 @@
 # Create your tests here.
 import json
 import tempfile
+from datetime import timedelta
+from unittest import mock
 
 from PIL import Image
 from django.conf import settings
+from django.core.cache import caches
 from django.core.files import File
 from django.urls import reverse
+from django.utils import timezone
 from django_rq import get_worker
 from faker import Faker
 from rest_framework import status
 from rq import SimpleWorker
+from video_encoding.backends.ffmpeg import FFmpegBackend
+from video_encoding.media_info import MEDIA_INFO_CACHE_KEY, get_file_hash
 
 from openbook_common.tests.models import OpenbookAPITestCase
 import random
@@ -19,7 +25,8 @@ import logging
 from openbook_common.tests.helpers import make_authentication_headers_for_user, make_fake_post_text, \
     make_user, get_test_videos, get_test_image, get_test_video, make_circle, make_community, get_test_images
 from openbook_communities.models import Community
-from openbook_posts.models import PostMedia, Post
+from openbook_posts.jobs import ingest_post_media_upload
+from openbook_posts.models import PostMedia, Post, PostMediaUpload, PostImage
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -130,6 +137,209 @@ class PostMediaAPITests(OpenbookAPITestCase):
 
                 self.assertTrue(hasattr(post_video, 'file'))
 
+    def test_adding_media_records_processed_upload(self):
+        """
+        should record the upload of an added media as processed and discard its raw file
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        draft_post = user.create_public_post(is_draft=True)
+
+        image = Image.new('RGB', (100, 100))
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file)
+        tmp_file.seek(0)
+
+        data = {
+            'file': tmp_file
+        }
+
+        url = self._get_url(post=draft_post)
+
+        response = self.client.put(url, data, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        post_media_upload = draft_post.media_uploads.get()
+
+        self.assertEqual(post_media_upload.status, PostMediaUpload.STATUS_PROCESSED)
+        self.assertEqual(post_media_upload.progress, 100)
+        self.assertEqual(post_media_upload.media, draft_post.media.get())
+        self.assertFalse(post_media_upload.file)
+
+        url = self._get_uploads_url(post=draft_post)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_uploads = json.loads(response.content)
+
+        self.assertEqual(len(response_uploads), 1)
+        self.assertEqual(response_uploads[0]['id'], post_media_upload.pk)
+        self.assertEqual(response_uploads[0]['status'], PostMediaUpload.STATUS_PROCESSED)
+
+    def test_adding_unsupported_media_records_no_upload(self):
+        """
+        should not keep the upload of an unsupported media
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        draft_post = user.create_public_post(is_draft=True)
+
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        tmp_file.write(fake.text().encode())
+        tmp_file.seek(0)
+
+        data = {
+            'file': tmp_file
+        }
+
+        url = self._get_url(post=draft_post)
+
+        response = self.client.put(url, data, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(draft_post.media_uploads.exists())
+        self.assertFalse(draft_post.has_media())
+
+    def test_ingests_stalled_media_uploads_again(self):
+        """
+        should ingest again the uploads whose ingestion stalled, but not the ones still being ingested
+        """
+        user = make_user()
+
+        draft_post = user.create_public_post(is_draft=True)
+
+        image = Image.new('RGB', (100, 100))
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file)
+        tmp_file.seek(0)
+
+        post_media_upload = PostMediaUpload.create_post_media_upload(post=draft_post, file=File(tmp_file))
+        post_media_upload.start_processing()
+
+        ingest_post_media_upload(post_media_upload_id=post_media_upload.pk)
+
+        post_media_upload.refresh_from_db()
+        self.assertEqual(post_media_upload.status, PostMediaUpload.STATUS_PROCESSING)
+
+        PostMediaUpload.objects.filter(pk=post_media_upload.pk).update(
+            processing_started=timezone.now() - timedelta(
+                seconds=settings.POST_MEDIA_UPLOAD_PROCESSING_TIMEOUT_SECONDS + 1))
+
+        ingest_post_media_upload(post_media_upload_id=post_media_upload.pk)
+
+        post_media_upload.refresh_from_db()
+        self.assertEqual(post_media_upload.status, PostMediaUpload.STATUS_PROCESSED)
+        self.assertTrue(draft_post.has_media())
+
+    def test_cant_retrieve_foreign_post_media_uploads(self):
+        """
+        should not be able to retrieve the media uploads of a post of someone else
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        foreign_user = make_user()
+        draft_post = foreign_user.create_public_post(is_draft=True)
+
+        url = self._get_uploads_url(post=draft_post)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_adding_stored_media_references_it(self):
+        """
+        should reference the image already stored with the same hash, and only delete it once no post references it
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        image = Image.new('RGB', (100, 100))
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file)
+
+        draft_posts = [user.create_public_post(is_draft=True) for i in range(0, 2)]
+
+        for draft_post in draft_posts:
+            tmp_file.seek(0)
+
+            data = {
+                'file': tmp_file
+            }
+
+            url = self._get_url(post=draft_post)
+
+            response = self.client.put(url, data, **headers, format='multipart')
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        first_post_image = draft_posts[0].media.get().content_object
+        second_post_image = draft_posts[1].media.get().content_object
+
+        self.assertEqual(first_post_image.pk, second_post_image.pk)
+        self.assertEqual(PostImage.objects.filter(hash=first_post_image.hash).count(), 1)
+
+        draft_posts[1].refresh_from_db()
+        self.assertTrue(draft_posts[1].media_thumbnail)
+
+        draft_posts[0].delete()
+
+        self.assertTrue(PostImage.objects.filter(pk=first_post_image.pk).exists())
+        self.assertTrue(first_post_image.image.storage.exists(first_post_image.image.name))
+
+        draft_posts[1].delete()
+
+        self.assertFalse(PostImage.objects.filter(pk=first_post_image.pk).exists())
+        self.assertFalse(first_post_image.image.storage.exists(first_post_image.image.name))
+
+    def test_add_media_image_creates_image_variants(self):
+        """
+        should create the variants of an added media image up to its width, in every format
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        draft_post = user.create_public_post(is_draft=True)
+
+        image_width = 700
+
+        image = Image.new('RGB', (image_width, 400))
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file)
+        tmp_file.seek(0)
+
+        data = {
+            'file': tmp_file
+        }
+
+        url = self._get_url(post=draft_post)
+
+        response = self.client.put(url, data, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        post_image = draft_post.media.get().content_object
+
+        expected_widths = [width for width in settings.POST_IMAGE_VARIANTS_WIDTHS if width <= image_width]
+
+        for variant_format in settings.POST_IMAGE_VARIANTS_FORMATS:
+            self.assertEqual(sorted(post_image.variants.filter(format=variant_format).values_list('width', flat=True)),
+                             sorted(expected_widths))
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_media = json.loads(response.content)
+
+        self.assertEqual(len(response_media[0]['content_object']['variants']),
+                         len(expected_widths) * len(settings.POST_IMAGE_VARIANTS_FORMATS))
+
     def test_cant_add_media_image_to_published_post(self):
         """
         should not be able to add a media image to a published post
@@ -217,6 +427,35 @@ class PostMediaAPITests(OpenbookAPITestCase):
                 self.assertIsNotNone(post.media_width)
                 self.assertIsNotNone(post.media_height)
 
+    def test_add_media_video_probes_it_once(self):
+        """
+        should probe a video added as media only once, for its dimensions, duration and thumbnail
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user=user)
+
+        test_video = get_test_video()
+
+        caches[settings.VIDEO_ENCODING_MEDIA_INFO_CACHE].delete(
+            MEDIA_INFO_CACHE_KEY.format(hash=get_file_hash(test_video['path'])))
+
+        post = user.create_public_post(is_draft=True)
+
+        url = self._get_url(post=post)
+
+        with mock.patch.object(FFmpegBackend, '_probe_media_info', autospec=True,
+                               side_effect=FFmpegBackend._probe_media_info) as probe_media_info:
+            with open(test_video['path'], 'rb') as file:
+                response = self.client.put(url, {'file': file}, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(probe_media_info.call_count, 1)
+
+        post_video = post.get_first_media().content_object
+
+        self.assertEqual(post_video.width, test_video['width'])
+        self.assertEqual(post_video.height, test_video['height'])
+
     def test_add_first_media_image_creates_media_thumbnail_and_dimensions(self):
         """
         should create a post media_thumbnail and dimensions when adding the first media image
@@ -906,3 +1145,8 @@ class PostMediaAPITests(OpenbookAPITestCase):
         return reverse('post-media', kwargs={
             'post_uuid': post.uuid
         })
+
+    def _get_uploads_url(self, post):
+        return reverse('post-media-uploads', kwargs={
+            'post_uuid': post.uuid
+        })
@@ -10,7 +10,7 @@ from openbook_common.tests.helpers import make_authentication_headers_for_user,
     make_fake_post_comment_text, make_user, make_circle, make_emoji, make_reactions_emoji_group, \
     make_community
 from openbook_notifications.models import PostReactionNotification, Notification
-from openbook_posts.models import PostReaction
+from openbook_posts.models import PostReaction, PostReactionEmojiCount
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -432,6 +432,36 @@ class PostReactionItemAPITests(OpenbookAPITestCase):
         self.assertFalse(PostReactionNotification.objects.filter(pk=post_reaction_notification.pk).exists())
         self.assertFalse(Notification.objects.filter(pk=notification.pk).exists())
 
+    def test_deleting_reaction_updates_post_reactions_counters(self):
+        """
+        should decrement the post reactions count and the reaction emoji count when deleting a reaction
+        """
+        user = make_user()
+
+        reactor = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+
+        post_reaction_emoji_id = make_emoji(group=emoji_group).pk
+
+        user.react_to_post_with_id(post.pk, emoji_id=post_reaction_emoji_id, )
+        post_reaction = reactor.react_to_post_with_id(post.pk, emoji_id=post_reaction_emoji_id, )
+
+        url = self._get_url(post_reaction=post_reaction, post=post)
+
+        headers = make_authentication_headers_for_user(reactor)
+        response = self.client.delete(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.reactions_count, 1)
+        self.assertEqual(PostReactionEmojiCount.objects.get(post_id=post.pk, emoji_id=post_reaction_emoji_id).count,
+                         1)
+
     def _get_url(self, post, post_reaction):
         return reverse('post-reaction', kwargs={
             'post_uuid': post.uuid,
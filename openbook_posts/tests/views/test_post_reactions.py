@@ -1,5 +1,6 @@
 # Create your tests here.
 import json
+from django.test import override_settings
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
@@ -9,8 +10,8 @@ import logging
 from openbook_common.tests.helpers import make_authentication_headers_for_user, make_fake_post_text, \
     make_fake_post_comment_text, make_user, make_circle, make_emoji, make_emoji_group, make_reactions_emoji_group, \
     make_community
-from openbook_notifications.models import PostReactionNotification
-from openbook_posts.models import PostReaction
+from openbook_notifications.models import PostReactionNotification, Notification
+from openbook_posts.models import PostReaction, PostReactionEmojiCount
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -582,6 +583,164 @@ class PostReactionsAPITests(OpenbookAPITestCase):
         self.assertFalse(PostReactionNotification.objects.filter(post_reaction__emoji__id=post_reaction_emoji_id,
                                                                  notification__owner=user).exists())
 
+    def test_reacting_in_foreign_post_aggregates_notifications(self):
+        """
+         should aggregate the notifications of the reactions to a post into one holding their count and latest reactors
+         """
+        user = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        post_reaction_emoji_id = make_emoji(group=emoji_group).pk
+
+        data = self._get_create_post_reaction_request_data(post_reaction_emoji_id, emoji_group.pk)
+        url = self._get_url(post)
+
+        reactors = [make_user() for i in range(0, 4)]
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS=60 * 60,
+                               NOTIFICATIONS_AGGREGATION_MAX_LATEST_ACTORS=3):
+            for reactor in reactors:
+                headers = make_authentication_headers_for_user(reactor)
+                self.client.put(url, data, **headers)
+
+        notifications = Notification.objects.filter(owner=user, notification_type=Notification.POST_REACTION)
+
+        self.assertEqual(notifications.count(), 1)
+        self.assertEqual(PostReactionNotification.objects.filter(post_reaction__post=post).count(), 1)
+
+        notification = notifications.get()
+
+        self.assertEqual(notification.aggregated_count, 4)
+        self.assertEqual(notification.get_latest_actors_ids(), [reactor.pk for reactor in reversed(reactors[1:])])
+        self.assertEqual(notification.content_object.post_reaction.reactor_id, reactors[-1].pk)
+        self.assertEqual(user.count_unread_notifications(), 1)
+
+    def test_removing_aggregated_reaction_keeps_the_notification_of_the_other_reactions(self):
+        """
+         should point an aggregated notification to another reaction when its reaction is removed
+         """
+        user = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        post_reaction_emoji_id = make_emoji(group=emoji_group).pk
+
+        reactors = [make_user() for i in range(0, 3)]
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS=60 * 60):
+            post_reactions = [reactor.react_to_post(post=post, emoji_id=post_reaction_emoji_id) for reactor in
+                              reactors]
+
+        reactors[-1].delete_reaction_with_id_for_post_with_id(post_reaction_id=post_reactions[-1].pk,
+                                                              post_id=post.pk)
+
+        notification = Notification.objects.get(owner=user, notification_type=Notification.POST_REACTION)
+
+        self.assertEqual(notification.aggregated_count, 2)
+        self.assertEqual(notification.get_latest_actors_ids(), [reactors[1].pk, reactors[0].pk])
+        self.assertEqual(notification.content_object.post_reaction_id, post_reactions[1].pk)
+
+    def test_removing_earlier_aggregated_reaction_drops_its_reactor(self):
+        """
+         should drop the reactor of a removed reaction from the aggregated notification pointing to a later reaction
+         """
+        user = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        post_reaction_emoji_id = make_emoji(group=emoji_group).pk
+
+        reactors = [make_user() for i in range(0, 3)]
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS=60 * 60):
+            post_reactions = [reactor.react_to_post(post=post, emoji_id=post_reaction_emoji_id) for reactor in
+                              reactors]
+
+        reactors[0].delete_reaction_with_id_for_post_with_id(post_reaction_id=post_reactions[0].pk,
+                                                             post_id=post.pk)
+
+        notification = Notification.objects.get(owner=user, notification_type=Notification.POST_REACTION)
+
+        self.assertEqual(notification.aggregated_count, 2)
+        self.assertEqual(notification.get_latest_actors_ids(), [reactors[2].pk, reactors[1].pk])
+        self.assertEqual(notification.content_object.post_reaction_id, post_reactions[2].pk)
+
+    def test_reacting_does_not_aggregate_into_read_notifications(self):
+        """
+         should create a new notification for a reaction once the aggregated notification was read
+         """
+        user = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        post_reaction_emoji_id = make_emoji(group=emoji_group).pk
+
+        with override_settings(NOTIFICATIONS_AGGREGATION_WINDOW_SECONDS=60 * 60):
+            make_user().react_to_post(post=post, emoji_id=post_reaction_emoji_id)
+            user.read_notifications()
+            make_user().react_to_post(post=post, emoji_id=post_reaction_emoji_id)
+
+        notifications = Notification.objects.filter(owner=user, notification_type=Notification.POST_REACTION)
+
+        self.assertEqual(notifications.count(), 2)
+        self.assertEqual(notifications.filter(read=False, aggregated_count=1).count(), 1)
+
+    def test_reacting_updates_post_reactions_counters(self):
+        """
+        should increment the post reactions count and the reaction emoji count when reacting
+        """
+        user = make_user()
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+
+        post_reaction_emoji_id = make_emoji(group=emoji_group).pk
+
+        data = self._get_create_post_reaction_request_data(post_reaction_emoji_id, emoji_group.pk)
+
+        url = self._get_url(post)
+
+        amount_of_reactors = 3
+
+        for i in range(0, amount_of_reactors):
+            reactor = make_user()
+            headers = make_authentication_headers_for_user(reactor)
+            response = self.client.put(url, data, **headers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.reactions_count, amount_of_reactors)
+        self.assertEqual(PostReactionEmojiCount.objects.get(post_id=post.pk, emoji_id=post_reaction_emoji_id).count,
+                         amount_of_reactors)
+
+    def test_changing_reaction_moves_post_reactions_emoji_counts(self):
+        """
+        should move the reaction between the emoji counts without changing the post reactions count
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+
+        first_emoji_id = make_emoji(group=emoji_group).pk
+        second_emoji_id = make_emoji(group=emoji_group).pk
+
+        url = self._get_url(post)
+        self.client.put(url, self._get_create_post_reaction_request_data(first_emoji_id, emoji_group.pk), **headers)
+        response = self.client.put(url, self._get_create_post_reaction_request_data(second_emoji_id, emoji_group.pk),
+                                   **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.reactions_count, 1)
+        self.assertEqual(PostReactionEmojiCount.objects.get(post_id=post.pk, emoji_id=first_emoji_id).count, 0)
+        self.assertEqual(PostReactionEmojiCount.objects.get(post_id=post.pk, emoji_id=second_emoji_id).count, 1)
+
     def _get_create_post_reaction_request_data(self, emoji_id, emoji_group_id):
         return {
             'emoji_id': emoji_id,
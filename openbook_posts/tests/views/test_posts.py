@@ -1,12 +1,19 @@
 # Create your tests here.
+import os
 import tempfile
-from unittest import mock
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
 from PIL import Image
 from django.conf import settings
 from django.core.files import File
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from django.utils import timezone
 from django_rq import get_worker
 from faker import Faker
 from rest_framework import status
@@ -27,15 +34,19 @@ from openbook_common.tests.helpers import make_user, make_users, make_fake_post_
     make_authentication_headers_for_user, make_circle, make_community, make_list, make_moderation_category, \
     get_test_usernames, get_test_videos, get_test_image, make_global_moderator, \
     make_fake_post_comment_text, make_reactions_emoji_group, make_emoji, make_hashtag_name, make_hashtag, \
-    get_test_valid_hashtags, get_test_invalid_hashtags, get_post_links
+    get_test_valid_hashtags, get_test_invalid_hashtags, get_post_links, count_queries_for_table
 from openbook_common.utils.helpers import sha256sum, normalize_url
 from openbook_communities.models import Community
 from openbook_hashtags.models import Hashtag
 from openbook_lists.models import List
 from openbook_moderation.models import ModeratedObject
 from openbook_notifications.models import PostUserMentionNotification, Notification, UserNewPostNotification
-from openbook_posts.jobs import curate_top_posts, curate_trending_posts
-from openbook_posts.models import Post, PostUserMention, PostMedia, TopPost, TrendingPost, PostLink
+from openbook_posts.jobs import curate_top_posts, curate_trending_posts, warm_up_timeline_for_user_with_id, \
+    fan_out_post_to_timelines, clean_top_posts, fan_out_post_to_subscribers
+from openbook_posts.models import Post, PostUserMention, PostMedia, TopPost, TrendingPost, PostLink, PostReaction, \
+    PostComment, PostMute, PostReactionEmojiCount
+from openbook_posts import timelines, trending
+from openbook_posts.top_posts import get_top_posts_candidates, CURATE_TOP_POSTS_CONSUMER
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -3951,19 +3962,460 @@ class PostsAPITests(OpenbookAPITestCase):
         self.assertTrue(UserNewPostNotification.objects.filter(
             user_notifications_subscription=subscriber_notifications_subscription).count() == 1)
 
+    def test_fan_out_post_to_subscribers_notifies_every_chunk(self):
+        """
+        should notify the subscribers of every chunk of subscriptions
+        """
+        user = make_user()
+        subscribers = [make_user() for i in range(0, 5)]
+
+        for subscriber in subscribers:
+            subscriber.enable_new_post_notifications_for_user_with_username(user.username)
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        UserNewPostNotification.objects.filter(post=post).delete()
+
+        fan_out_post_to_subscribers(post_id=post.pk, chunk_size=2)
+
+        self.assertEqual(UserNewPostNotification.objects.filter(post=post).count(), len(subscribers))
+        self.assertEqual(Notification.objects.filter(notification_type=Notification.USER_NEW_POST,
+                                                     owner__in=subscribers).count(), len(subscribers))
+
+    def test_fan_out_post_to_subscribers_is_idempotent(self):
+        """
+        should not notify the subscribers again if the fan out is retried
+        """
+        user = make_user()
+        subscribers = [make_user() for i in range(0, 3)]
+
+        for subscriber in subscribers:
+            subscriber.enable_new_post_notifications_for_user_with_username(user.username)
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        fan_out_post_to_subscribers(post_id=post.pk, chunk_size=2)
+
+        self.assertEqual(UserNewPostNotification.objects.filter(post=post).count(), len(subscribers))
+        self.assertEqual(Notification.objects.filter(notification_type=Notification.USER_NEW_POST,
+                                                     owner__in=subscribers).count(), len(subscribers))
+
+    def test_viewer_state_queries_do_not_grow_with_the_amount_of_posts(self):
+        """
+        should query the reactions, comments and mutes of the timeline posts a fixed amount of times
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        url = self._get_url()
+
+        tables_queries_counts = []
+
+        for i in range(2):
+            for j in range(3):
+                post = user.create_public_post(text=make_fake_post_text())
+                user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+                user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+                user.mute_post_with_id(post_id=post.pk)
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            tables_queries_counts.append(
+                [count_queries_for_table(context.captured_queries, table_name) for table_name in
+                 (PostReaction._meta.db_table, PostComment._meta.db_table, PostMute._meta.db_table)])
+
+        self.assertEqual(tables_queries_counts[0], tables_queries_counts[1])
+
+    def _get_url(self):
+        return reverse('posts')
+
+
+class MaterializedTimelineAPITests(OpenbookAPITestCase):
+    """
+    MaterializedTimelineAPITests
+    """
+
+    fixtures = [
+        'openbook_circles/fixtures/circles.json'
+    ]
+
+    def test_cold_timeline_is_served_from_the_database(self):
+        """
+        should retrieve the timeline posts while the materialized timeline is cold
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user_with_id(user_id=followed_user.pk)
+
+        post = followed_user.create_public_post(text=make_fake_post_text())
+
+        headers = make_authentication_headers_for_user(user)
+        response = self.client.get(self._get_url(), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_posts_ids = [post['id'] for post in json.loads(response.content)]
+
+        self.assertEqual([post.pk], response_posts_ids)
+
+    def test_warm_up_fills_the_timeline(self):
+        """
+        should fill the materialized timeline with the timeline posts when warming it up
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user_with_id(user_id=followed_user.pk)
+
+        posts_ids = [followed_user.create_public_post(text=make_fake_post_text()).pk for i in range(5)]
+        own_post = user.create_public_post(text=make_fake_post_text())
+        posts_ids.append(own_post.pk)
+
+        warm_up_timeline_for_user_with_id(user_id=user.pk)
+
+        self.assertEqual(sorted(posts_ids, reverse=True),
+                         timelines.get_timeline_posts_ids(user_id=user.pk, count=10))
+
+    def test_fan_out_adds_post_to_warm_timelines(self):
+        """
+        should add a new post to the warm timelines of the followers and retrieve it
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user_with_id(user_id=followed_user.pk)
+
+        warm_up_timeline_for_user_with_id(user_id=user.pk)
+
+        post = followed_user.create_public_post(text=make_fake_post_text())
+        fan_out_post_to_timelines(post_id=post.pk)
+
+        self.assertEqual([post.pk], timelines.get_timeline_posts_ids(user_id=user.pk, count=10))
+
+        headers = make_authentication_headers_for_user(user)
+        response = self.client.get(self._get_url(), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_posts_ids = [post['id'] for post in json.loads(response.content)]
+
+        self.assertEqual([post.pk], response_posts_ids)
+
+    def test_fan_out_does_not_add_encircled_post_to_non_targeted_timelines(self):
+        """
+        should not add an encircled post to the timeline of a follower outside the circle
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user_with_id(user_id=followed_user.pk)
+
+        warm_up_timeline_for_user_with_id(user_id=user.pk)
+
+        circle = make_circle(creator=followed_user)
+        post = followed_user.create_encircled_post(text=make_fake_post_text(), circles_ids=[circle.pk])
+        fan_out_post_to_timelines(post_id=post.pk)
+
+        self.assertEqual([], timelines.get_timeline_posts_ids(user_id=user.pk, count=10))
+
+    def test_does_not_retrieve_deleted_post_of_warm_timeline(self):
+        """
+        should not retrieve a deleted post still present in the warm timeline
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user_with_id(user_id=followed_user.pk)
+
+        post = followed_user.create_public_post(text=make_fake_post_text())
+        deleted_post = followed_user.create_public_post(text=make_fake_post_text())
+
+        warm_up_timeline_for_user_with_id(user_id=user.pk)
+
+        deleted_post.soft_delete()
+
+        headers = make_authentication_headers_for_user(user)
+        response = self.client.get(self._get_url(), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_posts_ids = [post['id'] for post in json.loads(response.content)]
+
+        self.assertEqual([post.pk], response_posts_ids)
+
+    def test_unfollowing_removes_posts_from_timeline(self):
+        """
+        should remove the posts of an unfollowed user from the warm timeline
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user_with_id(user_id=followed_user.pk)
+
+        followed_user.create_public_post(text=make_fake_post_text())
+        own_post = user.create_public_post(text=make_fake_post_text())
+
+        warm_up_timeline_for_user_with_id(user_id=user.pk)
+
+        user.unfollow_user_with_id(user_id=followed_user.pk)
+
+        self.assertEqual([own_post.pk], timelines.get_timeline_posts_ids(user_id=user.pk, count=10))
+
+    def test_following_invalidates_timeline(self):
+        """
+        should invalidate the warm timeline when following a user
+        """
+        user = make_user()
+        timelines.invalidate_timeline(user_id=user.pk)
+
+        user.create_public_post(text=make_fake_post_text())
+
+        warm_up_timeline_for_user_with_id(user_id=user.pk)
+
+        user_to_follow = make_user()
+        user.follow_user_with_id(user_id=user_to_follow.pk)
+
+        self.assertIsNone(timelines.get_timeline_posts_ids(user_id=user.pk, count=10))
+
     def _get_url(self):
         return reverse('posts')
 
 
+class FilteredTimelinePostsTests(OpenbookAPITestCase):
+    """
+    FilteredTimelinePostsTests
+    """
+
+    fixtures = [
+        'openbook_circles/fixtures/circles.json'
+    ]
+
+    def test_matches_per_follow_query_on_random_graphs(self):
+        """
+        should retrieve the same filtered timeline posts as the per follow query on randomized graphs
+        """
+        for seed in range(3):
+            user, circles_ids, lists_ids = self._make_random_graph(rng=random.Random(seed))
+
+            filters = [{'circles_ids': [circle_id]} for circle_id in circles_ids]
+            filters.append({'circles_ids': circles_ids})
+            filters.extend({'lists_ids': [list_id]} for list_id in lists_ids)
+            if lists_ids:
+                filters.append({'lists_ids': lists_ids})
+                filters.append({'circles_ids': circles_ids[:1], 'lists_ids': lists_ids[:1]})
+
+            for timeline_filters in filters:
+                posts_ids = set(user.get_timeline_posts(**timeline_filters).values_list('id', flat=True))
+                expected_posts_ids = set(self._get_timeline_posts_with_filters_per_follow(
+                    user=user, **timeline_filters).values_list('id', flat=True))
+
+                self.assertEqual(expected_posts_ids, posts_ids, msg='seed %d, filters %s' % (seed, timeline_filters))
+
+    @skipUnless(os.environ.get('OPENBOOK_RUN_BENCHMARKS'), 'Set OPENBOOK_RUN_BENCHMARKS to run benchmarks')
+    def test_benchmark_filtered_timeline(self):
+        """
+        benchmarks the filtered timeline against the per follow query for a growing amount of follows
+        """
+        for follows_count in (10, 300, 1500):
+            user = make_user()
+            timeline_list = make_list(creator=user)
+
+            for i in range(follows_count):
+                followed_user = make_user()
+                user.follow_user_with_id(user_id=followed_user.pk, lists_ids=[timeline_list.pk])
+                followed_user.create_public_post(text=make_fake_post_text())
+
+            posts = user.get_timeline_posts(lists_ids=[timeline_list.pk])
+            per_follow_posts = self._get_timeline_posts_with_filters_per_follow(user=user,
+                                                                                lists_ids=[timeline_list.pk])
+
+            elapsed = self._time_first_page(posts)
+            per_follow_elapsed = self._time_first_page(per_follow_posts)
+
+            logger.info('%d follows: %.4fs, per follow query: %.4fs' % (follows_count, elapsed, per_follow_elapsed))
+
+    def _time_first_page(self, posts, runs=5):
+        start = time.perf_counter()
+        for i in range(runs):
+            list(posts.order_by('-id')[:10])
+        return (time.perf_counter() - start) / runs
+
+    def _make_random_graph(self, rng):
+        user = make_user()
+
+        circles_ids = [make_circle(creator=user).pk for i in range(3)]
+        lists_ids = [make_list(creator=user).pk for i in range(3)]
+
+        user.create_public_post(text=make_fake_post_text())
+        for circle_id in circles_ids:
+            user.create_encircled_post(text=make_fake_post_text(), circles_ids=[circle_id])
+
+        for i in range(12):
+            other_user = make_user()
+            relationship = rng.choice(('none', 'follow', 'pending_connection', 'connection', 'incoming_connection'))
+
+            if relationship == 'follow':
+                user.follow_user_with_id(user_id=other_user.pk,
+                                         lists_ids=rng.sample(lists_ids, rng.randint(1, len(lists_ids))))
+            elif relationship == 'pending_connection':
+                user.connect_with_user_with_id(user_id=other_user.pk,
+                                               circles_ids=rng.sample(circles_ids, rng.randint(1, len(circles_ids))))
+            elif relationship == 'connection':
+                user.connect_with_user_with_id(user_id=other_user.pk,
+                                               circles_ids=rng.sample(circles_ids, rng.randint(1, len(circles_ids))))
+                other_user.confirm_connection_with_user_with_id(user_id=user.pk)
+                if rng.random() < 0.5:
+                    user.update_follow_for_user_with_id(user_id=other_user.pk, lists_ids=[rng.choice(lists_ids)])
+            elif relationship == 'incoming_connection':
+                other_user.connect_with_user_with_id(user_id=user.pk)
+                user.confirm_connection_with_user_with_id(user_id=other_user.pk,
+                                                          circles_ids=[rng.choice(circles_ids)])
+
+            other_user_circle = make_circle(creator=other_user)
+            community = make_community(creator=other_user)
+
+            other_user.create_public_post(text=make_fake_post_text())
+            other_user.create_encircled_post(text=make_fake_post_text(), circles_ids=[other_user_circle.pk])
+            other_user.create_encircled_post(text=make_fake_post_text(),
+                                             circles_ids=[other_user.connections_circle_id])
+            other_user.create_community_post(community_name=community.name, text=make_fake_post_text())
+
+        # Only keep the lists with follows, as filtering on empty lists was never supported
+        lists_ids = [list_id for list_id in lists_ids if user.follows.filter(lists__id=list_id).exists()]
+
+        return user, circles_ids, lists_ids
+
+    def _get_timeline_posts_with_filters_per_follow(self, user, max_id=None, circles_ids=None, lists_ids=None):
+        """
+        The filtered timeline query as it used to be built, with a clause per followed user
+        """
+        world_circle_id = Circle.get_world_circle_id()
+
+        if circles_ids:
+            timeline_posts_query = Q(creator=user.pk, circles__id__in=circles_ids)
+        else:
+            timeline_posts_query = Q()
+
+        if lists_ids:
+            followed_users_query = user.follows.filter(lists__id__in=lists_ids)
+        else:
+            followed_users_query = user.follows.all()
+
+        for followed_user in followed_users_query.values('followed_user__id'):
+            followed_user_query = Q(creator_id=followed_user['followed_user__id'])
+
+            if circles_ids:
+                followed_user_query.add(Q(creator__connections__target_connection__circles__in=circles_ids), Q.AND)
+
+            followed_user_circles_query = Q(circles__id=world_circle_id)
+
+            followed_user_circles_query.add(Q(circles__connections__target_user_id=user.pk,
+                                              circles__connections__target_connection__circles__isnull=False), Q.OR)
+
+            followed_user_query.add(followed_user_circles_query, Q.AND)
+
+            timeline_posts_query.add(followed_user_query, Q.OR)
+
+        if max_id:
+            timeline_posts_query.add(Q(id__lt=max_id), Q.AND)
+
+        timeline_posts_query.add(Q(is_deleted=False, status=Post.STATUS_PUBLISHED), Q.AND)
+
+        timeline_posts_query.add(~Q(moderated_object__reports__reporter_id=user.pk), Q.AND)
+
+        return Post.objects.filter(timeline_posts_query).distinct()
+
+
+class PostCountersReconciliationTests(OpenbookAPITestCase):
+    """
+    PostCountersReconciliationTests
+    """
+
+    fixtures = [
+        'openbook_circles/fixtures/circles.json',
+        'openbook_common/fixtures/languages.json'
+    ]
+
+    def test_reconciliation_repairs_drifted_counters(self):
+        """
+        should recount the counters of the posts whose counters drifted
+        """
+        user = make_user()
+        commenter = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        emoji = make_emoji(group=emoji_group)
+        other_emoji = make_emoji(group=emoji_group)
+
+        user.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        commenter.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        user.react_to_post_with_id(post.pk, emoji_id=emoji.pk)
+        commenter.react_to_post_with_id(post.pk, emoji_id=emoji.pk)
+
+        Post.objects.filter(pk=post.pk).update(comments_count=10, commenters_count=0, reactions_count=1)
+        PostReactionEmojiCount.objects.filter(post_id=post.pk).delete()
+        PostReactionEmojiCount.objects.create(post_id=post.pk, emoji_id=other_emoji.pk, count=4)
+
+        repaired_posts = Post.reconcile_counters_for_posts_with_ids(posts_ids=[post.pk])
+
+        self.assertEqual(repaired_posts, 1)
+
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(post.commenters_count, 2)
+        self.assertEqual(post.reactions_count, 2)
+        self.assertEqual(PostReactionEmojiCount.objects.get(post_id=post.pk, emoji_id=emoji.pk).count, 2)
+        self.assertEqual(PostReactionEmojiCount.objects.get(post_id=post.pk, emoji_id=other_emoji.pk).count, 0)
+
+    def test_reconciliation_leaves_consistent_counters_untouched(self):
+        """
+        should not repair the counters of posts that didn't drift
+        """
+        user = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+        other_post = user.create_public_post(text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        emoji = make_emoji(group=emoji_group)
+
+        user.comment_post_with_id(post.pk, text=make_fake_post_comment_text())
+        user.react_to_post_with_id(other_post.pk, emoji_id=emoji.pk)
+
+        repaired_posts = Post.reconcile_counters_for_posts_with_ids(posts_ids=[post.pk, other_post.pk])
+
+        self.assertEqual(repaired_posts, 0)
+
+
 class TrendingPostsAPITests(OpenbookAPITestCase):
     """
     TrendingPostsAPITests
     """
 
     fixtures = [
-        'openbook_circles/fixtures/circles.json'
+        'openbook_circles/fixtures/circles.json',
+        'openbook_common/fixtures/languages.json'
     ]
 
+    def setUp(self):
+        super().setUp()
+        trending.get_trending_posts_scores().clear()
+
     def test_displays_community_posts_only(self):
         """
         should display community posts only and return 200
@@ -4434,6 +4886,104 @@ class TrendingPostsAPITests(OpenbookAPITestCase):
         response_post = response_posts[0]
         self.assertEqual(response_post['post']['id'], post_two.pk)
 
+    def test_ranks_posts_by_trending_score(self):
+        """
+        should list first the posts with the highest trending score
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=user)
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+
+        post_two = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        user.react_to_post_with_id(post_id=post_two.pk, emoji_id=emoji.pk)
+        user.comment_post_with_id(post_id=post_two.pk, text=make_fake_post_comment_text())
+
+        curate_trending_posts()
+
+        response = self.client.get(self._get_url(), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_posts_ids = [response_post['post']['id'] for response_post in json.loads(response.content)]
+        self.assertEqual([post_two.pk, post.pk], response_posts_ids)
+
+    def test_removes_deleted_engagement_from_trending_score(self):
+        """
+        should drop the post from the trending scores once its reactions and comments are deleted
+        """
+        user = make_user()
+
+        community = make_community(creator=user)
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+        post_comment = user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+
+        trending_posts_scores = trending.get_trending_posts_scores()
+        self.assertEqual([post.pk], trending_posts_scores.get_posts_ids(offset=0, count=10))
+
+        user.delete_reaction_with_id_for_post_with_id(post_reaction_id=post.reactions.get().pk, post_id=post.pk)
+        user.delete_comment_with_id_for_post_with_id(post_comment_id=post_comment.pk, post_id=post.pk)
+
+        self.assertEqual([], trending_posts_scores.get_posts_ids(offset=0, count=10))
+
+    def test_decays_trending_score_with_half_life(self):
+        """
+        should halve the weight of the engagement every half life
+        """
+        now = timezone.now()
+        half_life = timedelta(seconds=settings.TRENDING_POSTS_HALF_LIFE_SECONDS)
+
+        trending.add_trending_post_engagement(post_id=1, weight=1, created=now - half_life)
+        trending.add_trending_post_engagement(post_id=2, weight=0.6, created=now)
+        trending.add_trending_post_engagement(post_id=3, weight=1, created=now - half_life * 5)
+
+        trending_posts_scores = trending.get_trending_posts_scores()
+        self.assertEqual([2, 1, 3], trending_posts_scores.get_posts_ids(offset=0, count=10))
+
+        # Post 3 is worth 1 / 32 by now, under the min score
+        self.assertEqual(2, trending_posts_scores.compact(now=now.timestamp()))
+        self.assertEqual([2, 1], trending_posts_scores.get_posts_ids(offset=0, count=10))
+
+    def test_viewer_state_queries_do_not_grow_with_the_amount_of_posts(self):
+        """
+        should query the reactions and comments of the trending posts a fixed amount of times
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=user)
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        url = self._get_url()
+
+        tables_queries_counts = []
+
+        for i in range(2):
+            for j in range(3):
+                post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+                user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+                user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+
+            curate_trending_posts()
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((i + 1) * 3, len(json.loads(response.content)))
+            tables_queries_counts.append(
+                [count_queries_for_table(context.captured_queries, table_name) for table_name in
+                 (PostReaction._meta.db_table, PostComment._meta.db_table)])
+
+        self.assertEqual(tables_queries_counts[0], tables_queries_counts[1])
+
     def _get_url(self):
         return reverse('trending-posts-new')
 
@@ -5058,6 +5608,100 @@ class TopPostsAPITests(OpenbookAPITestCase):
         response_posts = json.loads(response.content)
         self.assertEqual(5, len(response_posts))
 
+    def test_viewer_state_queries_do_not_grow_with_the_amount_of_posts(self):
+        """
+        should query the reactions and comments of the top posts a fixed amount of times
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        community = make_community(creator=user)
+        emoji = make_emoji(group=make_reactions_emoji_group())
+
+        url = self._get_url()
+
+        tables_queries_counts = []
+
+        for i in range(2):
+            for j in range(3):
+                post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+                user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+                user.comment_post_with_id(post_id=post.pk, text=make_fake_post_comment_text())
+
+            curate_top_posts()
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((i + 1) * 3, len(json.loads(response.content)))
+            tables_queries_counts.append(
+                [count_queries_for_table(context.captured_queries, table_name) for table_name in
+                 (PostReaction._meta.db_table, PostComment._meta.db_table)])
+
+        self.assertEqual(tables_queries_counts[0], tables_queries_counts[1])
+
+    def test_curates_only_posts_with_activity_since_last_run(self):
+        """
+        should only evaluate the posts with comments or reactions since the last curation unless it's a full run
+        """
+        user = make_user()
+        community = make_community(creator=user)
+
+        community_post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+
+        curate_top_posts()
+
+        # Qualify it without any activity
+        Post.objects.filter(pk=community_post.pk).update(commenters_count=1)
+
+        curate_top_posts()
+
+        self.assertFalse(TopPost.objects.filter(post_id=community_post.pk).exists())
+
+        curate_top_posts(full=True)
+
+        self.assertTrue(TopPost.objects.filter(post_id=community_post.pk).exists())
+
+    def test_curation_consumes_candidates(self):
+        """
+        should not return the candidates evaluated by the last curation
+        """
+        user = make_user()
+        community = make_community(creator=user)
+
+        community_post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        user.comment_post(community_post, text=make_fake_post_comment_text())
+
+        candidates_posts_ids, mark = get_top_posts_candidates(consumer=CURATE_TOP_POSTS_CONSUMER)
+        self.assertIn(community_post.pk, candidates_posts_ids)
+
+        curate_top_posts()
+
+        candidates_posts_ids, mark = get_top_posts_candidates(consumer=CURATE_TOP_POSTS_CONSUMER)
+        self.assertNotIn(community_post.pk, candidates_posts_ids)
+
+    def test_cleans_top_posts_whose_comments_were_deleted(self):
+        """
+        should remove the top posts that no longer meet the criteria after their comments were deleted
+        """
+        user = make_user()
+        community = make_community(creator=user)
+
+        community_post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        post_comment = user.comment_post(community_post, text=make_fake_post_comment_text())
+
+        curate_top_posts()
+        clean_top_posts()
+
+        self.assertTrue(TopPost.objects.filter(post_id=community_post.pk).exists())
+
+        user.delete_comment_with_id_for_post_with_id(post_comment_id=post_comment.pk, post_id=community_post.pk)
+
+        clean_top_posts()
+
+        self.assertFalse(TopPost.objects.filter(post_id=community_post.pk).exists())
+
     def _get_url(self):
         return reverse('top-posts')
 
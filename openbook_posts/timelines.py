@@ -0,0 +1,212 @@
+"""
+Materialized home timelines.
+
+Every user timeline is kept in redis as a sorted set of post ids (scored by the post id) capped at
+settings.TIMELINE_MAX_POSTS entries. Alongside it we keep a floor key, the lowest post id from which the
+timeline is known to be complete. The floor key also marks the timeline as warm; a user without it is cold
+and must be served by the timeline query until a warm up job fills the timeline.
+"""
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_KEY = 'ob-api-timeline-%(user_id)d'
+TIMELINE_FLOOR_KEY = 'ob-api-timeline-floor-%(user_id)d'
+TIMELINE_WARMING_KEY = 'ob-api-timeline-warming-%(user_id)d'
+
+# Adds a post to a warm timeline, trimming the oldest entries past the cap and moving the floor up.
+# The timeline expires along with its floor, which only reads keep alive, rather than living on from the writes alone.
+ADD_POST_TO_TIMELINE_SCRIPT = """
+local ttl = redis.call('TTL', KEYS[2])
+if ttl == -2 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[1])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[2])
+if overflow > 0 then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, overflow - 1)
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0)
+    redis.call('SET', KEYS[2], oldest[1], 'EX', ARGV[3])
+end
+return 1
+"""
+
+
+def get_timeline_posts_ids(user_id, count, max_id=None, min_id=None):
+    """
+    Returns the ids of the most recent posts in the materialized timeline within the given boundaries,
+    or None if the timeline is cold or can't answer the request completely.
+    """
+    if not count:
+        return None
+
+    try:
+        redis = _get_redis()
+        floor, posts_ids = _get_timeline_range(redis=redis, user_id=user_id, count=count, max_id=max_id,
+                                               min_id=min_id)
+    except RedisError as e:
+        logger.warning('Failed to read timeline of user with id %d: %s' % (user_id, e))
+        return None
+
+    if floor is None:
+        return None
+
+    floor = int(floor)
+
+    if len(posts_ids) < count and floor and (not min_id or min_id < floor):
+        # The timeline was trimmed and the requested page goes beyond what we keep
+        return None
+
+    return [int(post_id) for post_id in posts_ids]
+
+
+def fill_timeline(user_id, posts_ids):
+    """
+    Replaces the timeline of the user with the given posts ids, most recent first, as returned by the
+    timeline query limited to settings.TIMELINE_MAX_POSTS
+    """
+    posts_ids = posts_ids[:settings.TIMELINE_MAX_POSTS]
+
+    if len(posts_ids) < settings.TIMELINE_MAX_POSTS:
+        # We hold the whole timeline
+        floor = 0
+    else:
+        floor = min(posts_ids)
+
+    timeline_key = _make_timeline_key(user_id)
+    timeline_floor_key = _make_timeline_floor_key(user_id)
+
+    pipeline = _get_redis().pipeline()
+    pipeline.delete(timeline_key)
+    if posts_ids:
+        pipeline.zadd(timeline_key, {post_id: post_id for post_id in posts_ids})
+        pipeline.expire(timeline_key, settings.TIMELINE_EXPIRATION_SECONDS)
+    pipeline.set(timeline_floor_key, floor, ex=settings.TIMELINE_EXPIRATION_SECONDS)
+    pipeline.delete(_make_timeline_warming_key(user_id))
+    pipeline.execute()
+
+
+def claim_timeline_warm_up(user_id):
+    """
+    Returns whether the caller should schedule the warm up of the timeline, so cold reads
+    of the same user don't schedule it more than once
+    """
+    try:
+        return bool(_get_redis().set(_make_timeline_warming_key(user_id), 1, nx=True,
+                                     ex=settings.TIMELINE_WARM_UP_LOCK_SECONDS))
+    except RedisError:
+        return False
+
+
+def add_post_to_timelines(post_id, users_ids):
+    """
+    Adds the post to the timelines of the given users. Cold timelines are skipped as they will be filled
+    from the database when warmed up.
+    """
+    redis = _get_redis()
+    add_post_to_timeline = redis.register_script(ADD_POST_TO_TIMELINE_SCRIPT)
+
+    pipeline = redis.pipeline(transaction=False)
+    for user_id in users_ids:
+        add_post_to_timeline(keys=[_make_timeline_key(user_id), _make_timeline_floor_key(user_id)],
+                             args=[post_id, settings.TIMELINE_MAX_POSTS, settings.TIMELINE_EXPIRATION_SECONDS],
+                             client=pipeline)
+    pipeline.execute()
+
+
+def remove_post_from_timelines(post_id, users_ids):
+    pipeline = _get_redis().pipeline(transaction=False)
+    for user_id in users_ids:
+        pipeline.zrem(_make_timeline_key(user_id), post_id)
+    pipeline.execute()
+
+
+def remove_posts_from_timeline(user_id, posts_ids):
+    if not posts_ids:
+        return
+
+    try:
+        _get_redis().zrem(_make_timeline_key(user_id), *posts_ids)
+    except RedisError as e:
+        logger.warning('Failed to remove posts from timeline of user with id %d: %s' % (user_id, e))
+
+
+def get_all_timeline_posts_ids(user_id):
+    """
+    Returns all the posts ids held in the timeline of the user or None if the timeline is cold
+    """
+    try:
+        pipeline = _get_redis().pipeline(transaction=False)
+        pipeline.exists(_make_timeline_floor_key(user_id))
+        pipeline.zrange(_make_timeline_key(user_id), 0, -1)
+        is_warm, posts_ids = pipeline.execute()
+    except RedisError as e:
+        logger.warning('Failed to read timeline of user with id %d: %s' % (user_id, e))
+        return None
+
+    if not is_warm:
+        return None
+
+    return [int(post_id) for post_id in posts_ids]
+
+
+def invalidate_timeline(user_id):
+    """
+    Drops the timeline of the user, to be used when posts older than the ones already in it might
+    have become visible, e.g. after following someone or joining a community
+    """
+    try:
+        _get_redis().delete(_make_timeline_key(user_id), _make_timeline_floor_key(user_id))
+    except RedisError as e:
+        logger.warning('Failed to invalidate timeline of user with id %d: %s' % (user_id, e))
+
+
+def clear_timelines():
+    """
+    Drops every timeline, to be used by the tests as the users ids are reused across them
+    """
+    redis = _get_redis()
+
+    for key in redis.scan_iter(match='ob-api-timeline-*', count=1000):
+        redis.delete(key)
+
+
+def _get_timeline_range(redis, user_id, count, max_id=None, min_id=None):
+    timeline_key = _make_timeline_key(user_id)
+    timeline_floor_key = _make_timeline_floor_key(user_id)
+
+    max_score = '(%d' % max_id if max_id else '+inf'
+    min_score = '(%d' % min_id if min_id else '-inf'
+
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.get(timeline_floor_key)
+    pipeline.zrevrangebyscore(timeline_key, max_score, min_score, start=0, num=count)
+    # Reading a timeline keeps it alive
+    pipeline.expire(timeline_key, settings.TIMELINE_EXPIRATION_SECONDS)
+    pipeline.expire(timeline_floor_key, settings.TIMELINE_EXPIRATION_SECONDS)
+    floor, posts_ids, _, _ = pipeline.execute()
+
+    return floor, posts_ids
+
+
+def _make_timeline_key(user_id):
+    return TIMELINE_KEY % {'user_id': user_id}
+
+
+def _make_timeline_floor_key(user_id):
+    return TIMELINE_FLOOR_KEY % {'user_id': user_id}
+
+
+def _make_timeline_warming_key(user_id):
+    return TIMELINE_WARMING_KEY % {'user_id': user_id}
+
+
+def _get_redis():
+    return get_redis_connection('default')
@@ -0,0 +1,109 @@
+"""
+Top posts curation candidates.
+
+Every post whose comments, reactions or visibility change is pushed to a redis sorted set, scored by the redis
+server time of the change. The top posts jobs only evaluate the candidates that changed after their high-water
+mark, the score up to which they last evaluated the candidates. The marks are persisted per job so every job
+consumes the same candidates at its own pace, candidates below every mark are dropped.
+
+So the set stays bounded when a job is not scheduled or stops running, the candidates older than
+settings.TOP_POSTS_CANDIDATES_MAX_AGE_SECONDS are dropped as well, and only the latest
+settings.TOP_POSTS_CANDIDATES_MAX_COUNT are kept. A job lagging further behind has to evaluate every post again with
+full=True.
+"""
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOP_POSTS_CANDIDATES_KEY = 'ob-api-top-posts-candidates'
+TOP_POSTS_CANDIDATES_MARK_KEY = 'ob-api-top-posts-candidates-mark-%(consumer)s'
+
+CURATE_TOP_POSTS_CONSUMER = 'curate'
+CLEAN_TOP_POSTS_CONSUMER = 'clean'
+TOP_POSTS_CANDIDATES_CONSUMERS = (
+    CURATE_TOP_POSTS_CONSUMER,
+    CLEAN_TOP_POSTS_CONSUMER,
+)
+
+# Scoring with the server time guarantees a candidate is seen by any consumer reading the set after it was added
+ADD_TOP_POSTS_CANDIDATES_SCRIPT = """
+redis.replicate_commands()
+local time = redis.call('TIME')
+local score = tonumber(time[1]) + tonumber(time[2]) / 1000000
+for index = 2, #ARGV do
+    redis.call('ZADD', KEYS[1], score, ARGV[index])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[1]) - 1)
+return 1
+"""
+
+
+def add_top_posts_candidates(posts_ids):
+    posts_ids = list(posts_ids)
+
+    if not posts_ids:
+        return
+
+    _add_top_posts_candidates(posts_ids)
+
+    if transaction.get_connection().in_atomic_block:
+        # A curation running before the commit reads the previous state, add them again once committed
+        transaction.on_commit(lambda: _add_top_posts_candidates(posts_ids))
+
+
+def get_top_posts_candidates(consumer):
+    """
+    Returns the ids of the posts added since the high-water mark of the consumer, along with the new mark to be
+    committed with commit_top_posts_candidates once they have been evaluated
+    """
+    redis = _get_redis()
+
+    seconds, microseconds = redis.time()
+    mark = seconds + microseconds / 1000000
+
+    previous_mark = redis.get(_make_top_posts_candidates_mark_key(consumer))
+    min_score = '(%s' % previous_mark.decode() if previous_mark else '-inf'
+
+    posts_ids = redis.zrangebyscore(TOP_POSTS_CANDIDATES_KEY, min_score, repr(mark))
+
+    return [int(post_id) for post_id in posts_ids], mark
+
+
+def commit_top_posts_candidates(consumer, mark):
+    redis = _get_redis()
+
+    redis.set(_make_top_posts_candidates_mark_key(consumer), repr(mark))
+
+    marks = redis.mget(*[_make_top_posts_candidates_mark_key(consumer) for consumer in
+                         TOP_POSTS_CANDIDATES_CONSUMERS])
+
+    # Every consumer went past the ones under the lowest mark, the ones past their max age are dropped regardless
+    min_score = mark - settings.TOP_POSTS_CANDIDATES_MAX_AGE_SECONDS
+
+    if all(marks):
+        min_score = max(min_score, min(float(mark) for mark in marks))
+
+    redis.zremrangebyscore(TOP_POSTS_CANDIDATES_KEY, '-inf', repr(min_score))
+
+
+def _add_top_posts_candidates(posts_ids):
+    try:
+        redis = _get_redis()
+        add_top_posts_candidates_script = redis.register_script(ADD_TOP_POSTS_CANDIDATES_SCRIPT)
+        add_top_posts_candidates_script(keys=[TOP_POSTS_CANDIDATES_KEY],
+                                        args=[settings.TOP_POSTS_CANDIDATES_MAX_COUNT] + posts_ids)
+    except RedisError as e:
+        logger.warning('Failed to add top posts candidates %s: %s' % (posts_ids, e))
+
+
+def _make_top_posts_candidates_mark_key(consumer):
+    return TOP_POSTS_CANDIDATES_MARK_KEY % {'consumer': consumer}
+
+
+def _get_redis():
+    return get_redis_connection('default')
@@ -0,0 +1,220 @@
+"""
+Trending posts scores.
+
+Every reaction and comment on a community post adds a weight to the trending score of the post, a weight that halves
+every settings.TRENDING_POSTS_HALF_LIFE_SECONDS. Rather than decaying every score as time passes, new weights are
+scaled up by 2 ** ((time - epoch) / half life), which ranks the posts exactly as their decayed scores would. The
+compaction, run by the trending posts curation, moves the epoch to the current time, scaling every score down so they
+don't grow unbounded, and drops the posts that are no longer trending.
+
+The scores are kept in a redis sorted set, along with the epoch they are scaled from.
+"""
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from openbook_common.utils.backends import get_backend, RedisBackend, LocalBackend
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRENDING_POSTS_SCORES_KEY = 'ob-api-trending-posts-scores'
+TRENDING_POSTS_SCORES_EPOCH_KEY = 'ob-api-trending-posts-scores-epoch'
+
+# Weights can only be removed from posts which still have a score, posts are dropped once their score reaches 0
+UPDATE_TRENDING_POST_SCORE_SCRIPT = """
+local weight = tonumber(ARGV[2])
+local epoch = redis.call('GET', KEYS[2])
+if not epoch then
+    if weight <= 0 then
+        return 0
+    end
+    epoch = ARGV[3]
+    redis.call('SET', KEYS[2], epoch)
+end
+local score = weight * 2 ^ ((tonumber(ARGV[3]) - tonumber(epoch)) / tonumber(ARGV[4]))
+if score > 0 then
+    redis.call('ZINCRBY', KEYS[1], score, ARGV[1])
+    return 1
+end
+local current_score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not current_score then
+    return 0
+end
+local new_score = tonumber(current_score) + score
+-- Rounding errors must not leave a post behind once its last weight is removed
+if new_score > -score * 1e-9 then
+    redis.call('ZADD', KEYS[1], new_score, ARGV[1])
+else
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+COMPACT_TRENDING_POSTS_SCORES_SCRIPT = """
+local epoch = redis.call('GET', KEYS[2])
+if epoch then
+    local factor = 2 ^ ((tonumber(epoch) - tonumber(ARGV[1])) / tonumber(ARGV[2]))
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', factor)
+end
+redis.call('SET', KEYS[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[3])
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[4]) + 1))
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+def add_trending_post_engagement(post_id, weight, created):
+    """
+    Adds the weight of a reaction or comment made at created to the trending score of the post.
+    Writes are not transactional, a weight left behind by a rolled back engagement decays away like any other.
+    """
+    get_trending_posts_scores().update_score(post_id=post_id, weight=weight, at=created.timestamp())
+
+
+def remove_trending_post_engagement(post_id, weight, created):
+    """
+    Removes the weight of a deleted reaction or comment made at created from the trending score of the post
+    """
+    get_trending_posts_scores().update_score(post_id=post_id, weight=-weight, at=created.timestamp())
+
+
+def get_trending_posts_scores():
+    return get_backend('TRENDING_POSTS_SCORES_BACKEND',
+                       half_life_seconds=settings.TRENDING_POSTS_HALF_LIFE_SECONDS,
+                       min_score=settings.TRENDING_POSTS_MIN_SCORE,
+                       max_posts=settings.TRENDING_POSTS_MAX_SCORES)
+
+
+class BaseTrendingPostsScores(ABC):
+
+    def __init__(self, half_life_seconds, min_score, max_posts):
+        self.half_life_seconds = half_life_seconds
+        self.min_score = min_score
+        self.max_posts = max_posts
+
+    @abstractmethod
+    def update_score(self, post_id, weight, at):
+        """
+        Adds the weight, decayed from the timestamp at, to the score of the post. Negative weights only apply to
+        posts with a score.
+        """
+        pass
+
+    @abstractmethod
+    def get_posts_ids(self, offset, count):
+        """
+        Returns the ids of the posts ranked from offset, highest score first
+        """
+        pass
+
+    @abstractmethod
+    def remove_posts(self, posts_ids):
+        pass
+
+    @abstractmethod
+    def compact(self, now):
+        """
+        Moves the epoch to the timestamp now, then drops the posts with a decayed score under the min score and the
+        lowest ranked posts over the max posts. Returns the amount of scored posts left.
+        """
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class RedisTrendingPostsScores(BaseTrendingPostsScores, RedisBackend):
+
+    def update_score(self, post_id, weight, at):
+        try:
+            redis = self._get_redis()
+            update_trending_post_score_script = redis.register_script(UPDATE_TRENDING_POST_SCORE_SCRIPT)
+            update_trending_post_score_script(keys=[TRENDING_POSTS_SCORES_KEY, TRENDING_POSTS_SCORES_EPOCH_KEY],
+                                              args=[post_id, repr(weight), repr(at), self.half_life_seconds])
+        except RedisError as e:
+            logger.warning('Failed to update the trending score of post %d: %s' % (post_id, e))
+
+    def get_posts_ids(self, offset, count):
+        posts_ids = self._get_redis().zrevrange(TRENDING_POSTS_SCORES_KEY, offset, offset + count - 1)
+        return [int(post_id) for post_id in posts_ids]
+
+    def remove_posts(self, posts_ids):
+        if posts_ids:
+            self._get_redis().zrem(TRENDING_POSTS_SCORES_KEY, *posts_ids)
+
+    def compact(self, now):
+        redis = self._get_redis()
+        compact_trending_posts_scores_script = redis.register_script(COMPACT_TRENDING_POSTS_SCORES_SCRIPT)
+        return compact_trending_posts_scores_script(keys=[TRENDING_POSTS_SCORES_KEY, TRENDING_POSTS_SCORES_EPOCH_KEY],
+                                                    args=[repr(now), self.half_life_seconds, repr(self.min_score),
+                                                          self.max_posts])
+
+    def clear(self):
+        self._get_redis().delete(TRENDING_POSTS_SCORES_KEY, TRENDING_POSTS_SCORES_EPOCH_KEY)
+
+
+class LocalTrendingPostsScores(BaseTrendingPostsScores, LocalBackend):
+    """
+    Mirrors the scripts of the redis scores, a float score dropped once it reaches 0 up to rounding.
+    """
+    _scores = {}
+    _epoch = None
+
+    def update_score(self, post_id, weight, at):
+        cls = type(self)
+
+        with cls._lock:
+            if cls._epoch is None:
+                if weight <= 0:
+                    return
+                cls._epoch = at
+
+            score = weight * 2 ** ((at - cls._epoch) / self.half_life_seconds)
+
+            if score > 0:
+                cls._scores[post_id] = cls._scores.get(post_id, 0) + score
+            elif post_id in cls._scores:
+                new_score = cls._scores[post_id] + score
+                if new_score > -score * 1e-9:
+                    cls._scores[post_id] = new_score
+                else:
+                    del cls._scores[post_id]
+
+    def get_posts_ids(self, offset, count):
+        with self._lock:
+            ranked_posts_ids = sorted(self._scores, key=lambda post_id: (self._scores[post_id], post_id),
+                                      reverse=True)
+
+        return ranked_posts_ids[offset:offset + count]
+
+    def remove_posts(self, posts_ids):
+        with self._lock:
+            for post_id in posts_ids:
+                self._scores.pop(post_id, None)
+
+    def compact(self, now):
+        cls = type(self)
+
+        with cls._lock:
+            if cls._epoch is not None:
+                factor = 2 ** ((cls._epoch - now) / self.half_life_seconds)
+                cls._scores = {post_id: score * factor for post_id, score in cls._scores.items()
+                               if score * factor >= self.min_score}
+            cls._epoch = now
+
+            ranked_posts_ids = sorted(cls._scores, key=lambda post_id: (cls._scores[post_id], post_id), reverse=True)
+            for post_id in ranked_posts_ids[self.max_posts:]:
+                del cls._scores[post_id]
+
+            return len(cls._scores)
+
+    def clear(self):
+        cls = type(self)
+
+        with cls._lock:
+            cls._scores = {}
+            cls._epoch = None
@@ -0,0 +1,169 @@
+"""
+Post videos renditions.
+
+Every post video is encoded to the renditions of the ladder in settings.VIDEO_ENCODING_FORMATS up to its own height,
+so it's never upscaled, the lowest rendition being encoded regardless. Each rendition is encoded in its own job so
+the renditions of a post, and of many posts, are encoded concurrently across the workers.
+
+Encoding is CPU bound, the amount of renditions encoded at once is capped by settings.VIDEO_ENCODING_MAX_CONCURRENCY
+slots kept in redis. A job that finds every slot taken is scheduled again settings.VIDEO_ENCODING_RETRY_SECONDS later.
+A slot expires settings.VIDEO_ENCODING_SLOT_SECONDS after being taken, in case its job died before releasing it.
+
+A rendition is claimed by the job enqueued to encode it, from being enqueued to being encoded, so it's neither enqueued
+again, e.g. for another post with the same video, nor encoded by two jobs at once. The claim is refreshed as the job
+waits for a slot and starts encoding, and expires settings.VIDEO_ENCODING_CLAIM_SECONDS after that, in case its job
+died. Only then is the rendition stalled and enqueued again.
+"""
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from video_encoding.backends import get_backend
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+VIDEO_ENCODING_SLOT_KEY = 'ob-api-video-encoding-slot-%(slot)d'
+VIDEO_RENDITION_CLAIM_KEY = 'ob-api-video-rendition-claim-%(format_id)d'
+
+REFRESH_VIDEO_RENDITION_CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+RELEASE_VIDEO_RENDITION_CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+
+def get_video_encoding_formats():
+    return settings.VIDEO_ENCODING_FORMATS[get_backend().name]
+
+
+def get_video_encoding_format_with_name(name):
+    for options in get_video_encoding_formats():
+        if options['name'] == name:
+            return options
+
+    return None
+
+
+def get_renditions_formats_for_post_video(post_video):
+    """
+    Returns the formats of the renditions to encode the post video to, from the lowest
+    """
+    encoding_formats = sorted(get_video_encoding_formats(), key=lambda options: options.get('height') or 0)
+
+    if not encoding_formats:
+        return []
+
+    renditions_formats = [options for options in encoding_formats[1:] if
+                          not options.get('height') or not post_video.height or
+                          options['height'] <= post_video.height]
+
+    return encoding_formats[:1] + renditions_formats
+
+
+def acquire_video_encoding_slot():
+    """
+    Returns the number of the slot taken, or None if every slot is taken
+    """
+    try:
+        redis = _get_redis()
+
+        for slot in range(0, settings.VIDEO_ENCODING_MAX_CONCURRENCY):
+            if redis.set(_make_video_encoding_slot_key(slot), 1, nx=True, ex=settings.VIDEO_ENCODING_SLOT_SECONDS):
+                return slot
+    except RedisError as e:
+        # Better encoding without a cap than not at all
+        logger.warning('Failed to acquire a video encoding slot: %s' % e)
+        return -1
+
+    return None
+
+
+def release_video_encoding_slot(slot):
+    if slot < 0:
+        return
+
+    try:
+        _get_redis().delete(_make_video_encoding_slot_key(slot))
+    except RedisError as e:
+        logger.warning('Failed to release the video encoding slot %d: %s' % (slot, e))
+
+
+def claim_video_rendition(format_id):
+    """
+    Returns the claim of the rendition with the given format id to pass along to its job, or None if it's claimed by
+    another job
+    """
+    claim = uuid.uuid4().hex
+
+    try:
+        if not _get_redis().set(_make_video_rendition_claim_key(format_id), claim, nx=True,
+                                ex=settings.VIDEO_ENCODING_CLAIM_SECONDS):
+            return None
+    except RedisError as e:
+        # Better encoding a rendition twice than not at all
+        logger.warning('Failed to claim the video rendition with format id %d: %s' % (format_id, e))
+        return ''
+
+    return claim
+
+
+def refresh_video_rendition_claim(format_id, claim):
+    """
+    Returns whether the claim of the rendition with the given format id is still held, extending it if so
+    """
+    if not claim:
+        return True
+
+    try:
+        redis = _get_redis()
+        refresh_video_rendition_claim_script = redis.register_script(REFRESH_VIDEO_RENDITION_CLAIM_SCRIPT)
+        return bool(refresh_video_rendition_claim_script(keys=[_make_video_rendition_claim_key(format_id)],
+                                                         args=[claim, settings.VIDEO_ENCODING_CLAIM_SECONDS]))
+    except RedisError as e:
+        logger.warning('Failed to refresh the claim of the video rendition with format id %d: %s' % (format_id, e))
+        return True
+
+
+def release_video_rendition_claim(format_id, claim):
+    if not claim:
+        return
+
+    try:
+        redis = _get_redis()
+        release_video_rendition_claim_script = redis.register_script(RELEASE_VIDEO_RENDITION_CLAIM_SCRIPT)
+        release_video_rendition_claim_script(keys=[_make_video_rendition_claim_key(format_id)], args=[claim])
+    except RedisError as e:
+        logger.warning('Failed to release the claim of the video rendition with format id %d: %s' % (format_id, e))
+
+
+def clear_video_renditions_claims():
+    """
+    Drops the claims of every rendition, to be used by the tests as the formats ids are reused across them
+    """
+    redis = _get_redis()
+    for key in redis.scan_iter(match=VIDEO_RENDITION_CLAIM_KEY.replace('%(format_id)d', '*')):
+        redis.delete(key)
+
+
+def _make_video_encoding_slot_key(slot):
+    return VIDEO_ENCODING_SLOT_KEY % {'slot': slot}
+
+
+def _make_video_rendition_claim_key(format_id):
+    return VIDEO_RENDITION_CLAIM_KEY % {'format_id': format_id}
+
+
+def _get_redis():
+    return get_redis_connection('default')
@@ -0,0 +1,181 @@
+from django.db.models import Q, Count
+
+from openbook_common.utils.model_loaders import get_post_reaction_model, get_post_comment_model, \
+    get_community_membership_model, get_user_block_model, get_post_model, get_post_reaction_emoji_count_model
+from openbook_posts.queries import make_only_excluded_post_comments_for_user_with_id_query
+
+
+class PostsViewerState:
+    """
+    The state of a page of posts relative to the user viewing them.
+
+    Every lookup is done once for all of the posts of the page, the first time it's needed, so the post
+    serializer fields don't have to query it post by post. The posts can be any iterable, it won't be evaluated
+    until the first lookup.
+    """
+
+    def __init__(self, user, posts):
+        self.user = user
+        self._posts = posts
+        self._posts_by_id = None
+        self._reactions_by_post_id = None
+        self._muted_posts_ids = None
+        self._creators_memberships = None
+        self._blocked_users_ids = None
+        self._communities_staff_members_ids = None
+        self._comments_counts_by_post_id = None
+        self._emoji_counts_by_post_id = None
+
+    def has_post(self, post):
+        return post.pk in self._get_posts_by_id()
+
+    def get_reaction_for_post(self, post):
+        if self._reactions_by_post_id is None:
+            PostReaction = get_post_reaction_model()
+            reactions = PostReaction.objects.select_related('emoji').filter(reactor_id=self.user.pk,
+                                                                            post_id__in=self._get_posts_ids())
+            self._reactions_by_post_id = {reaction.post_id: reaction for reaction in reactions}
+
+        return self._reactions_by_post_id.get(post.pk)
+
+    def is_post_muted(self, post):
+        if self._muted_posts_ids is None:
+            self._muted_posts_ids = set(
+                self.user.post_mutes.filter(post_id__in=self._get_posts_ids()).values_list('post_id', flat=True))
+
+        return post.pk in self._muted_posts_ids
+
+    def get_creator_membership_for_post(self, post):
+        if not post.community_id:
+            return None
+
+        if self._creators_memberships is None:
+            community_posts = [post for post in self._get_posts() if post.community_id]
+
+            CommunityMembership = get_community_membership_model()
+            memberships = CommunityMembership.objects.filter(
+                user_id__in={post.creator_id for post in community_posts},
+                community_id__in={post.community_id for post in community_posts})
+            self._creators_memberships = {(membership.user_id, membership.community_id): membership for membership in
+                                          memberships}
+
+        return self._creators_memberships.get((post.creator_id, post.community_id))
+
+    def get_blocked_users_ids(self):
+        """
+        The ids of the users blocked by the viewer or blocking the viewer
+        """
+        if self._blocked_users_ids is None:
+            UserBlock = get_user_block_model()
+            users_blocks = UserBlock.objects.filter(Q(blocker_id=self.user.pk) | Q(blocked_user_id=self.user.pk))
+
+            self._blocked_users_ids = set()
+            for blocker_id, blocked_user_id in users_blocks.values_list('blocker_id', 'blocked_user_id'):
+                self._blocked_users_ids.add(blocked_user_id if blocker_id == self.user.pk else blocker_id)
+
+        return self._blocked_users_ids
+
+    def get_comments_count_for_post(self, post):
+        if self._comments_counts_by_post_id is None:
+            self._comments_counts_by_post_id = self._count_comments()
+
+        return self._comments_counts_by_post_id.get(post.pk, 0)
+
+    def get_emoji_counts_for_post(self, post):
+        if self._emoji_counts_by_post_id is None:
+            self._emoji_counts_by_post_id = self._count_emojis()
+
+        return self._emoji_counts_by_post_id.get(post.pk, [])
+
+    def _count_comments(self):
+        Post = get_post_model()
+        PostComment = get_post_comment_model()
+
+        comments_counts_by_post_id = dict(
+            Post.objects.filter(pk__in=self._get_posts_ids()).values_list('id', 'comments_count'))
+
+        # The excluded comments only depend on the community of the post, one count per community of the page
+        for community_id, posts_ids in self._get_posts_ids_by_community_id().items():
+            is_community_staff = community_id is not None and self._is_staff_of_community_with_id(community_id)
+
+            excluded_comments_query = make_only_excluded_post_comments_for_user_with_id_query(
+                user_id=self.user.pk,
+                community_id=community_id,
+                is_community_staff=is_community_staff)
+
+            excluded_comments_counts = PostComment.objects.filter(excluded_comments_query,
+                                                                  post_id__in=posts_ids).values(
+                'post_id').annotate(comments_count=Count('id', distinct=True)).order_by()
+
+            for excluded_comments_count in excluded_comments_counts:
+                post_id = excluded_comments_count['post_id']
+                comments_counts_by_post_id[post_id] = max(
+                    comments_counts_by_post_id.get(post_id, 0) - excluded_comments_count['comments_count'], 0)
+
+        return comments_counts_by_post_id
+
+    def _count_emojis(self):
+        PostReactionEmojiCount = get_post_reaction_emoji_count_model()
+
+        excluded_reactions_query = None
+
+        blocked_users_ids = self.get_blocked_users_ids()
+
+        if blocked_users_ids:
+            # Exclude blocked users reactions, on community posts only if we and them are not staff members
+            for community_id, posts_ids in self._get_posts_ids_by_community_id().items():
+                if community_id is None:
+                    excluded_users_ids = blocked_users_ids
+                elif self._is_staff_of_community_with_id(community_id):
+                    continue
+                else:
+                    excluded_users_ids = blocked_users_ids - self._get_community_staff_members_ids(community_id)
+
+                if excluded_users_ids:
+                    community_excluded_reactions_query = Q(post_id__in=posts_ids, reactor_id__in=excluded_users_ids)
+
+                    if excluded_reactions_query is None:
+                        excluded_reactions_query = community_excluded_reactions_query
+                    else:
+                        excluded_reactions_query.add(community_excluded_reactions_query, Q.OR)
+
+        return PostReactionEmojiCount.get_emoji_counts_for_posts_with_ids(
+            posts_ids=self._get_posts_ids(),
+            excluded_reactions_query=excluded_reactions_query)
+
+    def _is_staff_of_community_with_id(self, community_id):
+        return self.user.pk in self._get_community_staff_members_ids(community_id)
+
+    def _get_community_staff_members_ids(self, community_id):
+        if self._communities_staff_members_ids is None:
+            CommunityMembership = get_community_membership_model()
+
+            staff_memberships = CommunityMembership.objects.filter(
+                Q(is_administrator=True) | Q(is_moderator=True),
+                community_id__in={post.community_id for post in self._get_posts() if post.community_id})
+
+            self._communities_staff_members_ids = {}
+            for membership_community_id, user_id in staff_memberships.values_list('community_id', 'user_id'):
+                self._communities_staff_members_ids.setdefault(membership_community_id, set()).add(user_id)
+
+        return self._communities_staff_members_ids.get(community_id, set())
+
+    def _get_posts_ids_by_community_id(self):
+        posts_ids_by_community_id = {}
+
+        for post in self._get_posts():
+            posts_ids_by_community_id.setdefault(post.community_id, []).append(post.pk)
+
+        return posts_ids_by_community_id
+
+    def _get_posts(self):
+        return self._get_posts_by_id().values()
+
+    def _get_posts_ids(self):
+        return list(self._get_posts_by_id().keys())
+
+    def _get_posts_by_id(self):
+        if self._posts_by_id is None:
+            self._posts_by_id = {post.pk: post for post in self._posts}
+
+        return self._posts_by_id
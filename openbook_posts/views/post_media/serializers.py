@@ -5,7 +5,7 @@ from rest_framework import serializers
 from video_encoding.models import Format
 
 from openbook_common.serializers_fields.request import RestrictedImageFileSizeField, RestrictedFileSizeField
-from openbook_posts.models import PostMedia, PostImage, PostVideo
+from openbook_posts.models import PostMedia, PostImage, PostVideo, PostMediaUpload, PostImageVariant
 from openbook_posts.validators import post_uuid_exists, post_reaction_id_exists
 
 
@@ -26,8 +26,20 @@ class GetPostMediaSerializer(serializers.Serializer):
     )
 
 
+class PostImageVariantSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PostImageVariant
+        fields = (
+            'image',
+            'format',
+            'width',
+            'height'
+        )
+
+
 class PostImageSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(read_only=True, required=False, allow_empty_file=True)
+    variants = PostImageVariantSerializer(many=True, read_only=True)
 
     class Meta:
         model = PostImage
@@ -35,7 +47,8 @@ class PostImageSerializer(serializers.ModelSerializer):
             'image',
             'thumbnail',
             'width',
-            'height'
+            'height',
+            'variants'
         )
 
 
@@ -84,3 +97,16 @@ class PostMediaSerializer(serializers.ModelSerializer):
             'content_object',
             'order'
         )
+
+
+class PostMediaUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PostMediaUpload
+        fields = (
+            'id',
+            'order',
+            'status',
+            'stage',
+            'progress',
+            'error',
+        )
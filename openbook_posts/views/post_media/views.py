@@ -8,7 +8,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from openbook_moderation.permissions import IsNotSuspended
 from openbook_posts.views.post_media.serializers import AddPostMediaSerializer, GetPostMediaSerializer, \
-    PostMediaSerializer
+    PostMediaSerializer, PostMediaUploadSerializer
 
 
 class PostMedia(APIView):
@@ -52,3 +52,27 @@ class PostMedia(APIView):
         post_media_serializer = PostMediaSerializer(post_media, many=True, context={"request": request})
 
         return Response(post_media_serializer.data, status=status.HTTP_200_OK)
+
+
+class PostMediaUploads(APIView):
+    """
+    The ingestion status of the media added to a post
+    """
+    permission_classes = (IsAuthenticated, IsNotSuspended)
+
+    def get(self, request, post_uuid):
+        serializer = GetPostMediaSerializer(data={
+            'post_uuid': post_uuid
+        })
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        post_uuid = data.get('post_uuid')
+
+        user = request.user
+
+        post_media_uploads = user.get_media_uploads_for_post_with_uuid(post_uuid=post_uuid).order_by('order', 'pk')
+
+        post_media_uploads_serializer = PostMediaUploadSerializer(post_media_uploads, many=True)
+
+        return Response(post_media_uploads_serializer.data, status=status.HTTP_200_OK)
@@ -13,6 +13,7 @@ from openbook_common.serializers import CommonSearchCommunitiesSerializer, Commo
 from openbook_moderation.permissions import IsNotSuspended
 from openbook_common.utils.helpers import normalize_list_value_in_request_data, normalise_request_data
 from openbook_posts.permissions import IsGetOrIsAuthenticated
+from openbook_posts.viewer_state import PostsViewerState
 from openbook_posts.views.posts.serializers import AuthenticatedUserPostSerializer, \
     GetPostsSerializer, UnauthenticatedUserPostSerializer, CreatePostSerializer, GetTopPostsSerializer, \
     AuthenticatedUserTopPostSerializer, GetTrendingPostsSerializer, AuthenticatedUserTrendingPostSerializer, \
@@ -88,7 +89,11 @@ class Posts(APIView):
 
         posts = posts.order_by('-id')[:count]
 
-        post_serializer_data = AuthenticatedUserPostSerializer(posts, many=True, context={"request": request}).data
+        posts_viewer_state = PostsViewerState(user=user, posts=posts)
+
+        post_serializer_data = AuthenticatedUserPostSerializer(posts, many=True,
+                                                               context={"request": request,
+                                                                        "posts_viewer_state": posts_viewer_state}).data
 
         return Response(post_serializer_data, status=status.HTTP_200_OK)
 
@@ -122,7 +127,10 @@ class TrendingPosts(APIView):
         user = request.user
 
         posts = user.get_trending_posts_old()[:30]
-        posts_serializer = AuthenticatedUserPostSerializer(posts, many=True, context={"request": request})
+        posts_viewer_state = PostsViewerState(user=user, posts=posts)
+        posts_serializer = AuthenticatedUserPostSerializer(posts, many=True,
+                                                           context={"request": request,
+                                                                    "posts_viewer_state": posts_viewer_state})
         return Response(posts_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -142,8 +150,11 @@ class TrendingPostsNew(APIView):
         user = request.user
 
         trending_posts = user.get_trending_posts(max_id=max_id, min_id=min_id).order_by('-id')[:count]
+        posts_viewer_state = PostsViewerState(user=user,
+                                              posts=(trending_post.post for trending_post in trending_posts))
         posts_serializer = AuthenticatedUserTrendingPostSerializer(trending_posts, many=True,
-                                                                   context={"request": request})
+                                                                   context={"request": request,
+                                                                            "posts_viewer_state": posts_viewer_state})
         return Response(posts_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -166,7 +177,10 @@ class TopPosts(APIView):
 
         top_posts = user.get_top_posts(max_id=max_id, min_id=min_id,
                                        exclude_joined_communities=exclude_joined_communities).order_by('-id')[:count]
-        posts_serializer = AuthenticatedUserTopPostSerializer(top_posts, many=True, context={"request": request})
+        posts_viewer_state = PostsViewerState(user=user, posts=(top_post.post for top_post in top_posts))
+        posts_serializer = AuthenticatedUserTopPostSerializer(top_posts, many=True,
+                                                              context={"request": request,
+                                                                       "posts_viewer_state": posts_viewer_state})
         return Response(posts_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -12,7 +12,7 @@ class BaseEncodingBackend(six.with_metaclass(abc.ABCMeta)):
         return []
 
     @abc.abstractmethod
-    def encode(self, source_path, target_path, params):  # pragma: no cover
+    def encode(self, source_path, target_path, params, video_hash=None):  # pragma: no cover
         """
         Encodes a video to a specified file. All encoder specific options
         are passed in using `params`.
@@ -20,14 +20,17 @@ class BaseEncodingBackend(six.with_metaclass(abc.ABCMeta)):
         pass
 
     @abc.abstractmethod
-    def get_media_info(self, video_path):  # pragma: no cover
+    def get_media_info(self, video_path, video_hash=None):  # pragma: no cover
         """
         Returns duration, width and height of the video as dict.
+
+        `video_hash`, the hash of the video content if known, keys its
+        cached media info.
         """
         pass
 
     @abc.abstractmethod
-    def get_thumbnail(self, video_path):  # pragma: no cover
+    def get_thumbnail(self, video_path, video_hash=None):  # pragma: no cover
         """
         Extracts an image of a video and returns its path.
 
@@ -4,6 +4,7 @@ import logging
 import os
 import re
 import tempfile
+import time
 from subprocess import PIPE, Popen
 
 import six
@@ -12,6 +13,8 @@ from django.core import checks
 from .. import exceptions
 from ..compat import which
 from ..config import settings
+from ..media_info import get_file_hash, get_cached_media_info, cache_media_info, \
+    record_media_subprocess
 from .base import BaseEncodingBackend
 
 logger = logging.getLogger(__name__)
@@ -60,9 +63,9 @@ class FFmpegBackend(BaseEncodingBackend):
             ))
         return errors
 
-    def _spawn(self, cmds):
+    def _spawn(self, cmds, video_hash=None):
         try:
-            return Popen(
+            process = Popen(
                 cmds, shell=False,
                 stdin=PIPE, stdout=PIPE, stderr=PIPE,
                 close_fds=True,
@@ -71,8 +74,16 @@ class FFmpegBackend(BaseEncodingBackend):
             raise six.raise_from(
                 exceptions.FFmpegError('Error while running ffmpeg binary'), e)
 
+        # Recorded against the video once the process exits
+        process.video_hash = video_hash
+        process.started_at = time.perf_counter()
+        return process
+
     def _check_returncode(self, process):
         stdout, stderr = process.communicate()
+        if process.video_hash:
+            record_media_subprocess(process.video_hash,
+                                    time.perf_counter() - process.started_at)
         if process.returncode != 0:
             raise exceptions.FFmpegError("`{}` exited with code {:d}".format(
                 ' '.join(process.args), process.returncode))
@@ -81,19 +92,20 @@ class FFmpegBackend(BaseEncodingBackend):
         return self.stdout, self.stderr
 
     # TODO reduce complexity
-    def encode(self, source_path, target_path, params):  # NOQA: C901
+    def encode(self, source_path, target_path, params, video_hash=None):  # NOQA: C901
         """
         Encodes a video to a specified file. All encoder specific options
         are passed in using `params`.
         """
-        total_time = self.get_media_info(source_path)['duration']
+        video_hash = video_hash or get_file_hash(source_path)
+        total_time = self.get_media_info(source_path, video_hash=video_hash)['duration']
 
         cmds = [self.ffmpeg_path, '-i', source_path]
         cmds.extend(self.params)
         cmds.extend(params)
         cmds.extend([target_path])
 
-        process = self._spawn(cmds)
+        process = self._spawn(cmds, video_hash=video_hash)
 
         buf = output = ''
         # update progress
@@ -149,15 +161,30 @@ class FFmpegBackend(BaseEncodingBackend):
         del media_info['streams']
         return media_info
 
-    def get_media_info(self, video_path):
+    def get_media_info(self, video_path, video_hash=None):
         """
         Returns information about the given video as dict.
+
+        The video is probed once, its media info is cached by the hash of
+        its content, see `video_encoding.media_info`. The hash is computed
+        from the file unless it's given.
         """
+        video_hash = video_hash or get_file_hash(video_path)
+
+        media_info = get_cached_media_info(video_hash)
+
+        if media_info is None:
+            media_info = self._probe_media_info(video_path, video_hash)
+            cache_media_info(video_hash, media_info)
+
+        return media_info
+
+    def _probe_media_info(self, video_path, video_hash):
         cmds = [self.ffprobe_path, '-i', video_path]
         cmds.extend(['-print_format', 'json'])
         cmds.extend(['-show_format', '-show_streams'])
 
-        process = self._spawn(cmds)
+        process = self._spawn(cmds, video_hash=video_hash)
         stdout, __ = self._check_returncode(process)
 
         media_info = self._parse_media_info(stdout)
@@ -166,9 +193,11 @@ class FFmpegBackend(BaseEncodingBackend):
             'duration': float(media_info['format']['duration']),
             'width': int(media_info['video'][0]['width']),
             'height': int(media_info['video'][0]['height']),
+            'video': media_info['video'],
+            'audio': media_info['audio'],
         }
 
-    def get_thumbnail(self, video_path, at_time=0.5):
+    def get_thumbnail(self, video_path, at_time=0.5, video_hash=None):
         """
         Extracts an image of a video and returns its path.
 
@@ -179,7 +208,8 @@ class FFmpegBackend(BaseEncodingBackend):
         filename, __ = os.path.splitext(filename)
         _, image_path = tempfile.mkstemp(suffix='_{}.jpg'.format(filename))
 
-        video_duration = self.get_media_info(video_path)['duration']
+        video_hash = video_hash or get_file_hash(video_path)
+        video_duration = self.get_media_info(video_path, video_hash=video_hash)['duration']
         if at_time > video_duration:
             raise exceptions.InvalidTimeError()
         thumbnail_time = at_time
@@ -187,7 +217,7 @@ class FFmpegBackend(BaseEncodingBackend):
         cmds = [self.ffmpeg_path, '-i', video_path, '-vframes', '1']
         cmds.extend(['-ss', str(thumbnail_time), '-y', image_path])
 
-        process = self._spawn(cmds)
+        process = self._spawn(cmds, video_hash=video_hash)
         self._check_returncode(process)
 
         if not os.path.getsize(image_path):
@@ -7,6 +7,9 @@ class VideoEncodingAppConf(AppConf):
     PROGRESS_UPDATE = 30
     BACKEND = 'video_encoding.backends.ffmpeg.FFmpegBackend'
     BACKEND_PARAMS = {}
+    # The cache of the probed media info of the videos, see video_encoding.media_info
+    MEDIA_INFO_CACHE = 'default'
+    MEDIA_INFO_CACHE_TIMEOUT = 60 * 60 * 24 * 7
     FORMATS = {
         'FFmpeg': [
             {
@@ -24,8 +24,11 @@ class VideoField(ImageField):
     description = _("Video")
 
     def __init__(self, verbose_name=None, name=None, duration_field=None,
-                 **kwargs):
+                 hash_field=None, **kwargs):
         self.duration_field = duration_field
+        # The sha256 of the video content, its cached media info is used
+        # rather than fetching and probing the video again
+        self.hash_field = hash_field
         super(VideoField, self).__init__(verbose_name, name, **kwargs)
 
     def check(self, **kwargs):
@@ -4,6 +4,7 @@ from django.core.files import File
 
 from video_encoding.utils import get_fieldfile_local_path
 from .backends import get_backend
+from .media_info import get_cached_media_info
 
 
 class VideoFile(File):
@@ -41,11 +42,19 @@ class VideoFile(File):
         Returns basic information about the video as dictionary.
         """
         if not hasattr(self, '_info_cache'):
+            # The video might have been probed already, no need to fetch it
+            video_hash = self.get_video_hash()
+            info_cache = get_cached_media_info(video_hash) if video_hash else None
+
+            if info_cache is not None:
+                self._info_cache = info_cache
+                return self._info_cache
+
             encoding_backend = get_backend()
 
             local_path, local_tmp_file = get_fieldfile_local_path(fieldfile=self)
 
-            info_cache = encoding_backend.get_media_info(local_path)
+            info_cache = encoding_backend.get_media_info(local_path, video_hash=video_hash)
 
             if local_tmp_file:
                 os.unlink(local_tmp_file.name)
@@ -54,3 +63,14 @@ class VideoFile(File):
             self._info_cache = info_cache
 
         return self._info_cache
+
+    def get_video_hash(self):
+        """
+        Returns the hash of the video content as kept in the `hash_field` of its instance, if any.
+        """
+        hash_field = getattr(getattr(self, 'field', None), 'hash_field', None)
+
+        if not hash_field:
+            return None
+
+        return getattr(self.instance, hash_field, None)
@@ -0,0 +1,109 @@
+"""
+Media info cache.
+
+The media info of a video is probed once and cached keyed by the sha256 of its content, so the same video probed again,
+from another local copy or in another worker, is not probed again. The fields reading the dimensions and duration of
+the video, the thumbnails and the encodings all share the cached media info.
+
+The callers knowing the hash of the video, as kept in the `hash_field` of a VideoField, pass it along. Only the others
+read the whole file to hash it, once per local path.
+
+The subprocesses run for a video are recorded in the cache along with it, keyed by the same hash, as their count and
+total duration.
+"""
+import hashlib
+import logging
+import os
+from functools import lru_cache
+
+from django.core.cache import caches
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+MEDIA_INFO_CACHE_KEY = 'video-encoding-media-info-{hash}'
+MEDIA_SUBPROCESSES_COUNT_CACHE_KEY = 'video-encoding-subprocesses-count-{hash}'
+MEDIA_SUBPROCESSES_MILLISECONDS_CACHE_KEY = 'video-encoding-subprocesses-ms-{hash}'
+
+HASH_CHUNK_SIZE = 256 * 1024
+
+
+def get_file_hash(path):
+    """
+    Returns the sha256 of the content of the file at the given path.
+    """
+    stat = os.stat(path)
+    return _get_file_hash(path, stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=128)
+def _get_file_hash(path, size, mtime_ns):
+    # The size and modification time invalidate the hash of a path whose file changed
+    sha256 = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def get_cached_media_info(video_hash):
+    """
+    Returns the cached media info of the video with the given hash, or None if it was not probed yet.
+    """
+    try:
+        return _get_cache().get(MEDIA_INFO_CACHE_KEY.format(hash=video_hash))
+    except Exception as e:
+        logger.warning('Failed to get the cached media info of {}: {}'.format(video_hash, e))
+
+    return None
+
+
+def cache_media_info(video_hash, media_info):
+    try:
+        _get_cache().set(MEDIA_INFO_CACHE_KEY.format(hash=video_hash), media_info,
+                         settings.VIDEO_ENCODING_MEDIA_INFO_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning('Failed to cache the media info of {}: {}'.format(video_hash, e))
+
+
+def record_media_subprocess(video_hash, seconds):
+    """
+    Adds a subprocess of the given duration to the ones run for the video with the given hash.
+    """
+    logger.debug('Ran a subprocess for {} in {:.2f}s'.format(video_hash, seconds))
+
+    try:
+        cache = _get_cache()
+
+        for key, delta in ((MEDIA_SUBPROCESSES_COUNT_CACHE_KEY, 1),
+                           (MEDIA_SUBPROCESSES_MILLISECONDS_CACHE_KEY, int(seconds * 1000))):
+            key = key.format(hash=video_hash)
+            cache.add(key, 0, settings.VIDEO_ENCODING_MEDIA_INFO_CACHE_TIMEOUT)
+            cache.incr(key, delta)
+    except Exception as e:
+        logger.warning('Failed to record a subprocess of {}: {}'.format(video_hash, e))
+
+
+def get_media_subprocesses_stats(video_hash):
+    """
+    Returns the count and total duration in seconds of the subprocesses run for the video with the given hash.
+    """
+    if not video_hash:
+        return 0, 0.0
+
+    try:
+        cache = _get_cache()
+        count = cache.get(MEDIA_SUBPROCESSES_COUNT_CACHE_KEY.format(hash=video_hash)) or 0
+        milliseconds = cache.get(MEDIA_SUBPROCESSES_MILLISECONDS_CACHE_KEY.format(hash=video_hash)) or 0
+    except Exception as e:
+        logger.warning('Failed to get the subprocesses of {}: {}'.format(video_hash, e))
+        return 0, 0.0
+
+    return count, milliseconds / 1000
+
+
+def _get_cache():
+    return caches[settings.VIDEO_ENCODING_MEDIA_INFO_CACHE]
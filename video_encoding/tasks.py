@@ -38,8 +38,39 @@ def convert_video(fieldfile, force=False):
     """
     Converts a given video file into all defined formats.
     """
+    encoding_backend = get_backend()
+
+    for options in settings.VIDEO_ENCODING_FORMATS[encoding_backend.name]:
+        convert_video_to_format(fieldfile, options, force=force)
+
+
+def get_or_create_video_format(fieldfile, options):
+    """
+    Returns the format of a given video file for the given format options and whether it was created.
+    """
     instance = fieldfile.instance
-    field = fieldfile.field
+
+    video_format, created = Format.objects.get_or_create(
+        object_id=instance.pk,
+        content_type=ContentType.objects.get_for_model(instance),
+        field_name=fieldfile.field.name, format=options['name'])
+
+    return video_format, created
+
+
+def convert_video_to_format(fieldfile, options, force=False):
+    """
+    Converts a given video file into the given format. Returns the format, or None if the encoding failed.
+    Formats with a `height` are scaled to it, but never above the height of the video.
+    """
+    video_format, created = get_or_create_video_format(fieldfile=fieldfile, options=options)
+
+    # do not reencode if not requested
+    if video_format.file and not force:
+        return video_format
+
+    # set progress to 0
+    video_format.reset_progress()
 
     local_path, temp_file = get_fieldfile_local_path(fieldfile=fieldfile)
 
@@ -48,27 +79,21 @@ def convert_video(fieldfile, force=False):
 
     encoding_backend = get_backend()
 
-    for options in settings.VIDEO_ENCODING_FORMATS[encoding_backend.name]:
-        video_format, created = Format.objects.get_or_create(
-            object_id=instance.pk,
-            content_type=ContentType.objects.get_for_model(instance),
-            field_name=field.name, format=options['name'])
-
-        # do not reencode if not requested
-        if video_format.file and not force:
-            continue
-        else:
-            # set progress to 0
-            video_format.reset_progress()
+    params = options['params']
 
-        # TODO do not upscale videos
+    if options.get('height'):
+        params = params + ['-vf', 'scale=-2:{:d}'.format(
+            _get_format_height(fieldfile=fieldfile, height=options['height']))]
 
-        _, target_path = tempfile.mkstemp(
-            suffix='_{name}.{extension}'.format(**options))
+    _, target_path = tempfile.mkstemp(
+        suffix='_{name}.{extension}'.format(**options))
 
+    try:
         try:
+            # The hash known for the video spares hashing the local copy
             encoding = encoding_backend.encode(
-                source_path, target_path, options['params'])
+                source_path, target_path, params,
+                video_hash=fieldfile.get_video_hash())
             while encoding:
                 try:
                     progress = next(encoding)
@@ -78,20 +103,39 @@ def convert_video(fieldfile, force=False):
         except VideoEncodingError:
             # TODO handle with more care
             video_format.delete()
-            os.remove(target_path)
-            continue
+            return None
 
         # save encoded file
-        video_format.file.save(
-            '{filename}_{name}.{extension}'.format(filename=filename,
-                                                   **options),
-            File(open(target_path, mode='rb')))
+        with open(target_path, mode='rb') as target_file:
+            video_format.file.save(
+                '{filename}_{name}.{extension}'.format(filename=filename,
+                                                       **options),
+                File(target_file))
 
         video_format.update_progress(100)  # now we are ready
-
-        # remove temporary file
+    finally:
+        # remove temporary files
         os.remove(target_path)
 
         if temp_file:
             os.unlink(temp_file.name)
             temp_file.close()
+
+    return video_format
+
+
+def _get_format_height(fieldfile, height):
+    """
+    Returns the given height, capped to the height of the video so it's not upscaled. x264 requires an even height.
+    """
+    height_field = fieldfile.field.height_field
+    video_height = getattr(fieldfile.instance, height_field, None) if height_field else None
+
+    if not video_height:
+        # The probed height, cached along with the media info of the video
+        video_height = fieldfile.height
+
+    if video_height:
+        height = min(height, video_height - video_height % 2)
+
+    return height